@@ -0,0 +1,127 @@
+"""
+CSV tur import'u — satır başına insert vs akışla okuma + parça parça multi-row insert
+
+Eski import_csv dosyayı tamamen belleğe alıp her satır için ayrı bir insert
+yapıyordu (N round trip). Yeni akış satırları spooled dosyadan okur ve
+IMPORT_BATCH_SIZE'lık multi-row insert'lerle yazar (N / batch round trip).
+Legacy yol BENCH_LEGACY_ROWS satırda ölçülür ve satır başına süreyle toplam
+satıra ölçeklenir (10k satır × gecikme dakikalar sürer).
+
+    cd backend && python -m benchmarks.bench_csv_import
+"""
+
+import asyncio
+import csv
+import io
+import logging
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.common import BACKEND_DIR  # noqa: F401
+
+import httpx
+
+import dependencies
+from tour_import import iter_csv_rows, import_tours, IMPORT_BATCH_SIZE
+
+ROWS = int(os.getenv("BENCH_ROWS", "10000"))
+LEGACY_ROWS = int(os.getenv("BENCH_LEGACY_ROWS", "500"))
+LATENCY = float(os.getenv("BENCH_DB_LATENCY", "0.01"))
+USER = {"id": "bench-admin", "email": "admin@bench.local"}
+
+FIELDS = ["title", "operator", "price", "currency", "start_date", "end_date", "duration",
+          "hotel", "services", "visa", "transport", "guide", "itinerary", "rating"]
+
+
+def synthetic_csv(rows: int) -> bytes:
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=FIELDS)
+    writer.writeheader()
+    for i in range(rows):
+        writer.writerow({
+            "title": f"Umre Turu {i}", "operator": f"Operatör {i % 40}", "price": 1500 + i % 2000,
+            "currency": "USD", "start_date": "2026-03-01", "end_date": "2026-03-15", "duration": "15 gün",
+            "hotel": "Hilton Makkah", "services": "Vize,Uçak,Transfer", "visa": "Dahil", "transport": "Otobüs",
+            "guide": "Türkçe rehber", "itinerary": "Mekke|Medine", "rating": "4.5",
+        })
+    return out.getvalue().encode("utf-8")
+
+
+def spooled(data: bytes):
+    # UploadFile ile aynı: 1 MB'a kadar bellekte, sonra diske taşan dosya
+    f = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    f.write(data)
+    f.seek(0)
+    return f
+
+
+class FakePostgrest:
+    def __init__(self):
+        self.requests = 0
+        self.rows = 0
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(LATENCY)
+        self.requests += 1
+        body = request.content
+        self.rows += body.count(b'"operator_id"')
+        return httpx.Response(201, headers={"content-type": "application/json"}, content=b"[]")
+
+
+async def legacy_import(file) -> int:
+    """Önceki import_csv gövdesi: read() + decode + satır başına insert"""
+    contents = file.read()
+    reader = csv.DictReader(io.StringIO(contents.decode('utf-8')))
+    imported = 0
+    for row in reader:
+        tour_doc = {
+            "operator_id": USER["id"], "title": row['title'], "operator": row['operator'],
+            "price": float(row['price']), "currency": row['currency'],
+            "start_date": row.get('start_date', ''), "end_date": row.get('end_date', ''),
+            "duration": row['duration'], "hotel": row['hotel'],
+            "services": row.get('services', '').split(',') if row.get('services') else [],
+            "visa": row['visa'], "transport": row.get('transport', ''), "guide": row.get('guide', ''),
+            "itinerary": row.get('itinerary', '').split('|') if row.get('itinerary') else [],
+            "rating": float(row['rating']) if row.get('rating') else None,
+            "source": "csv_import", "created_by": USER["email"], "status": "approved",
+        }
+        await dependencies.db.execute(dependencies.db.table("tours").insert(tour_doc))
+        imported += 1
+    return imported
+
+
+async def measure(name: str, run, data: bytes, rows: int, scale: float = 1.0):
+    fake = FakePostgrest()
+    dependencies.db.transport = httpx.MockTransport(fake.handler)
+    await dependencies.db.aclose()
+    tracemalloc.start()
+    started = time.perf_counter()
+    imported = await run(spooled(data))
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    await dependencies.db.aclose()
+    assert imported == rows and fake.rows == rows, (imported, fake.rows)
+    note = f"  (≈{elapsed * scale:6.1f}s @ {ROWS} satır, ölçeklenmiş)" if scale != 1.0 else ""
+    print(
+        f"{name:<24} satır={rows:6d}  round trip={fake.requests:6d}  "
+        f"süre={elapsed:7.2f}s  tepe bellek={peak / 1024 / 1024:6.1f}MB{note}"
+    )
+
+
+async def main():
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    print(f"DB gecikmesi={LATENCY * 1000:.0f}ms, parça={IMPORT_BATCH_SIZE}")
+
+    async def streamed(file):
+        return (await import_tours(iter_csv_rows(file), USER, dependencies.insert_rows)).imported
+
+    await measure("legacy (satır başına)", legacy_import, synthetic_csv(LEGACY_ROWS), LEGACY_ROWS, ROWS / LEGACY_ROWS)
+    await measure("akış + multi-row insert", streamed, synthetic_csv(ROWS), ROWS)
+    dependencies.db.transport = None
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
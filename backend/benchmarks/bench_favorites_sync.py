@@ -0,0 +1,102 @@
+"""
+POST /api/favorites/sync — id başına 2 sorgu vs tek in_() + tek multi-row upsert
+
+Eski sync_favorites her tur id'si için önce durum select'i sonra upsert yapıyordu
+(2N ardışık round trip). Yeni sürüm durumu tek in_("id", ...) sorgusuyla okur,
+onaylı turları tek multi-row upsert ile yazar (en fazla 2 round trip).
+
+    cd backend && python -m benchmarks.bench_favorites_sync
+"""
+
+import asyncio
+import contextlib
+import io
+import logging
+import os
+import time
+
+from benchmarks.common import BACKEND_DIR, TOURS, _postgrest_response  # noqa: F401
+
+import httpx
+from fastapi import FastAPI
+
+import dependencies
+from dependencies import db, get_current_user, FavoriteSync
+from routes.user_routes import router as user_router
+
+IDS = int(os.getenv("BENCH_IDS", "200"))
+LATENCY = float(os.getenv("BENCH_DB_LATENCY", "0.01"))
+ROUNDS = int(os.getenv("BENCH_ROUNDS", "3"))
+USER = {"id": "bench-user", "email": "user@bench.local", "role": "user"}
+
+
+class CountingPostgrest:
+    def __init__(self):
+        self.requests = 0
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(LATENCY)
+        self.requests += 1
+        if request.method == "GET":
+            return _postgrest_response(request)
+        return httpx.Response(201, headers={"content-type": "application/json"}, content=b"")
+
+
+def build_legacy_app() -> FastAPI:
+    """Önceki sync_favorites gövdesi: id başına select + upsert"""
+    app = FastAPI()
+
+    @app.post("/api/favorites/sync")
+    async def sync_favorites(data: FavoriteSync):
+        synced = skipped = 0
+        for tour_id in data.tour_ids:
+            tour_check = await db.execute(db.table("tours").select("id, status").eq("id", tour_id))
+            if not tour_check.data or tour_check.data[0].get("status") != "approved":
+                skipped += 1
+                continue
+            await db.execute(db.table("favorites").upsert(
+                {"user_id": USER["id"], "tour_id": tour_id}, on_conflict="user_id,tour_id"
+            ))
+            synced += 1
+        return {"synced": synced, "skipped": skipped}
+
+    return app
+
+
+def build_batched_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(user_router)
+    app.dependency_overrides[get_current_user] = lambda: USER
+    return app
+
+
+async def measure(name: str, app: FastAPI, tour_ids: list):
+    fake = CountingPostgrest()
+    db.transport = httpx.MockTransport(fake.handler)
+    await db.aclose()
+    timings = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for _ in range(ROUNDS):
+            # log_security_event stdout'a yazar; ölçüme ve çıktıya girmesin
+            with contextlib.redirect_stdout(io.StringIO()):
+                started = time.perf_counter()
+                response = await client.post("/api/favorites/sync", json={"tour_ids": tour_ids})
+                timings.append(time.perf_counter() - started)
+            assert response.status_code == 200 and response.json()["synced"] == len(tour_ids), response.text
+    await db.aclose()
+    print(f"{name:<28} round trip/istek={fake.requests // ROUNDS:5d}  süre={min(timings) * 1000:8.1f}ms")
+    return min(timings)
+
+
+async def main():
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    tour_ids = [tour["id"] for tour in TOURS][:IDS]
+    print(f"DB gecikmesi={LATENCY * 1000:.0f}ms, favori={len(tour_ids)}, tur={ROUNDS} (en iyi)")
+    legacy = await measure("legacy (id başına 2 sorgu)", build_legacy_app(), tour_ids)
+    batched = await measure("in_() + multi-row upsert", build_batched_app(), tour_ids)
+    print(f"hızlanma: {legacy / batched:.0f}x")
+    dependencies.db.transport = None
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,106 @@
+"""
+Import okuyucuları — CSV / XLSX / NDJSON için süre ve tepe bellek
+
+Her biçim aynı satırlarla iki boyutta (ROWS ve 4 × ROWS) üretilir ve okuyucudan
+import_tours'a (yazma no-op) akıtılır. Tepe bellek dosya boyutuyla büyümemeli:
+okuyucular dosyayı bütün olarak belleğe almaz, akış en fazla bir parça tutar.
+Karşılaştırma için eski yol (read() + decode + csv) da ölçülür.
+
+    cd backend && python -m benchmarks.bench_import_readers
+"""
+
+import asyncio
+import csv
+import io
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.common import BACKEND_DIR  # noqa: F401
+
+from benchmarks.bench_csv_import import FIELDS, synthetic_csv
+from tour_import import IMPORT_READERS, XLSX_AVAILABLE, import_tours
+
+ROWS = int(os.getenv("BENCH_ROWS", "5000"))
+USER = {"id": "bench-admin", "email": "admin@bench.local"}
+
+
+def synthetic_files(rows: int) -> dict:
+    data = synthetic_csv(rows)
+    records = list(csv.DictReader(io.StringIO(data.decode("utf-8"))))
+    files = {
+        "csv": data,
+        "csv (cp1254, ;)": data.decode("utf-8").replace(",", ";").encode("cp1254"),
+        "ndjson": "\n".join(json.dumps(r, ensure_ascii=False) for r in records).encode("utf-8"),
+    }
+    if XLSX_AVAILABLE:
+        import openpyxl
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(FIELDS)
+        for record in records:
+            sheet.append([record[field] for field in FIELDS])
+        out = io.BytesIO()
+        workbook.save(out)
+        files["xlsx"] = out.getvalue()
+    return files
+
+
+def spooled(data: bytes):
+    f = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    f.write(data)
+    f.seek(0)
+    return f
+
+
+async def _no_insert(table, rows):
+    pass
+
+
+async def legacy_read(file) -> int:
+    """Önceki import_csv okuması: tamamını belleğe al, UTF-8 çöz"""
+    contents = file.read()
+    return sum(1 for _ in csv.DictReader(io.StringIO(contents.decode("utf-8"))))
+
+
+async def streamed(file_format: str, file) -> int:
+    reader = IMPORT_READERS[file_format.split(" ")[0]]
+    return (await import_tours(reader(file), USER, _no_insert)).imported
+
+
+async def measure(run, data: bytes):
+    file = spooled(data)
+    tracemalloc.start()
+    started = time.perf_counter()
+    count = await run(file)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count, elapsed, peak / 1024 / 1024
+
+
+async def main():
+    small, large = synthetic_files(ROWS), synthetic_files(ROWS * 4)
+    print(f"satır={ROWS} / {ROWS * 4}" + ("" if XLSX_AVAILABLE else "  (openpyxl yok: xlsx atlandı)"))
+
+    for name in small:
+        results = []
+        for files, rows in ((small, ROWS), (large, ROWS * 4)):
+            count, elapsed, peak = await measure(lambda f: streamed(name, f), files[name])
+            assert count == rows, (name, count)
+            results.append((len(files[name]) / 1024 / 1024, elapsed, peak))
+        (s_size, s_time, s_peak), (l_size, l_time, l_peak) = results
+        print(
+            f"{name:<16} dosya={s_size:5.1f}/{l_size:5.1f}MB  süre={s_time:6.2f}/{l_time:6.2f}s  "
+            f"tepe bellek={s_peak:5.1f}/{l_peak:5.1f}MB"
+        )
+
+    _, _, s_peak = await measure(legacy_read, small["csv"])
+    _, _, l_peak = await measure(legacy_read, large["csv"])
+    print(f"{'legacy (read())':<16} tepe bellek={s_peak:5.1f}/{l_peak:5.1f}MB")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,115 @@
+"""
+Prompt injection dedektörü — mesaj başına maliyet (uzun girdiler)
+
+Eski dedektör her çağrıda ~20 derlenmemiş `re.search`, 4 separator regex'i,
+karakter karakter homoglyph dict araması yapıyor ve `detect_prompt_injection`
+içinde metni yeniden normalize ediyordu. Yeni dedektör tek alternation regex,
+`str.translate` tablosu ve içerik hash'i ile memoization kullanır.
+
+    cd backend && python -m benchmarks.bench_injection_detector
+"""
+
+import base64
+import os
+import re
+import time
+import unicodedata
+
+from benchmarks.common import BACKEND_DIR  # noqa: F401  (sys.path + dummy env)
+
+import ai_service
+from ai_service import PROMPT_INJECTION_PATTERNS
+
+ITERATIONS = int(os.getenv("BENCH_ITERATIONS", "300"))
+
+
+# ============================================
+# LEGACY (referans) — değişiklik öncesi davranış
+# ============================================
+
+def legacy_detect_prompt_injection(text: str) -> bool:
+    if not text:
+        return False
+    text_lower = unicodedata.normalize('NFKC', text).lower()
+    for pattern in PROMPT_INJECTION_PATTERNS:
+        if re.search(pattern, text_lower):
+            return True
+    return False
+
+
+def legacy_detect_prompt_injection_advanced(text: str) -> bool:
+    if not text:
+        return False
+    text_normalized = unicodedata.normalize('NFKC', text)
+    for match in re.findall(r'[A-Za-z0-9+/]{20,}={0,2}', text):
+        try:
+            decoded = base64.b64decode(match).decode('utf-8', errors='ignore')
+            if legacy_detect_prompt_injection(decoded):
+                return True
+        except Exception:
+            pass
+    homoglyph_map = {
+        'а': 'a', 'е': 'e', 'і': 'i', 'о': 'o', 'р': 'p', 'с': 'c', 'у': 'y',
+        'А': 'A', 'В': 'B', 'Е': 'E', 'К': 'K', 'М': 'M', 'Н': 'H', 'О': 'O',
+        'Р': 'P', 'С': 'C', 'Т': 'T', 'Х': 'X', 'х': 'x', 'ѕ': 's', 'ј': 'j',
+        'α': 'a', 'β': 'b', 'ε': 'e', 'η': 'n', 'ι': 'i', 'κ': 'k', 'ν': 'v',
+        'ο': 'o', 'ρ': 'p', 'τ': 't', 'υ': 'u', 'χ': 'x',
+    }
+    text_dehomoglyph = ''.join(homoglyph_map.get(c, c) for c in text_normalized)
+    text_no_comments = re.sub(r'<!--.*?-->', '', text_dehomoglyph, flags=re.DOTALL)
+    text_no_comments = re.sub(r'/\*.*?\*/', '', text_no_comments, flags=re.DOTALL)
+    text_no_comments = re.sub(r'```.*?```', '', text_no_comments, flags=re.DOTALL)
+    separator_patterns = [
+        r'\[END\s*(OF)?\s*(TOUR|USER|DATA|INPUT|TEXT)\s*(INFO|DATA|MESSAGE)?\]',
+        r'---+\s*(NEW|SYSTEM|ADMIN)\s*(INSTRUCTION|COMMAND|PROMPT)',
+        r'<\s*/?\s*(system|admin|instruction)',
+        r'###\s*(OVERRIDE|NEW|SYSTEM)',
+    ]
+    for sep_pattern in separator_patterns:
+        if re.search(sep_pattern, text_no_comments, re.IGNORECASE):
+            return True
+    return legacy_detect_prompt_injection(text_no_comments)
+
+
+# ============================================
+# GİRDİLER
+# ============================================
+
+PARAGRAPH = (
+    "Mekke'de Harem-i Şerif'e 300 metre mesafedeki Hilton otelinde konaklama, "
+    "Medine'de Mescid-i Nebevi'ye yürüme mesafesinde 5 yıldızlı otel, Türkçe rehber, "
+    "vize işlemleri ve tüm transferler pakete dahildir. Kahvaltı ve akşam yemeği açık büfe. "
+)
+
+INPUTS = {
+    "chat message (500 chars)": (PARAGRAPH * 3)[:500],
+    "tour description (8 KB)": PARAGRAPH * 40,
+    "tour description + base64": PARAGRAPH * 40 + " " + base64.b64encode(b"harmless tour reference data 2026").decode(),
+}
+
+
+def bench(fn, text: str, unique: bool) -> float:
+    """Mesaj başına ortalama süre (µs); unique=True memoization'ı devre dışı bırakır"""
+    texts = [f"{text} #{i}" for i in range(ITERATIONS)] if unique else [text] * ITERATIONS
+    started = time.perf_counter()
+    for t in texts:
+        fn(t)
+    return (time.perf_counter() - started) / ITERATIONS * 1e6
+
+
+def main():
+    print(f"iterations={ITERATIONS}")
+    for name, text in INPUTS.items():
+        assert legacy_detect_prompt_injection_advanced(text) == ai_service.detect_prompt_injection_advanced(text)
+        legacy = bench(legacy_detect_prompt_injection_advanced, text, unique=True)
+        ai_service._injection_verdicts.clear()
+        compiled = bench(ai_service.detect_prompt_injection_advanced, text, unique=True)
+        memoized = bench(ai_service.detect_prompt_injection_advanced, text, unique=False)
+        print(
+            f"{name:<28} legacy={legacy:9.1f}µs  compiled={compiled:9.1f}µs  "
+            f"memoized={memoized:7.1f}µs  ({legacy / compiled:4.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Kumru çağrıları sürerken diğer endpoint'lerin yanıt süresi — senkron vs async client
+
+Eski kod `async def chat` içinde senkron `OpenAI` client'ını çağırıyordu; HF
+Router yanıtı beklenirken event loop donuyor, aynı süreçteki her istek
+bekliyordu. Yeni kod pooled `AsyncOpenAI` + semaphore kullanır.
+
+Ölçüm: KUMRU_CALLS adet Kumru sohbeti başlatılır, bu sırada hafif bir
+endpoint'e (GET /api/currencies) ardışık probe istekleri atılır.
+
+    cd backend && python -m benchmarks.bench_kumru_responsiveness
+"""
+
+import asyncio
+import json
+import os
+import statistics
+import time
+
+from benchmarks.common import BACKEND_DIR  # noqa: F401  (sys.path + dummy env)
+
+import httpx
+from fastapi import FastAPI
+from openai import AsyncOpenAI, OpenAI
+
+import ai_service
+from routes.ai_routes import router as ai_router
+
+KUMRU_LATENCY = float(os.getenv("BENCH_KUMRU_LATENCY", "0.3"))
+KUMRU_CALLS = int(os.getenv("BENCH_KUMRU_CALLS", "8"))
+PROBE_INTERVAL = 0.01
+
+
+def _completion_body() -> bytes:
+    return json.dumps({
+        "id": "bench", "object": "chat.completion", "created": 0, "model": ai_service.KUMRU_MODEL,
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": "Umre için en uygun dönem sonbahardır."}}],
+    }).encode()
+
+
+def _sync_router(request: httpx.Request) -> httpx.Response:
+    time.sleep(KUMRU_LATENCY)
+    return httpx.Response(200, headers={"content-type": "application/json"}, content=_completion_body())
+
+
+async def _async_router(request: httpx.Request) -> httpx.Response:
+    await asyncio.sleep(KUMRU_LATENCY)
+    return httpx.Response(200, headers={"content-type": "application/json"}, content=_completion_body())
+
+
+def build_legacy_app() -> FastAPI:
+    """Önceki davranış: async handler içinde senkron OpenAI client"""
+    client = OpenAI(base_url="https://router.bench/v1", api_key="bench",
+                    http_client=httpx.Client(transport=httpx.MockTransport(_sync_router)))
+    app = FastAPI()
+    app.include_router(ai_router)
+
+    @app.post("/bench/kumru")
+    async def kumru():
+        completion = client.chat.completions.create(
+            model=ai_service.KUMRU_MODEL,
+            messages=[{"role": "user", "content": "Umre ne zaman?"}],
+            max_tokens=500,
+        )
+        return {"answer": completion.choices[0].message.content}
+
+    return app
+
+
+def build_async_app() -> FastAPI:
+    """Yeni davranış: AIService.chat → pooled AsyncOpenAI"""
+    ai_service.kumru_client = AsyncOpenAI(base_url="https://router.bench/v1", api_key="bench",
+                                          http_client=httpx.AsyncClient(transport=httpx.MockTransport(_async_router)))
+    service = ai_service.AIService()
+    app = FastAPI()
+    app.include_router(ai_router)
+
+    @app.post("/bench/kumru")
+    async def kumru():
+        return {"answer": await service.chat("Umre ne zaman?", provider="kumru")}
+
+    return app
+
+
+async def measure(app: FastAPI) -> dict:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60) as client:
+        started = time.perf_counter()
+        calls = [asyncio.create_task(client.post("/bench/kumru")) for _ in range(KUMRU_CALLS)]
+
+        # Probe süresi, Kumru task'ları henüz çalışmadan başlar: loop donarsa beklenen süre sayılır
+        probes = []
+        while True:
+            t0 = time.perf_counter()
+            response = await asyncio.create_task(client.get("/api/currencies"))
+            probes.append(time.perf_counter() - t0)
+            assert response.status_code == 200
+            if all(call.done() for call in calls):
+                break
+            await asyncio.sleep(PROBE_INTERVAL)
+
+        responses = await asyncio.gather(*calls)
+        assert all(r.status_code == 200 for r in responses)
+        elapsed = time.perf_counter() - started
+
+    probes.sort()
+    return {
+        "kumru_total_s": elapsed,
+        "probes": len(probes),
+        "probe_p50_ms": statistics.median(probes) * 1000,
+        "probe_max_ms": probes[-1] * 1000,
+    }
+
+
+def print_result(name: str, result: dict):
+    print(
+        f"{name:<22} kumru_total={result['kumru_total_s']:6.2f}s  probes={result['probes']:4d}  "
+        f"probe_p50={result['probe_p50_ms']:8.1f}ms  probe_max={result['probe_max_ms']:8.1f}ms"
+    )
+
+
+async def main():
+    print(f"Kumru calls={KUMRU_CALLS}, router latency={KUMRU_LATENCY * 1000:.0f}ms")
+    print_result("sync OpenAI (before)", await measure(build_legacy_app()))
+    print_result("AsyncOpenAI (after)", await measure(build_async_app()))
+    await ai_service.close_kumru_client()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
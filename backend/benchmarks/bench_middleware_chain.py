@@ -0,0 +1,145 @@
+"""
+Middleware zinciri — BaseHTTPMiddleware vs pure ASGI istek başına ek maliyet
+
+Eski zincir WAF ve security headers / signing için @app.middleware("http"),
+logging ve timeout için BaseHTTPMiddleware kullanıyordu; her katman ayrı bir
+task ve yanıt akışı sarmalıyordu. Yeni zincir aynı sırada pure ASGI sınıflarıdır.
+Her iki zincir de CORS'la birlikte aynı (middleware'siz) endpoint'in önüne
+konur; ek maliyet = zincirli ortalama − çıplak ortalama.
+
+    cd backend && python -m benchmarks.bench_middleware_chain
+"""
+
+import asyncio
+import logging
+import os
+import statistics
+import time
+
+from benchmarks.common import BACKEND_DIR  # noqa: F401
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+
+import server
+from security import SecurityHeadersMiddleware, SECURITY_HEADERS
+from signing import RequestSignatureMiddleware
+from logging_config import RequestLoggingMiddleware, logger
+
+REQUESTS = int(os.getenv("BENCH_REQUESTS", "2000"))
+ROUNDS = int(os.getenv("BENCH_ROUNDS", "5"))
+PATH = "/api/user/favorites"
+
+
+# ---------- eski zincir (BaseHTTPMiddleware / @app.middleware("http")) ----------
+
+async def legacy_security_headers(request: Request, call_next):
+    response = await call_next(request)
+    for name, value in SECURITY_HEADERS.items():
+        response.headers[name] = value
+    return response
+
+
+async def legacy_signature(request: Request, call_next):
+    # API_SIGNING_SECRET yok → doğrudan geçer (yeni zincirle aynı yol)
+    return await call_next(request)
+
+
+class LegacyLogging(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        start = time.time()
+        response = await call_next(request)
+        logger.info(f"{request.method} {request.url.path} {response.status_code} {int((time.time() - start) * 1000)}ms user=anon")
+        return response
+
+
+class LegacyTimeout(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        timeout = 60 if "/api/chat" in str(request.url) or "/api/compare" in str(request.url) else 30
+        try:
+            return await asyncio.wait_for(call_next(request), timeout=timeout)
+        except asyncio.TimeoutError:
+            return JSONResponse(status_code=504, content={"detail": "timeout"})
+
+
+async def legacy_waf(request: Request, call_next):
+    path = request.url.path.lower()
+    for blocked in server.WAF_BLOCKED_PATHS:
+        if blocked in path:
+            return JSONResponse(status_code=403, content={"detail": "Access Denied"})
+    return await call_next(request)
+
+
+def _base_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get(PATH)
+    async def favorites():
+        return {"favorites": [1, 2, 3]}
+
+    return app
+
+
+def _add_cors(app: FastAPI):
+    app.add_middleware(CORSMiddleware, allow_origins=["http://localhost:3000"], allow_credentials=True,
+                       allow_methods=["*"], allow_headers=["*"], max_age=600)
+
+
+def build_legacy_app() -> FastAPI:
+    app = _base_app()
+    app.add_middleware(LegacyLogging)
+    app.middleware("http")(legacy_security_headers)
+    app.middleware("http")(legacy_signature)
+    _add_cors(app)
+    app.add_middleware(LegacyTimeout)
+    app.middleware("http")(legacy_waf)
+    return app
+
+
+def build_asgi_app() -> FastAPI:
+    # server.py ile aynı sıra
+    app = _base_app()
+    app.add_middleware(RequestLoggingMiddleware)
+    app.add_middleware(SecurityHeadersMiddleware)
+    app.add_middleware(RequestSignatureMiddleware)
+    _add_cors(app)
+    app.add_middleware(server.TimeoutMiddleware)
+    app.add_middleware(server.WAFMiddleware)
+    return app
+
+
+async def per_request_us(app: FastAPI) -> float:
+    """Ardışık isteklerin ortalama süresi (µs); ROUNDS turun medyanı"""
+    headers = {"Origin": "http://localhost:3000"}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for _ in range(50):
+            await client.get(PATH, headers=headers)
+        rounds = []
+        for _ in range(ROUNDS):
+            started = time.perf_counter()
+            for _ in range(REQUESTS):
+                response = await client.get(PATH, headers=headers)
+            rounds.append((time.perf_counter() - started) / REQUESTS * 1e6)
+            assert response.status_code == 200
+    return statistics.median(rounds)
+
+
+async def main():
+    # log I/O'su ölçüme girmesin
+    logger.disabled = True
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    bare = await per_request_us(_base_app())
+    legacy = await per_request_us(build_legacy_app())
+    asgi = await per_request_us(build_asgi_app())
+    print(f"istek={REQUESTS} × {ROUNDS} tur (medyan)")
+    print(f"{'middleware yok':<28} {bare:8.1f}µs/istek")
+    print(f"{'legacy (BaseHTTPMiddleware)':<28} {legacy:8.1f}µs/istek  zincir={legacy - bare:7.1f}µs")
+    print(f"{'pure ASGI':<28} {asgi:8.1f}µs/istek  zincir={asgi - bare:7.1f}µs")
+    print(f"zincir maliyeti: %{(1 - (asgi - bare) / (legacy - bare)) * 100:.0f} azaldı")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,74 @@
+"""
+Semantic cache hit-rate benchmark (Türkçe soru korpusu)
+
+Her gruptaki ilk soru "yanıtlanmış" olarak indekslenir; kalan varyasyonlar
+sorgulanır. Ölçülenler:
+  - hit rate      : varyasyonun kendi grubunun yanıtını alma oranı
+  - wrong hits    : başka grubun yanıtını alma (yanlış pozitif)
+  - distinct hits : hiçbir gruba ait olmayan soruların cache'ten yanıtlanması
+  - exact-key hit : eski tam eşleşme anahtarıyla (cache.get_ai_cache_key) hit oranı
+
+    cd backend && python -m benchmarks.bench_semantic_cache
+"""
+
+import json
+import os
+import time
+
+from benchmarks.common import BACKEND_DIR  # noqa: F401  (sys.path + dummy env)
+
+from cache import get_ai_cache_key
+from semantic_cache import SemanticCache, SEMANTIC_CACHE_THRESHOLD
+
+CORPUS = os.path.join(os.path.dirname(__file__), "data", "turkish_questions.json")
+
+
+def evaluate(threshold: float, groups: list, distinct: list) -> dict:
+    index = SemanticCache(threshold=threshold, max_entries=10000)
+    for group_no, group in enumerate(groups):
+        index.add(group[0], "openai", f"answer-{group_no}")
+
+    hits = wrong = queries = 0
+    started = time.perf_counter()
+    for group_no, group in enumerate(groups):
+        for question in group[1:]:
+            queries += 1
+            answer = index.lookup(question, "openai")
+            if answer == f"answer-{group_no}":
+                hits += 1
+            elif answer is not None:
+                wrong += 1
+    distinct_hits = sum(1 for q in distinct if index.lookup(q, "openai") is not None)
+    elapsed = time.perf_counter() - started
+
+    return {
+        "threshold": threshold,
+        "hit_rate": hits / queries,
+        "wrong_hits": wrong,
+        "distinct_hits": distinct_hits,
+        "lookup_us": elapsed / (queries + len(distinct)) * 1e6,
+    }
+
+
+def exact_key_hit_rate(groups: list) -> float:
+    seeded = {get_ai_cache_key(group[0], "openai") for group in groups}
+    queries = [q for group in groups for q in group[1:]]
+    return sum(1 for q in queries if get_ai_cache_key(q, "openai") in seeded) / len(queries)
+
+
+def main():
+    with open(CORPUS, encoding="utf-8") as f:
+        corpus = json.load(f)
+    groups, distinct = corpus["groups"], corpus["distinct"]
+
+    print(f"{len(groups)} grup, {sum(len(g) - 1 for g in groups)} varyasyon, {len(distinct)} farklı soru")
+    print(f"exact-key hit rate: {exact_key_hit_rate(groups):.0%}")
+    print(f"{'threshold':>9} {'hit rate':>9} {'wrong':>6} {'distinct':>9} {'lookup':>9}")
+    for threshold in (0.4, 0.5, SEMANTIC_CACHE_THRESHOLD, 0.7, 0.8):
+        r = evaluate(threshold, groups, distinct)
+        marker = "  <- varsayılan" if threshold == SEMANTIC_CACHE_THRESHOLD else ""
+        print(f"{r['threshold']:>9.2f} {r['hit_rate']:>9.0%} {r['wrong_hits']:>6} {r['distinct_hits']:>9} {r['lookup_us']:>7.0f}µs{marker}")
+
+
+if __name__ == "__main__":
+    main()
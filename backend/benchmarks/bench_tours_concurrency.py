@@ -0,0 +1,65 @@
+"""
+GET /api/tours — eşzamanlı yük altında senkron vs async veri erişimi
+
+Eski handler `async def` içinde senkron supabase client'ı çağırıyordu; her
+sorgu event loop'u bloklayıp istekleri seri hale getiriyordu. Yeni handler
+`db.execute(...)` ile pooled async PostgREST client'ı kullanır.
+
+    cd backend && python -m benchmarks.bench_tours_concurrency
+"""
+
+import asyncio
+import os
+
+from benchmarks.common import (
+    async_postgrest_transport, sync_postgrest_transport,
+    run_concurrent, print_result,
+)
+
+from fastapi import FastAPI
+from postgrest import SyncPostgrestClient
+import httpx
+
+import dependencies
+from routes.tour_routes import router as tour_router
+
+LATENCY = float(os.getenv("BENCH_DB_LATENCY", "0.02"))
+TOTAL = int(os.getenv("BENCH_REQUESTS", "200"))
+CONCURRENCY = int(os.getenv("BENCH_CONCURRENCY", "50"))
+
+
+def build_legacy_app() -> FastAPI:
+    """Önceki davranış: async handler içinde iki senkron PostgREST çağrısı"""
+    sync_client = SyncPostgrestClient(
+        dependencies.db.rest_url,
+        headers=dependencies.db.headers,
+        http_client=httpx.Client(transport=sync_postgrest_transport(LATENCY)),
+    )
+    app = FastAPI()
+
+    @app.get("/api/tours")
+    async def get_tours(skip: int = 0, limit: int = 20):
+        query = sync_client.from_("tours").select("*").eq("status", "approved")
+        response = query.order("created_at", desc=True).range(skip, skip + limit - 1).execute()
+        count_response = sync_client.from_("tours").select("id", count="exact").eq("status", "approved").execute()
+        return {"tours": response.data, "total": count_response.count, "skip": skip, "limit": limit}
+
+    return app
+
+
+def build_async_app() -> FastAPI:
+    dependencies.db.transport = async_postgrest_transport(LATENCY)
+    app = FastAPI()
+    app.include_router(tour_router)
+    return app
+
+
+async def main():
+    print(f"DB gecikmesi={LATENCY * 1000:.0f}ms, istek={TOTAL}, eşzamanlılık={CONCURRENCY}")
+    print_result("legacy (sync client)", await run_concurrent(build_legacy_app(), "/api/tours", TOTAL, CONCURRENCY))
+    print_result("async (db.execute)", await run_concurrent(build_async_app(), "/api/tours", TOTAL, CONCURRENCY))
+    await dependencies.db.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,119 @@
+"""
+Benchmark ortak yardımcıları
+
+Benchmark'lar gerçek Supabase'e gitmez: dummy env ile backend modülleri
+import edilir ve PostgREST, gecikme eklenmiş sahte bir httpx transport ile
+taklit edilir. Çalıştırma: backend/ dizininden `python -m benchmarks.<isim>`
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import statistics
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+os.environ.setdefault("SUPABASE_URL", "https://bench.supabase.co")
+os.environ.setdefault("SUPABASE_ANON_KEY", "bench-anon")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "bench-service")
+os.environ.setdefault("ENVIRONMENT", "development")
+
+import httpx  # noqa: E402
+
+
+def make_tour(tour_id: int) -> dict:
+    """Sahte tur satırı"""
+    return {
+        "id": tour_id,
+        "title": f"Umre Turu {tour_id}",
+        "operator": f"Operatör {tour_id % 7}",
+        "price": 1500 + (tour_id * 37) % 2000,
+        "currency": "USD",
+        "start_date": "2026-03-01",
+        "end_date": "2026-03-15",
+        "duration": "15 gün",
+        "hotel": "Hilton Makkah",
+        "services": ["Vize", "Uçak", "Transfer"],
+        "visa": "Dahil",
+        "transport": "Otobüs",
+        "guide": "Türkçe rehber",
+        "itinerary": ["Mekke", "Medine"],
+        "status": "approved",
+        "created_at": "2026-01-01T00:00:00+00:00",
+        "updated_at": "2026-01-01T00:00:00+00:00",
+    }
+
+
+TOURS = [make_tour(i) for i in range(1, 201)]
+
+
+def _postgrest_response(request: httpx.Request) -> httpx.Response:
+    """offset/limit parametrelerine göre tur listesi + Content-Range döner"""
+    start = int(request.url.params.get("offset", 0))
+    limit = int(request.url.params.get("limit", len(TOURS)))
+    rows = TOURS[start:start + limit]
+    select = request.url.params.get("select", "*")
+    if select != "*":
+        columns = select.split(",")
+        rows = [{c: row.get(c) for c in columns} for row in rows]
+    headers = {
+        "content-type": "application/json",
+        "content-range": f"{start}-{start + max(len(rows) - 1, 0)}/{len(TOURS)}",
+    }
+    return httpx.Response(200, headers=headers, content=json.dumps(rows).encode())
+
+
+def async_postgrest_transport(latency: float) -> httpx.MockTransport:
+    """Event loop'u bloklamayan (await sleep) sahte PostgREST"""
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency)
+        return _postgrest_response(request)
+    return httpx.MockTransport(handler)
+
+
+def sync_postgrest_transport(latency: float) -> httpx.MockTransport:
+    """Senkron client için sahte PostgREST (thread'i bloklar)"""
+    def handler(request: httpx.Request) -> httpx.Response:
+        time.sleep(latency)
+        return _postgrest_response(request)
+    return httpx.MockTransport(handler)
+
+
+async def run_concurrent(app, path: str, total: int, concurrency: int) -> dict:
+    """ASGI app'e eşzamanlı istek atar; throughput ve gecikme yüzdeliklerini döner"""
+    transport = httpx.ASGITransport(app=app)
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one():
+            async with semaphore:
+                t0 = time.perf_counter()
+                response = await client.get(path)
+                latencies.append(time.perf_counter() - t0)
+                assert response.status_code == 200, response.text
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "rps": total / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+def print_result(name: str, result: dict):
+    print(
+        f"{name:<28} rps={result['rps']:8.1f}  "
+        f"p50={result['p50_ms']:7.1f}ms  p95={result['p95_ms']:7.1f}ms  "
+        f"(n={result['requests']}, c={result['concurrency']})"
+    )
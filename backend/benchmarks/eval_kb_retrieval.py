@@ -0,0 +1,59 @@
+"""
+Chat bilgi bankası — tam system prompt (önce) vs BM25 ile seçilen bölümler (sonra)
+
+Soru seti benchmarks/data/kb_eval_questions.json'dadır; her soru için doğru
+yanıtın dayandığı bilgi bankası satırları ("facts") verilir. Parite, gerçek
+LLM çağrısı yapılmadan bağlam kapsamıyla ölçülür: tam prompt'ta bulunan her
+fact kısaltılmış prompt'ta da bulunuyorsa model aynı bilgiyle yanıt verir.
+
+    cd backend && python -m benchmarks.eval_kb_retrieval
+"""
+
+import json
+import os
+import time
+
+from benchmarks.common import BACKEND_DIR  # noqa: F401  (sys.path + dummy env)
+
+from ai_service import CHAT_KNOWLEDGE_INDEX, CHAT_SYSTEM_PROMPT, build_chat_system_prompt, estimate_tokens
+
+QUESTIONS_PATH = os.path.join(os.path.dirname(__file__), "data", "kb_eval_questions.json")
+PROVIDER = os.getenv("BENCH_PROVIDER", "openai")
+ITERATIONS = int(os.getenv("BENCH_ITERATIONS", "200"))
+
+
+def main():
+    with open(QUESTIONS_PATH, encoding="utf-8") as f:
+        questions = json.load(f)["questions"]
+
+    full_tokens = estimate_tokens(CHAT_SYSTEM_PROMPT, PROVIDER)
+    print(f"sections={len(CHAT_KNOWLEDGE_INDEX)}  full prompt: {len(CHAT_SYSTEM_PROMPT)} chars, ~{full_tokens} tokens ({PROVIDER})\n")
+    print(f"{'question':<58}{'tokens':>8}{'saved':>8}  facts")
+
+    slim_total = 0
+    covered = 0
+    for item in questions:
+        prompt = build_chat_system_prompt(item["q"])
+        tokens = estimate_tokens(prompt, PROVIDER)
+        slim_total += tokens
+        assert all(fact in CHAT_SYSTEM_PROMPT for fact in item["facts"]), item["q"]
+        missing = [fact for fact in item["facts"] if fact not in prompt]
+        covered += not missing
+        status = "ok" if not missing else f"MISSING {missing}"
+        print(f"{item['q'][:56]:<58}{tokens:>8}{1 - tokens / full_tokens:>8.0%}  {status}")
+
+    started = time.perf_counter()
+    for _ in range(ITERATIONS):
+        for item in questions:
+            build_chat_system_prompt(item["q"])
+    retrieval_ms = (time.perf_counter() - started) / (ITERATIONS * len(questions)) * 1000
+
+    avg = slim_total / len(questions)
+    print(
+        f"\navg tokens: {full_tokens} → {avg:.0f} ({1 - avg / full_tokens:.0%} fewer)  "
+        f"parity: {covered}/{len(questions)}  retrieval: {retrieval_ms:.3f}ms/question"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Karşılaştırma prompt'u — pretty JSON (önce) vs kompakt anahtar:değer (sonra)
+
+Örnek turlar test_core.py'deki TOUR_1 / TOUR_2'dir; `select("*")` satırı gibi id,
+operator_id, created_by, zaman damgaları ve onay alanları eklenir. Üçüncü senaryo
+CSV import'larında görülen uzun programlı bir turu ekler.
+
+Uçtan uca süre ÖLÇÜLMEZ, tahmindir (gerçek LLM çağrısı yapılmaz):
+    tur bölümü oluşturma (ölçülen) + LLM_BASE_MS + input_token * LLM_PREFILL_MS_PER_TOKEN
+
+    cd backend && python -m benchmarks.report_prompt_size
+"""
+
+import json
+import os
+import sys
+import time
+
+from benchmarks.common import BACKEND_DIR  # noqa: F401  (sys.path + dummy env)
+
+import ai_service
+from ai_service import AIService, estimate_tokens, sanitize_tour_data, invalidate_tour_fragments
+
+# test_core.py depo kökünde
+REPO_DIR = os.path.dirname(BACKEND_DIR)
+if REPO_DIR not in sys.path:
+    sys.path.append(REPO_DIR)
+from test_core import TOUR_1, TOUR_2  # noqa: E402
+
+LLM_BASE_MS = float(os.getenv("BENCH_LLM_BASE_MS", "400"))
+LLM_PREFILL_MS_PER_TOKEN = float(os.getenv("BENCH_LLM_PREFILL_MS_PER_TOKEN", "0.35"))
+ITERATIONS = int(os.getenv("BENCH_ITERATIONS", "200"))
+CRITERIA = ["price", "comfort", "location", "services"]
+
+
+def _row(tour_id: int, payload: dict) -> dict:
+    """Tur payload'ını `select("*")` satırına çevirir"""
+    return {
+        "id": tour_id,
+        "operator_id": "8f14e45f-ceea-467e-a5d4-1c2f3b4a5d6e",
+        "rating": None,
+        "source": "operator",
+        **payload,
+        "status": "approved",
+        "created_by": "operator@example.com",
+        "approved_by": "2c9a1f7e-5b3d-4c8a-9e6f-7d1b2a3c4e5f",
+        "approval_reason": "Belgeler eksiksiz",
+        "rejection_reason": None,
+        "created_at": "2026-01-10T08:30:00+00:00",
+        "updated_at": "2026-01-12T14:05:00+00:00",
+    }
+
+
+SAMPLE_TOURS = [
+    _row(1, TOUR_1),
+    _row(2, TOUR_2),
+    # Uzun programlı tur (CSV import'larında görülen tipik 15 günlük program)
+    _row(3, {
+        "title": "Ramazan Umresi 15 Gün", "operator": "Örnek Turizm", "price": 2450.0, "currency": "USD",
+        "start_date": "2026-03-01", "end_date": "2026-03-15", "duration": "15 gün", "hotel": "Hilton Makkah",
+        "services": ["Vize", "Uçak", "Transfer", "Sahur", "İftar", "Ziyaret turları", "Zemzem", "Rehber", "Sigorta"],
+        "visa": "Dahil", "transport": "Otobüs", "guide": "Türkçe rehber",
+        "itinerary": [f"Gün {i}: {'Mekke' if i <= 8 else 'Medine'} — ibadet, ziyaret ve serbest zaman" for i in range(1, 16)],
+        "rating": 4.8, "source": "csv_import",
+    }),
+]
+
+
+def legacy_tours_text(tours) -> str:
+    """Değişiklik öncesi tur bölümü: her kolon, indent=2 JSON"""
+    safe_tours = [sanitize_tour_data(tour) for tour in tours]
+    return "\n\n".join(
+        f"TUR {i+1}:\n{json.dumps(safe_tour, ensure_ascii=False, indent=2)}"
+        for i, safe_tour in enumerate(safe_tours)
+    )
+
+
+def compact_tours_text(tours, provider) -> str:
+    fragments = [ai_service.get_tour_fragment(tour) for tour in tours]
+    return "\n\n".join(f"TUR {i+1}: {block}" for i, block in enumerate(ai_service.fit_tour_blocks(fragments, provider)))
+
+
+def legacy_prompt(service, tours, criteria, provider) -> str:
+    """Aynı şablon, tur bölümü eski formatta"""
+    prompt = service._build_compare_prompt(tours, criteria, provider)
+    return prompt.replace(compact_tours_text(tours, provider), legacy_tours_text(tours), 1)
+
+
+def timed(fn) -> float:
+    started = time.perf_counter()
+    for _ in range(ITERATIONS):
+        fn()
+    return (time.perf_counter() - started) / ITERATIONS * 1000
+
+
+def main():
+    service = AIService()
+    print(f"iterations={ITERATIONS}; tahmini e2e = tur bölümü (ölçülen) + {LLM_BASE_MS:.0f}ms "
+          f"+ {LLM_PREFILL_MS_PER_TOKEN}ms/input token (LLM çağrılmaz, ölçüm değildir)\n")
+    print(f"{'scenario':<22}{'provider':<11}{'chars':>14}{'tokens':>14}{'tours ms':>16}{'est. e2e ms':>16}")
+
+    scenarios = {
+        "TOUR_1 + TOUR_2": SAMPLE_TOURS[:2],
+        "TOUR_1 + long tour": [SAMPLE_TOURS[0], SAMPLE_TOURS[2]],
+        "3 tours": SAMPLE_TOURS,
+    }
+    for name, tours in scenarios.items():
+        for provider in ("openai", "kumru"):
+            before = legacy_prompt(service, tours, CRITERIA, provider)
+            invalidate_tour_fragments()
+            after = service._build_compare_prompt(tours, CRITERIA, provider)
+
+            before_tokens = estimate_tokens(before, provider)
+            after_tokens = estimate_tokens(after, provider)
+            before_build = timed(lambda: legacy_tours_text(tours))
+            after_build = timed(lambda: compact_tours_text(tours, provider))
+            before_e2e = before_build + LLM_BASE_MS + before_tokens * LLM_PREFILL_MS_PER_TOKEN
+            after_e2e = after_build + LLM_BASE_MS + after_tokens * LLM_PREFILL_MS_PER_TOKEN
+
+            print(
+                f"{name:<22}{provider:<11}"
+                f"{len(before):>6} → {len(after):<6}{before_tokens:>6} → {after_tokens:<6}"
+                f"{before_build:>7.3f} → {after_build:<7.3f}{before_e2e:>7.0f} → {after_e2e:<7.0f}"
+            )
+
+    print(f"\nfragment cache entries: {len(ai_service._tour_fragments)}")
+
+
+if __name__ == "__main__":
+    main()
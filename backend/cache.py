@@ -5,10 +5,14 @@ Supports both in-memory cache and Redis (when available)
 import os
 import json
 import hashlib
-from typing import Optional, Any
+from typing import Optional, Any, Callable, Awaitable
 from datetime import datetime, timedelta
 from cachetools import TTLCache
 import asyncio
+import time
+import uuid
+
+from state_backend import RateLimitResult, state
 
 # ============================================
 # CACHE CONFIGURATION
@@ -42,25 +46,26 @@ def generate_cache_key(prefix: str, *args) -> str:
     key_data = f"{prefix}:" + ":".join(str(arg) for arg in args)
     return hashlib.sha256(key_data.encode()).hexdigest()[:32]
 
-async def get_cached(key: str) -> Optional[str]:
+async def get_cached(key: str, local: Optional[TTLCache] = None) -> Optional[str]:
     """Get value from cache (Redis first, then memory)"""
+    local = memory_cache if local is None else local
     try:
-        # Try Redis first
+        # Redis varsa tek doğruluk kaynağı odur: başka replica'nın sildiği
+        # anahtar bu pod'un memory cache'inden bayat olarak dönmemeli
         if REDIS_AVAILABLE and redis_client:
-            value = await redis_client.get(key)
-            if value:
-                return value
+            return await redis_client.get(key)
         
         # Fallback to memory cache
-        return memory_cache.get(key)
+        return local.get(key)
     except Exception:
-        return memory_cache.get(key)
+        return local.get(key)
 
-async def set_cached(key: str, value: str, ttl: int = 3600) -> bool:
+async def set_cached(key: str, value: str, ttl: int = 3600, local: Optional[TTLCache] = None) -> bool:
     """Set value in cache (both Redis and memory)"""
+    local = memory_cache if local is None else local
     try:
         # Save to memory cache
-        memory_cache[key] = value
+        local[key] = value
         
         # Save to Redis if available
         if REDIS_AVAILABLE and redis_client:
@@ -83,61 +88,319 @@ async def delete_cached(key: str) -> bool:
     except Exception:
         return False
 
+# ============================================
+# STALE-WHILE-REVALIDATE + REQUEST COALESCING
+# ============================================
+
+# Değer bir zarf içinde saklanır: {"v": değer, "fresh_until": ts, "expires_at": ts}
+#   now < fresh_until          → taze, doğrudan döner
+#   fresh_until <= now < expires_at → bayat değer döner, tek bir task arka planda yeniler
+#   expires_at <= now           → miss; aynı anahtar için tek producer çalışır, diğerleri bekler
+# Replica'lar arası: Redis SET NX PX kilidi; kilidi alamayan, sahibinin yazmasını bekler.
+
+COMPUTE_LOCK_TIMEOUT = float(os.getenv("CACHE_COMPUTE_LOCK_TIMEOUT", "10"))
+_RELEASE_LOCK_LUA = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+
+# Süreç içi single-flight: key -> producer'ı çalıştıran task
+_inflight: dict = {}
+# Arka plan yenileme task'larına referans (GC'ye karşı)
+_background_refreshes: set = set()
+
+async def _read_envelope(key: str, local: Optional[TTLCache] = None) -> Optional[dict]:
+    raw = await get_cached(key, local)
+    if not raw:
+        return None
+    try:
+        envelope = json.loads(raw)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(envelope, dict) or envelope.get("expires_at", 0) <= time.time():
+        return None
+    return envelope
+
+async def _write_envelope(key: str, value: Any, ttl: int, stale_ttl: int, local: Optional[TTLCache] = None) -> None:
+    now = time.time()
+    envelope = {"v": value, "fresh_until": now + ttl, "expires_at": now + ttl + stale_ttl}
+    await set_cached(key, json.dumps(envelope, ensure_ascii=False, default=str), ttl=ttl + stale_ttl, local=local)
+
+async def _acquire_compute_lock(key: str) -> Optional[str]:
+    """Redis kilidini alır; Redis yoksa süreç içi single-flight yeterlidir"""
+    if not (REDIS_AVAILABLE and redis_client):
+        return "local"
+    token = uuid.uuid4().hex
+    try:
+        if await redis_client.set(f"lock:{key}", token, nx=True, px=int(COMPUTE_LOCK_TIMEOUT * 1000)):
+            return token
+        return None
+    except Exception:
+        return "local"
+
+async def _release_compute_lock(key: str, token: str) -> None:
+    if token == "local" or not (REDIS_AVAILABLE and redis_client):
+        return
+    try:
+        await redis_client.eval(_RELEASE_LOCK_LUA, 1, f"lock:{key}", token)
+    except Exception:
+        pass
+
+async def _compute_and_store(key: str, producer: Callable[[], Awaitable[Any]], ttl: int, stale_ttl: int, wait_for_peer: bool, options: dict) -> Any:
+    token = await _acquire_compute_lock(key)
+    if token is None:
+        if not wait_for_peer:
+            # Başka bir replica zaten yeniliyor (stale yenileme) — eldeki değeri bırak
+            envelope = await _read_envelope(key, options["local"])
+            return envelope["v"] if envelope else None
+        # Başka replica hesaplıyor: yazmasını bekle, süre dolarsa kendimiz hesaplarız
+        cache_stats["lock_waits"] += 1
+        deadline = time.time() + COMPUTE_LOCK_TIMEOUT
+        while time.time() < deadline:
+            await asyncio.sleep(0.05)
+            envelope = await _read_envelope(key, options["local"])
+            if envelope and envelope["fresh_until"] > time.time():
+                return envelope["v"]
+    try:
+        value = await producer()
+        # None = "cache'leme" (ör. bulunamadı); cacheable False = döndür ama saklama (ör. fallback mesajı)
+        cacheable = options["cacheable"]
+        if value is not None and (cacheable is None or cacheable(value)):
+            await _write_envelope(key, value, ttl, stale_ttl, options["local"])
+        return value
+    finally:
+        if token is not None:
+            await _release_compute_lock(key, token)
+
+def _start_flight(key: str, producer: Callable[[], Awaitable[Any]], ttl: int, stale_ttl: int, wait_for_peer: bool, options: dict) -> asyncio.Task:
+    task = asyncio.ensure_future(_compute_and_store(key, producer, ttl, stale_ttl, wait_for_peer, options))
+    _inflight[key] = task
+    task.add_done_callback(lambda _t: _inflight.pop(key, None) if _inflight.get(key) is _t else None)
+    # Bekleyeni kalmamış task'ın hatası "never retrieved" uyarısı üretmesin
+    task.add_done_callback(lambda _t: _t.cancelled() or _t.exception())
+    return task
+
+async def get_or_compute(
+    key: str,
+    producer: Callable[[], Awaitable[Any]],
+    ttl: int = 300,
+    stale_ttl: int = 0,
+    is_ai: bool = False,
+    cacheable: Optional[Callable[[Any], bool]] = None,
+    local: Optional[TTLCache] = None,
+) -> Any:
+    """
+    Read-through cache: taze değer varsa döner, yoksa producer'ı tek sefer çalıştırır.
+    stale_ttl > 0 ise süresi geçmiş değer bu süre boyunca servis edilir ve arka planda yenilenir.
+    Producer None dönerse, hata fırlatırsa veya cacheable(değer) False ise değer cache'lenmez.
+    local: memory katmanı olarak kullanılacak TTLCache (varsayılan memory_cache).
+    Değer JSON serileştirilebilir olmalıdır.
+    """
+    options = {"cacheable": cacheable, "local": local}
+    envelope = await _read_envelope(key, local)
+    now = time.time()
+
+    if envelope and envelope["fresh_until"] > now:
+        record_cache_hit(is_ai)
+        return envelope["v"]
+
+    if envelope:
+        # Bayat ama kullanılabilir: hemen dön, yenilemeyi tek task'a bırak
+        record_cache_hit(is_ai)
+        cache_stats["stale_serves"] += 1
+        if key not in _inflight:
+            task = _start_flight(key, producer, ttl, stale_ttl, wait_for_peer=False, options=options)
+            _background_refreshes.add(task)
+            task.add_done_callback(_background_refreshes.discard)
+            cache_stats["background_refreshes"] += 1
+        return envelope["v"]
+
+    record_cache_miss(is_ai)
+    task = _inflight.get(key)
+    if task is not None:
+        cache_stats["coalesced_waits"] += 1
+    else:
+        task = _start_flight(key, producer, ttl, stale_ttl, wait_for_peer=True, options=options)
+    # shield: bekleyen bir istek iptal edilirse ortak hesaplama yarıda kalmasın
+    return await asyncio.shield(task)
+
 # ============================================
 # AI RESPONSE CACHING
 # ============================================
 
+AI_CACHE_TTL = int(os.getenv("AI_CACHE_TTL", "86400"))
+
 def get_ai_cache_key(message: str, provider: str, context_ids: Optional[list] = None) -> str:
     """Generate cache key for AI responses"""
-    # Normalize message for caching
-    normalized_msg = message.lower().strip()[:200]  # First 200 chars
-    context_str = ",".join(sorted(context_ids)) if context_ids else ""
+    # Normalize message for caching: boşluklar tekilleştirilir, mesajın tamamı hash'e girer
+    normalized_msg = " ".join(message.lower().split())
+    context_str = ",".join(sorted(str(c) for c in context_ids)) if context_ids else ""
     return generate_cache_key("ai_chat", normalized_msg, provider, context_str)
 
+def get_compare_cache_key(tours: list, criteria: list, provider: str) -> str:
+    """Karşılaştırma anahtarı: sıralı tur id'leri + içerik versiyonu (updated_at) + kriterler + provider"""
+    versions = sorted(f"{t.get('id')}@{t.get('updated_at') or t.get('created_at') or ''}" for t in tours)
+    normalized_criteria = sorted({c.strip().lower() for c in criteria})
+    return generate_cache_key("ai_compare", ",".join(versions), ",".join(normalized_criteria), provider)
+
+async def get_cached_ai_value(key: str) -> Any:
+    """AI cache anahtarındaki değeri döndürür (get_or_compute ile aynı envelope formatı)"""
+    envelope = await _read_envelope(key, ai_response_cache)
+    if envelope is None:
+        record_cache_miss(is_ai=True)
+        return None
+    record_cache_hit(is_ai=True)
+    return envelope["v"]
+
+async def cache_ai_value(key: str, value: Any) -> None:
+    """Akış (streaming) sonunda tamamlanan AI yanıtını cache'e yazar"""
+    await _write_envelope(key, value, AI_CACHE_TTL, 0, ai_response_cache)
+
 async def get_cached_ai_response(message: str, provider: str, context_ids: Optional[list] = None) -> Optional[str]:
     """Get cached AI response if exists"""
-    key = get_ai_cache_key(message, provider, context_ids)
-    
-    # Check in-memory AI cache first (faster)
-    cached = ai_response_cache.get(key)
-    if cached:
-        return cached
-    
-    # Check Redis
-    return await get_cached(key)
+    return await get_cached_ai_value(get_ai_cache_key(message, provider, context_ids))
 
 async def cache_ai_response(message: str, provider: str, response: str, context_ids: Optional[list] = None) -> bool:
     """Cache AI response for future use"""
-    key = get_ai_cache_key(message, provider, context_ids)
-    
-    # Save to in-memory AI cache
-    ai_response_cache[key] = response
-    
-    # Save to Redis with 24 hour TTL
-    return await set_cached(key, response, ttl=86400)
+    await cache_ai_value(get_ai_cache_key(message, provider, context_ids), response)
+    return True
+
+# ============================================
+# TOUR CACHING (public list + detail)
+# ============================================
+
+TOUR_LIST_TTL = int(os.getenv("TOUR_LIST_CACHE_TTL", "60"))
+TOUR_DETAIL_TTL = int(os.getenv("TOUR_DETAIL_CACHE_TTL", "300"))
+# Süresi dolan tur yanıtları bu kadar süre daha bayat servis edilip arka planda yenilenir.
+# Yazma yolundaki invalidation anahtarı değiştirdiği/sildiği için bayat servis onu etkilemez.
+TOUR_STALE_TTL = int(os.getenv("TOUR_STALE_CACHE_TTL", "300"))
+TOUR_GENERATION_KEY = "tours:generation"
+
+# Liste anahtarları bir "generation" sayacı içerir: herhangi bir tur değişince
+# sayaç artar ve eski liste anahtarları bir daha okunmaz (TTL ile düşer).
+# Redis varsa sayaç tüm replica'larda ortaktır.
+_tour_generation = 0
+
+async def get_tour_generation() -> int:
+    """Güncel tur listesi generation değerini döndürür"""
+    if REDIS_AVAILABLE and redis_client:
+        try:
+            return int(await redis_client.get(TOUR_GENERATION_KEY) or 0)
+        except Exception:
+            pass
+    return _tour_generation
+
+def get_tour_list_cache_key(params: dict, generation: int) -> str:
+    """Sorgu parametrelerini normalize eder (None'lar atılır, sıralı) ve anahtar üretir"""
+    normalized = {k: str(v).strip().lower() for k, v in params.items() if v is not None and v != ""}
+    return generate_cache_key("tours_list", generation, json.dumps(normalized, sort_keys=True))
+
+def get_tour_detail_cache_key(tour_id: int) -> str:
+    return generate_cache_key("tour_detail", int(tour_id))
+
+async def invalidate_tour_cache(*tour_ids) -> None:
+    """Tur yazma işlemlerinden sonra: tüm liste anahtarlarını + verilen detay anahtarlarını geçersiz kılar"""
+    global _tour_generation
+    _tour_generation += 1
+    if REDIS_AVAILABLE and redis_client:
+        try:
+            await redis_client.incr(TOUR_GENERATION_KEY)
+        except Exception:
+            pass
+    for tour_id in tour_ids:
+        if tour_id is not None:
+            await delete_cached(get_tour_detail_cache_key(tour_id))
+
+async def get_cached_tour_details(tour_ids) -> dict:
+    """Detay cache'inde taze olan turları {id: tur} olarak döndürür (AI bağlamı için toplu okuma)"""
+    found = {}
+    for tour_id in tour_ids:
+        envelope = await _read_envelope(get_tour_detail_cache_key(tour_id))
+        if envelope and envelope["fresh_until"] > time.time() and envelope["v"]:
+            record_cache_hit()
+            found[int(tour_id)] = json.loads(envelope["v"])
+        else:
+            record_cache_miss()
+    return found
+
+async def cache_tour_details(tours: list) -> None:
+    """Toplu sorgudan gelen onaylı turları GET /api/tours/{id} ile aynı gövdeyle detay cache'ine yazar"""
+    for tour in tours:
+        if tour.get("status") == "approved":
+            body = json.dumps(tour, ensure_ascii=False, separators=(",", ":"), default=str)
+            await _write_envelope(get_tour_detail_cache_key(tour["id"]), body, TOUR_DETAIL_TTL, TOUR_STALE_TTL)
+
+def compute_etag(body: str) -> str:
+    """Yanıt gövdesinden strong ETag üretir"""
+    return '"' + hashlib.sha256(body.encode()).hexdigest()[:32] + '"'
+
+# ============================================
+# AUTH TOKEN CACHING
+# ============================================
+
+# Verified JWT cache (per-process): token hash -> {"claims", "profile", "exp"}
+# TTL 5 dakika: cache'lenmiş profilin en fazla ne kadar eski kalabileceğini sınırlar
+auth_token_cache: TTLCache = TTLCache(maxsize=10000, ttl=300)
+
+def get_auth_cache_key(token: str) -> str:
+    """Token'ın kendisi yerine hash'ini anahtar olarak kullan"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def get_cached_auth(token: str) -> Optional[dict]:
+    """Doğrulanmış token kaydını döndürür; süresi (exp) geçmişse siler"""
+    key = get_auth_cache_key(token)
+    entry = auth_token_cache.get(key)
+    if entry and entry["exp"] > time.time():
+        cache_stats["auth_cache_hits"] += 1
+        return entry
+
+    if entry:
+        auth_token_cache.pop(key, None)
+    cache_stats["auth_cache_misses"] += 1
+    return None
+
+def cache_auth(token: str, claims: dict, profile: dict) -> bool:
+    """Doğrulanmış token'ı claim'leri ve profil satırıyla birlikte cache'ler"""
+    exp = claims.get("exp")
+    if not exp or exp <= time.time():
+        return False
+    auth_token_cache[get_auth_cache_key(token)] = {
+        "claims": claims,
+        "profile": profile,
+        "exp": float(exp),
+    }
+    return True
+
+def invalidate_auth_token(token: str) -> bool:
+    """Tek bir token'ı cache'den çıkarır (logout)"""
+    return auth_token_cache.pop(get_auth_cache_key(token), None) is not None
+
+def invalidate_auth_user(user_id: str) -> int:
+    """Kullanıcıya ait tüm token'ları cache'den çıkarır (askıya alma, rol/durum değişikliği)"""
+    removed = 0
+    for key, entry in list(auth_token_cache.items()):
+        if str(entry["profile"].get("id")) == str(user_id):
+            auth_token_cache.pop(key, None)
+            removed += 1
+    return removed
 
 # ============================================
 # RATE LIMIT HELPERS
 # ============================================
 
-# Per-user rate limit tracking
-user_rate_limits: TTLCache = TTLCache(maxsize=10000, ttl=3600)
+# Per-user rate limit tracking — sliding window, replica'lar arası ortak (state_backend)
+async def consume_user_rate_limit(user_id: str, limit: int = 100, window: int = 3600) -> RateLimitResult:
+    """
+    Kullanıcı kovasından bir token harcar (token bucket: limit token, window saniyede dolar).
+    Sonuç X-RateLimit-Limit / Remaining / Reset ve Retry-After header'larını besler.
+    """
+    return await state.token_bucket(f"rate:{user_id}", limit, window)
 
 async def check_user_rate_limit(user_id: str, limit: int = 100, window: int = 3600) -> bool:
     """Check if user is within rate limit"""
-    key = f"rate:{user_id}"
-    
-    current = user_rate_limits.get(key, 0)
-    if current >= limit:
-        return False
-    
-    user_rate_limits[key] = current + 1
-    return True
+    return (await consume_user_rate_limit(user_id, limit, window)).allowed
 
-async def get_user_usage(user_id: str) -> int:
-    """Get current usage count for user"""
-    key = f"rate:{user_id}"
-    return user_rate_limits.get(key, 0)
+async def get_user_usage(user_id: str, limit: int = 100, window: int = 3600) -> int:
+    """Get current usage (kovadan harcanmış tam token sayısı; token harcamaz)"""
+    result = await state.token_bucket(f"rate:{user_id}", limit, window, cost=0)
+    return limit - result.remaining
 
 # ============================================
 # CACHE STATISTICS
@@ -147,19 +410,31 @@ cache_stats = {
     "hits": 0,
     "misses": 0,
     "ai_cache_hits": 0,
-    "ai_cache_misses": 0
+    "ai_cache_misses": 0,
+    "auth_cache_hits": 0,
+    "auth_cache_misses": 0,
+    "coalesced_waits": 0,
+    "stale_serves": 0,
+    "background_refreshes": 0,
+    "lock_waits": 0,
+    "semantic_hits": 0,
+    "semantic_misses": 0
 }
 
 def get_cache_stats() -> dict:
     """Get cache statistics"""
     total = cache_stats["hits"] + cache_stats["misses"]
     ai_total = cache_stats["ai_cache_hits"] + cache_stats["ai_cache_misses"]
+    auth_total = cache_stats["auth_cache_hits"] + cache_stats["auth_cache_misses"]
     
     return {
         "memory_cache_size": len(memory_cache),
         "ai_cache_size": len(ai_response_cache),
+        "auth_cache_size": len(auth_token_cache),
+        "inflight_computations": len(_inflight),
         "hit_rate": cache_stats["hits"] / total if total > 0 else 0,
         "ai_hit_rate": cache_stats["ai_cache_hits"] / ai_total if ai_total > 0 else 0,
+        "auth_hit_rate": cache_stats["auth_cache_hits"] / auth_total if auth_total > 0 else 0,
         "redis_available": REDIS_AVAILABLE,
         **cache_stats
     }
@@ -13,15 +13,26 @@ import json
 import csv
 import io
 import asyncio
+import base64
 
 from dotenv import load_dotenv
 load_dotenv()
 
 from supabase import create_client, Client
-from ai_service import AIService
+from postgrest import AsyncPostgrestClient
+from postgrest.types import ReturnMethod
+import httpx
+import jwt
+from ai_service import AIService, invalidate_tour_fragments
+from write_behind import WriteBehindQueue
+from import_jobs import ImportJobRunner, create_import_file_store
+from cache import (
+    get_cached_auth, cache_auth, invalidate_auth_token, invalidate_auth_user,
+    invalidate_tour_cache, get_cached_tour_details, cache_tour_details,
+)
 from security import (
     limiter,
-    add_security_headers,
+    SecurityHeadersMiddleware,
     validate_input,
     validate_password_strength,
     check_brute_force,
@@ -41,8 +52,105 @@ SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY")
 SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
 
+# ============================================
+# ASYNC DATA ACCESS (pooled PostgREST)
+# ============================================
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "50"))
+DB_MAX_CONCURRENCY = int(os.getenv("DB_MAX_CONCURRENCY", "50"))
+DB_TIMEOUT = float(os.getenv("DB_TIMEOUT", "10"))
+
+
+class AsyncRepository:
+    """
+    Route modülleri için ortak async veri erişim katmanı.
+    Tek bir keep-alive httpx connection pool'u üzerinden PostgREST'e gider;
+    semaphore ile aynı anda uçuşta olan sorgu sayısı sınırlanır.
+
+    Kullanım:
+        response = await db.execute(db.table("tours").select("*").eq("id", 1))
+    """
+
+    def __init__(self, url: str, key: str, max_connections: int, max_concurrency: int, timeout: float):
+        self.rest_url = f"{url}/rest/v1" if url else ""
+        self.headers = {"apikey": key or "", "Authorization": f"Bearer {key or ''}"}
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=30,
+        )
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.transport: Optional[httpx.AsyncBaseTransport] = None  # benchmark/test için değiştirilebilir
+        self._client: Optional[AsyncPostgrestClient] = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    @property
+    def client(self) -> AsyncPostgrestClient:
+        """PostgREST client'ını ilk kullanımda oluşturur (event loop içinde)"""
+        if self._client is None:
+            http_client = httpx.AsyncClient(
+                headers=self.headers,
+                limits=self.limits,
+                timeout=self.timeout,
+                transport=self.transport,
+                follow_redirects=True,
+            )
+            self._client = AsyncPostgrestClient(
+                self.rest_url,
+                headers={**self.headers, "Accept": "application/json", "Content-Type": "application/json"},
+                http_client=http_client,
+            )
+        return self._client
+
+    def table(self, name: str):
+        return self.client.from_(name)
+
+    def rpc(self, fn: str, params: Optional[dict] = None):
+        return self.client.rpc(fn, params or {})
+
+    async def execute(self, query):
+        """Sorguyu concurrency sınırı içinde çalıştırır"""
+        async with self._semaphore:
+            return await query.execute()
+
+    async def aclose(self):
+        """Connection pool'u kapatır (lifespan shutdown)"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+db = AsyncRepository(SUPABASE_URL, SUPABASE_SERVICE_KEY, DB_MAX_CONNECTIONS, DB_MAX_CONCURRENCY, DB_TIMEOUT)
+
+
+async def insert_rows(table: str, rows: list) -> None:
+    """Tek multi-row insert; eksik kolonlar tablo varsayılanını alır"""
+    await db.execute(db.table(table).insert(rows, returning=ReturnMethod.minimal, default_to_null=False))
+
+
+async def upsert_rows(table: str, rows: list, on_conflict: str, ignore_duplicates: bool = False) -> None:
+    """
+    Tek multi-row upsert (INSERT ... ON CONFLICT DO UPDATE); eksik kolonlar tablo varsayılanını alır.
+    ignore_duplicates=True: çakışan satırlara dokunulmaz (ON CONFLICT DO NOTHING)
+    """
+    await db.execute(db.table(table).upsert(
+        rows, returning=ReturnMethod.minimal, on_conflict=on_conflict,
+        ignore_duplicates=ignore_duplicates, default_to_null=False,
+    ))
+
+
+# Yanıtı bekletmeyen log/geçmiş insert'leri (server.py lifespan'ı başlatır ve boşaltır)
+write_behind = WriteBehindQueue(insert_rows)
+
 security = HTTPBearer(auto_error=False)
 
+# JWT doğrulaması: SUPABASE_JWT_SECRET (HS256) veya projenin JWKS endpoint'i (RS256/ES256)
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET", "")
+# Supabase'in ürettiği secret'lar en az bu uzunlukta; daha kısası örnek/yanlış değerdir
+SUPABASE_JWT_SECRET_MIN_LENGTH = 32
+SUPABASE_JWKS_URL = f"{SUPABASE_URL}/auth/v1/.well-known/jwks.json" if SUPABASE_URL else ""
+_jwks_client: Optional[jwt.PyJWKClient] = None
+
 # AI Service
 ai_service = AIService()
 
@@ -50,6 +158,75 @@ ai_service = AIService()
 # AUTH HELPERS
 # ============================================
 
+def check_jwt_secret(secret: str) -> str:
+    """
+    Örnek (env.template) veya kısa secret ile başlamayı reddeder: aksi halde her HS256
+    token imza hatasıyla 401 alır ve sorun ancak girişler başarısız olunca fark edilir.
+    """
+    if secret and (secret.startswith("your-") or len(secret) < SUPABASE_JWT_SECRET_MIN_LENGTH):
+        raise RuntimeError(
+            "SUPABASE_JWT_SECRET geçersiz: örnek değer veya çok kısa. Supabase Dashboard > "
+            "Settings > API'deki JWT secret'ı girin ya da JWKS kullanmak için boş bırakın."
+        )
+    return secret
+
+
+check_jwt_secret(SUPABASE_JWT_SECRET)
+
+
+def _get_jwks_client() -> jwt.PyJWKClient:
+    """JWKS client'ı tek sefer oluştur (anahtarlar client içinde cache'lenir)"""
+    global _jwks_client
+    if _jwks_client is None:
+        _jwks_client = jwt.PyJWKClient(SUPABASE_JWKS_URL, cache_keys=True, lifespan=3600)
+    return _jwks_client
+
+
+async def verify_supabase_jwt(token: str) -> Optional[dict]:
+    """
+    Supabase access token'ını yerel olarak doğrular (imza + exp + aud).
+    Doğrulama anahtarı yoksa None döner; çağıran Supabase Auth'a sorar.
+    JWKS anahtarı cache'te yoksa senkron HTTP ile çekilir; event loop'u bloklamasın diye thread'de.
+    """
+    try:
+        algorithm = jwt.get_unverified_header(token).get("alg", "")
+        if algorithm == "HS256" and SUPABASE_JWT_SECRET:
+            return jwt.decode(token, SUPABASE_JWT_SECRET, algorithms=["HS256"], audience="authenticated")
+        if algorithm in ("RS256", "ES256") and SUPABASE_JWKS_URL:
+            signing_key = await asyncio.to_thread(_get_jwks_client().get_signing_key_from_jwt, token)
+            return jwt.decode(token, signing_key.key, algorithms=[algorithm], audience="authenticated")
+    except jwt.PyJWKClientError:
+        return None
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail="Oturum süresi doldu")
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=401, detail="Geçersiz token")
+    return None
+
+
+async def _resolve_user(token: str) -> dict:
+    """Token'dan kullanıcı profilini çözer — önce doğrulanmış token cache'i"""
+    cached = get_cached_auth(token)
+    if cached:
+        return cached["profile"]
+
+    claims = await verify_supabase_jwt(token)
+    if claims is None:
+        # Yerel doğrulama yapılamadı — Supabase Auth'a sor (shared client)
+        user_response = await asyncio.to_thread(supabase.auth.get_user, token)
+        if not user_response.user:
+            raise HTTPException(status_code=401, detail="Geçersiz token")
+        claims = jwt.decode(token, options={"verify_signature": False})
+        claims["sub"] = user_response.user.id
+
+    profile = await db.execute(db.table("users").select("*").eq("id", claims["sub"]))
+    if not profile.data:
+        raise HTTPException(status_code=404, detail="Kullanıcı profili bulunamadı")
+
+    cache_auth(token, claims, profile.data[0])
+    return profile.data[0]
+
+
 async def get_token_from_request(request: Request, credentials: Optional[HTTPAuthorizationCredentials] = None) -> str:
     """Token'ı header veya cookie'den al"""
     if credentials and credentials.credentials:
@@ -60,7 +237,7 @@ async def get_token_from_request(request: Request, credentials: Optional[HTTPAut
     raise HTTPException(status_code=401, detail="Token bulunamadı")
 
 
-def get_current_user(request: Request, credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)) -> dict:
+async def get_current_user(request: Request, credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)) -> dict:
     """Supabase JWT'den kullanıcıyı doğrular - Header veya Cookie'den"""
     try:
         token = None
@@ -71,18 +248,7 @@ def get_current_user(request: Request, credentials: Optional[HTTPAuthorizationCr
         if not token:
             raise HTTPException(status_code=401, detail="Token bulunamadı")
 
-        user_supabase = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
-        user_supabase.auth.set_session(token, token)
-        user_response = user_supabase.auth.get_user(token)
-
-        if not user_response.user:
-            raise HTTPException(status_code=401, detail="Geçersiz token")
-
-        profile = supabase.table("users").select("*").eq("id", user_response.user.id).execute()
-        if not profile.data:
-            raise HTTPException(status_code=404, detail="Kullanıcı profili bulunamadı")
-
-        return profile.data[0]
+        return await _resolve_user(token)
     except HTTPException:
         raise
     except Exception as e:
@@ -121,7 +287,7 @@ def require_role(*allowed_roles: str):
     return dependency
 
 
-def get_optional_user(request: Request) -> Optional[dict]:
+async def get_optional_user(request: Request) -> Optional[dict]:
     """Opsiyonel kullanıcı kimlik doğrulaması"""
     try:
         auth_header = request.headers.get("Authorization")
@@ -130,19 +296,132 @@ def get_optional_user(request: Request) -> Optional[dict]:
         token = auth_header.split(" ")[1]
         if not token:
             return None
-        user_supabase = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
-        user_supabase.auth.set_session(token, token)
-        user_response = user_supabase.auth.get_user(token)
-        if not user_response.user:
-            return None
-        profile = supabase.table("users").select("*").eq("id", user_response.user.id).execute()
-        if not profile.data:
-            return None
-        return profile.data[0]
+        return await _resolve_user(token)
     except Exception:
         return None
 
 
+# ============================================
+# CURSOR (KEYSET) PAGINATION
+# ============================================
+# Cursor = base64url({"k": sort_key, "v": son satırın sort değeri, "id": son satırın id'si, "d": desc}).
+# Derin sayfalarda OFFSET yerine (sort_key, id) < (v, id) filtresi kullanılır;
+# böylece created_at / checked_at index'leri üzerinden sabit maliyetli okuma yapılır.
+# NULL olabilen kolonlarda (nullable=True) NULL'lar her iki yönde sona sıralanır;
+# son satırın değeri NULL ise cursor "v": null taşır ve sayfalama id ile devam eder.
+
+def encode_cursor(sort_key: str, value: Any, row_id: Any, desc: bool = True) -> str:
+    payload = json.dumps({"k": sort_key, "v": value, "id": row_id, "d": desc}, separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_key: str, desc: bool = True) -> tuple:
+    """Cursor'ı çözer; bozuk veya farklı sıralamaya ait cursor'da 400 döner"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if payload["k"] != sort_key or payload["d"] != desc or "v" not in payload:
+            raise ValueError("cursor sort mismatch")
+        return payload["v"], payload["id"]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Geçersiz cursor")
+
+
+def _postgrest_quote(value: Any) -> str:
+    """or=() filtresinde değerleri tırnaklar (timestamp içindeki ':' ve ',' için)"""
+    text = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{text}"'
+
+
+def apply_pagination(
+    query, sort_key: str, limit: int, cursor: Optional[str] = None, offset: int = 0,
+    desc: bool = True, nullable: bool = False,
+):
+    """
+    Sorguya sıralama + sayfalama uygular.
+    cursor varsa keyset filtresi, yoksa offset (geriye dönük uyumluluk) kullanılır.
+    Bir fazla satır istenir; next_cursor'ı page_with_cursor hesaplar.
+    sort_key çağıranın whitelist'inden gelmelidir; kolon adı olmayan değerde 400.
+    """
+    if not sort_key.isidentifier():
+        raise HTTPException(status_code=400, detail="Geçersiz sıralama alanı")
+    op = "lt" if desc else "gt"
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort_key, desc)
+        if value is None:
+            # NULL'lar sonda: kalan satırlar yalnızca NULL'lar arasında, id sırasıyla
+            query = query.is_(sort_key, "null").filter("id", op, str(last_id))
+        else:
+            v, i = _postgrest_quote(value), _postgrest_quote(last_id)
+            condition = f"{sort_key}.{op}.{v},and({sort_key}.eq.{v},id.{op}.{i})"
+            if nullable:
+                condition += f",{sort_key}.is.null"
+            query = query.or_(condition)
+        offset = 0
+    query = query.order(sort_key, desc=desc, nullsfirst=False if nullable else None).order("id", desc=desc)
+    return query.range(offset, offset + limit)
+
+
+def page_with_cursor(rows: Optional[list], sort_key: str, limit: int, desc: bool = True) -> tuple:
+    """(sayfa satırları, next_cursor) döner; son sayfada next_cursor None'dır"""
+    rows = rows or []
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(sort_key, last.get(sort_key), last.get("id"), desc)
+
+
+# ============================================
+# TOUR READ HELPERS
+# ============================================
+
+async def fetch_tours_by_ids(tour_ids) -> list:
+    """
+    Onaylı turları verilen id sırasıyla döndürür (bulunamayan/onaysız id'ler atlanır).
+    Önce tur detay cache'ine bakar; eksikler tek bir `in_("id", ...)` sorgusuyla gelir
+    ve detay cache'ine yazılır. Tam sayı olmayan id'de 400.
+    """
+    try:
+        ids = [int(tour_id) for tour_id in tour_ids]
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Geçersiz tur id")
+    unique_ids = list(dict.fromkeys(ids))
+    found = await get_cached_tour_details(unique_ids)
+    missing = [tour_id for tour_id in unique_ids if tour_id not in found]
+    if missing:
+        response = await db.execute(
+            db.table("tours").select("*").in_("id", missing).eq("status", "approved")
+        )
+        rows = response.data or []
+        await cache_tour_details(rows)
+        found.update({int(row["id"]): row for row in rows})
+    return [found[tour_id] for tour_id in ids if tour_id in found]
+
+
+# ============================================
+# TOUR CACHE INVALIDATION
+# ============================================
+
+async def invalidate_tours(*tour_ids) -> None:
+    """
+    Tur yazma yollarından (create/update/delete/import/approve/reject) çağrılır.
+    Public liste cache'ini, verilen turların detay cache'ini ve AI prompt parçalarını
+    düşürür; hata yazmayı bozmaz.
+    """
+    invalidate_tour_fragments(*tour_ids)
+    try:
+        await invalidate_tour_cache(*tour_ids)
+    except Exception as e:
+        log_security_event("TOUR_CACHE_INVALIDATE_ERROR", {"error": str(e), "tour_ids": list(tour_ids)}, "WARN")
+
+
+# Arka plan CSV import işleri (server.py lifespan'ı başlatır ve durdurur)
+import_job_runner = ImportJobRunner(
+    db, create_import_file_store(supabase), insert_rows, upsert_rows=upsert_rows, on_imported=invalidate_tours
+)
+
+
 # ============================================
 # AUDIT LOG HELPERS
 # ============================================
@@ -162,7 +441,7 @@ async def log_admin_action(request: Request, admin_id: str, action: str, details
             "user_agent": request.headers.get("user-agent", "")[:200],
             "created_at": datetime.utcnow().isoformat()
         }
-        supabase.table("admin_audit_log").insert(log_entry).execute()
+        await write_behind.submit("admin_audit_log", log_entry)
     except Exception as e:
         log_security_event(f"ADMIN_AUDIT_DB_ERROR ({action})", {"error": str(e)}, "ERROR")
 
@@ -182,7 +461,7 @@ async def write_audit_log(
     try:
         ip = request.client.host if request.client else "unknown"
         ua = request.headers.get("user-agent", "")[:500]
-        supabase.table("audit_logs").insert({
+        await write_behind.submit("audit_logs", {
             "user_id": user_id,
             "role": role,
             "action": action,
@@ -193,7 +472,7 @@ async def write_audit_log(
             "new_data": new_data or {},
             "ip_address": ip,
             "user_agent": ua,
-        }).execute()
+        })
     except Exception as e:
         log_security_event("AUDIT_LOG_ERROR", {"error": str(e)}, "WARNING")
 
@@ -201,13 +480,13 @@ async def write_audit_log(
 async def send_user_notification(user_id: str, title: str, message: str, notif_type: str = "info", action_url: str = None):
     """Internal: kullanıcıya bildirim gönder"""
     try:
-        supabase.table("user_notifications").insert({
+        await write_behind.submit("user_notifications", {
             "user_id": user_id,
             "title": title,
             "message": message,
             "type": notif_type,
             "action_url": action_url,
-        }).execute()
+        })
     except Exception:
         pass
 
@@ -215,12 +494,12 @@ async def send_user_notification(user_id: str, title: str, message: str, notif_t
 async def queue_email(to_email: str, subject: str, body: str):
     """Email kuyruğuna ekle"""
     try:
-        supabase.table("email_queue").insert({
+        await db.execute(db.table("email_queue").insert({
             "to_email": to_email,
             "subject": subject,
             "body": body,
             "status": "pending",
-        }).execute()
+        }))
     except Exception:
         pass
 
@@ -228,10 +507,10 @@ async def queue_email(to_email: str, subject: str, body: str):
 async def check_feature_access(user: dict, feature_name: str):
     """Helper: Kullanıcının feature erişimini kontrol eder"""
     try:
-        response = supabase.rpc("check_user_feature", {
+        response = await db.execute(db.rpc("check_user_feature", {
             "user_id_param": user["id"],
             "feature_name_param": feature_name
-        }).execute()
+        }))
         if not response.data or not response.data[0]["allowed"]:
             limit = response.data[0]["limit_value"] if response.data else 0
             remaining = response.data[0]["remaining"] if response.data else 0
@@ -239,10 +518,10 @@ async def check_feature_access(user: dict, feature_name: str):
                 status_code=403,
                 detail=f"Bu özelliği kullanma hakkınız doldu. Kalan: {remaining}/{limit}. Paketi yükseltin."
             )
-        supabase.rpc("record_feature_usage", {
+        await db.execute(db.rpc("record_feature_usage", {
             "user_id_param": user["id"],
             "feature_name_param": feature_name
-        }).execute()
+        }))
         return True
     except HTTPException:
         raise
@@ -321,8 +600,11 @@ class SettingsUpdate(BaseModel):
 class FavoriteCreate(BaseModel):
     tour_id: int
 
+# POST /api/favorites/sync: tek istekte kabul edilen azami favori (fazlası 422)
+FAVORITES_SYNC_MAX_IDS = int(os.getenv("FAVORITES_SYNC_MAX_IDS", "500"))
+
 class FavoriteSync(BaseModel):
-    tour_ids: List[int]
+    tour_ids: List[int] = Field(max_length=FAVORITES_SYNC_MAX_IDS)
 
 class PriceAlertCreate(BaseModel):
     tour_id: int
@@ -0,0 +1,483 @@
+"""
+Arka plan import işleri — büyük kataloglar için
+
+POST /api/import/csv dosyayı (CSV, XLSX veya NDJSON) kalıcı depoya (Supabase Storage
+veya yerel dizin) yazar, import_jobs'a "pending" satırı ekler ve iş id'siyle hemen
+döner. Her pod'da çalışan ImportJobRunner işi sahiplenir ve biçimin okuyucusuyla
+(tour_import.IMPORT_READERS) aynı akışta parça parça işler:
+
+- Sahiplenme: status/heartbeat_at üzerinden koşullu UPDATE (compare-and-set);
+  aynı işi iki pod alamaz
+- İlerleme: her parçadan sonra processed / imported_count / error_count ve
+  heartbeat_at yazılır (GET /api/import/jobs/{id} bunu okur)
+- Devam: pod öldüğünde heartbeat_at IMPORT_JOB_STALE_SECONDS'tan eskiyse başka bir
+  pod işi alır ve dosyayı depodan okuyup ilk `processed` satırı atlar; düzgün
+  kapanışta iş parça sınırında bırakılır ve hemen "pending"e döner
+- İptal: status "cancelled" yapılır; worker'ın bir sonraki koşullu yazması boş
+  döner ve iş o parça sınırında durur (yazılmış parçalar kalır)
+- Okuma: dosya çözümleme (CSV/XLSX/NDJSON) event loop'u bloklamasın diye satırlar
+  parça boyunda dilimlerle asyncio.to_thread içinde okunur
+- Upsert modu: satırlardaki her operatörün (tours.operator) mevcut turları, operatör
+  bir parçada ilk görüldüğünde tek sorguda okunup yerel hash index'e eklenir
+  (load_import_index); turu hangi admin oluşturmuş olursa olsun eşleşir
+
+Son checkpoint'ten sonra yazılmış ama kaydedilmemiş bir parça devamda insert
+modunda tekrar yazılabilir (en fazla bir parça); upsert modunda index yeniden
+yüklendiği için bu satırlar "unchanged" sayılır.
+"""
+import asyncio
+import os
+import shutil
+import socket
+import tempfile
+import uuid
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from typing import AsyncIterator, Awaitable, Callable, Iterator, List, Optional, Tuple
+
+import httpx
+
+from security import log_security_event
+from tour_import import (
+    ImportIndex, ImportResult, InsertRows, Row, UpsertRows, build_import_index, import_tours,
+    IMPORT_BATCH_SIZE, IMPORT_MAX_ERROR_DETAILS, IMPORT_MODES, IMPORT_READERS,
+)
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+IMPORT_JOBS_ENABLED = os.getenv("IMPORT_JOBS_ENABLED", "true").lower() == "true"
+IMPORT_FILE_STORE = os.getenv("IMPORT_FILE_STORE", "supabase").lower()
+IMPORT_FILE_BUCKET = os.getenv("IMPORT_FILE_BUCKET", "admin-documents")
+IMPORT_LOCAL_DIR = os.getenv("IMPORT_LOCAL_DIR", os.path.join(tempfile.gettempdir(), "hu-imports"))
+IMPORT_JOB_POLL_INTERVAL = float(os.getenv("IMPORT_JOB_POLL_INTERVAL", "5"))
+IMPORT_JOB_HEARTBEAT_INTERVAL = float(os.getenv("IMPORT_JOB_HEARTBEAT_INTERVAL", "30"))
+IMPORT_JOB_STALE_SECONDS = float(os.getenv("IMPORT_JOB_STALE_SECONDS", "120"))
+IMPORT_JOB_STOP_TIMEOUT = float(os.getenv("IMPORT_JOB_STOP_TIMEOUT", "10"))
+# Supabase Storage'dan indirme: imzalı URL ömrü (sn) ve akış parçası (bayt)
+IMPORT_SIGNED_URL_TTL = int(os.getenv("IMPORT_SIGNED_URL_TTL", "300"))
+IMPORT_DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# Upsert index'i için sayfa; PostgREST max-rows daha küçükse kalan satırlar id'den devam eder
+IMPORT_INDEX_PAGE_SIZE = int(os.getenv("IMPORT_INDEX_PAGE_SIZE", "50000"))
+
+# Bu süreci import_jobs.worker_id'de tanımlar
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+IMPORT_CONTENT_TYPES = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "ndjson": "application/x-ndjson",
+}
+
+ACTIVE_STATUSES = ("pending", "running")
+FINAL_STATUSES = ("completed", "failed", "cancelled")
+
+OnImported = Callable[[], Awaitable[None]]
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+async def _read_off_loop(rows: Iterator[Tuple[int, Row]], batch_size: int) -> AsyncIterator[Tuple[int, Row]]:
+    """Okuyucuyu batch_size'lık dilimlerle thread'de ilerletir (çözümleme event loop'u bloklamaz)"""
+    while True:
+        batch = await asyncio.to_thread(list, islice(rows, batch_size))
+        if not batch:
+            return
+        for item in batch:
+            yield item
+
+
+async def load_import_index(db, operators: List[str], page_size: int = IMPORT_INDEX_PAGE_SIZE) -> ImportIndex:
+    """
+    Verilen operatörlerin (tours.operator) mevcut turlarını doğal anahtar → IndexedTour
+    index'ine çevirir. Sadece anahtar kolonları okunur; turlar sunucunun max-rows
+    sınırına sığıyorsa tek sorgu.
+    """
+    tours, last_id, total = [], 0, None
+    while True:
+        query = db.table("tours").select(
+            "id,title,operator,start_date,price,content_hash,operator_id,import_key",
+            count="exact" if total is None else None,
+        ).in_("operator", operators).gt("id", last_id).order("id").limit(page_size)
+        response = await db.execute(query)
+        if total is None:
+            total = response.count or 0
+        tours.extend(response.data)
+        if not response.data or len(tours) >= total:
+            return build_import_index(tours)
+        last_id = response.data[-1]["id"]
+
+
+# ============================================
+# FILE STORES
+# ============================================
+
+class LocalImportFileStore:
+    """Tek pod / geliştirme: dosyalar yerel dizinde (pod yeniden başlayınca aynı diskte kalır)"""
+
+    name = "local"
+
+    def __init__(self, directory: str = IMPORT_LOCAL_DIR):
+        self.directory = directory
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key.replace("/", "_"))
+
+    def _copy(self, source, key: str) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(key), "wb") as target:
+            shutil.copyfileobj(source, target)
+
+    async def save(self, key: str, source, content_type: str = "text/csv") -> None:
+        await asyncio.to_thread(self._copy, source, key)
+
+    async def open(self, key: str):
+        return await asyncio.to_thread(open, self._path(key), "rb")
+
+    async def delete(self, key: str) -> None:
+        try:
+            await asyncio.to_thread(os.remove, self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+class SupabaseImportFileStore:
+    """Replica'lar arası: dosyalar Supabase Storage'da (her pod işi devralabilir)"""
+
+    name = "supabase"
+
+    def __init__(self, client, bucket: str = IMPORT_FILE_BUCKET, http_client: Optional[httpx.Client] = None):
+        self.client = client
+        self.bucket = bucket
+        # İndirme bu client ile akışla yapılır (test/benchmark için değiştirilebilir)
+        self.http_client = http_client or httpx.Client(timeout=httpx.Timeout(30.0, read=120.0))
+
+    def _upload(self, key: str, source, content_type: str) -> None:
+        # storage3 dosya yolunu açıp akışla gönderir; yükleme belleğe alınmaz
+        with tempfile.NamedTemporaryFile(suffix=".import", delete=False) as spool:
+            shutil.copyfileobj(source, spool)
+        try:
+            self.client.storage.from_(self.bucket).upload(
+                path=key, file=spool.name, file_options={"content-type": content_type}
+            )
+        finally:
+            os.remove(spool.name)
+
+    def _download(self, key: str):
+        # storage3 download() nesnenin tamamını bytes olarak döner; bunun yerine imzalı URL'den
+        # parça parça okunur ve 1 MB'tan büyük dosya diske taşar (bellek sabit kalır)
+        signed = self.client.storage.from_(self.bucket).create_signed_url(key, IMPORT_SIGNED_URL_TTL)
+        spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        try:
+            with self.http_client.stream("GET", signed["signedURL"]) as response:
+                response.raise_for_status()
+                for chunk in response.iter_bytes(IMPORT_DOWNLOAD_CHUNK_SIZE):
+                    spool.write(chunk)
+        except Exception:
+            spool.close()
+            raise
+        spool.seek(0)
+        return spool
+
+    async def save(self, key: str, source, content_type: str = "text/csv") -> None:
+        await asyncio.to_thread(self._upload, key, source, content_type)
+
+    async def open(self, key: str):
+        return await asyncio.to_thread(self._download, key)
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self.client.storage.from_(self.bucket).remove, [key])
+
+
+def create_import_file_store(supabase_client):
+    """IMPORT_FILE_STORE=local ise yerel dizin, aksi halde Supabase Storage"""
+    if IMPORT_FILE_STORE == "local":
+        return LocalImportFileStore()
+    return SupabaseImportFileStore(supabase_client)
+
+
+# ============================================
+# JOB RUNNER
+# ============================================
+
+class ImportJobRunner:
+    """import_jobs kuyruğunu işleyen, pod başına tek worker task'ı"""
+
+    def __init__(
+        self,
+        db,
+        store,
+        insert_rows: InsertRows,
+        upsert_rows: Optional[UpsertRows] = None,
+        on_imported: Optional[OnImported] = None,
+        worker_id: str = WORKER_ID,
+        batch_size: int = IMPORT_BATCH_SIZE,
+        poll_interval: float = IMPORT_JOB_POLL_INTERVAL,
+        heartbeat_interval: float = IMPORT_JOB_HEARTBEAT_INTERVAL,
+        stale_seconds: float = IMPORT_JOB_STALE_SECONDS,
+        enabled: bool = IMPORT_JOBS_ENABLED,
+    ):
+        self.db = db
+        self.store = store
+        self._insert_rows = insert_rows
+        self._upsert_rows = upsert_rows
+        self._on_imported = on_imported
+        self.worker_id = worker_id
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_seconds = stale_seconds
+        self.enabled = enabled
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._stopping = False
+        self.current_job_id: Optional[int] = None
+        self.stats = {"claimed": 0, "completed": 0, "failed": 0, "cancelled": 0, "released": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "running": self.running, "current_job_id": self.current_job_id, "worker_id": self.worker_id}
+
+    # ---------- producer (route) ----------
+
+    async def submit(self, source, filename: str, user: dict, mode: str = "insert", file_format: str = "csv") -> dict:
+        """Dosyayı depoya yazar, "pending" iş satırı ekler ve worker'ı uyandırır"""
+        if mode not in IMPORT_MODES:
+            raise ValueError(f"Geçersiz import modu: {mode}")
+        if file_format not in IMPORT_READERS:
+            raise ValueError(f"Desteklenmeyen import biçimi: {file_format}")
+        file_key = f"imports/{uuid.uuid4().hex}.{file_format}"
+        await self.store.save(file_key, source, IMPORT_CONTENT_TYPES[file_format])
+        response = await self.db.execute(self.db.table("import_jobs").insert({
+            "user_id": user["id"],
+            "created_by": user["email"],
+            "filename": filename,
+            "file_path": file_key,
+            "mode": mode,
+            "format": file_format,
+            "status": "pending",
+        }))
+        self.wake()
+        return response.data[0]
+
+    def wake(self) -> None:
+        if self._wake is not None:
+            self._wake.set()
+
+    async def get_job(self, job_id: int) -> Optional[dict]:
+        response = await self.db.execute(self.db.table("import_jobs").select("*").eq("id", job_id).limit(1))
+        return response.data[0] if response.data else None
+
+    async def cancel(self, job_id: int) -> Optional[dict]:
+        """Bekleyen/çalışan işi iptal eder; iş zaten bitmişse None"""
+        response = await self.db.execute(
+            self.db.table("import_jobs").update({"status": "cancelled", "finished_at": _now().isoformat()})
+            .eq("id", job_id).in_("status", list(ACTIVE_STATUSES))
+        )
+        if not response.data:
+            return None
+        job = response.data[0]
+        # Henüz kimse almadıysa dosya burada silinir; çalışan iş kendi temizler
+        if not job.get("worker_id"):
+            await self._delete_file(job)
+        return job
+
+    # ---------- worker ----------
+
+    def start(self) -> None:
+        """Worker task'ını başlatır (lifespan startup)"""
+        if self.running or not self.enabled:
+            return
+        self._stopping = False
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = IMPORT_JOB_STOP_TIMEOUT) -> None:
+        """Çalışan işi parça sınırında bırakır ("pending") ve task'ı durdurur (lifespan shutdown)"""
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        self._stopping = True
+        self.wake()
+        try:
+            await asyncio.wait_for(task, timeout=timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            pass
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                if await self.run_once():
+                    continue
+            except Exception as e:
+                log_security_event("IMPORT_JOB_RUNNER_ERROR", {"error": str(e)[:200]}, "ERROR")
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run_once(self) -> Optional[int]:
+        """Sahiplenilebilir bir iş varsa alır ve işler; işlenen iş id'si veya None"""
+        job = await self._claim()
+        if job is None:
+            return None
+        await self._process(job)
+        return job["id"]
+
+    def _claimable(self, job: dict) -> bool:
+        if job["status"] == "pending":
+            return True
+        heartbeat = _parse_time(job.get("heartbeat_at"))
+        return heartbeat is None or heartbeat < _now() - timedelta(seconds=self.stale_seconds)
+
+    async def _claim(self) -> Optional[dict]:
+        response = await self.db.execute(
+            self.db.table("import_jobs").select("*").in_("status", list(ACTIVE_STATUSES))
+            .order("created_at").limit(20)
+        )
+        for job in response.data:
+            if not self._claimable(job):
+                continue
+            # Compare-and-set: satırı son okuduğumuz haliyle güncelle
+            query = self.db.table("import_jobs").update({
+                "status": "running",
+                "worker_id": self.worker_id,
+                "heartbeat_at": _now().isoformat(),
+                "started_at": job.get("started_at") or _now().isoformat(),
+            }).eq("id", job["id"]).eq("status", job["status"])
+            if job.get("heartbeat_at"):
+                query = query.eq("heartbeat_at", job["heartbeat_at"])
+            else:
+                query = query.is_("heartbeat_at", "null")
+            claimed = await self.db.execute(query)
+            if claimed.data:
+                self.stats["claimed"] += 1
+                return claimed.data[0]
+        return None
+
+    async def _update_owned(self, job_id: int, values: dict, status: str = "running") -> bool:
+        """Sadece iş hâlâ bu worker'da ve `status` durumundaysa yazar"""
+        query = self.db.table("import_jobs").update(values) \
+            .eq("id", job_id).eq("status", status).eq("worker_id", self.worker_id)
+        return bool((await self.db.execute(query)).data)
+
+    async def _load_index(self, operators: List[str]) -> ImportIndex:
+        return await load_import_index(self.db, operators)
+
+    @staticmethod
+    def _progress(result: ImportResult) -> dict:
+        return {
+            "processed": result.processed,
+            "imported_count": result.imported,
+            "inserted_count": result.inserted,
+            "updated_count": result.updated,
+            "unchanged_count": result.unchanged,
+            "error_count": result.error_count,
+            "errors": result.errors[:IMPORT_MAX_ERROR_DETAILS],
+        }
+
+    async def _heartbeat(self, job_id: int, lost: asyncio.Event) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            if not await self._update_owned(job_id, {"heartbeat_at": _now().isoformat()}):
+                lost.set()
+                return
+
+    async def _process(self, job: dict) -> None:
+        job_id = job["id"]
+        self.current_job_id = job_id
+        result = ImportResult()
+        result.processed = job.get("processed") or 0
+        result.imported = job.get("imported_count") or 0
+        result.inserted = job.get("inserted_count") or 0
+        result.updated = job.get("updated_count") or 0
+        result.unchanged = job.get("unchanged_count") or 0
+        result.error_count = job.get("error_count") or 0
+        result.errors = list(job.get("errors") or [])
+        skip = result.processed
+        user = {"id": job["user_id"], "email": job.get("created_by") or ""}
+        mode = job.get("mode") or "insert"
+        read_rows = IMPORT_READERS[job.get("format") or "csv"]
+
+        lost = asyncio.Event()
+        heartbeat = asyncio.create_task(self._heartbeat(job_id, lost))
+
+        async def checkpoint(progress: ImportResult) -> bool:
+            if self._stopping or lost.is_set():
+                return False
+            values = {**self._progress(progress), "heartbeat_at": _now().isoformat()}
+            return await self._update_owned(job_id, values)
+
+        file = reader = None
+        try:
+            file = await self.store.open(job["file_path"])
+            reader = read_rows(file)
+            rows = _read_off_loop(((n, row) for n, row in reader if n > skip), self.batch_size)
+            result = await import_tours(
+                rows, user, self._insert_rows, batch_size=self.batch_size,
+                result=result, on_chunk=checkpoint,
+                mode=mode, load_index=self._load_index, upsert_rows=self._upsert_rows,
+            )
+        except Exception as e:
+            log_security_event("IMPORT_JOB_ERROR", {"job_id": job_id, "error": str(e)[:200]}, "ERROR")
+            result.add_error({"error": f"İş yarıda kaldı: {str(e)[:200]}"}, rows=0)
+            await self._finish(job, result, "failed")
+            return
+        finally:
+            heartbeat.cancel()
+            # Erken duran okuyucu dosyadan önce kapanmalı (TextIOWrapper.detach / workbook.close)
+            if reader is not None:
+                reader.close()
+            if file is not None:
+                file.close()
+            self.current_job_id = None
+
+        if not result.stopped:
+            await self._finish(job, result, "completed")
+        elif self._stopping and not lost.is_set():
+            await self._release(job, result)
+        else:
+            await self._finish(job, result, "cancelled", status="cancelled")
+
+    async def _finish(self, job: dict, result: ImportResult, final: str, status: str = "running") -> None:
+        values = {**self._progress(result), "finished_at": _now().isoformat()}
+        if final != status:
+            values["status"] = final
+        # İptal edilen iş: son sayaçlar "cancelled" satırına yazılır; iş başka worker'a geçtiyse dokunulmaz
+        if not await self._update_owned(job["id"], values, status=status):
+            # İptal son (checkpoint'siz) parça sırasında geldiyse yine de sayaçlar yazılır, dosya silinir
+            values.pop("status", None)
+            if status == "cancelled" or not await self._update_owned(job["id"], values, status="cancelled"):
+                return
+            final = "cancelled"
+        self.stats[final] += 1
+        if result.imported and self._on_imported:
+            await self._on_imported()
+        await self._delete_file(job)
+
+    async def _release(self, job: dict, result: ImportResult) -> None:
+        """Kapanışta işi bırakır; başka bir pod kaldığı yerden devam eder"""
+        values = {**self._progress(result), "status": "pending", "worker_id": None, "heartbeat_at": None}
+        if await self._update_owned(job["id"], values):
+            self.stats["released"] += 1
+            if result.imported and self._on_imported:
+                await self._on_imported()
+
+    async def _delete_file(self, job: dict) -> None:
+        try:
+            await self.store.delete(job["file_path"])
+        except Exception as e:
+            log_security_event("IMPORT_FILE_DELETE_ERROR", {"job_id": job["id"], "error": str(e)[:200]}, "WARN")
@@ -0,0 +1,137 @@
+"""
+Hac/Umre bilgi bankası — bölümlere ayırma + BM25 ile bölüm seçimi
+
+CHAT_SYSTEM_PROMPT'taki dört mezhebe göre hac/umre bilgi bankası her sohbet
+çağrısında tamamen gönderilmek yerine başlıklarına göre bölümlere ayrılır;
+her soru için yalnızca en ilgili CHAT_KB_TOP_K bölüm system prompt'a eklenir.
+
+- Bölüm: "## " başlığı; "### " alt başlıkları varsa her alt başlık ayrı bölüm
+  olur ve üst başlığı taşır ("HANEFİ MEZHEBİNE GÖRE HAC › HAC'CIN FARZLARI")
+- Tokenizasyon: semantic_cache.normalize_turkish_text + hafif ek soyma
+  ("umrenin" → "umr", "haccın" → "hac", "vacipleri" → "vacip"), rükün = farz
+- Skor: Okapi BM25 (k1=1.5, b=0.75); başlık terimleri iki kez sayılır
+"""
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, List
+
+from semantic_cache import normalize_turkish_text
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+CHAT_KB_RETRIEVAL_ENABLED = os.getenv("CHAT_KB_RETRIEVAL_ENABLED", "true").lower() == "true"
+CHAT_KB_TOP_K = int(os.getenv("CHAT_KB_TOP_K", "4"))
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+MIN_STEM_LENGTH = 3
+
+_HEADING = re.compile(r"^(#{2,3}) (.+)$", re.MULTILINE)
+# Özel isimlerde kesme işaretinden sonraki ek: Mekke'de, HAC'CIN, Türkiye'den
+_APOSTROPHE_SUFFIX = re.compile(r"['’]\w+")
+
+# Katlanmış (ı→i, ü→u, ...) Türkçe çekim ekleri, uzundan kısaya
+_SUFFIXES = tuple(sorted({
+    "lerinin", "larinin", "lerini", "larini", "lerin", "larin", "leri", "lari", "ler", "lar",
+    "sinin", "sini", "nin", "nun", "dan", "den", "tan", "ten",
+    "yla", "yle", "si", "su", "yi", "yu", "ya", "ye", "da", "de", "ta", "te", "in", "un",
+    "li", "lu", "dir", "tir", "dur", "tur", "i", "u", "a", "e",
+}, key=len, reverse=True))
+# Kök sonu yumuşaması: mezheb(i) → mezhep, vacib → vacip
+_FINAL_CONSONANT = {"b": "p", "d": "t", "g": "k"}
+# Aynı kavram: Şafii/Maliki/Hanbeli'de "rükün" (kökü "ruk") = farz
+_STEM_ALIASES = {"ruk": "farz"}
+# Ayırt ediciliği olmayan kelimeler (kök halleri); "nedir" tanım bölümlerini (HAC NEDİR?) bulduğu için tutulur
+_STOP_STEMS = frozenset({"ve", "ile", "icin", "gor", "ol", "bir", "vey", "nasil", "neler", "kac", "var", "yok", "mi", "ne"})
+
+
+def stem(word: str) -> str:
+    """Hafif Türkçe kök bulma: ekleri soyar, çift ünsüzü teke indirir (hacc → hac)"""
+    for _ in range(3):
+        for suffix in _SUFFIXES:
+            if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM_LENGTH:
+                word = word[:-len(suffix)]
+                break
+        else:
+            break
+    if len(word) > MIN_STEM_LENGTH and word[-1] == word[-2]:
+        word = word[:-1]
+    if word[-1:] in _FINAL_CONSONANT:
+        word = word[:-1] + _FINAL_CONSONANT[word[-1]]
+    return _STEM_ALIASES.get(word, word)
+
+
+def tokenize(text: str) -> List[str]:
+    """normalize_turkish_text + kök; durak kelimeler atılır"""
+    text = _APOSTROPHE_SUFFIX.sub("", text)
+    stems = (stem(word) for word in normalize_turkish_text(text).split())
+    return [s for s in stems if s and s not in _STOP_STEMS]
+
+
+def split_sections(text: str) -> List[Dict[str, str]]:
+    """Bilgi bankasını {"title", "body"} bölümlerine ayırır (başlık satırı body'de kalır)"""
+    sections = []
+    headings = list(_HEADING.finditer(text))
+    parent = ""
+    for i, match in enumerate(headings):
+        level, title = len(match.group(1)), match.group(2).strip()
+        end = headings[i + 1].start() if i + 1 < len(headings) else len(text)
+        body = text[match.start():end].strip().rstrip("-").strip()
+        if level == 2:
+            parent = title
+            # Alt başlıkları olan "## " başlığının kendi gövdesi yalnızca başlıktır
+            if i + 1 < len(headings) and len(headings[i + 1].group(1)) == 3 and body == match.group(0).strip():
+                continue
+            sections.append({"title": title, "body": body})
+        else:
+            sections.append({"title": f"{parent} › {title}", "body": f"## {parent}\n{body}"})
+    return sections
+
+
+# ============================================
+# INDEX
+# ============================================
+
+class BM25Index:
+    """Küçük, bellekte tutulan BM25 indeksi (başlangıçta bir kez kurulur)"""
+
+    def __init__(self, sections: List[Dict[str, str]]):
+        self.sections = sections
+        self._term_freqs: List[Counter] = []
+        for section in sections:
+            terms = tokenize(section["body"]) + tokenize(section["title"]) * 2
+            self._term_freqs.append(Counter(terms))
+        self._lengths = [sum(tf.values()) for tf in self._term_freqs]
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+        doc_freq: Counter = Counter()
+        for tf in self._term_freqs:
+            doc_freq.update(tf.keys())
+        n = len(sections)
+        self._idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freq.items()}
+
+    def __len__(self) -> int:
+        return len(self.sections)
+
+    def scores(self, query: str) -> List[float]:
+        terms = set(tokenize(query))
+        results = []
+        for tf, length in zip(self._term_freqs, self._lengths):
+            score = 0.0
+            for term in terms:
+                freq = tf.get(term)
+                if not freq:
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * length / self._avg_length)
+                score += self._idf[term] * freq * (BM25_K1 + 1) / (freq + norm)
+            results.append(score)
+        return results
+
+    def search(self, query: str, k: int = CHAT_KB_TOP_K) -> List[Dict[str, str]]:
+        """Skoru > 0 olan en iyi k bölüm, bilgi bankasındaki sıralarıyla"""
+        scored = [(score, i) for i, score in enumerate(self.scores(query)) if score > 0]
+        top = sorted(scored, reverse=True)[:k]
+        return [self.sections[i] for _, i in sorted(top, key=lambda item: item[1])]
@@ -12,7 +12,6 @@ import os
 import traceback
 from typing import Optional
 from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
 
 # ============================================
 # 1. STRUCTURED LOGGING SETUP
@@ -97,10 +96,14 @@ def _filter_sensitive_data(event, hint):
 # 3. REQUEST LOGGING MIDDLEWARE
 # ============================================
 
-class RequestLoggingMiddleware(BaseHTTPMiddleware):
+# Loglanmayan path'ler (health check ve static dosyalar)
+LOG_SKIP_PATHS = frozenset({"/health", "/favicon.ico", "/docs", "/openapi.json"})
+
+
+class RequestLoggingMiddleware:
     """
-    Her API isteğini loglar:
-    - Method, path, status code, duration
+    Her API isteğini loglar (pure ASGI):
+    - Method, path, status code, duration (yanıt header'ları gönderilene kadar)
     - User ID (varsa)
     - Error durumunda stack trace
 
@@ -109,41 +112,29 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
     [2026-02-08 00:00:00] ERROR | POST /api/tours 500 120ms user=abc-123 | ValueError: ...
     """
 
-    async def dispatch(self, request: Request, call_next):
-        start = time.time()
-        method = request.method
-        path = request.url.path
-        user_id = "anon"
+    def __init__(self, app):
+        self.app = app
 
-        # Skip health check ve static dosyalar
-        if path in ("/health", "/favicon.ico", "/docs", "/openapi.json"):
-            return await call_next(request)
-
-        try:
-            response = await call_next(request)
-            duration_ms = int((time.time() - start) * 1000)
-            status = response.status_code
-
-            # User ID'yi response header'dan veya request state'den al
-            try:
-                if hasattr(request.state, "user_id"):
-                    user_id = request.state.user_id
-            except Exception:
-                pass
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in LOG_SKIP_PATHS:
+            await self.app(scope, receive, send)
+            return
 
-            # Loglama seviyesi status code'a göre
-            log_msg = f"{method} {path} {status} {duration_ms}ms user={user_id}"
-
-            if status >= 500:
-                logger.error(log_msg)
-            elif status >= 400:
-                logger.warning(log_msg)
-            else:
-                logger.info(log_msg)
+        start = time.time()
+        method = scope["method"]
+        path = scope["path"]
+        response = {}
 
-            return response
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["duration_ms"] = int((time.time() - start) * 1000)
+            await send(message)
 
+        try:
+            await self.app(scope, receive, send_with_status)
         except Exception as exc:
+            user_id = _scope_user_id(scope)
             duration_ms = int((time.time() - start) * 1000)
             tb = traceback.format_exc()
             logger.error(
@@ -163,6 +154,25 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
 
             raise
 
+        if "status" not in response:
+            return
+        status = response["status"]
+
+        # Loglama seviyesi status code'a göre
+        log_msg = f"{method} {path} {status} {response['duration_ms']}ms user={_scope_user_id(scope)}"
+
+        if status >= 500:
+            logger.error(log_msg)
+        elif status >= 400:
+            logger.warning(log_msg)
+        else:
+            logger.info(log_msg)
+
+
+def _scope_user_id(scope) -> str:
+    """set_request_user ile request.state'e yazılan user_id (scope["state"])"""
+    return scope.get("state", {}).get("user_id", "anon")
+
 
 # ============================================
 # 4. USER ID INJECTION HELPER
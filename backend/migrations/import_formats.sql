@@ -0,0 +1,7 @@
+-- ============================================
+-- Migration: Import File Formats
+-- POST /api/import/csv artık CSV, XLSX ve NDJSON kabul eder; worker dosyayı
+-- işin biçimine göre okur (tour_import.IMPORT_READERS)
+-- ============================================
+
+ALTER TABLE import_jobs ADD COLUMN IF NOT EXISTS format TEXT NOT NULL DEFAULT 'csv';
@@ -0,0 +1,24 @@
+-- ============================================
+-- Migration: Background Import Jobs
+-- import_jobs artık iş kuyruğudur: POST /api/import/csv "pending" satırı ekler,
+-- pod'lardaki worker'lar satırı koşullu UPDATE ile sahiplenir ve ilerlemeyi yazar
+-- (status: pending → running → completed | failed | cancelled)
+-- ============================================
+
+-- 1. Kalıcı depodaki dosya ve iş sahibi (tours.created_by için)
+ALTER TABLE import_jobs ADD COLUMN IF NOT EXISTS file_path TEXT;
+ALTER TABLE import_jobs ADD COLUMN IF NOT EXISTS created_by TEXT;
+
+-- 2. İlerleme (processed = işlenen satır; devam bu satırdan sonra başlar)
+ALTER TABLE import_jobs ADD COLUMN IF NOT EXISTS processed INTEGER NOT NULL DEFAULT 0;
+
+-- 3. Sahiplik ve canlılık (heartbeat_at eskiyen iş başka pod'a geçer)
+ALTER TABLE import_jobs ADD COLUMN IF NOT EXISTS worker_id TEXT;
+ALTER TABLE import_jobs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMPTZ;
+ALTER TABLE import_jobs ADD COLUMN IF NOT EXISTS started_at TIMESTAMPTZ;
+ALTER TABLE import_jobs ADD COLUMN IF NOT EXISTS finished_at TIMESTAMPTZ;
+
+-- 4. Worker'ın bekleyen/çalışan işleri bulduğu sorgu
+CREATE INDEX IF NOT EXISTS idx_import_jobs_active
+  ON import_jobs (created_at)
+  WHERE status IN ('pending', 'running');
@@ -0,0 +1,15 @@
+-- ============================================
+-- Migration: Aggregated Rate Limit Logs
+-- rate_limit_logs satırları artık tek olay değil, bir flush penceresinde
+-- (ip_address, endpoint, blocked, reason) başına toplanan olaylardır
+-- ============================================
+
+-- 1. Pencere içindeki olay sayısı (eski satırlar = 1 olay)
+ALTER TABLE rate_limit_logs
+  ADD COLUMN IF NOT EXISTS hit_count INTEGER NOT NULL DEFAULT 1;
+
+-- 2. Penceredeki son olay zamanı (created_at = ilk olay)
+ALTER TABLE rate_limit_logs
+  ADD COLUMN IF NOT EXISTS last_seen_at TIMESTAMPTZ;
+
+UPDATE rate_limit_logs SET last_seen_at = created_at WHERE last_seen_at IS NULL;
@@ -0,0 +1,23 @@
+-- ============================================
+-- Migration: Idempotent CSV Import (upsert mode)
+-- POST /api/import/csv?mode=upsert aynı turu (title + operator + start_date + price)
+-- tekrar eklemez: dosyadaki operatörlerin turları okunup yerel hash index'e çevrilir,
+-- content_hash'i değişmeyen satır hiç yazılmaz; parçalar arası tekrarları import_key yakalar
+-- ============================================
+
+-- 1. Tur içeriğinin hash'i (import sırasında yazılır; eski turlarda NULL → ilk upsert'te güncellenir)
+ALTER TABLE tours ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
+-- 2. Doğal anahtarın hash'i (upsert modunda yazılır); yeni turlar on_conflict=import_key ile
+--    yazıldığından aynı tur iki kez eklenemez. NULL'lar (insert modu, manuel turlar) çakışmaz
+ALTER TABLE tours ADD COLUMN IF NOT EXISTS import_key TEXT;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_tours_import_key ON tours (import_key);
+
+-- 3. Index yükleme sorgusu: operator IN (...) AND id > ? ORDER BY id
+CREATE INDEX IF NOT EXISTS idx_tours_operator_name_id ON tours (operator, id);
+
+-- 4. İş modu ve ayrıntılı sayaçlar (imported_count = inserted + updated)
+ALTER TABLE import_jobs ADD COLUMN IF NOT EXISTS mode TEXT NOT NULL DEFAULT 'insert';
+ALTER TABLE import_jobs ADD COLUMN IF NOT EXISTS inserted_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE import_jobs ADD COLUMN IF NOT EXISTS updated_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE import_jobs ADD COLUMN IF NOT EXISTS unchanged_count INTEGER NOT NULL DEFAULT 0;
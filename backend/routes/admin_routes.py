@@ -5,10 +5,11 @@ notifications, file manager, licenses, agency analytics, rollback
 
 from fastapi import APIRouter, Request, Depends, UploadFile, File
 from dependencies import (
-    supabase, limiter, log_security_event,
+    supabase, db, limiter, log_security_event,
     require_admin, require_super_admin,
-    write_audit_log, log_admin_action,
-    send_user_notification, queue_email,
+    write_audit_log, log_admin_action, invalidate_tours,
+    apply_pagination, page_with_cursor,
+    send_user_notification, queue_email, invalidate_auth_user,
     NotificationCreate, SettingsUpdate, ScheduledActionCreate,
     ReviewModerate,
     HTTPException, Optional, Dict, Any, datetime, timedelta,
@@ -25,20 +26,21 @@ router = APIRouter(prefix="/api/admin", tags=["admin"])
 async def approve_tour(tour_id: int, request: Request, user: dict = Depends(require_admin)):
     """Admin turu onaylar (RPC)"""
     try:
-        response = supabase.rpc('approve_tour', {
+        response = await db.execute(db.rpc('approve_tour', {
             'tour_id_param': tour_id, 'admin_id': user['id'],
             'approval_reason_param': 'Approved by admin'
-        }).execute()
+        }))
 
+        await invalidate_tours(tour_id)
         await write_audit_log(request, user["id"], "admin", "tour.approve", "tour", tour_id)
 
         try:
-            tour_data = supabase.table("tours").select("user_id, title, operator").eq("id", tour_id).single().execute()
+            tour_data = await db.execute(db.table("tours").select("user_id, title, operator").eq("id", tour_id).single())
             if tour_data.data and tour_data.data.get('user_id'):
                 op_id = tour_data.data['user_id']
                 tour_title = tour_data.data.get('title', f'Tur #{tour_id}')
                 await send_user_notification(op_id, "Tur Onaylandı ✅", f"\"{tour_title}\" turunuz onaylandı ve yayında!", "success", "/operator/tours")
-                op_info = supabase.table("users").select("email").eq("id", op_id).single().execute()
+                op_info = await db.execute(db.table("users").select("email").eq("id", op_id).single())
                 if op_info.data and op_info.data.get('email'):
                     await queue_email(
                         op_info.data['email'],
@@ -58,20 +60,21 @@ async def approve_tour(tour_id: int, request: Request, user: dict = Depends(requ
 async def reject_tour(tour_id: int, reason: str, request: Request, user: dict = Depends(require_admin)):
     """Admin turu reddeder (RPC)"""
     try:
-        response = supabase.rpc('reject_tour', {
+        response = await db.execute(db.rpc('reject_tour', {
             'tour_id_param': tour_id, 'admin_id': user['id'],
             'rejection_reason_param': reason
-        }).execute()
+        }))
 
+        await invalidate_tours(tour_id)
         await write_audit_log(request, user["id"], "admin", "tour.reject", "tour", tour_id, {"reason": reason})
 
         try:
-            tour_data = supabase.table("tours").select("user_id, title, operator").eq("id", tour_id).single().execute()
+            tour_data = await db.execute(db.table("tours").select("user_id, title, operator").eq("id", tour_id).single())
             if tour_data.data and tour_data.data.get('user_id'):
                 op_id = tour_data.data['user_id']
                 tour_title = tour_data.data.get('title', f'Tur #{tour_id}')
                 await send_user_notification(op_id, "Tur Reddedildi ❌", f"\"{tour_title}\" turunuz reddedildi. Sebep: {reason}", "error", "/operator/tours")
-                op_info = supabase.table("users").select("email").eq("id", op_id).single().execute()
+                op_info = await db.execute(db.table("users").select("email").eq("id", op_id).single())
                 if op_info.data and op_info.data.get('email'):
                     await queue_email(
                         op_info.data['email'],
@@ -97,11 +100,12 @@ async def get_audit_logs(
     skip: int = 0, limit: int = 20,
     role: Optional[str] = None, action: Optional[str] = None,
     date_from: Optional[str] = None, date_to: Optional[str] = None,
+    cursor: Optional[str] = None,
 ):
-    """Audit loglarını listeler"""
+    """Audit loglarını listeler (skip veya cursor ile); total yalnızca ilk sayfada (cursor yokken) sayılır"""
     try:
-        query = supabase.table("audit_logs").select("*")
-        count_query = supabase.table("audit_logs").select("id", count="exact")
+        query = db.table("audit_logs").select("*")
+        count_query = db.table("audit_logs").select("id", count="exact")
 
         if role:
             query = query.eq("role", role)
@@ -116,11 +120,14 @@ async def get_audit_logs(
             query = query.lte("created_at", f"{date_to}T23:59:59")
             count_query = count_query.lte("created_at", f"{date_to}T23:59:59")
 
-        query = query.order("created_at", desc=True).range(skip, skip + limit - 1)
-        response = query.execute()
-        count_response = count_query.execute()
+        query = apply_pagination(query, "created_at", limit, cursor=cursor, offset=skip)
+        response = await db.execute(query)
+        total = None if cursor else (await db.execute(count_query)).count or 0
+        logs, next_cursor = page_with_cursor(response.data, "created_at", limit)
 
-        return {"logs": response.data, "total": count_response.count or 0, "skip": skip, "limit": limit}
+        return {"logs": logs, "total": total, "skip": skip, "limit": limit, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
         log_security_event("AUDIT_LOG_QUERY_ERROR", {"error": str(e)}, "ERROR")
         raise HTTPException(status_code=500, detail="Audit logları alınırken hata oluştu")
@@ -134,7 +141,7 @@ async def get_audit_history(
 ):
     """Paginated audit log history with filters"""
     try:
-        query = supabase.table("audit_logs").select("*", count="exact").order("created_at", desc=True)
+        query = db.table("audit_logs").select("*", count="exact").order("created_at", desc=True)
         if action:
             query = query.eq("action", action)
         if role:
@@ -144,7 +151,7 @@ async def get_audit_history(
 
         offset = page * page_size
         query = query.range(offset, offset + page_size - 1)
-        result = query.execute()
+        result = await db.execute(query)
 
         return {"data": result.data or [], "total": result.count or 0, "page": page, "page_size": page_size}
     except Exception as e:
@@ -160,9 +167,9 @@ async def get_audit_history(
 async def get_agency_analytics(user: dict = Depends(require_admin)):
     """Ajanta bazlı analytics"""
     try:
-        response = supabase.table("tours").select(
+        response = await db.execute(db.table("tours").select(
             "operator_id, operator, status, created_at"
-        ).not_.is_("operator_id", "null").execute()
+        ).not_.is_("operator_id", "null"))
 
         agency_map: Dict[str, dict] = {}
         for tour in response.data:
@@ -203,7 +210,7 @@ async def get_agency_analytics(user: dict = Depends(require_admin)):
 async def get_pending_licenses(user: dict = Depends(require_admin)):
     """Onay bekleyen license belgelerini listeler"""
     try:
-        response = supabase.rpc('get_operators_pending_verification').execute()
+        response = await db.execute(db.rpc('get_operators_pending_verification'))
         return {"operators": response.data}
     except Exception as e:
         log_security_event("PENDING_LICENSES_ERROR", {"error": str(e)}, "ERROR")
@@ -214,10 +221,10 @@ async def get_pending_licenses(user: dict = Depends(require_admin)):
 async def verify_license(operator_id: str, verified: bool, license_number: str = "", request: Request = None, user: dict = Depends(require_admin)):
     """Admin operator license'ını onaylar/reddeder"""
     try:
-        response = supabase.rpc('verify_operator_license', {
+        response = await db.execute(db.rpc('verify_operator_license', {
             'operator_id_param': operator_id, 'admin_id': user['id'],
             'verified': verified, 'license_number_param': license_number if license_number else None
-        }).execute()
+        }))
 
         await write_audit_log(
             request=request, user_id=user['id'],
@@ -237,22 +244,22 @@ async def verify_license(operator_id: str, verified: bool, license_number: str =
 # USER MANAGEMENT
 # ============================================
 
-def _calculate_user_impact(user_id: str) -> dict:
+async def _calculate_user_impact(user_id: str) -> dict:
     impact = {"affected_tours": 0, "affected_favorites": 0, "affected_reviews": 0, "tour_titles": []}
     try:
-        tours = supabase.table("tours").select("id, title").eq("operator_id", user_id).in_("status", ["approved", "pending"]).execute()
+        tours = await db.execute(db.table("tours").select("id, title").eq("operator_id", user_id).in_("status", ["approved", "pending"]))
         if tours.data:
             impact["affected_tours"] = len(tours.data)
             impact["tour_titles"] = [t["title"] for t in tours.data[:5]]
     except Exception:
         pass
     try:
-        favs = supabase.table("favorites").select("id", count="exact").eq("user_id", user_id).execute()
+        favs = await db.execute(db.table("favorites").select("id", count="exact").eq("user_id", user_id))
         impact["affected_favorites"] = favs.count or 0
     except Exception:
         pass
     try:
-        reviews = supabase.table("reviews").select("id", count="exact").eq("user_id", user_id).execute()
+        reviews = await db.execute(db.table("reviews").select("id", count="exact").eq("user_id", user_id))
         impact["affected_reviews"] = reviews.count or 0
     except Exception:
         pass
@@ -266,7 +273,7 @@ async def suspend_user(user_id: str, request: Request, dry_run: bool = False, us
         if user_id == user['id']:
             raise HTTPException(status_code=400, detail="Kendinizi askıya alamazsınız")
 
-        profile = supabase.table("users").select("id, email, user_role, status").eq("id", user_id).execute()
+        profile = await db.execute(db.table("users").select("id, email, user_role, status").eq("id", user_id))
         if not profile.data:
             raise HTTPException(status_code=404, detail="Kullanıcı bulunamadı")
 
@@ -276,7 +283,7 @@ async def suspend_user(user_id: str, request: Request, dry_run: bool = False, us
         if target_user.get('user_role') in ['admin', 'super_admin'] and user.get('user_role') != 'super_admin':
             raise HTTPException(status_code=403, detail="Admin kullanıcıları sadece super admin askıya alabilir")
 
-        impact = _calculate_user_impact(user_id)
+        impact = await _calculate_user_impact(user_id)
 
         if dry_run:
             return {
@@ -286,7 +293,8 @@ async def suspend_user(user_id: str, request: Request, dry_run: bool = False, us
                 "impact": impact, "message": "Bu işlem uygulanmadı. Onay bekliyor."
             }
 
-        supabase.table("users").update({"status": "suspended"}).eq("id", user_id).execute()
+        await db.execute(db.table("users").update({"status": "suspended"}).eq("id", user_id))
+        invalidate_auth_user(user_id)
 
         await write_audit_log(
             request=request, user_id=user['id'],
@@ -309,7 +317,7 @@ async def suspend_user(user_id: str, request: Request, dry_run: bool = False, us
 async def activate_user(user_id: str, request: Request, user: dict = Depends(require_admin)):
     """Askıya alınmış kullanıcıyı aktifleştirir."""
     try:
-        profile = supabase.table("users").select("id, email, status, user_role").eq("id", user_id).execute()
+        profile = await db.execute(db.table("users").select("id, email, status, user_role").eq("id", user_id))
         if not profile.data:
             raise HTTPException(status_code=404, detail="Kullanıcı bulunamadı")
 
@@ -317,7 +325,8 @@ async def activate_user(user_id: str, request: Request, user: dict = Depends(req
         if target_user.get('status', 'active') == 'active':
             raise HTTPException(status_code=400, detail="Kullanıcı zaten aktif")
 
-        supabase.table("users").update({"status": "active"}).eq("id", user_id).execute()
+        await db.execute(db.table("users").update({"status": "active"}).eq("id", user_id))
+        invalidate_auth_user(user_id)
 
         await write_audit_log(
             request=request, user_id=user['id'],
@@ -339,7 +348,7 @@ async def activate_user(user_id: str, request: Request, user: dict = Depends(req
 @router.post("/users/{user_id}/toggle-status")
 async def toggle_user_status_compat(user_id: str, request: Request, user: dict = Depends(require_admin)):
     """Geriye uyumluluk — suspend veya activate çağırır"""
-    profile = supabase.table("users").select("status").eq("id", user_id).execute()
+    profile = await db.execute(db.table("users").select("status").eq("id", user_id))
     if not profile.data:
         raise HTTPException(status_code=404, detail="Kullanıcı bulunamadı")
     current = profile.data[0]
@@ -359,7 +368,7 @@ CRITICAL_SETTINGS = ['maintenance_mode', 'registration_enabled', 'auto_approve_t
 async def get_settings(user: dict = Depends(require_admin)):
     """Platform ayarlarını getirir"""
     try:
-        result = supabase.table("platform_settings").select("key, value").execute()
+        result = await db.execute(db.table("platform_settings").select("key, value"))
         settings = {}
         if result.data:
             for row in result.data:
@@ -380,7 +389,7 @@ async def update_settings(data: SettingsUpdate, request: Request, dry_run: bool
 
         current = {}
         try:
-            result = supabase.table("platform_settings").select("key, value").execute()
+            result = await db.execute(db.table("platform_settings").select("key, value"))
             if result.data:
                 for row in result.data:
                     current[row['key']] = row['value']
@@ -402,7 +411,7 @@ async def update_settings(data: SettingsUpdate, request: Request, dry_run: bool
             }
 
         for key, value in data.settings.items():
-            supabase.table("platform_settings").upsert({"key": key, "value": value}, on_conflict="key").execute()
+            await db.execute(db.table("platform_settings").upsert({"key": key, "value": value}, on_conflict="key"))
 
         old_settings = {c['key']: c['old_value'] for c in changes}
         new_settings = {c['key']: c['new_value'] for c in changes}
@@ -432,7 +441,7 @@ ROLLBACK_ELIGIBLE_ACTIONS = ['user_suspended', 'user_activated', 'settings_updat
 async def rollback_action(audit_id: str, request: Request, user: dict = Depends(require_super_admin)):
     """Audit kaydındaki previous_data ile işlemi geri alır. Sadece super_admin."""
     try:
-        record = supabase.table("audit_logs").select("*").eq("id", audit_id).execute()
+        record = await db.execute(db.table("audit_logs").select("*").eq("id", audit_id))
         if not record.data:
             raise HTTPException(status_code=404, detail="Audit kaydı bulunamadı")
 
@@ -450,12 +459,13 @@ async def rollback_action(audit_id: str, request: Request, user: dict = Depends(
         entity_id = audit.get('entity_id')
 
         if entity == 'user' and entity_id:
-            supabase.table("users").update(previous_data).eq("id", entity_id).execute()
+            await db.execute(db.table("users").update(previous_data).eq("id", entity_id))
+            invalidate_auth_user(entity_id)
         elif entity == 'platform_settings':
             for key, value in previous_data.items():
-                supabase.table("platform_settings").upsert({"key": key, "value": value}, on_conflict="key").execute()
+                await db.execute(db.table("platform_settings").upsert({"key": key, "value": value}, on_conflict="key"))
         elif entity == 'feature_flag' and entity_id:
-            supabase.table("feature_flags").update(previous_data).eq("key", entity_id).execute()
+            await db.execute(db.table("feature_flags").update(previous_data).eq("key", entity_id))
         else:
             raise HTTPException(status_code=400, detail="Bilinmeyen entity türü")
 
@@ -468,7 +478,7 @@ async def rollback_action(audit_id: str, request: Request, user: dict = Depends(
         )
 
         try:
-            supabase.table("audit_logs").update({"is_rollback": True}).eq("id", audit_id).execute()
+            await db.execute(db.table("audit_logs").update({"is_rollback": True}).eq("id", audit_id))
         except Exception:
             pass
 
@@ -488,7 +498,7 @@ async def rollback_action(audit_id: str, request: Request, user: dict = Depends(
 async def get_feature_flags(user: dict = Depends(require_admin)):
     """Tüm feature flag'leri listeler"""
     try:
-        result = supabase.table("feature_flags").select("*").order("key").execute()
+        result = await db.execute(db.table("feature_flags").select("*").order("key"))
         return {"flags": result.data or []}
     except Exception as e:
         log_security_event("FEATURE_FLAGS_ERROR", {"error": str(e)}, "ERROR")
@@ -499,17 +509,17 @@ async def get_feature_flags(user: dict = Depends(require_admin)):
 async def toggle_feature_flag(key: str, request: Request, user: dict = Depends(require_admin)):
     """Feature flag aç/kapat"""
     try:
-        existing = supabase.table("feature_flags").select("*").eq("key", key).execute()
+        existing = await db.execute(db.table("feature_flags").select("*").eq("key", key))
         if not existing.data:
             raise HTTPException(status_code=404, detail=f"Feature flag '{key}' bulunamadı")
 
         current = existing.data[0]
         new_enabled = not current['enabled']
 
-        supabase.table("feature_flags").update({
+        await db.execute(db.table("feature_flags").update({
             "enabled": new_enabled, "updated_by": user['id'],
             "updated_at": datetime.utcnow().isoformat()
-        }).eq("key", key).execute()
+        }).eq("key", key))
 
         await write_audit_log(
             request=request, user_id=user['id'],
@@ -535,7 +545,7 @@ async def toggle_feature_flag(key: str, request: Request, user: dict = Depends(r
 async def get_notifications(user: dict = Depends(require_admin)):
     """Duyuruları listeler"""
     try:
-        result = supabase.table("notifications").select("*").order("created_at", desc=True).limit(50).execute()
+        result = await db.execute(db.table("notifications").select("*").order("created_at", desc=True).limit(50))
         return {"notifications": result.data or []}
     except Exception as e:
         log_security_event("NOTIFICATIONS_GET_ERROR", {"error": str(e)}, "ERROR")
@@ -549,10 +559,10 @@ async def create_notification(data: NotificationCreate, request: Request, user:
         if data.target_role not in ['all', 'user', 'operator']:
             raise HTTPException(status_code=400, detail="Geçersiz hedef kitle")
 
-        result = supabase.table("notifications").insert({
+        result = await db.execute(db.table("notifications").insert({
             "title": data.title, "message": data.message,
             "target_role": data.target_role, "created_by": user['id'],
-        }).execute()
+        }))
 
         await write_audit_log(
             request=request, user_id=user['id'],
@@ -572,7 +582,7 @@ async def create_notification(data: NotificationCreate, request: Request, user:
 async def delete_notification(notification_id: str, request: Request, user: dict = Depends(require_admin)):
     """Duyuru siler"""
     try:
-        supabase.table("notifications").delete().eq("id", notification_id).execute()
+        await db.execute(db.table("notifications").delete().eq("id", notification_id))
         await write_audit_log(
             request=request, user_id=user['id'],
             role=user.get('user_role', 'admin'), action='notification_deleted',
@@ -679,7 +689,7 @@ async def admin_get_file_url(file_path: str, user: dict = Depends(require_admin)
 async def get_admin_reviews(status: str = "pending", user: dict = Depends(require_admin)):
     """Admin: Yorumları listeler"""
     try:
-        result = supabase.table("operator_reviews").select("*").eq("status", status).order("created_at", desc=True).execute()
+        result = await db.execute(db.table("operator_reviews").select("*").eq("status", status).order("created_at", desc=True))
         return {"reviews": result.data or [], "total": len(result.data or [])}
     except Exception as e:
         log_security_event("ADMIN_REVIEWS_ERROR", {"error": str(e)}, "ERROR")
@@ -697,7 +707,7 @@ async def moderate_review(review_id: str, data: ReviewModerate, request: Request
         if data.rejection_reason:
             update_data["rejection_reason"] = data.rejection_reason
 
-        supabase.table("operator_reviews").update(update_data).eq("id", review_id).execute()
+        await db.execute(db.table("operator_reviews").update(update_data).eq("id", review_id))
 
         await write_audit_log(
             request=request, user_id=user['id'],
@@ -722,10 +732,10 @@ async def moderate_review(review_id: str, data: ReviewModerate, request: Request
 async def get_scheduled_actions(status_filter: str = "pending", user: dict = Depends(require_admin)):
     """Zamanlanmış aksiyonları listele"""
     try:
-        query = supabase.table("scheduled_actions").select("*", count="exact").order("scheduled_at", desc=False)
+        query = db.table("scheduled_actions").select("*", count="exact").order("scheduled_at", desc=False)
         if status_filter:
             query = query.eq("status", status_filter)
-        result = query.limit(100).execute()
+        result = await db.execute(query.limit(100))
         return {"data": result.data or [], "total": result.count or 0}
     except Exception as e:
         raise HTTPException(status_code=500, detail="Zamanlanmış aksiyonlar yüklenemedi")
@@ -735,11 +745,11 @@ async def get_scheduled_actions(status_filter: str = "pending", user: dict = Dep
 async def create_scheduled_action(data: ScheduledActionCreate, request: Request, user: dict = Depends(require_admin)):
     """Yeni zamanlanmış aksiyon oluştur"""
     try:
-        result = supabase.table("scheduled_actions").insert({
+        result = await db.execute(db.table("scheduled_actions").insert({
             "action_type": data.action_type, "entity": data.entity,
             "entity_id": data.entity_id, "payload": data.payload,
             "scheduled_at": data.scheduled_at, "created_by": user['id'],
-        }).execute()
+        }))
 
         await write_audit_log(
             request=request, user_id=user['id'],
@@ -757,7 +767,7 @@ async def create_scheduled_action(data: ScheduledActionCreate, request: Request,
 async def cancel_scheduled_action(action_id: str, user: dict = Depends(require_admin)):
     """Zamanlanmış aksiyonu iptal et"""
     try:
-        supabase.table("scheduled_actions").update({"status": "cancelled"}).eq("id", action_id).eq("status", "pending").execute()
+        await db.execute(db.table("scheduled_actions").update({"status": "cancelled"}).eq("id", action_id).eq("status", "pending"))
         return {"success": True}
     except Exception:
         raise HTTPException(status_code=500, detail="Aksiyon iptal edilemedi")
@@ -771,12 +781,12 @@ async def cancel_scheduled_action(action_id: str, user: dict = Depends(require_a
 async def get_operator_performance(user: dict = Depends(require_admin)):
     """Operatör performans metrikleri — Batch queries"""
     try:
-        operators = supabase.table("users").select("id, email, company_name, created_at").eq("user_role", "operator").execute()
+        operators = await db.execute(db.table("users").select("id, email, company_name, created_at").eq("user_role", "operator"))
         op_ids = [op['id'] for op in (operators.data or [])]
         if not op_ids:
             return {"operators": []}
 
-        all_tours = supabase.table("tours").select("user_id, status").in_("user_id", op_ids).execute()
+        all_tours = await db.execute(db.table("tours").select("user_id, status").in_("user_id", op_ids))
         tours_by_op: dict = {}
         for t in (all_tours.data or []):
             uid = t['user_id']
@@ -786,7 +796,7 @@ async def get_operator_performance(user: dict = Depends(require_admin)):
 
         all_reviews_data = []
         try:
-            all_reviews = supabase.table("reviews").select("operator_id, rating").in_("operator_id", op_ids).execute()
+            all_reviews = await db.execute(db.table("reviews").select("operator_id, rating").in_("operator_id", op_ids))
             all_reviews_data = all_reviews.data or []
         except Exception:
             pass
@@ -838,7 +848,7 @@ async def get_system_info(user: dict = Depends(require_admin)):
         tables = {}
         for table_name in ['users', 'tours', 'reviews', 'audit_logs', 'uptime_logs', 'email_queue']:
             try:
-                r = supabase.table(table_name).select("id", count="exact").limit(0).execute()
+                r = await db.execute(db.table(table_name).select("id", count="exact").limit(0))
                 tables[table_name] = r.count or 0
             except Exception:
                 tables[table_name] = -1
@@ -2,44 +2,194 @@
 AI Routes — Tour comparison, Chatbot, Provider listing
 """
 
-from fastapi import APIRouter, Request, Depends
+import asyncio
+import json
+import math
+from fastapi import APIRouter, Request, Response, Depends
+from fastapi.responses import StreamingResponse
+from ai_service import is_cacheable_ai_response, AI_STREAM_MAX_SECONDS
+from cache import (
+    get_or_compute, get_ai_cache_key, get_compare_cache_key, ai_response_cache, AI_CACHE_TTL,
+    get_cached_ai_value, cache_ai_value,
+)
+from semantic_cache import semantic_cache, SEMANTIC_CACHE_ENABLED
 from dependencies import (
-    supabase, limiter, ai_service, log_security_event,
-    get_current_user, get_optional_user, check_feature_access,
+    db, limiter, ai_service, log_security_event, write_behind,
+    get_current_user, get_optional_user, check_feature_access, fetch_tours_by_ids,
     CompareRequest, ChatRequest,
     HTTPException, Optional,
 )
 
 router = APIRouter(prefix="/api", tags=["ai"])
 
+BOT_DETECTED_ANSWER = "Bir hata oluştu. Lütfen tekrar deneyin."
+
+# Saatlik chat kotası (token bucket: kova limit kadar dolar, saatte tamamen yenilenir)
+CHAT_USER_LIMIT = 100
+CHAT_ANON_LIMIT = 20
+CHAT_LIMIT_WINDOW = 3600
+
+
+# ============================================
+# SHARED PREFLIGHT
+# ============================================
+
+async def _load_compare_tours(compare_request: CompareRequest, user: dict) -> list:
+    """Lisans kontrolü + karşılaştırılacak turları yükler"""
+    await check_feature_access(user, "ai_compare")
+
+    tours = await fetch_tours_by_ids(compare_request.tour_ids)
+    if len(tours) < 2:
+        raise HTTPException(status_code=400, detail="En az 2 tur gerekli")
+    return tours
+
+
+async def _save_comparison(user: dict, compare_request: CompareRequest, result: dict) -> None:
+    await write_behind.submit("comparisons", {
+        "user_id": user["id"],
+        "tour_ids": compare_request.tour_ids,
+        "criteria": compare_request.criteria,
+        "ai_provider": compare_request.ai_provider,
+        "result": result
+    })
+
+
+def _rate_limit_headers(quota) -> dict:
+    """X-RateLimit-* (Reset: kova dolana kadar saniye); reddedildiyse Retry-After"""
+    headers = {
+        "X-RateLimit-Limit": str(quota.limit),
+        "X-RateLimit-Remaining": str(quota.remaining),
+        "X-RateLimit-Reset": str(math.ceil(quota.reset_after)),
+    }
+    if not quota.allowed:
+        headers["Retry-After"] = str(max(math.ceil(quota.retry_after), 1))
+    return headers
+
+
+async def _chat_preflight(request: Request, chat_request: ChatRequest):
+    """
+    Rate limit, anonim kullanıcı kontrolleri ve tur bağlamı.
+    Döner: (user, context_tours, bot_detected)
+    """
+    user = await get_optional_user(request)
+
+    # ===== DYNAMIC RATE LIMITING =====
+    from cache import consume_user_rate_limit
+    from security import get_secure_client_ip, log_rate_limit_event
+
+    if user:
+        user_id = user.get("id", "unknown")
+        quota = await consume_user_rate_limit(user_id, limit=CHAT_USER_LIMIT, window=CHAT_LIMIT_WINDOW)
+        if not quota.allowed:
+            log_rate_limit_event(get_secure_client_ip(request), endpoint="/api/chat", blocked=True, reason="User hourly limit exceeded")
+            raise HTTPException(status_code=429, detail="Saatlik sınırınıza ulaştınız. Lütfen bekleyin.", headers=_rate_limit_headers(quota))
+    else:
+        client_ip = get_secure_client_ip(request)
+        quota = await consume_user_rate_limit(f"anon:{client_ip}", limit=CHAT_ANON_LIMIT, window=CHAT_LIMIT_WINDOW)
+        if not quota.allowed:
+            log_rate_limit_event(client_ip, endpoint="/api/chat", blocked=True, reason="Anonymous hourly limit exceeded")
+            raise HTTPException(status_code=429, detail="Anonim kullanıcı sınırına ulaştınız. Giriş yaparak daha fazla mesaj gönderebilirsiniz.", headers=_rate_limit_headers(quota))
+    request.state.rate_limit = quota
+
+    # ===== ANONIM KULLANICI GÜVENLİK KONTROLLARI =====
+    if not user:
+        honeypot = request.headers.get("X-Form-Token", "")
+        if honeypot and len(honeypot) > 0:
+            log_security_event("BOT_DETECTED_HONEYPOT", {"ip": request.client.host}, "WARN")
+            return None, [], True
+
+        if len(chat_request.message) > 500:
+            raise HTTPException(status_code=400, detail="Mesaj çok uzun. Giriş yapmadan maksimum 500 karakter gönderebilirsiniz.")
+
+        client_ip = get_secure_client_ip(request)
+        log_security_event("ANONYMOUS_CHAT_REQUEST", {"ip": client_ip, "message_length": len(chat_request.message)})
+
+    if user:
+        try:
+            await check_feature_access(user, "ai_chat")
+        except HTTPException:
+            user = None
+
+    context_tours = []
+    if chat_request.context_tour_ids:
+        context_tours = await fetch_tours_by_ids(chat_request.context_tour_ids)
+
+    return user, context_tours, False
+
+
+async def _save_chat(user: Optional[dict], chat_request: ChatRequest, answer: str) -> None:
+    if user:
+        await write_behind.submit("chats", {
+            "user_id": user["id"],
+            "message": chat_request.message,
+            "context_tour_ids": chat_request.context_tour_ids or [],
+            "ai_provider": chat_request.ai_provider,
+            "answer": answer
+        })
+
+
+# ============================================
+# SERVER-SENT EVENTS
+# ============================================
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+def _sse_response(events, headers: Optional[dict] = None) -> StreamingResponse:
+    return StreamingResponse(events, media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",  # nginx: parçaları tamponlamadan ilet
+        **(headers or {}),
+    })
+
+
+async def _with_deadline(stream, seconds: float):
+    """
+    Akışı en fazla `seconds` saniye tüketir; süre dolarsa asyncio.TimeoutError.
+    İstemci bağlantıyı koparınca Starlette yanıt task'ını iptal eder; finally
+    bloğu üst akışı (ve model bağlantısını) kapatır.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + seconds
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(stream.__anext__(), max(deadline - loop.time(), 0))
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        await stream.aclose()
+
+
+# ============================================
+# ENDPOINTS
+# ============================================
 
 @router.post("/compare")
 @limiter.limit("10/hour")
 async def compare_tours(request: Request, compare_request: CompareRequest, user: dict = Depends(get_current_user)):
     """AI ile turları karşılaştırır - License Protected"""
     try:
-        await check_feature_access(user, "ai_compare")
+        tours = await _load_compare_tours(compare_request, user)
 
-        tours = []
-        for tour_id in compare_request.tour_ids:
-            response = supabase.table("tours").select("*").eq("id", int(tour_id)).execute()
-            if response.data:
-                tours.append(response.data[0])
+        # Aynı turlar (aynı içerik versiyonu) + kriterler + provider → aynı sonuç
+        provider = compare_request.ai_provider if compare_request.ai_provider in ai_service.providers else "openai"
 
-        if len(tours) < 2:
-            raise HTTPException(status_code=400, detail="En az 2 tur gerekli")
+        async def produce():
+            return await ai_service.compare_tours(
+                tours=tours, criteria=compare_request.criteria, provider=compare_request.ai_provider
+            )
 
-        result = await ai_service.compare_tours(
-            tours=tours, criteria=compare_request.criteria, provider=compare_request.ai_provider
+        result = await get_or_compute(
+            get_compare_cache_key(tours, compare_request.criteria, provider), produce,
+            ttl=AI_CACHE_TTL, is_ai=True, local=ai_response_cache,
+            # Başka provider'a düşen (fallback) sonuçlar bu provider'ın anahtarına yazılmaz
+            cacheable=lambda r: r.get("provider") == provider and is_cacheable_ai_response(r),
         )
 
-        supabase.table("comparisons").insert({
-            "user_id": user["id"],
-            "tour_ids": compare_request.tour_ids,
-            "criteria": compare_request.criteria,
-            "ai_provider": compare_request.ai_provider,
-            "result": result
-        }).execute()
+        await _save_comparison(user, compare_request, result)
 
         return result
     except HTTPException:
@@ -49,78 +199,95 @@ async def compare_tours(request: Request, compare_request: CompareRequest, user:
         raise HTTPException(status_code=500, detail="Karşılaştırma yapılırken bir hata oluştu")
 
 
+@router.post("/compare/stream")
+@limiter.limit("10/hour")
+async def compare_tours_stream(request: Request, compare_request: CompareRequest, user: dict = Depends(get_current_user)):
+    """
+    /api/compare'in akışlı (SSE) hali.
+    Olaylar: delta (model metni), result (compare ile aynı JSON), blocked, error, done.
+    """
+    tours = await _load_compare_tours(compare_request, user)
+    provider = compare_request.ai_provider if compare_request.ai_provider in ai_service.providers else "openai"
+    cache_key = get_compare_cache_key(tours, compare_request.criteria, provider)
+
+    async def events():
+        try:
+            cached = await get_cached_ai_value(cache_key)
+            if cached is not None:
+                yield _sse("result", cached)
+                yield _sse("done", {"cached": True})
+                return
+
+            stream = ai_service.compare_tours_stream(tours=tours, criteria=compare_request.criteria, provider=compare_request.ai_provider)
+            async for event, data in _with_deadline(stream, AI_STREAM_MAX_SECONDS):
+                yield _sse(event, data)
+                if event == "blocked":
+                    break
+                if event == "result":
+                    if data.get("provider") == provider and is_cacheable_ai_response(data):
+                        await cache_ai_value(cache_key, data)
+                    await _save_comparison(user, compare_request, data)
+            yield _sse("done", {"cached": False})
+        except asyncio.TimeoutError:
+            log_security_event("AI_STREAM_TIMEOUT", {"endpoint": "/api/compare/stream"}, "WARN")
+            yield _sse("error", {"detail": "Yanıt süresi aşıldı"})
+        except Exception as e:
+            log_security_event("AI_COMPARE_ERROR", {"error": str(e), "stream": True}, "ERROR")
+            yield _sse("error", {"detail": "Karşılaştırma yapılırken bir hata oluştu"})
+
+    return _sse_response(events())
+
+
 @router.post("/chat")
 @limiter.limit("100/hour")
-async def chat(request: Request, chat_request: ChatRequest):
+async def chat(request: Request, chat_request: ChatRequest, response: Response):
     """AI chatbot ile sohbet - Giriş yapmadan da kullanılabilir"""
     try:
-        user = get_optional_user(request)
-
-        # ===== DYNAMIC RATE LIMITING =====
-        from cache import check_user_rate_limit
-        from security import get_secure_client_ip, log_rate_limit_event
-
-        if user:
-            user_id = user.get("id", "unknown")
-            if not await check_user_rate_limit(user_id, limit=100, window=3600):
-                log_rate_limit_event(get_secure_client_ip(request), endpoint="/api/chat", blocked=True, reason="User hourly limit exceeded")
-                raise HTTPException(status_code=429, detail="Saatlik sınırınıza ulaştınız. Lütfen bekleyin.")
-        else:
-            client_ip = get_secure_client_ip(request)
-            if not await check_user_rate_limit(f"anon:{client_ip}", limit=20, window=3600):
-                log_rate_limit_event(client_ip, endpoint="/api/chat", blocked=True, reason="Anonymous hourly limit exceeded")
-                raise HTTPException(status_code=429, detail="Anonim kullanıcı sınırına ulaştınız. Giriş yaparak daha fazla mesaj gönderebilirsiniz.")
-
-        # ===== ANONIM KULLANICI GÜVENLİK KONTROLLARI =====
-        if not user:
-            honeypot = request.headers.get("X-Form-Token", "")
-            if honeypot and len(honeypot) > 0:
-                log_security_event("BOT_DETECTED_HONEYPOT", {"ip": request.client.host}, "WARN")
-                return {"answer": "Bir hata oluştu. Lütfen tekrar deneyin.", "provider": "error"}
-
-            if len(chat_request.message) > 500:
-                raise HTTPException(status_code=400, detail="Mesaj çok uzun. Giriş yapmadan maksimum 500 karakter gönderebilirsiniz.")
-
-            client_ip = get_secure_client_ip(request)
-            log_security_event("ANONYMOUS_CHAT_REQUEST", {"ip": client_ip, "message_length": len(chat_request.message)})
-
-        if user:
-            try:
-                await check_feature_access(user, "ai_chat")
-            except HTTPException:
-                user = None
-
-        context_tours = []
-        if chat_request.context_tour_ids:
-            for tour_id in chat_request.context_tour_ids:
-                response = supabase.table("tours").select("*").eq("id", int(tour_id)).execute()
-                if response.data:
-                    context_tours.append(response.data[0])
-
-        cached_answer = None  # Cache disabled
-
-        if cached_answer:
-            answer = cached_answer
-        else:
-            answer = await ai_service.chat(
+        user, context_tours, bot_detected = await _chat_preflight(request, chat_request)
+        response.headers.update(_rate_limit_headers(request.state.rate_limit))
+        if bot_detected:
+            return {"answer": BOT_DETECTED_ANSWER, "provider": "error"}
+
+        computed = False
+        context_free = not chat_request.context_tour_ids
+        provider = chat_request.ai_provider if chat_request.ai_provider in ai_service.providers else "openai"
+        answered_by = provider
+
+        async def produce():
+            nonlocal computed, answered_by
+            # Yakın-kopya soru daha önce yanıtlandıysa LLM'e gitme
+            if context_free and SEMANTIC_CACHE_ENABLED:
+                similar_answer = semantic_cache.lookup(chat_request.message, provider)
+                if similar_answer:
+                    return similar_answer
+
+            computed = True
+            answer, answered_by = await ai_service.chat_with_provider(
                 message=chat_request.message,
                 context_tours=context_tours,
                 provider=chat_request.ai_provider
             )
+            if context_free and SEMANTIC_CACHE_ENABLED and answered_by == provider and is_cacheable_ai_response(answer):
+                semantic_cache.add(chat_request.message, provider, answer)
+            return answer
 
-        if user:
-            supabase.table("chats").insert({
-                "user_id": user["id"],
-                "message": chat_request.message,
-                "context_tour_ids": chat_request.context_tour_ids or [],
-                "ai_provider": chat_request.ai_provider,
-                "answer": answer
-            }).execute()
+        # Sadece tur bağlamı olmayan (SSS tarzı) mesajlar cache'lenir
+        if not context_free:
+            answer = await produce()
+        else:
+            answer = await get_or_compute(
+                get_ai_cache_key(chat_request.message, provider), produce,
+                ttl=AI_CACHE_TTL, is_ai=True, local=ai_response_cache,
+                # Başka provider'a düşen (fallback) yanıtlar bu provider'ın anahtarına yazılmaz
+                cacheable=lambda r: answered_by == provider and is_cacheable_ai_response(r),
+            )
+
+        await _save_chat(user, chat_request, answer)
 
         return {
             "answer": answer,
-            "provider": chat_request.ai_provider,
-            "cached": cached_answer is not None
+            "provider": answered_by,
+            "cached": not computed
         }
     except HTTPException:
         raise
@@ -129,6 +296,66 @@ async def chat(request: Request, chat_request: ChatRequest):
         raise HTTPException(status_code=500, detail="Chatbot yanıt veremedi")
 
 
+@router.post("/chat/stream")
+@limiter.limit("100/hour")
+async def chat_stream(request: Request, chat_request: ChatRequest):
+    """
+    /api/chat'in akışlı (SSE) hali — yanıt, model ürettikçe parça parça gönderilir.
+    Olaylar: delta (metin parçası), blocked (çıktı filtresi akışı kesti), error, done.
+    """
+    user, context_tours, bot_detected = await _chat_preflight(request, chat_request)
+    context_free = not chat_request.context_tour_ids
+    provider = chat_request.ai_provider if chat_request.ai_provider in ai_service.providers else "openai"
+    cache_key = get_ai_cache_key(chat_request.message, provider)
+
+    async def events():
+        if bot_detected:
+            yield _sse("delta", BOT_DETECTED_ANSWER)
+            yield _sse("done", {"cached": False})
+            return
+        try:
+            if context_free:
+                cached = await get_cached_ai_value(cache_key)
+                if cached is None and SEMANTIC_CACHE_ENABLED:
+                    cached = semantic_cache.lookup(chat_request.message, provider)
+                if cached is not None:
+                    yield _sse("delta", cached)
+                    yield _sse("done", {"cached": True})
+                    await _save_chat(user, chat_request, cached)
+                    return
+
+            parts = []
+            answered_by = provider
+            stream = ai_service.chat_stream(message=chat_request.message, context_tours=context_tours, provider=provider)
+            async for event, text in _with_deadline(stream, AI_STREAM_MAX_SECONDS):
+                if event == "provider":
+                    answered_by = text
+                    continue
+                yield _sse(event, text)
+                if event == "blocked":
+                    parts = [text]
+                    break
+                parts.append(text)
+
+            answer = "".join(parts)
+            yield _sse("done", {"cached": False})
+
+            # Yalnızca tamamlanmış akış cache'lenir / kaydedilir; fallback yanıtı bu provider'a yazılmaz
+            if context_free and answered_by == provider and is_cacheable_ai_response(answer):
+                await cache_ai_value(cache_key, answer)
+                if SEMANTIC_CACHE_ENABLED:
+                    semantic_cache.add(chat_request.message, provider, answer)
+            await _save_chat(user, chat_request, answer)
+        except asyncio.TimeoutError:
+            log_security_event("AI_STREAM_TIMEOUT", {"endpoint": "/api/chat/stream"}, "WARN")
+            yield _sse("error", {"detail": "Yanıt süresi aşıldı"})
+        except Exception as e:
+            log_security_event("AI_CHAT_ERROR", {"error": str(e), "stream": True}, "ERROR")
+            yield _sse("error", {"detail": "Chatbot yanıt veremedi"})
+
+    return _sse_response(events(), headers=_rate_limit_headers(request.state.rate_limit))
+
+
 @router.get("/providers/models")
 async def get_providers():
     """Mevcut AI sağlayıcıları listeler"""
@@ -157,7 +384,7 @@ async def get_currencies():
 async def get_packages():
     """Mevcut paketleri listeler"""
     try:
-        response = supabase.table("packages").select("*").eq("is_active", True).execute()
+        response = await db.execute(db.table("packages").select("*").eq("is_active", True))
         return {"packages": response.data}
     except Exception as e:
         log_security_event("PACKAGES_ERROR", {"error": str(e)}, "ERROR")
@@ -168,9 +395,9 @@ async def get_packages():
 async def get_user_license(user: dict = Depends(get_current_user)):
     """Kullanıcının aktif lisansını getirir"""
     try:
-        response = supabase.table("user_licenses").select(
+        response = await db.execute(db.table("user_licenses").select(
             "*, package:packages(*)"
-        ).eq("user_id", user["id"]).eq("is_active", True).gte("expires_at", "now()").execute()
+        ).eq("user_id", user["id"]).eq("is_active", True).gte("expires_at", "now()"))
 
         return {"license": response.data[0] if response.data else None, "has_active_license": len(response.data) > 0}
     except Exception as e:
@@ -182,9 +409,9 @@ async def get_user_license(user: dict = Depends(get_current_user)):
 async def get_feature_usage(feature_name: str, user: dict = Depends(get_current_user)):
     """Kullanıcının feature kullanım bilgisini getirir"""
     try:
-        response = supabase.rpc("check_user_feature", {
+        response = await db.execute(db.rpc("check_user_feature", {
             "user_id_param": user["id"], "feature_name_param": feature_name
-        }).execute()
+        }))
 
         result = response.data[0] if response.data else {"allowed": False, "remaining": 0, "limit_value": 0}
 
@@ -4,8 +4,8 @@ Auth Routes — Register, Login, Logout, Refresh, Sync, Me
 
 from fastapi import APIRouter, Request, Response, Depends
 from dependencies import (
-    supabase, limiter, security,
-    get_current_user, get_optional_user,
+    supabase, db, limiter, security,
+    get_current_user, get_optional_user, invalidate_auth_token,
     validate_input, validate_password_strength,
     check_brute_force, record_failed_login, record_successful_login,
     log_security_event, verify_turnstile_token,
@@ -84,7 +84,7 @@ async def login(request: Request, credentials: UserLogin, response: Response):
     client_ip = request.client.host
 
     try:
-        check_brute_force(client_ip)
+        await check_brute_force(client_ip)
 
         if not await verify_turnstile_token(credentials.turnstile_token or "", client_ip):
             log_security_event("TURNSTILE_REJECTED", {"email": credentials.email, "ip": client_ip}, "WARN")
@@ -97,14 +97,14 @@ async def login(request: Request, credentials: UserLogin, response: Response):
         })
 
         if not auth_response.user:
-            record_failed_login(client_ip)
+            await record_failed_login(client_ip)
             log_security_event("LOGIN_FAILED", {"email": email, "ip": client_ip}, "WARN")
             raise HTTPException(status_code=401, detail="Email veya şifre hatalı")
 
-        record_successful_login(client_ip)
+        await record_successful_login(client_ip)
         log_security_event("LOGIN_SUCCESS", {"email": email, "ip": client_ip})
 
-        profile = supabase.table("users").select("*").eq("id", auth_response.user.id).execute()
+        profile = await db.execute(db.table("users").select("*").eq("id", auth_response.user.id))
 
         user_data = {}
         if profile.data and len(profile.data) > 0:
@@ -117,7 +117,7 @@ async def login(request: Request, credentials: UserLogin, response: Response):
             raise HTTPException(status_code=403, detail="Hesabınız askıya alınmıştır. Destek ile iletişime geçin.")
 
         from security import create_csrf_token_for_session
-        csrf_token = create_csrf_token_for_session(auth_response.user.id)
+        csrf_token = await create_csrf_token_for_session(auth_response.user.id)
 
         access_token = auth_response.session.access_token if auth_response.session else None
 
@@ -147,7 +147,7 @@ async def login(request: Request, credentials: UserLogin, response: Response):
     except HTTPException:
         raise
     except Exception as e:
-        record_failed_login(client_ip)
+        await record_failed_login(client_ip)
         log_security_event("LOGIN_ERROR", {"email": credentials.email, "error": str(e), "ip": client_ip}, "ERROR")
         raise HTTPException(status_code=401, detail="Giriş hatası")
 
@@ -167,6 +167,12 @@ async def get_me(user: dict = Depends(get_current_user)):
 async def logout(request: Request, response: Response):
     """Kullanıcı çıkışı - HttpOnly cookie'leri temizler"""
     try:
+        # Doğrulanmış token cache'inden çıkar — token bu pod'da artık kabul edilmez
+        auth_header = request.headers.get("Authorization", "")
+        for token in (request.cookies.get("access_token"), auth_header[7:] if auth_header.startswith("Bearer ") else None):
+            if token:
+                invalidate_auth_token(token)
+
         response.delete_cookie(key="access_token", path="/", domain=None, secure=True, httponly=True, samesite="strict")
         response.delete_cookie(key="refresh_token", path="/api/auth", domain=None, secure=True, httponly=True, samesite="strict")
         log_security_event("LOGOUT_SUCCESS", {"ip": request.client.host})
@@ -210,7 +216,7 @@ async def refresh_session(request: Request, response: Response):
             )
 
         user = auth_response.user
-        profile = supabase.table("users").select("*").eq("id", user.id).execute()
+        profile = await db.execute(db.table("users").select("*").eq("id", user.id))
         user_role = "user"
         company_name = None
         if profile.data:
@@ -5,10 +5,16 @@ Also includes public feature flags endpoint
 
 from fastapi import APIRouter, Request, Depends
 from dependencies import (
-    supabase, limiter, log_security_event,
-    require_admin, send_user_notification,
+    supabase, db, limiter, log_security_event,
+    require_admin, send_user_notification, invalidate_auth_user, write_behind, import_job_runner,
+    apply_pagination, page_with_cursor,
     HTTPException, Optional, os, datetime, timedelta, asyncio,
 )
+from security import (
+    drain_rate_limit_events, rate_limit_log_stats,
+    RATE_LIMIT_LOG_FLUSH_INTERVAL, RATE_LIMIT_LOG_OVERFLOW_IP,
+)
+from postgrest.types import ReturnMethod
 import time as _time
 import httpx
 
@@ -33,7 +39,10 @@ async def health_check(request: Request):
             "cache_enabled": True,
             "redis_available": REDIS_AVAILABLE,
             "ai_cache_size": cache_stats.get("ai_cache_size", 0),
-            "ai_cache_hit_rate": round(cache_stats.get("ai_hit_rate", 0) * 100, 2)
+            "ai_cache_hit_rate": round(cache_stats.get("ai_hit_rate", 0) * 100, 2),
+            "auth_cache_hit_rate": round(cache_stats.get("auth_hit_rate", 0) * 100, 2),
+            "write_behind": write_behind.get_stats(),
+            "import_jobs": import_job_runner.get_stats(),
         },
         "environment": os.getenv("ENVIRONMENT", "development")
     }
@@ -47,7 +56,7 @@ async def health_check(request: Request):
 async def get_public_feature_flags():
     """Public: Frontend useFeature hook için — auth gerekmez"""
     try:
-        result = supabase.table("feature_flags").select("key, enabled").execute()
+        result = await db.execute(db.table("feature_flags").select("key, enabled"))
         flags = {}
         if result.data:
             for row in result.data:
@@ -76,7 +85,7 @@ async def _run_health_check_and_log():
     error_msg = None
 
     try:
-        r = supabase.table("tours").select("id").limit(1).execute()
+        r = await db.execute(db.table("tours").select("id").limit(1))
         db_ok = True
     except Exception as e:
         error_msg = f"DB: {str(e)[:100]}"
@@ -97,12 +106,12 @@ async def _run_health_check_and_log():
         _consecutive_failures += 1
 
     try:
-        supabase.table("uptime_logs").insert({
+        await db.execute(db.table("uptime_logs").insert({
             "status": status, "response_time_ms": response_time,
             "db_ok": db_ok, "auth_ok": auth_ok,
             "error_message": error_msg,
             "consecutive_failures": _consecutive_failures,
-        }).execute()
+        }))
     except Exception:
         pass
 
@@ -149,7 +158,7 @@ async def get_uptime_stats(user: dict = Depends(require_admin)):
         now = datetime.utcnow()
 
         day_ago = (now - timedelta(hours=24)).isoformat()
-        day_result = supabase.table("uptime_logs").select("status, response_time_ms", count="exact").gte("checked_at", day_ago).execute()
+        day_result = await db.execute(db.table("uptime_logs").select("status, response_time_ms", count="exact").gte("checked_at", day_ago))
         day_total = day_result.count or 0
         day_ok = sum(1 for r in (day_result.data or []) if r['status'] == 'ok')
         day_avg_rt = 0
@@ -158,7 +167,7 @@ async def get_uptime_stats(user: dict = Depends(require_admin)):
             day_avg_rt = int(sum(rts) / len(rts)) if rts else 0
 
         week_ago = (now - timedelta(days=7)).isoformat()
-        week_result = supabase.table("uptime_logs").select("status, response_time_ms", count="exact").gte("checked_at", week_ago).execute()
+        week_result = await db.execute(db.table("uptime_logs").select("status, response_time_ms", count="exact").gte("checked_at", week_ago))
         week_total = week_result.count or 0
         week_ok = sum(1 for r in (week_result.data or []) if r['status'] == 'ok')
         week_avg_rt = 0
@@ -167,7 +176,7 @@ async def get_uptime_stats(user: dict = Depends(require_admin)):
             week_avg_rt = int(sum(rts) / len(rts)) if rts else 0
 
         month_ago = (now - timedelta(days=30)).isoformat()
-        month_result = supabase.table("uptime_logs").select("status", count="exact").gte("checked_at", month_ago).execute()
+        month_result = await db.execute(db.table("uptime_logs").select("status", count="exact").gte("checked_at", month_ago))
         month_total = month_result.count or 0
         month_ok = sum(1 for r in (month_result.data or []) if r['status'] == 'ok')
 
@@ -185,16 +194,19 @@ async def get_uptime_stats(user: dict = Depends(require_admin)):
 
 
 @router.get("/api/admin/uptime/logs")
-async def get_uptime_logs(page: int = 0, page_size: int = 50, status_filter: str = None, user: dict = Depends(require_admin)):
-    """Son uptime check logları (paginated)"""
+async def get_uptime_logs(page: int = 0, page_size: int = 50, status_filter: str = None, cursor: Optional[str] = None, user: dict = Depends(require_admin)):
+    """Son uptime check logları (page veya cursor ile); total yalnızca ilk sayfada sayılır"""
     try:
-        query = supabase.table("uptime_logs").select("*", count="exact").order("checked_at", desc=True)
+        # Cursor sayfalarında toplam tekrar sayılmaz (count=exact tüm tabloyu tarar)
+        query = db.table("uptime_logs").select("*", count=None if cursor else "exact")
         if status_filter:
             query = query.eq("status", status_filter)
-        offset = page * page_size
-        query = query.range(offset, offset + page_size - 1)
-        result = query.execute()
-        return {"data": result.data or [], "total": result.count or 0, "page": page, "page_size": page_size}
+        query = apply_pagination(query, "checked_at", page_size, cursor=cursor, offset=page * page_size)
+        result = await db.execute(query)
+        data, next_cursor = page_with_cursor(result.data, "checked_at", page_size)
+        return {"data": data, "total": None if cursor else result.count or 0, "page": page, "page_size": page_size, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
         log_security_event("UPTIME_LOGS_ERROR", {"error": str(e)}, "ERROR")
         raise HTTPException(status_code=500, detail="Uptime logları yüklenemedi")
@@ -205,9 +217,9 @@ async def get_uptime_chart(hours: int = 24, user: dict = Depends(require_admin))
     """Response time chart data"""
     try:
         since = (datetime.utcnow() - timedelta(hours=hours)).isoformat()
-        result = supabase.table("uptime_logs").select(
+        result = await db.execute(db.table("uptime_logs").select(
             "checked_at, status, response_time_ms"
-        ).gte("checked_at", since).order("checked_at", desc=False).execute()
+        ).gte("checked_at", since).order("checked_at", desc=False))
         return {"data": result.data or []}
     except Exception as e:
         log_security_event("UPTIME_CHART_ERROR", {"error": str(e)}, "ERROR")
@@ -218,6 +230,31 @@ async def get_uptime_chart(hours: int = 24, user: dict = Depends(require_admin))
 # RATE LIMITING DASHBOARD
 # ============================================
 
+async def flush_rate_limit_events():
+    """Biriken rate limit olaylarını tek multi-row insert ile rate_limit_logs'a yazar"""
+    rows = drain_rate_limit_events()
+    if not rows:
+        return
+    try:
+        await db.execute(db.table("rate_limit_logs").insert(rows, returning=ReturnMethod.minimal))
+        rate_limit_log_stats["rows_flushed"] += len(rows)
+    except Exception as e:
+        rate_limit_log_stats["dropped_events"] += sum(row["hit_count"] for row in rows)
+        log_security_event("RATE_LIMIT_LOG_FLUSH_ERROR", {"rows": len(rows), "error": str(e)[:200]}, "WARN")
+
+
+async def _rate_limit_log_scheduler():
+    """Background task — rate limit olaylarını RATE_LIMIT_LOG_FLUSH_INTERVAL'da bir yazar"""
+    while True:
+        try:
+            await asyncio.sleep(RATE_LIMIT_LOG_FLUSH_INTERVAL)
+            await flush_rate_limit_events()
+        except asyncio.CancelledError:
+            break
+        except Exception:
+            pass
+
+
 @router.get("/api/admin/rate-limits/stats")
 async def get_rate_limit_stats(user: dict = Depends(require_admin)):
     """Rate limit istatistikleri"""
@@ -225,18 +262,20 @@ async def get_rate_limit_stats(user: dict = Depends(require_admin)):
         now = datetime.utcnow()
         day_ago = (now - timedelta(hours=24)).isoformat()
 
-        result = supabase.table("rate_limit_logs").select("ip_address, blocked, endpoint", count="exact").gte("created_at", day_ago).execute()
+        result = await db.execute(db.table("rate_limit_logs").select("ip_address, blocked, endpoint, hit_count", count="exact").gte("created_at", day_ago))
 
-        total = result.count or 0
-        blocked = sum(1 for r in (result.data or []) if r.get('blocked'))
+        # Her satır bir flush penceresindeki hit_count kadar olayı temsil eder
+        rows = result.data or []
+        total = sum(r.get('hit_count') or 1 for r in rows)
+        blocked = sum(r.get('hit_count') or 1 for r in rows if r.get('blocked'))
 
-        blocked_ips = list(set(r['ip_address'] for r in (result.data or []) if r.get('blocked')))
+        blocked_ips = list(set(r['ip_address'] for r in rows if r.get('blocked') and r['ip_address'] != RATE_LIMIT_LOG_OVERFLOW_IP))
 
         ip_counts: dict = {}
-        for r in (result.data or []):
+        for r in rows:
             if r.get('blocked'):
                 ip = r['ip_address']
-                ip_counts[ip] = ip_counts.get(ip, 0) + 1
+                ip_counts[ip] = ip_counts.get(ip, 0) + (r.get('hit_count') or 1)
 
         top_offenders = sorted(ip_counts.items(), key=lambda x: x[1], reverse=True)[:10]
 
@@ -252,16 +291,18 @@ async def get_rate_limit_stats(user: dict = Depends(require_admin)):
 
 
 @router.get("/api/admin/rate-limits/logs")
-async def get_rate_limit_logs(page: int = 0, blocked_only: bool = False, user: dict = Depends(require_admin)):
-    """Rate limit log listesi"""
+async def get_rate_limit_logs(page: int = 0, blocked_only: bool = False, cursor: Optional[str] = None, user: dict = Depends(require_admin)):
+    """Rate limit log listesi (page veya cursor ile); total yalnızca ilk sayfada sayılır"""
     try:
-        query = supabase.table("rate_limit_logs").select("*", count="exact").order("created_at", desc=True)
+        query = db.table("rate_limit_logs").select("*", count=None if cursor else "exact")
         if blocked_only:
             query = query.eq("blocked", True)
-        offset = page * 50
-        query = query.range(offset, offset + 49)
-        result = query.execute()
-        return {"data": result.data or [], "total": result.count or 0, "page": page}
+        query = apply_pagination(query, "created_at", 50, cursor=cursor, offset=page * 50)
+        result = await db.execute(query)
+        data, next_cursor = page_with_cursor(result.data, "created_at", 50)
+        return {"data": data, "total": None if cursor else result.count or 0, "page": page, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail="Rate limit logları yüklenemedi")
 
@@ -271,23 +312,25 @@ async def get_rate_limit_logs(page: int = 0, blocked_only: bool = False, user: d
 # ============================================
 
 @router.get("/api/admin/email-queue")
-async def get_email_queue(page: int = 0, status: str = None, user: dict = Depends(require_admin)):
-    """Email kuyruk durumu"""
+async def get_email_queue(page: int = 0, status: str = None, cursor: Optional[str] = None, user: dict = Depends(require_admin)):
+    """Email kuyruk durumu (page veya cursor ile); total yalnızca ilk sayfada sayılır"""
     try:
-        query = supabase.table("email_queue").select("*", count="exact").order("created_at", desc=True)
+        query = db.table("email_queue").select("*", count=None if cursor else "exact")
         if status:
             query = query.eq("status", status)
-        offset = page * 20
-        query = query.range(offset, offset + 19)
-        result = query.execute()
+        query = apply_pagination(query, "created_at", 20, cursor=cursor, offset=page * 20)
+        result = await db.execute(query)
+        data, next_cursor = page_with_cursor(result.data, "created_at", 20)
 
-        stats_result = supabase.table("email_queue").select("status", count="exact").execute()
+        stats_result = await db.execute(db.table("email_queue").select("status", count="exact"))
         status_counts: dict = {}
         for r in (stats_result.data or []):
             s = r.get('status', 'unknown')
             status_counts[s] = status_counts.get(s, 0) + 1
 
-        return {"data": result.data or [], "total": result.count or 0, "page": page, "stats": status_counts}
+        return {"data": data, "total": None if cursor else result.count or 0, "page": page, "stats": status_counts, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail="Email kuyruk yüklenemedi")
 
@@ -296,7 +339,7 @@ async def get_email_queue(page: int = 0, status: str = None, user: dict = Depend
 async def retry_email(email_id: str, user: dict = Depends(require_admin)):
     """Başarısız emaili tekrar dene"""
     try:
-        supabase.table("email_queue").update({"status": "pending", "error_message": None}).eq("id", email_id).execute()
+        await db.execute(db.table("email_queue").update({"status": "pending", "error_message": None}).eq("id", email_id))
         return {"success": True}
     except Exception:
         raise HTTPException(status_code=500, detail="Email yeniden kuyruğa eklenemedi")
@@ -309,7 +352,7 @@ async def retry_email(email_id: str, user: dict = Depends(require_admin)):
 async def _process_email_queue():
     """Background: pending emailleri gönder"""
     try:
-        result = supabase.table("email_queue").select("*").eq("status", "pending").order("created_at").limit(10).execute()
+        result = await db.execute(db.table("email_queue").select("*").eq("status", "pending").order("created_at").limit(10))
         for email in (result.data or []):
             try:
                 resend_key = os.getenv("RESEND_API_KEY", "")
@@ -325,9 +368,9 @@ async def _process_email_queue():
                             }
                         )
                         if resp.status_code == 200:
-                            supabase.table("email_queue").update({
+                            await db.execute(db.table("email_queue").update({
                                 "status": "sent", "sent_at": datetime.utcnow().isoformat(),
-                            }).eq("id", email['id']).execute()
+                            }).eq("id", email['id']))
                         else:
                             raise Exception(f"Resend error: {resp.status_code}")
                 else:
@@ -335,10 +378,10 @@ async def _process_email_queue():
             except Exception as e:
                 attempts = email.get('attempts', 0) + 1
                 new_status = "failed" if attempts >= email.get('max_attempts', 3) else "retry"
-                supabase.table("email_queue").update({
+                await db.execute(db.table("email_queue").update({
                     "status": new_status, "attempts": attempts,
                     "error_message": str(e)[:200],
-                }).eq("id", email['id']).execute()
+                }).eq("id", email['id']))
     except Exception:
         pass
 
@@ -347,27 +390,29 @@ async def _execute_scheduled_actions():
     """Background: zamanı gelen aksiyonları çalıştır"""
     try:
         now = datetime.utcnow().isoformat()
-        result = supabase.table("scheduled_actions").select("*").eq("status", "pending").lte("scheduled_at", now).limit(10).execute()
+        result = await db.execute(db.table("scheduled_actions").select("*").eq("status", "pending").lte("scheduled_at", now).limit(10))
 
         for action in (result.data or []):
             try:
                 action_type = action['action_type']
                 if action_type == 'activate_user' and action.get('entity_id'):
-                    supabase.table("users").update({"status": "active"}).eq("id", action['entity_id']).execute()
+                    await db.execute(db.table("users").update({"status": "active"}).eq("id", action['entity_id']))
+                    invalidate_auth_user(action['entity_id'])
                     await send_user_notification(action['entity_id'], "Hesap Aktif", "Hesabınız aktifleştirildi.", "success")
                 elif action_type == 'suspend_user' and action.get('entity_id'):
-                    supabase.table("users").update({"status": "suspended"}).eq("id", action['entity_id']).execute()
+                    await db.execute(db.table("users").update({"status": "suspended"}).eq("id", action['entity_id']))
+                    invalidate_auth_user(action['entity_id'])
                 elif action_type == 'send_notification' and action.get('payload'):
                     p = action['payload']
                     if p.get('user_id'):
                         await send_user_notification(p['user_id'], p.get('title', ''), p.get('message', ''), p.get('type', 'info'))
 
-                supabase.table("scheduled_actions").update({
+                await db.execute(db.table("scheduled_actions").update({
                     "status": "executed", "executed_at": datetime.utcnow().isoformat(),
-                }).eq("id", action['id']).execute()
+                }).eq("id", action['id']))
             except Exception as e:
-                supabase.table("scheduled_actions").update({
+                await db.execute(db.table("scheduled_actions").update({
                     "status": "failed", "error_message": str(e)[:200],
-                }).eq("id", action['id']).execute()
+                }).eq("id", action['id']))
     except Exception:
         pass
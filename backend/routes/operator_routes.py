@@ -4,8 +4,9 @@ Operator Routes — Operator tours, stats, license, reviews
 
 from fastapi import APIRouter, Request, Depends, UploadFile, File
 from dependencies import (
-    supabase, limiter, log_security_event,
-    get_current_user, require_operator,
+    supabase, db, limiter, log_security_event,
+    get_current_user, require_operator, invalidate_tours, invalidate_auth_user,
+    apply_pagination, page_with_cursor,
     TourCreate, TourUpdate,
     HTTPException, Optional,
 )
@@ -18,22 +19,28 @@ async def get_operator_tours(
     user: dict = Depends(require_operator),
     skip: int = 0,
     limit: int = 20,
-    status: Optional[str] = None
+    status: Optional[str] = None,
+    cursor: Optional[str] = None
 ):
-    """Operatörün kendi turlarını listeler"""
+    """Operatörün kendi turlarını listeler (skip veya cursor ile); total yalnızca ilk sayfada sayılır"""
     try:
-        query = supabase.table("tours").select("*").eq("operator_id", user["id"])
+        query = db.table("tours").select("*").eq("operator_id", user["id"])
         if status:
             query = query.eq("status", status)
-        query = query.order("created_at", desc=True).range(skip, skip + limit - 1)
-        response = query.execute()
-
-        count_query = supabase.table("tours").select("id", count="exact").eq("operator_id", user["id"])
-        if status:
-            count_query = count_query.eq("status", status)
-        count_response = count_query.execute()
-
-        return {"tours": response.data, "total": count_response.count, "skip": skip, "limit": limit}
+        query = apply_pagination(query, "created_at", limit, cursor=cursor, offset=skip)
+        response = await db.execute(query)
+        tours, next_cursor = page_with_cursor(response.data, "created_at", limit)
+
+        total = None
+        if not cursor:
+            count_query = db.table("tours").select("id", count="exact").eq("operator_id", user["id"])
+            if status:
+                count_query = count_query.eq("status", status)
+            total = (await db.execute(count_query)).count
+
+        return {"tours": tours, "total": total, "skip": skip, "limit": limit, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
         log_security_event("OPERATOR_TOURS_ERROR", {"error": str(e)}, "ERROR")
         raise HTTPException(status_code=500, detail="Turlar yüklenirken bir hata oluştu")
@@ -53,7 +60,7 @@ async def create_operator_tour(tour: TourCreate, user: dict = Depends(require_op
         tour_data["created_by"] = user["email"]
         tour_data["status"] = "pending"
 
-        response = supabase.table("tours").insert(tour_data).execute()
+        response = await db.execute(db.table("tours").insert(tour_data))
 
         return {"message": "Tur başarıyla oluşturuldu ve onay bekliyor", "tour_id": response.data[0]["id"]}
     except Exception as e:
@@ -65,7 +72,7 @@ async def create_operator_tour(tour: TourCreate, user: dict = Depends(require_op
 async def update_operator_tour(tour_id: int, tour_update: TourUpdate, user: dict = Depends(require_operator)):
     """Operatör kendi turunu günceller - IDOR Protected"""
     try:
-        existing = supabase.table("tours").select("operator_id").eq("id", tour_id).execute()
+        existing = await db.execute(db.table("tours").select("operator_id").eq("id", tour_id))
         if not existing.data:
             raise HTTPException(status_code=404, detail="Tur bulunamadı")
         if existing.data[0]["operator_id"] != user["id"]:
@@ -79,11 +86,13 @@ async def update_operator_tour(tour_id: int, tour_update: TourUpdate, user: dict
             raise HTTPException(status_code=400, detail="Güncellenecek alan yok")
 
         update_data["status"] = "pending"
-        response = supabase.table("tours").update(update_data).eq("id", tour_id).eq("operator_id", user["id"]).execute()
+        response = await db.execute(db.table("tours").update(update_data).eq("id", tour_id).eq("operator_id", user["id"]))
 
         if not response.data:
             raise HTTPException(status_code=404, detail="Tur bulunamadı veya yetkiniz yok")
 
+        # Güncellenen tur tekrar onaya düşer; public listeden ve detaydan çıkmalı
+        await invalidate_tours(tour_id)
         return {"message": "Tur başarıyla güncellendi"}
     except HTTPException:
         raise
@@ -95,7 +104,7 @@ async def update_operator_tour(tour_id: int, tour_update: TourUpdate, user: dict
 async def get_operator_stats(user: dict = Depends(require_operator)):
     """Operatörün tur istatistiklerini getirir (RPC)"""
     try:
-        response = supabase.rpc('get_operator_stats', {'operator_user_id': user['id']}).execute()
+        response = await db.execute(db.rpc('get_operator_stats', {'operator_user_id': user['id']}))
         stats = response.data
         if stats:
             stats['company_name'] = user.get('company_name')
@@ -139,13 +148,14 @@ async def upload_license(file: UploadFile = File(...), license_number: str = "",
         else:
             document_url = supabase.storage.from_(bucket_name).get_public_url(file_path)
 
-        supabase.table("users").update({
+        await db.execute(db.table("users").update({
             "license_document_url": document_url,
             "license_document_path": file_path,
             "license_bucket": bucket_name,
             "license_number": license_number,
             "license_verified": False
-        }).eq("id", user["id"]).execute()
+        }).eq("id", user["id"]))
+        invalidate_auth_user(user["id"])
 
         log_security_event("LICENSE_UPLOAD_SUCCESS", {"user_id": user["id"], "bucket": bucket_name, "file_size": len(contents)})
 
@@ -186,15 +196,15 @@ async def get_operator_own_reviews(user: dict = Depends(get_current_user)):
         if user.get("role") not in ["operator", "admin"]:
             raise HTTPException(status_code=403, detail="Bu işlem için operatör yetkisi gerekli")
 
-        user_response = supabase.table("users").select("company_name").eq("id", user["id"]).execute()
+        user_response = await db.execute(db.table("users").select("company_name").eq("id", user["id"]))
         if not user_response.data or not user_response.data[0].get("company_name"):
             raise HTTPException(status_code=400, detail="Firma adı tanımlı değil")
 
         operator_name = user_response.data[0]["company_name"]
 
-        response = supabase.table("operator_reviews").select(
+        response = await db.execute(db.table("operator_reviews").select(
             "id, rating, title, comment, status, created_at, helpful_count"
-        ).eq("operator_name", operator_name).order("created_at", desc=True).execute()
+        ).eq("operator_name", operator_name).order("created_at", desc=True))
 
         reviews = response.data
         approved_reviews = [r for r in reviews if r["status"] == "approved"]
@@ -2,19 +2,54 @@
 Tour Routes — Public tour listing, CRUD, CSV import
 """
 
-from fastapi import APIRouter, Request, Depends, UploadFile, File
+from fastapi import APIRouter, Request, Response, Depends, UploadFile, File
+from cache import (
+    get_or_compute, compute_etag,
+    get_tour_generation, get_tour_list_cache_key, get_tour_detail_cache_key,
+    TOUR_LIST_TTL, TOUR_DETAIL_TTL, TOUR_STALE_TTL,
+)
+from import_jobs import FINAL_STATUSES
+from tour_import import IMPORT_MODES, IMPORT_EXTENSIONS, XLSX_AVAILABLE, detect_format
 from dependencies import (
-    supabase, limiter, log_security_event,
+    db, limiter, log_security_event, invalidate_tours, import_job_runner,
     get_current_user, require_admin, log_admin_action, write_audit_log,
+    apply_pagination, page_with_cursor,
     TourCreate, TourUpdate,
-    HTTPException, Optional, csv, io,
+    HTTPException, Optional, json,
 )
 
 router = APIRouter(prefix="/api", tags=["tours"])
 
+# GET /api/tours `count` parametresi → PostgREST count yöntemi
+TOUR_COUNT_MODES = {"exact": "exact", "estimated": "estimated", "none": None}
+# Sıralanabilir kolonlar → NULL olabilir mi (apply_pagination nullable)
+TOUR_SORT_COLUMNS = {
+    "created_at": False, "price": False, "title": False,
+    "start_date": True, "end_date": True, "rating": True,
+}
+TOUR_SORT_ORDERS = ("asc", "desc")
+
+
+def _dump(payload) -> str:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def _public_json_response(request: Request, body: str, max_age: int) -> Response:
+    """Cache'lenebilir public yanıt: ETag + Cache-Control, If-None-Match eşleşirse 304"""
+    etag = compute_etag(body)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={max_age}, stale-while-revalidate={max_age * 5}",
+    }
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 
 @router.get("/tours")
 async def get_tours(
+    request: Request,
     skip: int = 0,
     limit: int = 20,
     min_price: Optional[float] = None,
@@ -22,11 +57,29 @@ async def get_tours(
     operator: Optional[str] = None,
     status: Optional[str] = None,
     sort_by: str = "created_at",
-    sort_order: str = "desc"
+    sort_order: str = "desc",
+    count: str = "exact",
+    cursor: Optional[str] = None
 ):
-    """Turları listeler"""
-    try:
-        query = supabase.table("tours").select("*")
+    """
+    Turları listeler.
+    Sayfa ve toplam sayı tek sorguda döner (Prefer: count=...). `count`:
+    exact = filtrelenmiş kesin toplam, estimated = planner tahmini (sonsuz scroll),
+    none = toplam hesaplanmaz.
+    `cursor` verilirse skip yerine keyset sayfalama kullanılır; yanıt `next_cursor` içerir.
+    Toplam yalnızca ilk sayfada (cursor yokken) hesaplanır; cursor sayfalarında total None.
+    Onaylı (public) listeler cache'ten (stale-while-revalidate) ETag ile servis edilir.
+    """
+    if count not in TOUR_COUNT_MODES:
+        raise HTTPException(status_code=400, detail="Geçersiz count parametresi (exact, estimated, none)")
+    if sort_by not in TOUR_SORT_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"Geçersiz sıralama alanı ({', '.join(TOUR_SORT_COLUMNS)})")
+    if sort_order not in TOUR_SORT_ORDERS:
+        raise HTTPException(status_code=400, detail="Geçersiz sıralama yönü (asc, desc)")
+
+    async def load_page() -> dict:
+        count_method = None if cursor else TOUR_COUNT_MODES[count]
+        query = db.table("tours").select("*", count=count_method) if count_method else db.table("tours").select("*")
 
         if status:
             query = query.eq("status", status)
@@ -40,44 +93,59 @@ async def get_tours(
         if operator:
             query = query.ilike("operator", f"%{operator}%")
 
-        ascending = sort_order == "asc"
-        query = query.order(sort_by, desc=not ascending)
-        query = query.range(skip, skip + limit - 1)
+        descending = sort_order == "desc"
+        query = apply_pagination(
+            query, sort_by, limit, cursor=cursor, offset=skip, desc=descending,
+            nullable=TOUR_SORT_COLUMNS[sort_by],
+        )
 
-        response = query.execute()
-
-        count_query = supabase.table("tours").select("id", count="exact")
-        if status:
-            count_query = count_query.eq("status", status)
-        else:
-            count_query = count_query.eq("status", "approved")
-        count_response = count_query.execute()
+        response = await db.execute(query)
+        tours, next_cursor = page_with_cursor(response.data, sort_by, limit, desc=descending)
 
         return {
-            "tours": response.data,
-            "total": count_response.count,
+            "tours": tours,
+            "total": response.count if count_method else None,
             "skip": skip,
-            "limit": limit
+            "limit": limit,
+            "next_cursor": next_cursor
         }
+
+    try:
+        if status not in (None, "approved"):
+            return await load_page()
+
+        cache_key = get_tour_list_cache_key({
+            "skip": skip, "limit": limit, "min_price": min_price, "max_price": max_price,
+            "operator": operator, "sort_by": sort_by, "sort_order": sort_order,
+            "count": count, "cursor": cursor,
+        }, await get_tour_generation())
+
+        async def produce() -> str:
+            return _dump(await load_page())
+
+        body = await get_or_compute(cache_key, produce, ttl=TOUR_LIST_TTL, stale_ttl=TOUR_STALE_TTL)
+        return _public_json_response(request, body, TOUR_LIST_TTL)
+    except HTTPException:
+        raise
     except Exception as e:
         log_security_event("TOURS_LOAD_ERROR", {"error": str(e)}, "ERROR")
         raise HTTPException(status_code=500, detail="Turlar yüklenirken bir hata oluştu")
 
 
 @router.get("/tours/{tour_id}")
-async def get_tour(tour_id: int):
-    """Tek bir turu getirir - SECURITY: Only approved tours visible"""
-    try:
-        response = supabase.table("tours").select("*").eq("id", tour_id).execute()
-
-        if not response.data:
-            raise HTTPException(status_code=404, detail="Tur bulunamadı")
+async def get_tour(tour_id: int, request: Request):
+    """Tek bir turu getirir - SECURITY: Only approved tours visible (sadece onaylılar cache'lenir)"""
+    async def produce() -> Optional[str]:
+        response = await db.execute(db.table("tours").select("*").eq("id", tour_id))
+        if not response.data or response.data[0].get("status") != "approved":
+            return None
+        return _dump(response.data[0])
 
-        tour = response.data[0]
-        if tour.get("status") != "approved":
+    try:
+        body = await get_or_compute(get_tour_detail_cache_key(tour_id), produce, ttl=TOUR_DETAIL_TTL, stale_ttl=TOUR_STALE_TTL)
+        if body is None:
             raise HTTPException(status_code=404, detail="Tur bulunamadı")
-
-        return tour
+        return _public_json_response(request, body, TOUR_DETAIL_TTL)
     except HTTPException:
         raise
     except Exception as e:
@@ -92,8 +160,9 @@ async def create_tour(tour: TourCreate, request: Request, user: dict = Depends(r
         tour_data["operator_id"] = user["id"]
         tour_data["created_by"] = user["email"]
 
-        response = supabase.table("tours").insert(tour_data).execute()
+        response = await db.execute(db.table("tours").insert(tour_data))
 
+        await invalidate_tours(response.data[0]["id"])
         await log_admin_action(request, user["id"], "CREATE_TOUR", {"tour_id": response.data[0]["id"], "title": tour.title})
 
         return {"message": "Tur başarıyla oluşturuldu", "tour_id": response.data[0]["id"]}
@@ -110,11 +179,12 @@ async def update_tour(tour_id: int, tour_update: TourUpdate, request: Request, u
         if not update_data:
             raise HTTPException(status_code=400, detail="Güncellenecek alan yok")
 
-        response = supabase.table("tours").update(update_data).eq("id", tour_id).execute()
+        response = await db.execute(db.table("tours").update(update_data).eq("id", tour_id))
 
         if not response.data:
             raise HTTPException(status_code=404, detail="Tur bulunamadı")
 
+        await invalidate_tours(tour_id)
         await log_admin_action(request, user["id"], "UPDATE_TOUR", {"tour_id": tour_id, "updates": list(update_data.keys())})
 
         return {"message": "Tur başarıyla güncellendi"}
@@ -127,11 +197,12 @@ async def update_tour(tour_id: int, tour_update: TourUpdate, request: Request, u
 async def delete_tour(tour_id: int, request: Request, user: dict = Depends(require_admin)):
     """Turu siler (Admin)"""
     try:
-        response = supabase.table("tours").delete().eq("id", tour_id).execute()
+        response = await db.execute(db.table("tours").delete().eq("id", tour_id))
 
         if not response.data:
             raise HTTPException(status_code=404, detail="Tur bulunamadı")
 
+        await invalidate_tours(tour_id)
         await log_admin_action(request, user["id"], "DELETE_TOUR", {"tour_id": tour_id})
 
         return {"message": "Tur başarıyla silindi"}
@@ -140,69 +211,74 @@ async def delete_tour(tour_id: int, request: Request, user: dict = Depends(requi
         raise HTTPException(status_code=400, detail="Tur silinirken bir hata oluştu")
 
 
-# CSV Import
-@router.post("/import/csv")
-async def import_csv(file: UploadFile = File(...), user: dict = Depends(require_admin)):
-    """CSV dosyasından tur import eder"""
+# CSV Import (arka plan işi)
+def _job_response(job: dict) -> dict:
+    return {
+        "job_id": job["id"],
+        "filename": job.get("filename"),
+        "format": job.get("format") or "csv",
+        "mode": job.get("mode") or "insert",
+        "status": job.get("status"),
+        "processed": job.get("processed") or 0,
+        "imported": job.get("imported_count") or 0,
+        "inserted": job.get("inserted_count") or 0,
+        "updated": job.get("updated_count") or 0,
+        "unchanged": job.get("unchanged_count") or 0,
+        "errors": job.get("error_count") or 0,
+        "error_details": (job.get("errors") or [])[:5],
+        "created_at": job.get("created_at"),
+        "started_at": job.get("started_at"),
+        "finished_at": job.get("finished_at"),
+    }
+
+
+@router.post("/import/csv", status_code=202)
+async def import_csv(file: UploadFile = File(...), mode: str = "insert", user: dict = Depends(require_admin)):
+    """
+    CSV, XLSX veya NDJSON dosyasından tur import eder (biçim dosya uzantısından;
+    CSV'de kodlama UTF-8 / Windows-1254 ve ayraç otomatik tespit edilir).
+    Dosya kaydedilir ve iş id'siyle hemen dönülür; satırlar arka planda parça parça
+    işlenir (bkz. import_jobs). İlerleme: GET /api/import/jobs/{job_id}
+    mode=upsert: aynı tur (title + operator + start_date + price) tekrar eklenmez;
+    değişen turlar güncellenir, değişmeyenler atlanır.
+    """
+    if mode not in IMPORT_MODES:
+        raise HTTPException(status_code=400, detail="Geçersiz import modu (insert veya upsert)")
+    file_format = detect_format(file.filename)
+    if file_format is None:
+        raise HTTPException(
+            status_code=400, detail=f"Desteklenmeyen dosya biçimi ({', '.join(sorted(IMPORT_EXTENSIONS))})"
+        )
+    if file_format == "xlsx" and not XLSX_AVAILABLE:
+        raise HTTPException(status_code=400, detail="XLSX import bu sunucuda etkin değil")
     try:
-        contents = await file.read()
-        csv_text = contents.decode('utf-8')
-        csv_file = io.StringIO(csv_text)
-        reader = csv.DictReader(csv_file)
-
-        imported_count = 0
-        errors = []
-
-        for i, row in enumerate(reader, 1):
-            try:
-                required_fields = ['title', 'operator', 'price', 'currency', 'duration', 'hotel', 'visa']
-                missing_fields = [field for field in required_fields if field not in row or not row[field]]
-
-                if missing_fields:
-                    errors.append({"row": i, "error": f"Eksik alanlar: {', '.join(missing_fields)}"})
-                    continue
-
-                tour_doc = {
-                    "operator_id": user["id"],
-                    "title": row['title'],
-                    "operator": row['operator'],
-                    "price": float(row['price']),
-                    "currency": row['currency'],
-                    "start_date": row.get('start_date', ''),
-                    "end_date": row.get('end_date', ''),
-                    "duration": row['duration'],
-                    "hotel": row['hotel'],
-                    "services": row.get('services', '').split(',') if row.get('services') else [],
-                    "visa": row['visa'],
-                    "transport": row.get('transport', ''),
-                    "guide": row.get('guide', ''),
-                    "itinerary": row.get('itinerary', '').split('|') if row.get('itinerary') else [],
-                    "rating": float(row['rating']) if row.get('rating') else None,
-                    "source": "csv_import",
-                    "created_by": user["email"],
-                    "status": "approved"
-                }
-
-                supabase.table("tours").insert(tour_doc).execute()
-                imported_count += 1
-            except Exception as e:
-                errors.append({"row": i, "error": str(e)})
-
-        supabase.table("import_jobs").insert({
-            "user_id": user["id"],
-            "filename": file.filename,
-            "status": "completed",
-            "imported_count": imported_count,
-            "error_count": len(errors),
-            "errors": errors[:10]
-        }).execute()
-
-        return {
-            "message": f"{imported_count} tur başarıyla import edildi",
-            "imported": imported_count,
-            "errors": len(errors),
-            "error_details": errors[:5]
-        }
+        job = await import_job_runner.submit(file.file, file.filename, user, mode=mode, file_format=file_format)
+        return {"message": "Import işi kuyruğa alındı", **_job_response(job)}
     except Exception as e:
         log_security_event("CSV_IMPORT_ERROR", {"error": str(e)}, "ERROR")
         raise HTTPException(status_code=500, detail="CSV import esnasında bir hata oluştu")
+
+
+@router.get("/import/jobs/{job_id}")
+async def get_import_job(job_id: int, user: dict = Depends(require_admin)):
+    """Import işinin durumu ve ilerlemesi"""
+    job = await import_job_runner.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import işi bulunamadı")
+    return _job_response(job)
+
+
+@router.post("/import/jobs/{job_id}/cancel")
+async def cancel_import_job(job_id: int, user: dict = Depends(require_admin)):
+    """Bekleyen veya çalışan import işini iptal eder (yazılmış parçalar kalır)"""
+    job = await import_job_runner.cancel(job_id)
+    if job:
+        log_security_event("IMPORT_JOB_CANCELLED", {"job_id": job_id, "admin": user.get("email")})
+        return _job_response(job)
+
+    job = await import_job_runner.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import işi bulunamadı")
+    if job.get("status") in FINAL_STATUSES:
+        raise HTTPException(status_code=409, detail="Import işi zaten tamamlanmış")
+    raise HTTPException(status_code=409, detail="Import işi iptal edilemedi")
@@ -4,8 +4,8 @@ User Routes — Favorites, Price Alerts, Tour Alerts, Reviews, Notifications
 
 from fastapi import APIRouter, Request, Depends
 from dependencies import (
-    supabase, log_security_event,
-    get_current_user, send_user_notification,
+    db, log_security_event, upsert_rows,
+    get_current_user, send_user_notification, apply_pagination, page_with_cursor,
     FavoriteCreate, FavoriteSync,
     PriceAlertCreate,
     TourAlertCreate, TourAlertUpdate,
@@ -33,27 +33,27 @@ async def check_favorites_abuse(user_id: str, tour_id: int, request: Request):
         from datetime import timedelta
         day_ago = (datetime.utcnow() - timedelta(hours=24)).isoformat()
 
-        daily_count_response = supabase.table("favorites").select("id", count="exact").eq(
+        daily_count_response = await db.execute(db.table("favorites").select("id", count="exact").eq(
             "user_id", user_id
-        ).gte("created_at", day_ago).execute()
+        ).gte("created_at", day_ago))
         daily_count = daily_count_response.count or 0
 
         if daily_count >= 100:
-            supabase.table("favorites_abuse_signals").insert({
+            await db.execute(db.table("favorites_abuse_signals").insert({
                 "user_id": user_id, "ip_masked": client_ip,
                 "signal_type": "high_volume", "count": daily_count,
                 "window_size": "24h", "tour_id": tour_id
-            }).execute()
+            }))
             log_security_event("FAVORITES_ABUSE_SIGNAL", {"type": "high_volume", "user_id": user_id, "count": daily_count, "window": "24h"}, "WARN")
 
-        total_response = supabase.table("favorites").select("id", count="exact").eq("user_id", user_id).execute()
+        total_response = await db.execute(db.table("favorites").select("id", count="exact").eq("user_id", user_id))
         total_count = total_response.count or 0
         if total_count >= 500:
-            supabase.table("favorites_abuse_signals").insert({
+            await db.execute(db.table("favorites_abuse_signals").insert({
                 "user_id": user_id, "ip_masked": client_ip,
                 "signal_type": "excessive_total", "count": total_count,
                 "window_size": "total", "tour_id": tour_id
-            }).execute()
+            }))
             log_security_event("FAVORITES_ABUSE_SIGNAL", {"type": "excessive_total", "user_id": user_id, "count": total_count}, "WARN")
     except Exception as e:
         log_security_event("FAVORITES_ABUSE_CHECK_ERROR", {"error": str(e)}, "ERROR")
@@ -65,17 +65,17 @@ async def check_rapid_toggle(user_id: str, tour_id: int, request: Request):
         from datetime import timedelta
         ten_min_ago = (datetime.utcnow() - timedelta(minutes=10)).isoformat()
 
-        recent_signals = supabase.table("favorites_abuse_signals").select("id", count="exact").eq(
+        recent_signals = await db.execute(db.table("favorites_abuse_signals").select("id", count="exact").eq(
             "user_id", user_id
-        ).eq("tour_id", tour_id).eq("signal_type", "rapid_toggle").gte("created_at", ten_min_ago).execute()
+        ).eq("tour_id", tour_id).eq("signal_type", "rapid_toggle").gte("created_at", ten_min_ago))
         toggle_count = (recent_signals.count or 0) + 1
 
         if toggle_count >= 10:
-            supabase.table("favorites_abuse_signals").insert({
+            await db.execute(db.table("favorites_abuse_signals").insert({
                 "user_id": user_id, "ip_masked": client_ip,
                 "signal_type": "rapid_toggle", "count": toggle_count,
                 "window_size": "10m", "tour_id": tour_id
-            }).execute()
+            }))
             log_security_event("FAVORITES_ABUSE_SIGNAL", {"type": "rapid_toggle", "user_id": user_id, "tour_id": tour_id, "count": toggle_count, "window": "10m"}, "WARN")
     except Exception as e:
         log_security_event("FAVORITES_RAPID_TOGGLE_CHECK_ERROR", {"error": str(e)}, "ERROR")
@@ -85,15 +85,15 @@ async def check_rapid_toggle(user_id: str, tour_id: int, request: Request):
 async def add_favorite(data: FavoriteCreate, request: Request, user: dict = Depends(get_current_user)):
     """Kullanıcının favorilerine tur ekler"""
     try:
-        tour_check = supabase.table("tours").select("id, status").eq("id", data.tour_id).execute()
+        tour_check = await db.execute(db.table("tours").select("id, status").eq("id", data.tour_id))
         if not tour_check.data:
             raise HTTPException(status_code=404, detail="Tur bulunamadı")
         if tour_check.data[0].get("status") != "approved":
             raise HTTPException(status_code=400, detail="Bu tur favorilere eklenemez")
 
-        supabase.table("favorites").upsert({
+        await db.execute(db.table("favorites").upsert({
             "user_id": user["id"], "tour_id": data.tour_id
-        }, on_conflict="user_id,tour_id").execute()
+        }, on_conflict="user_id,tour_id"))
 
         log_security_event("FAVORITE_ADDED", {"user_id": user["id"], "tour_id": data.tour_id})
 
@@ -116,7 +116,7 @@ async def add_favorite(data: FavoriteCreate, request: Request, user: dict = Depe
 async def remove_favorite(tour_id: int, request: Request, user: dict = Depends(get_current_user)):
     """Kullanıcının favorilerinden tur kaldırır"""
     try:
-        supabase.table("favorites").delete().eq("user_id", user["id"]).eq("tour_id", tour_id).execute()
+        await db.execute(db.table("favorites").delete().eq("user_id", user["id"]).eq("tour_id", tour_id))
         log_security_event("FAVORITE_REMOVED", {"user_id": user["id"], "tour_id": tour_id})
         try:
             await check_rapid_toggle(user["id"], tour_id, request)
@@ -132,9 +132,9 @@ async def remove_favorite(tour_id: int, request: Request, user: dict = Depends(g
 async def get_favorites(user: dict = Depends(get_current_user)):
     """Kullanıcının favori turlarını listeler"""
     try:
-        response = supabase.table("favorites").select(
+        response = await db.execute(db.table("favorites").select(
             "id, tour_id, created_at, tours!inner(id, title, operator, price, currency, duration, hotel, services, start_date, end_date, status, is_verified, operator_phone)"
-        ).eq("user_id", user["id"]).execute()
+        ).eq("user_id", user["id"]))
 
         favorites = []
         for fav in response.data:
@@ -150,24 +150,44 @@ async def get_favorites(user: dict = Depends(get_current_user)):
 
 @router.post("/favorites/sync")
 async def sync_favorites(data: FavoriteSync, user: dict = Depends(get_current_user)):
-    """localStorage'dan gelen favorileri veritabanına senkronize eder"""
+    """
+    localStorage'dan gelen favorileri veritabanına senkronize eder.
+    Turların durumu tek in_("id", ...) sorgusuyla okunur, onaylı olanlar tek
+    multi-row upsert ile yazılır (mevcut favorilere dokunulmaz).
+    results: her tur için synced | not_found | unavailable | error
+    (liste FAVORITES_SYNC_MAX_IDS ile sınırlı; fazlası model doğrulamasında 422)
+    """
     try:
-        synced = 0
-        skipped = 0
-        for tour_id in data.tour_ids:
-            try:
-                tour_check = supabase.table("tours").select("id, status").eq("id", tour_id).execute()
-                if not tour_check.data or tour_check.data[0].get("status") != "approved":
-                    skipped += 1
-                    continue
-                supabase.table("favorites").upsert({"user_id": user["id"], "tour_id": tour_id}, on_conflict="user_id,tour_id").execute()
-                synced += 1
-            except Exception:
-                skipped += 1
-                continue
-
+        # Sırayı koruyarak tekrarları at
+        accepted = list(dict.fromkeys(data.tour_ids))
+        results = {tour_id: "not_found" for tour_id in accepted}
+
+        if accepted:
+            tours = await db.execute(db.table("tours").select("id, status").in_("id", accepted))
+            for tour in tours.data:
+                if tour["id"] in results:
+                    results[tour["id"]] = "synced" if tour.get("status") == "approved" else "unavailable"
+
+            approved = [tour_id for tour_id in accepted if results[tour_id] == "synced"]
+            if approved:
+                try:
+                    await upsert_rows(
+                        "favorites", [{"user_id": user["id"], "tour_id": tour_id} for tour_id in approved],
+                        on_conflict="user_id,tour_id", ignore_duplicates=True,
+                    )
+                except Exception as e:
+                    log_security_event("FAVORITES_SYNC_WRITE_ERROR", {"user_id": user["id"], "error": str(e)[:200]}, "WARN")
+                    results.update({tour_id: "error" for tour_id in approved})
+
+        synced = sum(1 for status in results.values() if status == "synced")
+        skipped = len(results) - synced
         log_security_event("FAVORITES_SYNCED", {"user_id": user["id"], "synced": synced, "skipped": skipped})
-        return {"message": "Favoriler senkronize edildi", "synced": synced, "skipped": skipped}
+        return {
+            "message": "Favoriler senkronize edildi",
+            "synced": synced,
+            "skipped": skipped,
+            "results": [{"tour_id": tour_id, "status": status} for tour_id, status in results.items()],
+        }
     except Exception as e:
         log_security_event("FAVORITES_SYNC_ERROR", {"error": str(e)}, "ERROR")
         raise HTTPException(status_code=400, detail="Favoriler senkronize edilirken bir hata oluştu")
@@ -178,17 +198,17 @@ async def sync_favorites(data: FavoriteSync, user: dict = Depends(get_current_us
 @router.post("/price-alerts")
 async def create_price_alert(data: PriceAlertCreate, user: dict = Depends(get_current_user)):
     try:
-        tour = supabase.table("tours").select("id, price, status").eq("id", data.tour_id).execute()
+        tour = await db.execute(db.table("tours").select("id, price, status").eq("id", data.tour_id))
         if not tour.data:
             raise HTTPException(status_code=404, detail="Tur bulunamadı")
         if tour.data[0].get("status") != "approved":
             raise HTTPException(status_code=400, detail="Bu tur için bildirim oluşturulamaz")
 
         current_price = tour.data[0]["price"]
-        supabase.table("price_alerts").upsert({
+        await db.execute(db.table("price_alerts").upsert({
             "user_id": user["id"], "tour_id": data.tour_id,
             "last_seen_price": current_price, "is_active": True
-        }, on_conflict="user_id,tour_id").execute()
+        }, on_conflict="user_id,tour_id"))
 
         return {"message": "Fiyat bildirimi aktif", "tour_id": data.tour_id, "current_price": current_price}
     except HTTPException:
@@ -203,7 +223,7 @@ async def create_price_alert(data: PriceAlertCreate, user: dict = Depends(get_cu
 @router.delete("/price-alerts/{tour_id}")
 async def delete_price_alert(tour_id: int, user: dict = Depends(get_current_user)):
     try:
-        supabase.table("price_alerts").delete().eq("user_id", user["id"]).eq("tour_id", tour_id).execute()
+        await db.execute(db.table("price_alerts").delete().eq("user_id", user["id"]).eq("tour_id", tour_id))
         return {"message": "Bildirim kaldırıldı", "tour_id": tour_id}
     except Exception as e:
         log_security_event("PRICE_ALERT_DELETE_ERROR", {"error": str(e)}, "ERROR")
@@ -213,9 +233,9 @@ async def delete_price_alert(tour_id: int, user: dict = Depends(get_current_user
 @router.get("/price-alerts")
 async def get_price_alerts(user: dict = Depends(get_current_user)):
     try:
-        response = supabase.table("price_alerts").select(
+        response = await db.execute(db.table("price_alerts").select(
             "id, tour_id, last_seen_price, is_active, created_at, tours!inner(id, title, operator, price, currency, status)"
-        ).eq("user_id", user["id"]).eq("is_active", True).execute()
+        ).eq("user_id", user["id"]).eq("is_active", True))
 
         alerts = []
         for alert in response.data:
@@ -240,19 +260,19 @@ async def get_price_alerts(user: dict = Depends(get_current_user)):
 @router.post("/price-alerts/{tour_id}/toggle")
 async def toggle_price_alert(tour_id: int, user: dict = Depends(get_current_user)):
     try:
-        existing = supabase.table("price_alerts").select("id, is_active").eq("user_id", user["id"]).eq("tour_id", tour_id).execute()
+        existing = await db.execute(db.table("price_alerts").select("id, is_active").eq("user_id", user["id"]).eq("tour_id", tour_id))
         if existing.data:
             new_state = not existing.data[0]["is_active"]
-            supabase.table("price_alerts").update({"is_active": new_state}).eq("id", existing.data[0]["id"]).execute()
+            await db.execute(db.table("price_alerts").update({"is_active": new_state}).eq("id", existing.data[0]["id"]))
             return {"message": "Bildirim güncellendi", "tour_id": tour_id, "is_active": new_state}
         else:
-            tour = supabase.table("tours").select("id, price, status").eq("id", tour_id).execute()
+            tour = await db.execute(db.table("tours").select("id, price, status").eq("id", tour_id))
             if not tour.data or tour.data[0].get("status") != "approved":
                 raise HTTPException(status_code=400, detail="Bu tur için bildirim oluşturulamaz")
-            supabase.table("price_alerts").insert({
+            await db.execute(db.table("price_alerts").insert({
                 "user_id": user["id"], "tour_id": tour_id,
                 "last_seen_price": tour.data[0]["price"], "is_active": True
-            }).execute()
+            }))
             return {"message": "Bildirim aktif", "tour_id": tour_id, "is_active": True}
     except HTTPException:
         raise
@@ -277,12 +297,12 @@ async def create_tour_alert(data: TourAlertCreate, user: dict = Depends(get_curr
         except ValueError:
             raise HTTPException(status_code=400, detail="Geçersiz tarih formatı (YYYY-MM-DD)")
 
-        response = supabase.table("tour_alerts").insert({
+        response = await db.execute(db.table("tour_alerts").insert({
             "user_id": user["id"], "start_date": data.start_date,
             "end_date": data.end_date, "tour_type": data.tour_type,
             "max_price": data.max_price, "preferred_operator": data.preferred_operator,
             "is_active": True
-        }).execute()
+        }))
 
         return {"message": "Tur alarmı oluşturuldu", "alert": response.data[0] if response.data else None}
     except HTTPException:
@@ -295,9 +315,9 @@ async def create_tour_alert(data: TourAlertCreate, user: dict = Depends(get_curr
 @router.get("/tour-alerts")
 async def get_tour_alerts(user: dict = Depends(get_current_user)):
     try:
-        response = supabase.table("tour_alerts").select(
+        response = await db.execute(db.table("tour_alerts").select(
             "id, start_date, end_date, tour_type, max_price, preferred_operator, is_active, notified_count, created_at"
-        ).eq("user_id", user["id"]).order("created_at", desc=True).execute()
+        ).eq("user_id", user["id"]).order("created_at", desc=True))
         return {"alerts": response.data, "total": len(response.data)}
     except Exception as e:
         log_security_event("TOUR_ALERTS_FETCH_ERROR", {"error": str(e)}, "ERROR")
@@ -307,13 +327,13 @@ async def get_tour_alerts(user: dict = Depends(get_current_user)):
 @router.put("/tour-alerts/{alert_id}")
 async def update_tour_alert(alert_id: str, data: TourAlertUpdate, user: dict = Depends(get_current_user)):
     try:
-        existing = supabase.table("tour_alerts").select("id").eq("id", alert_id).eq("user_id", user["id"]).execute()
+        existing = await db.execute(db.table("tour_alerts").select("id").eq("id", alert_id).eq("user_id", user["id"]))
         if not existing.data:
             raise HTTPException(status_code=404, detail="Alarm bulunamadı")
         update_data = {k: v for k, v in data.dict().items() if v is not None}
         if not update_data:
             raise HTTPException(status_code=400, detail="Güncellenecek veri yok")
-        response = supabase.table("tour_alerts").update(update_data).eq("id", alert_id).execute()
+        response = await db.execute(db.table("tour_alerts").update(update_data).eq("id", alert_id))
         return {"message": "Alarm güncellendi", "alert": response.data[0] if response.data else None}
     except HTTPException:
         raise
@@ -325,7 +345,7 @@ async def update_tour_alert(alert_id: str, data: TourAlertUpdate, user: dict = D
 @router.delete("/tour-alerts/{alert_id}")
 async def delete_tour_alert(alert_id: str, user: dict = Depends(get_current_user)):
     try:
-        supabase.table("tour_alerts").delete().eq("id", alert_id).eq("user_id", user["id"]).execute()
+        await db.execute(db.table("tour_alerts").delete().eq("id", alert_id).eq("user_id", user["id"]))
         return {"message": "Alarm silindi", "alert_id": alert_id}
     except Exception as e:
         log_security_event("TOUR_ALERT_DELETE_ERROR", {"error": str(e)}, "ERROR")
@@ -339,15 +359,15 @@ async def create_review(data: ReviewCreate, user: dict = Depends(get_current_use
     try:
         if data.rating < 1 or data.rating > 5:
             raise HTTPException(status_code=400, detail="Puan 1-5 arası olmalıdır")
-        existing = supabase.table("operator_reviews").select("id").eq("user_id", user["id"]).eq("operator_name", data.operator_name).execute()
+        existing = await db.execute(db.table("operator_reviews").select("id").eq("user_id", user["id"]).eq("operator_name", data.operator_name))
         if existing.data:
             raise HTTPException(status_code=400, detail="Bu firmayı zaten değerlendirdiniz")
 
-        response = supabase.table("operator_reviews").insert({
+        response = await db.execute(db.table("operator_reviews").insert({
             "user_id": user["id"], "operator_name": data.operator_name,
             "rating": data.rating, "title": data.title,
             "comment": data.comment, "tour_id": data.tour_id, "status": "pending"
-        }).execute()
+        }))
 
         return {"message": "Değerlendirmeniz alındı, onay sonrası yayınlanacaktır", "review": response.data[0] if response.data else None}
     except HTTPException:
@@ -360,9 +380,9 @@ async def create_review(data: ReviewCreate, user: dict = Depends(get_current_use
 @router.get("/reviews/operator/{operator_name}")
 async def get_operator_reviews(operator_name: str, limit: int = 20):
     try:
-        response = supabase.table("operator_reviews").select(
+        response = await db.execute(db.table("operator_reviews").select(
             "id, rating, title, comment, created_at, helpful_count"
-        ).eq("operator_name", operator_name).eq("status", "approved").order("created_at", desc=True).limit(limit).execute()
+        ).eq("operator_name", operator_name).eq("status", "approved").order("created_at", desc=True).limit(limit))
 
         ratings = [r["rating"] for r in response.data]
         avg_rating = sum(ratings) / len(ratings) if ratings else 0
@@ -376,9 +396,9 @@ async def get_operator_reviews(operator_name: str, limit: int = 20):
 @router.get("/reviews/my")
 async def get_my_reviews(user: dict = Depends(get_current_user)):
     try:
-        response = supabase.table("operator_reviews").select(
+        response = await db.execute(db.table("operator_reviews").select(
             "id, operator_name, rating, title, comment, status, created_at"
-        ).eq("user_id", user["id"]).order("created_at", desc=True).execute()
+        ).eq("user_id", user["id"]).order("created_at", desc=True))
         return {"reviews": response.data, "total": len(response.data)}
     except Exception as e:
         log_security_event("MY_REVIEWS_FETCH_ERROR", {"error": str(e)}, "ERROR")
@@ -388,7 +408,7 @@ async def get_my_reviews(user: dict = Depends(get_current_user)):
 @router.delete("/reviews/{review_id}")
 async def delete_review(review_id: str, user: dict = Depends(get_current_user)):
     try:
-        supabase.table("operator_reviews").delete().eq("id", review_id).eq("user_id", user["id"]).execute()
+        await db.execute(db.table("operator_reviews").delete().eq("id", review_id).eq("user_id", user["id"]))
         return {"message": "Yorum silindi", "review_id": review_id}
     except Exception as e:
         log_security_event("REVIEW_DELETE_ERROR", {"error": str(e)}, "ERROR")
@@ -398,11 +418,15 @@ async def delete_review(review_id: str, user: dict = Depends(get_current_user)):
 # ===== IN-APP NOTIFICATIONS =====
 
 @router.get("/notifications/my")
-async def get_my_notifications(page: int = 0, user: dict = Depends(get_current_user)):
+async def get_my_notifications(page: int = 0, cursor: Optional[str] = None, user: dict = Depends(get_current_user)):
     try:
-        offset = page * 20
-        result = supabase.table("user_notifications").select("*", count="exact").eq("user_id", user['id']).order("created_at", desc=True).range(offset, offset + 19).execute()
-        return {"data": result.data or [], "total": result.count or 0, "page": page}
+        # total yalnızca ilk sayfada (cursor yokken) sayılır
+        query = db.table("user_notifications").select("*", count=None if cursor else "exact").eq("user_id", user['id'])
+        result = await db.execute(apply_pagination(query, "created_at", 20, cursor=cursor, offset=page * 20))
+        data, next_cursor = page_with_cursor(result.data, "created_at", 20)
+        return {"data": data, "total": None if cursor else result.count or 0, "page": page, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception:
         raise HTTPException(status_code=500, detail="Bildirimler yüklenemedi")
 
@@ -410,7 +434,7 @@ async def get_my_notifications(page: int = 0, user: dict = Depends(get_current_u
 @router.get("/notifications/unread-count")
 async def get_unread_count(user: dict = Depends(get_current_user)):
     try:
-        result = supabase.table("user_notifications").select("id", count="exact").eq("user_id", user['id']).eq("is_read", False).execute()
+        result = await db.execute(db.table("user_notifications").select("id", count="exact").eq("user_id", user['id']).eq("is_read", False))
         return {"count": result.count or 0}
     except Exception:
         return {"count": 0}
@@ -419,7 +443,7 @@ async def get_unread_count(user: dict = Depends(get_current_user)):
 @router.patch("/notifications/{notif_id}/read")
 async def mark_notification_read(notif_id: str, user: dict = Depends(get_current_user)):
     try:
-        supabase.table("user_notifications").update({"is_read": True}).eq("id", notif_id).eq("user_id", user['id']).execute()
+        await db.execute(db.table("user_notifications").update({"is_read": True}).eq("id", notif_id).eq("user_id", user['id']))
         return {"success": True}
     except Exception:
         raise HTTPException(status_code=500, detail="Bildirim güncellenemedi")
@@ -428,7 +452,7 @@ async def mark_notification_read(notif_id: str, user: dict = Depends(get_current
 @router.patch("/notifications/mark-all-read")
 async def mark_all_read(user: dict = Depends(get_current_user)):
     try:
-        supabase.table("user_notifications").update({"is_read": True}).eq("user_id", user['id']).eq("is_read", False).execute()
+        await db.execute(db.table("user_notifications").update({"is_read": True}).eq("user_id", user['id']).eq("is_read", False))
         return {"success": True}
     except Exception:
         raise HTTPException(status_code=500, detail="Bildirimler güncellenemedi")
@@ -8,8 +8,9 @@ import bleach
 import re
 import unicodedata
 from typing import Any, Dict
+from datetime import datetime, timezone
 import secrets
-from cachetools import TTLCache
+from state_backend import state, REDIS_URL, STATE_BACKEND
 import ipaddress
 import hashlib
 import os
@@ -113,7 +114,14 @@ def get_rate_limit_key(request: Request) -> str:
     return f"{ip}:{fingerprint}"
 
 # Rate Limiter with secure key function
-limiter = Limiter(key_func=get_rate_limit_key)
+# slowapi sayaçları da state_backend ile aynı Redis'te tutulur (replica'lar arası ortak limit);
+# Redis erişilemezse limits süreç içi belleğe düşer
+RATE_LIMIT_STORAGE_URI = os.getenv("RATE_LIMIT_STORAGE_URI") or (REDIS_URL if STATE_BACKEND == "redis" and REDIS_URL else "memory://")
+limiter = Limiter(
+    key_func=get_rate_limit_key,
+    storage_uri=RATE_LIMIT_STORAGE_URI,
+    in_memory_fallback_enabled=RATE_LIMIT_STORAGE_URI != "memory://",
+)
 
 # Security Configurations
 ALLOWED_TAGS = []  # No HTML tags allowed
@@ -215,16 +223,16 @@ def verify_csrf_token(token: str, expected: str) -> bool:
 # CSRF PROTECTION SYSTEM
 # ============================================
 
-# CSRF token storage (TTL: 1 hour)
-csrf_token_store: TTLCache = TTLCache(maxsize=10000, ttl=3600)
+# CSRF token storage (TTL: 1 hour) — state_backend
+CSRF_TOKEN_TTL = 3600
 
-def create_csrf_token_for_session(session_id: str) -> str:
+async def create_csrf_token_for_session(session_id: str) -> str:
     """Create and store CSRF token for a session"""
     token = generate_csrf_token()
-    csrf_token_store[session_id] = token
+    await state.set(f"csrf:{session_id}", token, CSRF_TOKEN_TTL)
     return token
 
-def validate_csrf_token(request: Request, session_id: str) -> bool:
+async def validate_csrf_token(request: Request, session_id: str) -> bool:
     """
     Validate CSRF token from request header
     Token should be in X-CSRF-Token header
@@ -233,55 +241,75 @@ def validate_csrf_token(request: Request, session_id: str) -> bool:
     if not token:
         return False
     
-    expected = csrf_token_store.get(session_id)
+    expected = await state.get(f"csrf:{session_id}")
     if not expected:
         return False
     
     return verify_csrf_token(token, expected)
 
-def require_csrf_token(request: Request, session_id: str):
+async def require_csrf_token(request: Request, session_id: str):
     """
     Middleware function to require CSRF token for state-changing requests
     """
     if request.method in ["POST", "PUT", "DELETE", "PATCH"]:
-        if not validate_csrf_token(request, session_id):
+        if not await validate_csrf_token(request, session_id):
             raise HTTPException(
                 status_code=403,
                 detail="CSRF token missing or invalid"
             )
 
 # Security Headers Middleware
-async def add_security_headers(request: Request, call_next):
-    """Add security headers to all responses"""
-    response = await call_next(request)
-    
-    # Security headers
-    response.headers["X-Content-Type-Options"] = "nosniff"
-    response.headers["X-Frame-Options"] = "DENY"
-    response.headers["X-XSS-Protection"] = "1; mode=block"
-    response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
-    response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-    response.headers["Permissions-Policy"] = "geolocation=(), microphone=(), camera=()"
-    
-    # Content Security Policy - ENHANCED
-    # Note: unsafe-inline needed for React, but unsafe-eval removed
-    csp = (
-        "default-src 'self'; "
-        "script-src 'self' 'unsafe-inline' https://fonts.googleapis.com https://www.youtube.com https://challenges.cloudflare.com; "  # unsafe-eval REMOVED
-        "style-src 'self' 'unsafe-inline' https://fonts.googleapis.com; "
-        "font-src 'self' https://fonts.gstatic.com data:; "
-        "img-src 'self' data: https: blob:; "
-        "media-src 'self' https://www.youtube.com https://*.youtube.com; "
-        "frame-src 'self' https://www.youtube.com https://*.youtube.com https://challenges.cloudflare.com; "  # YouTube embed + Turnstile
-        "connect-src 'self' https://*.supabase.co https://fonts.googleapis.com https://fonts.gstatic.com wss://*.supabase.co https://challenges.cloudflare.com; "
-        "frame-ancestors 'none'; "
-        "base-uri 'self'; "
-        "form-action 'self'; "
-        "upgrade-insecure-requests;"  # HTTP -> HTTPS upgrade
-    )
-    response.headers["Content-Security-Policy"] = csp
-    
-    return response
+# Content Security Policy - ENHANCED
+# Note: unsafe-inline needed for React, but unsafe-eval removed
+CONTENT_SECURITY_POLICY = (
+    "default-src 'self'; "
+    "script-src 'self' 'unsafe-inline' https://fonts.googleapis.com https://www.youtube.com https://challenges.cloudflare.com; "  # unsafe-eval REMOVED
+    "style-src 'self' 'unsafe-inline' https://fonts.googleapis.com; "
+    "font-src 'self' https://fonts.gstatic.com data:; "
+    "img-src 'self' data: https: blob:; "
+    "media-src 'self' https://www.youtube.com https://*.youtube.com; "
+    "frame-src 'self' https://www.youtube.com https://*.youtube.com https://challenges.cloudflare.com; "  # YouTube embed + Turnstile
+    "connect-src 'self' https://*.supabase.co https://fonts.googleapis.com https://fonts.gstatic.com wss://*.supabase.co https://challenges.cloudflare.com; "
+    "frame-ancestors 'none'; "
+    "base-uri 'self'; "
+    "form-action 'self'; "
+    "upgrade-insecure-requests;"  # HTTP -> HTTPS upgrade
+)
+
+SECURITY_HEADERS = {
+    "X-Content-Type-Options": "nosniff",
+    "X-Frame-Options": "DENY",
+    "X-XSS-Protection": "1; mode=block",
+    "Strict-Transport-Security": "max-age=31536000; includeSubDomains",
+    "Referrer-Policy": "strict-origin-when-cross-origin",
+    "Permissions-Policy": "geolocation=(), microphone=(), camera=()",
+    "Content-Security-Policy": CONTENT_SECURITY_POLICY,
+}
+
+# Header'lar bir kez encode edilir; her yanıtta sadece liste birleştirilir
+_SECURITY_HEADER_ITEMS = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in SECURITY_HEADERS.items()]
+_SECURITY_HEADER_NAMES = {k for k, _ in _SECURITY_HEADER_ITEMS}
+
+
+class SecurityHeadersMiddleware:
+    """Add security headers to all responses (pure ASGI — yanıt gövdesine dokunmaz)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                # Aynı isimli header varsa üzerine yazılır
+                headers = [(k, v) for k, v in message.get("headers", []) if k.lower() not in _SECURITY_HEADER_NAMES]
+                message["headers"] = headers + _SECURITY_HEADER_ITEMS
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
 
 # ============================================
 # LOG MASKING UTILITIES
@@ -495,76 +523,92 @@ def validate_password_strength(password: str) -> bool:
     
     return True
 
-# IP-based brute force protection - SECURITY FIX: TTL Cache to prevent memory leak
-# Max 10000 IPs, 1 hour TTL for failed attempts, 15 min TTL for blocked IPs
-failed_login_attempts: TTLCache = TTLCache(maxsize=10000, ttl=3600)
-blocked_ips: TTLCache = TTLCache(maxsize=1000, ttl=900)
+# IP-based brute force protection — sayaç ve blok state_backend'de (Redis varsa tüm replica'larda ortak)
+# Başarısız deneme penceresi 1 saat, blok süresi 15 dakika
+BRUTE_FORCE_MAX_ATTEMPTS = 5
+BRUTE_FORCE_ATTEMPT_WINDOW = 3600
+BRUTE_FORCE_BLOCK_SECONDS = 15 * 60
 
-def check_brute_force(ip: str) -> bool:
+async def check_brute_force(ip: str) -> bool:
     """Check if IP is blocked due to brute force"""
-    import time
-    
-    if ip in blocked_ips:
-        if time.time() < blocked_ips[ip]:
-            raise HTTPException(
-                status_code=429,
-                detail="Çok fazla başarısız giriş denemesi. Lütfen 15 dakika sonra tekrar deneyin."
-            )
-        else:
-            # Unblock
-            del blocked_ips[ip]
-            failed_login_attempts[ip] = 0
-    
+    if await state.get(f"bf:block:{ip}"):
+        raise HTTPException(
+            status_code=429,
+            detail="Çok fazla başarısız giriş denemesi. Lütfen 15 dakika sonra tekrar deneyin."
+        )
     return True
 
-def record_failed_login(ip: str):
+async def record_failed_login(ip: str):
     """Record failed login attempt"""
-    import time
-    
-    failed_login_attempts[ip] = failed_login_attempts.get(ip, 0) + 1
-    
+    attempts = await state.incr(f"bf:fail:{ip}", BRUTE_FORCE_ATTEMPT_WINDOW)
+
     # Block after 5 failed attempts
-    if failed_login_attempts[ip] >= 5:
-        blocked_ips[ip] = time.time() + (15 * 60)  # Block for 15 minutes
+    if attempts >= BRUTE_FORCE_MAX_ATTEMPTS:
+        await state.set(f"bf:block:{ip}", "1", BRUTE_FORCE_BLOCK_SECONDS)
+        # Blok bitince sayaç sıfırdan başlar
+        await state.delete(f"bf:fail:{ip}")
         log_security_event(
             "BRUTE_FORCE_DETECTED",
-            {"ip": ip, "attempts": failed_login_attempts[ip]},
+            {"ip": ip, "attempts": attempts},
             "CRITICAL"
         )
-        log_rate_limit_event(ip, endpoint="/api/auth/login", blocked=True, reason=f"Brute force: {failed_login_attempts[ip]} failed attempts")
+        log_rate_limit_event(ip, endpoint="/api/auth/login", blocked=True, reason="Brute force: 5+ failed attempts")
 
-def record_successful_login(ip: str):
+async def record_successful_login(ip: str):
     """Clear failed attempts on successful login"""
-    if ip in failed_login_attempts:
-        failed_login_attempts[ip] = 0
+    await state.delete(f"bf:fail:{ip}")
 
 
 # ============================================
 # RATE LIMIT DB LOGGING
 # ============================================
 
+# Olaylar istek yolunda DB'ye yazılmaz: (ip, endpoint, blocked, reason) başına bellekte
+# sayılır, monitoring_routes'taki arka plan task'ı RATE_LIMIT_LOG_FLUSH_INTERVAL'da bir
+# hit_count'lu satırlar olarak toplu insert eder. Saldırı anında engellenen her istek
+# yeni bir HTTP client + DB yazması üretmez.
+RATE_LIMIT_LOG_FLUSH_INTERVAL = float(os.getenv("RATE_LIMIT_LOG_FLUSH_INTERVAL", "10"))
+# Pencere başına tutulan farklı anahtar sayısı; aşılırsa olaylar ip="*" satırında toplanır
+RATE_LIMIT_LOG_MAX_KEYS = int(os.getenv("RATE_LIMIT_LOG_MAX_KEYS", "5000"))
+RATE_LIMIT_LOG_OVERFLOW_IP = "*"
+
+_rate_limit_events: Dict[tuple, dict] = {}
+rate_limit_log_stats = {"events": 0, "rows_flushed": 0, "overflow_events": 0, "dropped_events": 0}
+
+
 def log_rate_limit_event(ip_address: str, endpoint: str = "", blocked: bool = True, reason: str = ""):
     """
-    Log rate limit events to the rate_limit_logs table for the admin dashboard.
-    This is a fire-and-forget operation — failures are silently ignored.
+    Rate limit olayını admin dashboard'u (rate_limit_logs) için sayar.
+    Senkron ve I/O'suz; yazma drain_rate_limit_events() ile toplu yapılır.
     """
     try:
-        # Import here to avoid circular imports
-        from supabase import create_client, Client
-        supabase_url = os.getenv("SUPABASE_URL", "")
-        supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY", "")
-        if supabase_url and supabase_key:
-            sb: Client = create_client(supabase_url, supabase_key)
-            sb.table("rate_limit_logs").insert({
-                "ip_address": ip_address,
-                "endpoint": endpoint[:200] if endpoint else "",
-                "blocked": blocked,
-                "reason": reason[:200] if reason else "",
-            }).execute()
+        key = (ip_address, endpoint[:200] if endpoint else "", bool(blocked), reason[:200] if reason else "")
+        now = datetime.now(timezone.utc).isoformat()
+        rate_limit_log_stats["events"] += 1
+        entry = _rate_limit_events.get(key)
+        if entry is None and len(_rate_limit_events) >= RATE_LIMIT_LOG_MAX_KEYS:
+            rate_limit_log_stats["overflow_events"] += 1
+            key = (RATE_LIMIT_LOG_OVERFLOW_IP,) + key[1:]
+            entry = _rate_limit_events.get(key)
+        if entry is None:
+            _rate_limit_events[key] = {"hit_count": 1, "created_at": now, "last_seen_at": now}
+        else:
+            entry["hit_count"] += 1
+            entry["last_seen_at"] = now
     except Exception:
         pass  # Fire-and-forget — never break the request flow
 
 
+def drain_rate_limit_events() -> list:
+    """Biriken olayları rate_limit_logs satırlarına çevirir ve tamponu sıfırlar"""
+    global _rate_limit_events
+    events, _rate_limit_events = _rate_limit_events, {}
+    return [
+        {"ip_address": ip, "endpoint": endpoint, "blocked": blocked, "reason": reason, **entry}
+        for (ip, endpoint, blocked, reason), entry in events.items()
+    ]
+
+
 # ============================================
 # CLOUDFLARE TURNSTILE VERIFICATION
 # ============================================
@@ -0,0 +1,209 @@
+"""
+Semantic (near-duplicate) cache for context-free chatbot questions
+
+Aynı fıkıh / SSS sorusu sayısız varyasyonla gelir ("Umrenin farzları nelerdir?",
+"umrenin farzlari neler", "umrenin farzları nelerdir acaba"). Bu modül daha önce
+yanıtlanmış tur bağlamsız soruların karakter 3-gram kümelerini tutar:
+
+- Aday bulma: MinHash imzası + LSH bantları (tüm girdileri taramadan)
+- Karar: adayların gerçek Jaccard benzerliği >= SEMANTIC_CACHE_THRESHOLD
+- Güvenlik: sorudaki sayılar (yıl, gün, fiyat) ve yanıtı değiştiren alan terimleri
+  (hac/umre, mezhep, farz/vacip/sünnet, ...) birebir aynı olmalı
+- Boyut: SEMANTIC_CACHE_MAX_ENTRIES, LRU ile tahliye
+
+Süreç içi (per-process) çalışır; tam eşleşme cache'i (cache.get_or_compute) Redis'te paylaşılır.
+"""
+import os
+import re
+import hashlib
+import unicodedata
+from collections import OrderedDict
+from typing import Optional, List, Tuple, Set
+
+from cache import cache_stats
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.6"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2000"))
+
+SHINGLE_SIZE = 3
+NUM_BANDS = 16
+ROWS_PER_BAND = 4
+NUM_PERM = NUM_BANDS * ROWS_PER_BAND
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# Sabit tohumlu permütasyon katsayıları (tüm süreçlerde aynı imza)
+_PERMUTATIONS = [
+    (
+        int.from_bytes(hashlib.blake2b(f"a{i}".encode(), digest_size=8).digest(), "big") % (_MERSENNE_PRIME - 1) + 1,
+        int.from_bytes(hashlib.blake2b(f"b{i}".encode(), digest_size=8).digest(), "big") % _MERSENNE_PRIME,
+    )
+    for i in range(NUM_PERM)
+]
+
+# ============================================
+# TURKISH NORMALIZATION
+# ============================================
+
+# Türkçe büyük/küçük harf: I → ı, İ → i (str.lower() "İ"yi "i̇" yapar)
+_TURKISH_UPPER = str.maketrans({"I": "ı", "İ": "i"})
+# ASCII klavyeyle yazılan sorularla eşleşmek için diakritikler katlanır
+_TURKISH_FOLD = str.maketrans({"ı": "i", "ğ": "g", "ü": "u", "ş": "s", "ö": "o", "ç": "c", "â": "a", "î": "i", "û": "u"})
+_NON_WORD = re.compile(r"[^\w\s]+")
+_DIGITS = re.compile(r"\d+")
+
+# Anlamı değiştirmeyen dolgu kelimeleri (katlanmış halleriyle)
+_FILLER_WORDS = frozenset({
+    "acaba", "lutfen", "bana", "merhaba", "selam", "selamunaleykum", "hocam", "peki",
+    "soyler", "misiniz", "misin", "anlatir", "anlatirmisin", "bilgi", "verir", "verirmisin",
+    "mi", "mu", "ya", "ki", "da", "de", "bir",
+})
+
+
+# Yanıtı değiştiren alan terimleri (katlanmış kök → kanonik terim). Karakter benzerliği
+# "Haccın vacipleri" ile "Umrenin vacipleri"ni ayırt edemez; bu terimler birebir tutmalı.
+_DISCRIMINATOR_STEMS = (
+    ("hac", "hac"), ("umre", "umre"),
+    ("hanefi", "hanefi"), ("safii", "safii"), ("maliki", "maliki"), ("hanbeli", "hanbeli"),
+    ("farz", "farz"), ("vacip", "vacip"), ("vacib", "vacip"), ("sunnet", "sunnet"), ("mustehap", "mustehap"),
+    ("kadin", "kadin"), ("erkek", "erkek"), ("cocuk", "cocuk"),
+    ("ramazan", "ramazan"), ("kurban", "kurban"), ("mekke", "mekke"), ("medine", "medine"),
+)
+
+
+def _key_terms(normalized: str) -> frozenset:
+    """Sayılar + alan terimleri: eşleşme için birebir aynı olmalı"""
+    terms = set(_DIGITS.findall(normalized))
+    for word in normalized.split():
+        for stem, canonical in _DISCRIMINATOR_STEMS:
+            if word.startswith(stem):
+                terms.add(canonical)
+                break
+    return frozenset(terms)
+
+
+def normalize_turkish_text(text: str) -> str:
+    """Türkçe duyarlı küçük harf + diakritik katlama + noktalama/dolgu temizliği"""
+    text = unicodedata.normalize("NFKC", text or "")
+    text = text.translate(_TURKISH_UPPER).lower().translate(_TURKISH_FOLD)
+    text = _NON_WORD.sub(" ", text)
+    words = [w for w in text.split() if w not in _FILLER_WORDS]
+    return " ".join(words)
+
+
+def _shingles(normalized: str) -> Set[str]:
+    padded = f" {normalized} "
+    if len(padded) <= SHINGLE_SIZE:
+        return {padded}
+    return {padded[i:i + SHINGLE_SIZE] for i in range(len(padded) - SHINGLE_SIZE + 1)}
+
+
+def _minhash(shingles: Set[str]) -> Tuple[int, ...]:
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=4).digest(), "big") for s in shingles]
+    return tuple(
+        min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+        for a, b in _PERMUTATIONS
+    )
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+# ============================================
+# INDEX
+# ============================================
+
+class SemanticCache:
+    """
+    LSH ile aday bulan, Jaccard ile karar veren, LRU sınırlı yakın-kopya cache'i.
+    Anahtarlar provider bazında ayrılır (aynı soru, farklı model → ayrı yanıt).
+    """
+
+    def __init__(self, threshold: float = SEMANTIC_CACHE_THRESHOLD, max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        # entry_key -> (provider, shingles, key_terms, signature, answer)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        # (provider, band_no, band_hash) -> {entry_key}
+        self._buckets: dict = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _band_keys(self, provider: str, signature: Tuple[int, ...]) -> List[tuple]:
+        return [
+            (provider, band, hash(signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]))
+            for band in range(NUM_BANDS)
+        ]
+
+    def lookup(self, message: str, provider: str) -> Optional[str]:
+        """Yeterince benzer, daha önce yanıtlanmış soru varsa yanıtını döndürür"""
+        normalized = normalize_turkish_text(message)
+        if not normalized:
+            return None
+        shingles = _shingles(normalized)
+        key_terms = _key_terms(normalized)
+        signature = _minhash(shingles)
+
+        candidates = set()
+        for band_key in self._band_keys(provider, signature):
+            candidates |= self._buckets.get(band_key, set())
+
+        best_key, best_score = None, 0.0
+        for entry_key in candidates:
+            _, entry_shingles, entry_terms, _, _ = self._entries[entry_key]
+            if entry_terms != key_terms:
+                continue
+            score = jaccard(shingles, entry_shingles)
+            if score > best_score:
+                best_key, best_score = entry_key, score
+
+        if best_key is None or best_score < self.threshold:
+            cache_stats["semantic_misses"] += 1
+            return None
+
+        self._entries.move_to_end(best_key)
+        cache_stats["semantic_hits"] += 1
+        return self._entries[best_key][4]
+
+    def add(self, message: str, provider: str, answer: str) -> None:
+        """Yanıtlanmış soruyu indekse ekler; doluysa en eski kullanılan girdiyi çıkarır"""
+        normalized = normalize_turkish_text(message)
+        if not normalized:
+            return
+        entry_key = f"{provider}:{normalized}"
+        if entry_key in self._entries:
+            self._remove(entry_key)
+
+        shingles = _shingles(normalized)
+        signature = _minhash(shingles)
+        self._entries[entry_key] = (provider, shingles, _key_terms(normalized), signature, answer)
+        for band_key in self._band_keys(provider, signature):
+            self._buckets.setdefault(band_key, set()).add(entry_key)
+
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, entry_key: str) -> None:
+        provider, _, _, signature, _ = self._entries.pop(entry_key)
+        for band_key in self._band_keys(provider, signature):
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(entry_key)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._buckets.clear()
+
+
+semantic_cache = SemanticCache()
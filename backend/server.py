@@ -20,11 +20,11 @@ load_dotenv()
 
 from security import (
     limiter,
-    add_security_headers,
+    SecurityHeadersMiddleware,
     log_security_event,
     _rate_limit_exceeded_handler,
 )
-from signing import verify_request_signature
+from signing import RequestSignatureMiddleware
 from logging_config import init_sentry, RequestLoggingMiddleware, logger
 
 # Initialize Sentry monitoring (production error tracking)
@@ -34,10 +34,14 @@ init_sentry()
 # =========================================================================
 # LIFESPAN — Background task lifecycle (modern replacement for on_event)
 # =========================================================================
+from dependencies import db, write_behind, import_job_runner
+from ai_service import close_kumru_client
 from routes.monitoring_routes import (
     _process_email_queue,
     _execute_scheduled_actions,
     _uptime_scheduler,
+    _rate_limit_log_scheduler,
+    flush_rate_limit_events,
 )
 
 
@@ -59,9 +63,20 @@ async def lifespan(app):
     """Modern lifespan handler — replaces deprecated on_event('startup'/'shutdown')"""
     combined_task = asyncio.create_task(_combined_scheduler())
     uptime_task = asyncio.create_task(_uptime_scheduler())
+    rate_limit_log_task = asyncio.create_task(_rate_limit_log_scheduler())
+    write_behind.start()
+    import_job_runner.start()
     yield
+    # Çalışan import işi parça sınırında bırakılır (başka pod devam eder)
+    await import_job_runner.stop()
     combined_task.cancel()
     uptime_task.cancel()
+    rate_limit_log_task.cancel()
+    await flush_rate_limit_events()
+    # Kuyruktaki log/geçmiş kayıtları pool kapanmadan yazılır
+    await write_behind.stop()
+    await db.aclose()
+    await close_kumru_client()
 
 
 # Initialize FastAPI app
@@ -79,8 +94,8 @@ if os.getenv("ENVIRONMENT", "production").lower() == "production":
 
 # ⚠️ Development modda security headers ve signing middleware devre dışı
 if os.getenv("ENVIRONMENT", "production").lower() == "production":
-    app.middleware("http")(add_security_headers)
-    app.middleware("http")(verify_request_signature)
+    app.add_middleware(SecurityHeadersMiddleware)
+    app.add_middleware(RequestSignatureMiddleware)
 
 # -------------------------------------------------------------------------
 # ✅ 4️⃣ CORS WHITELIST
@@ -132,28 +147,53 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     )
 
 # ===== REQUEST TIMEOUT MIDDLEWARE (DoS Protection) =====
-from starlette.middleware.base import BaseHTTPMiddleware
+# Tüm middleware'ler pure ASGI: BaseHTTPMiddleware her katmanda ek task ve
+# yanıt akışı sarmalıyordu (SSE akışlarını da tamponluyordu).
 
-class TimeoutMiddleware(BaseHTTPMiddleware):
-    """Prevent long-running requests (DoS protection)"""
+AI_REQUEST_TIMEOUT = 60
+REQUEST_TIMEOUT = 30
 
-    async def dispatch(self, request: Request, call_next):
-        if "/api/chat" in str(request.url) or "/api/compare" in str(request.url):
-            timeout = 60
-        else:
-            timeout = 30
+
+class TimeoutMiddleware:
+    """
+    Prevent long-running requests (DoS protection).
+    Süre yanıt header'ları gönderilene kadar sayılır; başlamış akışlar (SSE) kesilmez.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        timeout = AI_REQUEST_TIMEOUT if "/api/chat" in path or "/api/compare" in path else REQUEST_TIMEOUT
+        started = False
 
         try:
-            return await asyncio.wait_for(call_next(request), timeout=timeout)
+            async with asyncio.timeout(timeout) as deadline:
+                async def send_and_release(message):
+                    nonlocal started
+                    if message["type"] == "http.response.start":
+                        started = True
+                        deadline.reschedule(None)
+                    await send(message)
+
+                await self.app(scope, receive, send_and_release)
         except asyncio.TimeoutError:
+            if started:
+                raise
             log_security_event("REQUEST_TIMEOUT", {
-                "path": str(request.url.path),
-                "method": request.method
+                "path": path,
+                "method": scope["method"]
             }, "WARN")
-            return JSONResponse(
+            response = JSONResponse(
                 status_code=504,
                 content={"detail": "İstek zaman aşımına uğradı. Lütfen tekrar deneyin."}
             )
+            await response(scope, receive, send)
 
 if os.getenv("ENVIRONMENT", "production").lower() == "production":
     app.add_middleware(TimeoutMiddleware)
@@ -161,22 +201,33 @@ if os.getenv("ENVIRONMENT", "production").lower() == "production":
 # -------------------------------------------------------------------------
 # ✅ 6️⃣ APPLICATION WAF (Bot Protection)
 # -------------------------------------------------------------------------
-@app.middleware("http")
-async def waf_middleware(request: Request, call_next):
+WAF_BLOCKED_PATHS = (
+    "/wp-admin", "/phpmyadmin", "/.env", "/.git",
+    "/console", "/admin/login.php"
+)
+
+
+class WAFMiddleware:
     """Simple application-layer WAF to block common exploit paths"""
-    path = request.url.path.lower()
-    blocked_paths = [
-        "/wp-admin", "/phpmyadmin", "/.env", "/.git",
-        "/console", "/admin/login.php"
-    ]
-
-    for blocked in blocked_paths:
-        if blocked in path:
-            client_ip = request.client.host if request.client else "unknown"
-            log_security_event("WAF_BLOCK", {"path": path, "ip": client_ip}, "WARN")
-            return JSONResponse(status_code=403, content={"detail": "Access Denied"})
-
-    return await call_next(request)
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            path = scope["path"].lower()
+            for blocked in WAF_BLOCKED_PATHS:
+                if blocked in path:
+                    client = scope.get("client")
+                    client_ip = client[0] if client else "unknown"
+                    log_security_event("WAF_BLOCK", {"path": path, "ip": client_ip}, "WARN")
+                    await JSONResponse(status_code=403, content={"detail": "Access Denied"})(scope, receive, send)
+                    return
+
+        await self.app(scope, receive, send)
+
+
+app.add_middleware(WAFMiddleware)
 
 
 # =========================================================================
@@ -7,14 +7,15 @@ import hmac
 import hashlib
 import time
 import os
-from fastapi import Request, HTTPException
-from cachetools import TTLCache
+from starlette.datastructures import Headers
+from fastapi.responses import JSONResponse
+from state_backend import state
 
 # Signing secret — .env'den okunur
 API_SIGNING_SECRET = os.getenv("API_SIGNING_SECRET", "")
 
-# Nonce replay koruması — 2 dakika TTL, max 50.000 nonce
-_used_nonces: TTLCache = TTLCache(maxsize=50000, ttl=120)
+# Nonce replay koruması — 2 dakika TTL; state_backend (Redis'te SET NX) ile tüm replica'larda tek kullanımlık
+NONCE_TTL = 120
 
 # İmza doğrulaması gerektirmeyen endpoint'ler
 EXEMPT_PATHS = {
@@ -59,68 +60,99 @@ def compute_signature(method: str, path: str, timestamp: str, nonce: str, body_h
     ).hexdigest()
 
 
-async def verify_request_signature(request: Request, call_next):
-    """
-    API Request Signing Middleware.
-    
-    Her istekte X-Timestamp, X-Nonce, X-Signature header'larını doğrular.
-    Eşleşmeyen veya süresi geçmiş istekleri reddeder.
-    """
-    path = request.url.path
-    method = request.method
+async def _read_body(receive) -> tuple:
+    """Gövdeyi tamamen okur; alt uygulamaya aynı gövdeyi yeniden veren bir receive döner"""
+    chunks = []
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message["type"] != "http.request":
+            # İstemci gövde bitmeden ayrıldı
+            return b"".join(chunks), receive
+        chunks.append(message.get("body", b""))
+        more_body = message.get("more_body", False)
+    body = b"".join(chunks)
+    replayed = False
 
-    # Muaf endpoint'ler (GET public & auth)
-    if _is_exempt(path) and method == "GET":
-        return await call_next(request)
-    
-    # Auth endpoint'leri tüm method'lar için muaf
-    if path in EXEMPT_PATHS:
-        return await call_next(request)
+    async def replay():
+        nonlocal replayed
+        if not replayed:
+            replayed = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
 
-    # OPTIONS (CORS preflight) her zaman geçer
-    if method == "OPTIONS":
-        return await call_next(request)
+    return body, replay
 
-    # Secret yoksa middleware devre dışı (development)
-    if not API_SIGNING_SECRET:
-        return await call_next(request)
 
+async def _signature_error(method: str, path: str, headers: Headers, receive) -> tuple:
+    """
+    İmzayı doğrular. Döner: (hata mesajı veya None, alt uygulamaya verilecek receive)
+    """
     # Header'ları oku
-    timestamp = request.headers.get("X-Timestamp", "")
-    nonce = request.headers.get("X-Nonce", "")
-    signature = request.headers.get("X-Signature", "")
+    timestamp = headers.get("X-Timestamp", "")
+    nonce = headers.get("X-Nonce", "")
+    signature = headers.get("X-Signature", "")
 
     if not all([timestamp, nonce, signature]):
-        raise HTTPException(
-            status_code=401,
-            detail="İstek imzası eksik (X-Timestamp, X-Nonce, X-Signature gerekli)"
-        )
+        return "İstek imzası eksik (X-Timestamp, X-Nonce, X-Signature gerekli)", receive
 
     # Timestamp kontrolü (±60 saniye)
     try:
         req_time = int(timestamp)
-        now = int(time.time())
-        if abs(now - req_time) > TIMESTAMP_TOLERANCE:
-            raise HTTPException(
-                status_code=401,
-                detail="İstek süresi dolmuş (timestamp tolerans dışı)"
-            )
     except ValueError:
-        raise HTTPException(status_code=401, detail="Geçersiz timestamp")
+        return "Geçersiz timestamp", receive
+    if abs(int(time.time()) - req_time) > TIMESTAMP_TOLERANCE:
+        return "İstek süresi dolmuş (timestamp tolerans dışı)", receive
 
     # Nonce replay koruması
-    if nonce in _used_nonces:
-        raise HTTPException(status_code=401, detail="Tekrarlanan istek (nonce replay)")
-    _used_nonces[nonce] = True
+    if not await state.set_nx(f"nonce:{nonce}", NONCE_TTL):
+        return "Tekrarlanan istek (nonce replay)", receive
 
     # Body hash hesapla
-    body = await request.body()
-    body_hash = hashlib.sha256(body).hexdigest() if body else hashlib.sha256(b"").hexdigest()
+    body, receive = await _read_body(receive)
+    body_hash = hashlib.sha256(body).hexdigest()
 
     # İmza hesapla ve karşılaştır
     expected = compute_signature(method, path, timestamp, nonce, body_hash, API_SIGNING_SECRET)
 
     if not hmac.compare_digest(signature, expected):
-        raise HTTPException(status_code=401, detail="Geçersiz istek imzası")
+        return "Geçersiz istek imzası", receive
+    return None, receive
+
+
+class RequestSignatureMiddleware:
+    """
+    API Request Signing Middleware (pure ASGI).
+    
+    Her istekte X-Timestamp, X-Nonce, X-Signature header'larını doğrular.
+    Eşleşmeyen veya süresi geçmiş istekleri 401 JSON ile reddeder.
+    """
 
-    return await call_next(request)
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        method = scope["method"]
+
+        # Muaf endpoint'ler (GET public & auth), auth endpoint'leri tüm method'lar için muaf,
+        # OPTIONS (CORS preflight) her zaman geçer, secret yoksa middleware devre dışı (development)
+        if (
+            (method == "GET" and _is_exempt(path))
+            or path in EXEMPT_PATHS
+            or method == "OPTIONS"
+            or not API_SIGNING_SECRET
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        error, receive = await _signature_error(method, path, Headers(scope=scope), receive)
+        if error:
+            await JSONResponse(status_code=401, content={"detail": error})(scope, receive, send)
+            return
+
+        await self.app(scope, receive, send)
@@ -0,0 +1,241 @@
+"""
+Paylaşılan güvenlik durumu — rate limit sayaçları, brute-force, CSRF token'ları, nonce'lar
+
+Bu durum süreç içi TTLCache'lerde tutulduğunda her replica / uvicorn worker kendi
+sayacını tutar (3 pod × 100 istek = 300), bir pod'da kullanılan nonce başka pod'da
+tekrar oynatılabilir. state_backend REDIS_URL varsa Redis'i, yoksa belleği kullanır:
+
+- Rate limit: token bucket (anahtar başına O(1): kalan token + son zaman);
+  Redis'te HASH + Lua (doldur → harca → yaz tek atomik adım)
+- Nonce / "ilk kez mi": SET NX PX
+- Sayaç: INCR + ilk artışta PEXPIRE (Lua)
+- Değer: SET PX / GET / DEL
+
+Redis hatasında çağrı bellek backend'ine düşer (fail-open değil, süreç içi limit);
+state_stats["redis_errors"] sayılır.
+"""
+import math
+import os
+import time
+from typing import Any, NamedTuple, Optional
+
+from cachetools import TLRUCache
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+REDIS_URL = os.getenv("REDIS_URL")
+STATE_BACKEND = os.getenv("STATE_BACKEND", "redis" if REDIS_URL else "memory").lower()
+STATE_MEMORY_MAX_KEYS = int(os.getenv("STATE_MEMORY_MAX_KEYS", "50000"))
+STATE_KEY_PREFIX = os.getenv("STATE_KEY_PREFIX", "hu:state:")
+
+state_stats = {"redis_errors": 0}
+
+
+class RateLimitResult(NamedTuple):
+    """
+    Token bucket kararı (X-RateLimit-* header'ları için):
+    remaining = harcanabilir tam token, reset_after = kova dolana kadar saniye,
+    retry_after = reddedildiyse bir sonraki token'a kadar saniye
+    """
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_after: float
+    retry_after: float
+
+
+# Token miktarı bu hassasiyete yuvarlanır: float birikim hatası (0.9999999…) tam zamanında
+# gelen isteği reddetmesin. Lua betiği aynı yuvarlamayı yapar (iki backend aynı kararı verir)
+TOKEN_PRECISION = 1e9
+
+
+def _settle(tokens: float) -> float:
+    return math.floor(tokens * TOKEN_PRECISION + 0.5) / TOKEN_PRECISION
+
+
+def _refill(tokens: float, last: float, now: float, limit: int, window: float) -> float:
+    """Kovayı geçen süre kadar doldurur (saniyede limit/window token, en fazla limit)"""
+    return _settle(min(float(limit), tokens + max(now - last, 0.0) * limit / window))
+
+
+def _bucket_result(allowed: bool, tokens: float, limit: int, window: float, cost: int) -> RateLimitResult:
+    rate = limit / window
+    tokens = _settle(tokens)
+    return RateLimitResult(
+        allowed=allowed,
+        limit=limit,
+        remaining=max(int(math.floor(tokens)), 0),
+        reset_after=max((limit - tokens) / rate, 0.0),
+        retry_after=0.0 if allowed else max((cost - tokens) / rate, 0.0),
+    )
+
+
+def _expires_at(_key, value, _now):
+    # Değerler (payload, bitiş zamanı) olarak saklanır
+    return value[1]
+
+
+# ============================================
+# MEMORY BACKEND (tek süreç / geliştirme)
+# ============================================
+
+class MemoryStateBackend:
+    """Süreç içi backend; anahtar başına TTL (TLRUCache) ile"""
+
+    name = "memory"
+
+    def __init__(self, maxsize: int = STATE_MEMORY_MAX_KEYS):
+        self._values = TLRUCache(maxsize=maxsize, ttu=_expires_at, timer=time.time)
+
+    def _get(self, key: str) -> Any:
+        item = self._values.get(key)
+        return item[0] if item else None
+
+    async def get(self, key: str) -> Optional[str]:
+        return self._get(key)
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        self._values[key] = (value, time.time() + ttl)
+
+    async def delete(self, key: str) -> None:
+        self._values.pop(key, None)
+
+    async def set_nx(self, key: str, ttl: float) -> bool:
+        """Anahtar yoksa oluşturur ve True döner (nonce ilk kez görüldü)"""
+        if self._get(key) is not None:
+            return False
+        await self.set(key, "1", ttl)
+        return True
+
+    async def incr(self, key: str, ttl: float) -> int:
+        """Sayacı artırır; TTL ilk artışta başlar (sabit pencere)"""
+        item = self._values.get(key)
+        if item is None:
+            self._values[key] = (1, time.time() + ttl)
+            return 1
+        self._values[key] = (item[0] + 1, item[1])
+        return item[0] + 1
+
+    async def token_bucket(self, key: str, limit: int, window: float, cost: int = 1, now: Optional[float] = None) -> RateLimitResult:
+        """limit token'lık kova, window saniyede tamamen dolar; cost=0 sadece okur"""
+        now = time.time() if now is None else now
+        item = self._get(key)
+        tokens = float(limit) if item is None else _refill(item[0], item[1], now, limit, window)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        self._values[key] = ((tokens, now), time.time() + window)
+        return _bucket_result(allowed, tokens, limit, window, cost)
+
+
+# ============================================
+# REDIS BACKEND (replica'lar arası ortak)
+# ============================================
+
+# KEYS[1]=kova (HASH t=token, ts=son zaman)  ARGV: limit, window, now, cost  →  {allowed, token (string)}
+_TOKEN_BUCKET_LUA = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local bucket = redis.call('HMGET', KEYS[1], 't', 'ts')
+local tokens = tonumber(bucket[1])
+local last = tonumber(bucket[2])
+if tokens == nil or last == nil then
+  tokens = limit
+  last = now
+end
+tokens = math.min(limit, tokens + math.max(now - last, 0) * limit / window)
+tokens = math.floor(tokens * 1e9 + 0.5) / 1e9
+local allowed = 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+end
+redis.call('HSET', KEYS[1], 't', string.format('%.17g', tokens), 'ts', string.format('%.17g', now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(window * 1000))
+return {allowed, string.format('%.17g', tokens)}
+"""
+
+# KEYS[1]=sayaç  ARGV[1]=ttl_ms
+_INCR_LUA = """
+local value = redis.call('INCR', KEYS[1])
+if value == 1 then redis.call('PEXPIRE', KEYS[1], ARGV[1]) end
+return value
+"""
+
+
+class RedisStateBackend:
+    """Redis backend; hata durumunda bellek backend'ine düşer"""
+
+    name = "redis"
+
+    def __init__(self, client, prefix: str = STATE_KEY_PREFIX, fallback: Optional[MemoryStateBackend] = None):
+        self.client = client
+        self.prefix = prefix
+        self.fallback = fallback or MemoryStateBackend()
+        self._token_bucket = client.register_script(_TOKEN_BUCKET_LUA)
+        self._incr = client.register_script(_INCR_LUA)
+
+    def _k(self, key: str) -> str:
+        return self.prefix + key
+
+    async def get(self, key: str) -> Optional[str]:
+        try:
+            return await self.client.get(self._k(key))
+        except Exception:
+            state_stats["redis_errors"] += 1
+            return await self.fallback.get(key)
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        try:
+            await self.client.set(self._k(key), value, px=max(int(ttl * 1000), 1))
+        except Exception:
+            state_stats["redis_errors"] += 1
+            await self.fallback.set(key, value, ttl)
+
+    async def delete(self, key: str) -> None:
+        try:
+            await self.client.delete(self._k(key))
+        except Exception:
+            state_stats["redis_errors"] += 1
+            await self.fallback.delete(key)
+
+    async def set_nx(self, key: str, ttl: float) -> bool:
+        try:
+            return bool(await self.client.set(self._k(key), "1", nx=True, px=max(int(ttl * 1000), 1)))
+        except Exception:
+            state_stats["redis_errors"] += 1
+            return await self.fallback.set_nx(key, ttl)
+
+    async def incr(self, key: str, ttl: float) -> int:
+        try:
+            return int(await self._incr(keys=[self._k(key)], args=[max(int(ttl * 1000), 1)]))
+        except Exception:
+            state_stats["redis_errors"] += 1
+            return await self.fallback.incr(key, ttl)
+
+    async def token_bucket(self, key: str, limit: int, window: float, cost: int = 1, now: Optional[float] = None) -> RateLimitResult:
+        now = time.time() if now is None else now
+        try:
+            allowed, tokens = await self._token_bucket(keys=[self._k(key)], args=[limit, window, now, cost])
+            return _bucket_result(bool(allowed), float(tokens), limit, window, cost)
+        except Exception:
+            state_stats["redis_errors"] += 1
+            return await self.fallback.token_bucket(key, limit, window, cost, now)
+
+
+def create_state_backend():
+    """STATE_BACKEND=redis ve redis paketi varsa Redis, aksi halde bellek"""
+    if STATE_BACKEND == "redis" and REDIS_URL:
+        try:
+            import redis.asyncio as redis
+            return RedisStateBackend(redis.from_url(REDIS_URL, decode_responses=True))
+        except ImportError:
+            pass
+    return MemoryStateBackend()
+
+
+state = create_state_backend()
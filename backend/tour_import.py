@@ -0,0 +1,501 @@
+"""
+Toplu tur import'u — satır satır okuma, doğrulama ve parça parça yazma
+
+Eski import_csv tüm dosyayı belleğe alıp satır başına bir insert yapıyordu;
+5.000 satırlık bir katalog 5.000 ardışık round trip demekti ve 30 sn'lik
+TimeoutMiddleware sınırını aşıyordu. Akış artık üç ayrı adımdır:
+
+- Okuma: satırlar yüklenen (spooled) dosyadan biçime göre bir okuyucuyla tek
+  tek okunur (IMPORT_READERS: CSV, XLSX, NDJSON); hiçbiri dosyayı bütün olarak
+  belleğe almaz
+- Doğrulama: validate_row satırı tur kaydına çevirir veya hata mesajı üretir
+- Yazma: geçerli satırlar IMPORT_BATCH_SIZE'lık parçalar halinde tek multi-row
+  insert ile yazılır; başarısız parça, kapsadığı satır aralığıyla raporlanır
+
+Bellekte en fazla bir parça ve ilk IMPORT_MAX_ERROR_DETAILS hata tutulur.
+
+İki mod vardır:
+
+- insert: her geçerli satır yeni tur olarak yazılır
+- upsert: satırın doğal anahtarı (title + operator + start_date + price), satırdaki
+  operatörün mevcut turlarından kurulan yerel hash index'te aranır (ImportIndex;
+  her operatör için bir kez, parçada ilk görüldüğünde yüklenir). Yoksa insert,
+  içerik hash'i (content_hash) farklıysa id üzerinden update, aynıysa hiç
+  yazılmaz (unchanged). Aynı dosyayı tekrar yüklemek böylece tur tablosunu
+  büyütmez; kaldığı yerden devam eden iş de tekrar yazmaz.
+
+  Dosya içi tekrarlar yalnızca parça içinde ayıklanır (bellek bir parçayla
+  sınırlı kalır). Parçalar arası tekrarları tours.import_key üzerindeki unique
+  index yakalar: yeni turlar on_conflict=import_key + ignore_duplicates ile
+  yazılır, ilk yazılan kalır. Bu satırlar "inserted" sayılır, yani sayaçlar
+  parçalar arası tekrarlarda yaklaşıktır. Update, turun durumunu (status),
+  sahibini (operator_id) ve kaynak bilgisini değiştirmez; onaylı bir tur
+  import ile taslağa dönmez.
+
+Her parça yazıldıktan sonra on_chunk çağrılır (import_jobs ilerlemeyi burada
+kaydeder); False dönerse import o noktada durur (iptal / kapanış).
+"""
+import codecs
+import csv
+import hashlib
+import importlib.util
+import io
+import json
+import os
+from datetime import date, datetime
+from typing import AsyncIterable, AsyncIterator, Awaitable, BinaryIO, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple, Union
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+IMPORT_MAX_ERROR_DETAILS = int(os.getenv("IMPORT_MAX_ERROR_DETAILS", "100"))
+# CSV kodlama / ayraç tespiti için dosyanın başından okunan bayt
+IMPORT_SNIFF_BYTES = int(os.getenv("IMPORT_SNIFF_BYTES", "65536"))
+
+REQUIRED_FIELDS = ('title', 'operator', 'price', 'currency', 'duration', 'hotel', 'visa')
+
+IMPORT_MODES = ("insert", "upsert")
+
+# Aynı turu tanımlayan alanlar (doğal anahtar)
+NATURAL_KEY_FIELDS = ('title', 'operator', 'start_date', 'price')
+# content_hash'e giren alanlar: CSV'den gelen her şey (operator_id / status gibi kayıt alanları hariç)
+CONTENT_FIELDS = (
+    'title', 'operator', 'price', 'currency', 'start_date', 'end_date', 'duration', 'hotel',
+    'services', 'visa', 'transport', 'guide', 'itinerary', 'rating',
+)
+# Mevcut tur güncellenirken yazılmayan alanlar: onay durumu, sahiplik ve kaynak turda kalır
+UPDATE_EXCLUDED_FIELDS = ('status', 'operator_id', 'created_by', 'source')
+
+# (tablo, satırlar) → tek multi-row insert
+InsertRows = Callable[[str, List[dict]], Awaitable[None]]
+# (tablo, satırlar, on_conflict, ignore_duplicates=False) → tek multi-row upsert
+UpsertRows = Callable[..., Awaitable[None]]
+
+
+class IndexedTour(NamedTuple):
+    """Index'teki mevcut tur; content_hash'i olmayan eski turlarda content_hash None"""
+    id: int
+    content_hash: Optional[str]
+    operator_id: str
+
+
+# doğal anahtar → mevcut tur
+ImportIndex = Dict[str, IndexedTour]
+# operatör adları → bu operatörlerin turlarının index'i
+LoadIndex = Callable[[List[str]], Awaitable[ImportIndex]]
+# Parça yazıldıktan sonra: False → dur
+OnChunk = Callable[["ImportResult"], Awaitable[bool]]
+
+
+class ImportRowError(ValueError):
+    """Satır doğrulama hatası (mesaj kullanıcıya gösterilir)"""
+
+
+# ============================================
+# READING
+# ============================================
+
+# Okuyucu: ikili dosya → (satır no, satır) — satır no boş satırlar atlanarak 1'den sayılır
+# (kaldığı yerden devam buna dayanır); okunamayan satır ImportRowError olarak gelir
+Row = Union[dict, ImportRowError]
+RowReader = Callable[[BinaryIO], Iterator[Tuple[int, Row]]]
+
+XLSX_AVAILABLE = importlib.util.find_spec("openpyxl") is not None
+
+CSV_DELIMITERS = (",", ";", "\t")
+
+
+def sniff_encoding(sample: bytes) -> str:
+    """BOM → utf-8-sig; geçerli UTF-8 → utf-8; aksi halde Windows-1254 (Türkçe Excel çıktısı)"""
+    if sample.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    try:
+        # final=False: örneğin sonunda yarım kalan çok baytlı karakter hata sayılmaz
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "cp1254"
+
+
+def sniff_delimiter(sample_text: str) -> str:
+    """Başlık satırında en çok geçen ayraç (Türkçe yerel ayarlı Excel ';' kullanır)"""
+    header = sample_text.lstrip("\ufeff").splitlines()[0] if sample_text else ""
+    return max(CSV_DELIMITERS, key=header.count) if any(d in header for d in CSV_DELIMITERS) else ","
+
+
+def iter_csv_rows(binary_file, encoding: Optional[str] = None) -> Iterator[Tuple[int, dict]]:
+    """
+    Yüklenen dosyayı satır satır okur (tamamı belleğe alınmaz).
+    encoding verilmezse dosyanın başından tespit edilir (UTF-8 / Windows-1254), ayraç da öyle.
+    Döner: (satır no, satır) — satır no başlıktan sonraki ilk satır için 1
+    """
+    start = binary_file.tell()
+    sample = binary_file.read(IMPORT_SNIFF_BYTES)
+    binary_file.seek(start)
+    encoding = encoding or sniff_encoding(sample)
+    delimiter = sniff_delimiter(sample.decode(encoding, errors="ignore"))
+
+    # newline="": tırnak içindeki satır sonları csv modülüne aynen gider
+    text = io.TextIOWrapper(binary_file, encoding=encoding, newline="")
+    try:
+        for i, row in enumerate(csv.DictReader(text, delimiter=delimiter), 1):
+            yield i, row
+    finally:
+        # Wrapper kapanırken yüklenen dosyayı da kapatmasın
+        text.detach()
+
+
+def _cell_text(value) -> str:
+    """XLSX hücresi → CSV'deki karşılığı (tarih ISO, tam sayı ondalıksız)"""
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.date().isoformat() if value.time() == datetime.min.time() else value.isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def iter_xlsx_rows(binary_file) -> Iterator[Tuple[int, dict]]:
+    """
+    İlk çalışma sayfasını openpyxl read-only modunda satır satır okur
+    (sayfa XML'i akışla ayrıştırılır; ilk dolu satır başlıktır).
+    """
+    if not XLSX_AVAILABLE:
+        raise RuntimeError("XLSX desteği için openpyxl kurulu değil")
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(binary_file, read_only=True, data_only=True)
+    try:
+        header = None
+        number = 0
+        for values in workbook.worksheets[0].iter_rows(values_only=True):
+            cells = [_cell_text(value) for value in values]
+            if not any(cells):
+                continue
+            if header is None:
+                header = cells
+                continue
+            number += 1
+            yield number, {name: cell for name, cell in zip(header, cells) if name}
+    finally:
+        workbook.close()
+
+
+def _json_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return [str(item) for item in value]
+    return value if isinstance(value, str) else str(value)
+
+
+def iter_ndjson_rows(binary_file) -> Iterator[Tuple[int, Row]]:
+    """Her satırı bir JSON nesnesi olan dosyayı (NDJSON / JSON Lines) satır satır okur"""
+    text = io.TextIOWrapper(binary_file, encoding="utf-8-sig")
+    try:
+        number = 0
+        for line in text:
+            if not line.strip():
+                continue
+            number += 1
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield number, ImportRowError(f"Geçersiz JSON: {str(e)[:50]}")
+                continue
+            if not isinstance(record, dict):
+                yield number, ImportRowError("Satır bir JSON nesnesi olmalı")
+                continue
+            yield number, {key: _json_value(value) for key, value in record.items()}
+    finally:
+        text.detach()
+
+
+IMPORT_READERS: Dict[str, RowReader] = {
+    "csv": iter_csv_rows,
+    "xlsx": iter_xlsx_rows,
+    "ndjson": iter_ndjson_rows,
+}
+
+IMPORT_EXTENSIONS = {
+    ".csv": "csv",
+    ".txt": "csv",
+    ".xlsx": "xlsx",
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+}
+
+
+def detect_format(filename: Optional[str]) -> Optional[str]:
+    """Dosya uzantısından import biçimi; tanınmıyorsa None"""
+    return IMPORT_EXTENSIONS.get(os.path.splitext(filename or "")[1].lower())
+
+
+# ============================================
+# VALIDATION
+# ============================================
+
+def _number(row: dict, field: str) -> float:
+    try:
+        return float(row[field])
+    except (TypeError, ValueError):
+        raise ImportRowError(f"Geçersiz sayı ({field}): {str(row[field])[:50]}")
+
+
+def _list(row: dict, field: str, separator: str) -> List[str]:
+    """CSV/XLSX'te ayraçlı metin, NDJSON'da liste olabilir"""
+    value = row.get(field)
+    if not value:
+        return []
+    return list(value) if isinstance(value, list) else value.split(separator)
+
+
+def _key_text(value) -> str:
+    return " ".join(str(value or "").split()).casefold()
+
+
+def natural_key(tour: dict) -> str:
+    """title + operator + start_date + price → sabit uzunlukta anahtar (boşluk/büyük harf farkı yok sayılır)"""
+    price = tour.get('price')
+    parts = [
+        _key_text(tour.get('title')),
+        _key_text(tour.get('operator')),
+        str(tour.get('start_date') or '')[:10],
+        f"{float(price):.2f}" if price not in (None, '') else '',
+    ]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()[:32]
+
+
+def content_hash(tour: dict) -> str:
+    """Tur içeriğinin hash'i; değişmeyen satırı yazmadan atlamak için"""
+    content = {field: tour.get(field) for field in CONTENT_FIELDS}
+    encoded = json.dumps(content, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:32]
+
+
+def build_import_index(tours: Iterable[dict]) -> ImportIndex:
+    """
+    Mevcut turlardan (id, title, operator, start_date, price, content_hash, operator_id,
+    import_key) yerel hash index. Aynı anahtarda birden fazla tur varsa import_key'i
+    bu anahtar olan tercih edilir (update'te unique index çakışması olmasın).
+    """
+    index: ImportIndex = {}
+    for tour in tours:
+        key = natural_key(tour)
+        if key not in index or tour.get('import_key') == key:
+            index[key] = IndexedTour(tour['id'], tour.get('content_hash'), tour['operator_id'])
+    return index
+
+
+def validate_row(row: dict, user: dict) -> dict:
+    """CSV satırını tours kaydına çevirir; eksik/bozuk alanda ImportRowError"""
+    missing_fields = [field for field in REQUIRED_FIELDS if not row.get(field)]
+    if missing_fields:
+        raise ImportRowError(f"Eksik alanlar: {', '.join(missing_fields)}")
+
+    tour = {
+        "operator_id": user["id"],
+        "title": row['title'],
+        "operator": row['operator'],
+        "price": _number(row, 'price'),
+        "currency": row['currency'],
+        "start_date": row.get('start_date') or '',
+        "end_date": row.get('end_date') or '',
+        "duration": row['duration'],
+        "hotel": row['hotel'],
+        "services": _list(row, 'services', ','),
+        "visa": row['visa'],
+        "transport": row.get('transport') or '',
+        "guide": row.get('guide') or '',
+        "itinerary": _list(row, 'itinerary', '|'),
+        "rating": _number(row, 'rating') if row.get('rating') else None,
+        "source": "csv_import",
+        "created_by": user["email"],
+        "status": "approved"
+    }
+    tour["content_hash"] = content_hash(tour)
+    return tour
+
+
+# ============================================
+# PERSISTENCE
+# ============================================
+
+class ImportResult:
+    """Sayaçlar + ilk IMPORT_MAX_ERROR_DETAILS hata (imported = inserted + updated)"""
+
+    def __init__(self):
+        self.processed = 0
+        self.imported = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.error_count = 0
+        self.chunks = 0
+        self.errors: List[dict] = []
+        self.stopped = False
+
+    def add_error(self, error: dict, rows: int = 1) -> None:
+        self.error_count += rows
+        if len(self.errors) < IMPORT_MAX_ERROR_DETAILS:
+            self.errors.append(error)
+
+    def to_dict(self) -> dict:
+        return {
+            "processed": self.processed,
+            "imported": self.imported,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "unchanged": self.unchanged,
+            "errors": self.error_count,
+            "chunks": self.chunks,
+        }
+
+
+class _Writer:
+    """
+    Bir parçayı yazar. insert modunda tek multi-row insert; upsert modunda parça önce
+    index'e göre ayrılır: yeni turlar import_key üzerinden, değişenler id üzerinden
+    birer multi-row upsert ile yazılır.
+    """
+
+    def __init__(
+        self,
+        insert_rows: InsertRows,
+        result: ImportResult,
+        mode: str = "insert",
+        upsert_rows: Optional[UpsertRows] = None,
+        load_index: Optional[LoadIndex] = None,
+    ):
+        self.mode = mode
+        self.insert_rows = insert_rows
+        self.upsert_rows = upsert_rows
+        self.load_index = load_index
+        self.result = result
+        self.index: ImportIndex = {}
+        self.loaded_operators: Set[str] = set()
+
+    async def _split(self, chunk: List[Tuple[int, dict]]) -> Tuple[List[dict], List[dict]]:
+        """Parçayı (yeni turlar, güncellenecek turlar) olarak ayırır; tekrarlar ve değişmeyenler sayılıp atlanır"""
+        result = self.result
+        operators = {doc["operator"] for _, doc in chunk} - self.loaded_operators
+        if operators:
+            self.index.update(await self.load_index(sorted(operators)))
+            self.loaded_operators |= operators
+
+        # Bu parçada görülen anahtarlar → content_hash (aynı satır tek upsert'te iki kez olamaz)
+        seen: Dict[str, str] = {}
+        inserts, updates = [], []
+        for row_number, doc in chunk:
+            key = natural_key(doc)
+            if key in seen:
+                if seen[key] == doc["content_hash"]:
+                    result.unchanged += 1
+                else:
+                    result.add_error({"row": row_number, "error": "Aynı tur dosyada farklı içerikle tekrar ediyor"})
+                continue
+            seen[key] = doc["content_hash"]
+
+            existing = self.index.get(key)
+            if existing is None:
+                inserts.append({**doc, "import_key": key})
+            elif existing.content_hash == doc["content_hash"]:
+                result.unchanged += 1
+            else:
+                update = {field: value for field, value in doc.items() if field not in UPDATE_EXCLUDED_FIELDS}
+                # operator_id NOT NULL: upsert'ün insert kısmı için mevcut değer gönderilir (değişmez)
+                updates.append({"id": existing.id, "operator_id": existing.operator_id, "import_key": key, **update})
+        return inserts, updates
+
+    async def write(self, chunk: List[Tuple[int, dict]]) -> None:
+        result = self.result
+        result.chunks += 1
+        if self.mode == "upsert":
+            inserts, updates = await self._split(chunk)
+        else:
+            inserts, updates = [doc for _, doc in chunk], []
+        try:
+            if inserts:
+                if self.mode == "upsert":
+                    # Önceki parçada (veya yarıda kalan işte) yazılmış tur atlanır
+                    await self.upsert_rows("tours", inserts, "import_key", ignore_duplicates=True)
+                else:
+                    await self.insert_rows("tours", inserts)
+                result.inserted += len(inserts)
+                result.imported += len(inserts)
+                inserts = []
+            if updates:
+                await self.upsert_rows("tours", updates, "id")
+                result.updated += len(updates)
+                result.imported += len(updates)
+        except Exception as e:
+            # Yazılamayan kısım parçanın satır aralığına atfedilir
+            result.add_error({
+                "chunk": result.chunks,
+                "rows": [chunk[0][0], chunk[-1][0]],
+                "error": str(e)[:200],
+            }, rows=len(inserts) + len(updates))
+
+
+async def _iterate(rows: Union[Iterable[Tuple[int, Row]], AsyncIterable[Tuple[int, Row]]]) -> AsyncIterator[Tuple[int, Row]]:
+    if hasattr(rows, "__aiter__"):
+        async for item in rows:
+            yield item
+    else:
+        for item in rows:
+            yield item
+
+
+async def import_tours(
+    rows: Union[Iterable[Tuple[int, Row]], AsyncIterable[Tuple[int, Row]]],
+    user: dict,
+    insert_rows: InsertRows,
+    batch_size: int = IMPORT_BATCH_SIZE,
+    result: Optional[ImportResult] = None,
+    on_chunk: Optional[OnChunk] = None,
+    mode: str = "insert",
+    load_index: Optional[LoadIndex] = None,
+    upsert_rows: Optional[UpsertRows] = None,
+) -> ImportResult:
+    """
+    Satırları doğrular ve batch_size'lık multi-row insert'lerle yazar.
+    rows senkron ya da async iterable olabilir (arka plan işi okuyucuyu thread'de çalıştırır).
+    result verilirse sayaçlar oradan devam eder (kaldığı yerden devam eden iş).
+    mode="upsert": load_index (operatör adları → ImportIndex, bkz. build_import_index)
+    ve upsert_rows gerekir.
+    """
+    if mode not in IMPORT_MODES:
+        raise ValueError(f"Geçersiz import modu: {mode}")
+    if mode == "upsert" and (load_index is None or upsert_rows is None):
+        raise ValueError("upsert modu için load_index ve upsert_rows gerekli")
+
+    result = result or ImportResult()
+    writer = _Writer(insert_rows, result, mode, upsert_rows, load_index)
+    chunk: List[Tuple[int, dict]] = []
+
+    async for row_number, row in _iterate(rows):
+        result.processed += 1
+        try:
+            if isinstance(row, ImportRowError):
+                raise row
+            doc = validate_row(row, user)
+        except ImportRowError as e:
+            result.add_error({"row": row_number, "error": str(e)})
+            continue
+
+        chunk.append((row_number, doc))
+        if len(chunk) >= batch_size:
+            await writer.write(chunk)
+            chunk = []
+            if on_chunk and not await on_chunk(result):
+                result.stopped = True
+                return result
+
+    if chunk:
+        await writer.write(chunk)
+    return result
@@ -0,0 +1,201 @@
+"""
+Write-behind queue — yanıt yolundaki "ateşle ve unut" insert'leri için
+
+AI çağrısından sonra yazılan comparisons / chats kayıtları ve audit, admin log,
+kullanıcı bildirimi insert'leri yanıtı bekletmek yerine süreç içi sınırlı bir
+kuyruğa alınır. server.py lifespan'ındaki task kuyruğu toplu (multi-row) insert'lerle
+boşaltır:
+
+- Toplama: ilk satır geldikten sonra en fazla WRITE_BEHIND_FLUSH_INTERVAL saniye
+  veya WRITE_BEHIND_BATCH_SIZE satır beklenir; satırlar tablo başına tek insert'e gider
+- Hata: toplu insert başarısız olursa satırlar tek tek denenir; yine yazılamayan
+  satır "lost write" sayılır ve loglanır
+- Backpressure: kuyruk doluysa (WRITE_BEHIND_MAX_QUEUE) satır çağıranın içinde
+  doğrudan yazılır — yazma kaybolmaz, sadece o istek eski gecikmeyi öder
+- Kapanış: stop() kuyruğu WRITE_BEHIND_DRAIN_TIMEOUT içinde boşaltır; kalan satırlar
+  lost write sayılır
+
+Flush task'ı çalışmıyorsa (testler, script'ler) submit() satırı doğrudan yazar.
+"""
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from security import log_security_event
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "true").lower() == "true"
+WRITE_BEHIND_MAX_QUEUE = int(os.getenv("WRITE_BEHIND_MAX_QUEUE", "10000"))
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "200"))
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", "0.5"))
+WRITE_BEHIND_DRAIN_TIMEOUT = float(os.getenv("WRITE_BEHIND_DRAIN_TIMEOUT", "10"))
+COLLECT_POLL_INTERVAL = 0.02
+
+# (tablo, satırlar) → tek multi-row insert
+InsertRows = Callable[[str, List[dict]], Awaitable[None]]
+
+
+class WriteBehindQueue:
+    """Sınırlı, süreç içi write-behind kuyruğu (tek flush task'ı)"""
+
+    def __init__(
+        self,
+        insert_rows: InsertRows,
+        maxsize: int = WRITE_BEHIND_MAX_QUEUE,
+        batch_size: int = WRITE_BEHIND_BATCH_SIZE,
+        flush_interval: float = WRITE_BEHIND_FLUSH_INTERVAL,
+        enabled: bool = WRITE_BEHIND_ENABLED,
+    ):
+        self._insert_rows = insert_rows
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enabled = enabled
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._pending: List[Tuple[str, dict]] = []
+        self._flushing = False
+        self._closing = False
+        self.stats = {
+            "enqueued": 0,
+            "written": 0,
+            "batches": 0,
+            "direct_writes": 0,     # task yokken / devre dışıyken doğrudan yazılan
+            "backpressure": 0,      # kuyruk dolu olduğu için doğrudan yazılan
+            "batch_failures": 0,    # tek tek denemeye düşen toplu insert'ler
+            "lost_writes": 0,
+            "max_depth": 0,
+            "last_flush_ms": 0.0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "depth": self.depth(), "capacity": self.maxsize, "running": self.running}
+
+    # ---------- producer ----------
+
+    async def submit(self, table: str, row: dict) -> None:
+        """Satırı kuyruğa alır; kuyruk yoksa veya doluysa doğrudan yazar"""
+        if not (self.enabled and self.running):
+            self.stats["direct_writes"] += 1
+            await self._write_direct(table, row)
+            return
+        try:
+            self._queue.put_nowait((table, row))
+        except asyncio.QueueFull:
+            self.stats["backpressure"] += 1
+            await self._write_direct(table, row)
+            return
+        self.stats["enqueued"] += 1
+        self.stats["max_depth"] = max(self.stats["max_depth"], self._queue.qsize())
+
+    async def _write_direct(self, table: str, row: dict) -> None:
+        try:
+            await self._insert_rows(table, [row])
+            self.stats["written"] += 1
+        except Exception as e:
+            self._record_lost(table, 1, e)
+
+    # ---------- consumer ----------
+
+    def start(self) -> None:
+        """Flush task'ını başlatır (lifespan startup)"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._pending = []
+        self._flushing = False
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = WRITE_BEHIND_DRAIN_TIMEOUT) -> None:
+        """Kuyruğu boşaltır ve task'ı durdurur (lifespan shutdown)"""
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        self._closing = True
+        # Yazmakta olan batch yarıda kesilmez; task flush bitince kendisi çıkar
+        if not self._flushing:
+            task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        try:
+            await asyncio.wait_for(self._drain(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        remaining = len(self._pending) + self._queue.qsize()
+        if remaining:
+            self.stats["lost_writes"] += remaining
+            log_security_event("WRITE_BEHIND_DRAIN_TIMEOUT", {"lost_writes": remaining}, "ERROR")
+        self._queue = None
+
+    async def _run(self) -> None:
+        while not self._closing:
+            await self._collect()
+            self._flushing = True
+            try:
+                await self._flush(self._take_pending())
+            finally:
+                self._flushing = False
+
+    async def _collect(self) -> None:
+        """İlk satırı bekler, sonra flush_interval dolana veya batch_size'a ulaşana kadar toplar"""
+        self._pending.append(await self._queue.get())
+        deadline = time.monotonic() + self.flush_interval
+        # wait_for(queue.get()) zaman aşımıyla yarışırsa satır kaybolabilir; kısa aralıklarla bakılır
+        while len(self._pending) < self.batch_size:
+            try:
+                self._pending.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(min(remaining, COLLECT_POLL_INTERVAL))
+
+    def _take_pending(self) -> List[Tuple[str, dict]]:
+        batch, self._pending = self._pending, []
+        return batch
+
+    async def _drain(self) -> None:
+        """Toplanmış ama yazılmamış satırlar + kuyrukta kalanlar"""
+        while self._pending or not self._queue.empty():
+            while not self._queue.empty() and len(self._pending) < self.batch_size:
+                self._pending.append(self._queue.get_nowait())
+            await self._flush(self._take_pending())
+
+    async def _flush(self, batch: List[Tuple[str, dict]]) -> None:
+        started = time.perf_counter()
+        by_table: Dict[str, List[dict]] = {}
+        for table, row in batch:
+            by_table.setdefault(table, []).append(row)
+
+        for table, rows in by_table.items():
+            try:
+                await self._insert_rows(table, rows)
+                self.stats["written"] += len(rows)
+                self.stats["batches"] += 1
+            except Exception as e:
+                # Tek bir bozuk satır tüm batch'i düşürmesin
+                self.stats["batch_failures"] += 1
+                log_security_event("WRITE_BEHIND_BATCH_ERROR", {"table": table, "rows": len(rows), "error": str(e)[:200]}, "WARN")
+                for row in rows:
+                    await self._write_direct(table, row)
+        self.stats["last_flush_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+    def _record_lost(self, table: str, count: int, error: Exception) -> None:
+        self.stats["lost_writes"] += count
+        log_security_event("WRITE_BEHIND_LOST_WRITE", {"table": table, "rows": count, "error": str(error)[:200]}, "ERROR")
@@ -36,6 +36,14 @@ describe('API Client Configuration', () => {
         expect(api.adminApi.getSettings).toBeInstanceOf(Function);
     });
 
+    it('should export import job API methods', async () => {
+        const api = await import('./api');
+        expect(api.importApi).toBeDefined();
+        expect(api.importApi.uploadCSV).toBeInstanceOf(Function);
+        expect(api.importApi.getJob).toBeInstanceOf(Function);
+        expect(api.importApi.cancelJob).toBeInstanceOf(Function);
+    });
+
     it('should export token management functions', async () => {
         const api = await import('./api');
         expect(api.setAuthToken).toBeInstanceOf(Function);
@@ -1,5 +1,5 @@
 import axios from 'axios';
-import type { Tour, ComparisonResult, AIProvider } from './types';
+import type { Tour, ComparisonResult, AIProvider, ImportJob, ImportMode } from './types';
 
 const API_URL = import.meta.env.VITE_BACKEND_URL || import.meta.env.REACT_APP_BACKEND_URL || '';
 
@@ -180,18 +180,29 @@ export const aiApi = {
   },
 };
 
-// Import API
+// Import API — yükleme iş id'siyle döner (202); satırlar arka planda işlenir
 export const importApi = {
-  uploadCSV: async (file: File) => {
+  uploadCSV: async (file: File, mode: ImportMode = 'insert') => {
     const formData = new FormData();
     formData.append('file', file);
-    const response = await api.post('/api/import/csv', formData, {
+    const response = await api.post<ImportJob>('/api/import/csv', formData, {
+      params: { mode },
       headers: {
         'Content-Type': 'multipart/form-data',
       },
     });
     return response.data;
   },
+  // İşin durumu ve ilerlemesi
+  getJob: async (jobId: number) => {
+    const response = await api.get<ImportJob>(`/api/import/jobs/${jobId}`);
+    return response.data;
+  },
+  // Bekleyen/çalışan işi iptal et (yazılmış parçalar kalır)
+  cancelJob: async (jobId: number) => {
+    const response = await api.post<ImportJob>(`/api/import/jobs/${jobId}/cancel`);
+    return response.data;
+  },
 };
 
 // Operator API
@@ -1,20 +1,59 @@
-import React, { useState } from 'react';
+import React, { useEffect, useState } from 'react';
 import { importApi } from '../../api';
 import { useSEO } from '../../hooks/useSEO';
+import type { ImportJob, ImportJobError, ImportMode } from '../../types';
+
+// Import arka planda çalışır; iş bitene kadar durumu bu aralıkla sorgulanır
+const POLL_INTERVAL_MS = 2000;
+const FINAL_STATUSES = ['completed', 'failed', 'cancelled'];
+
+const STATUS_LABELS: Record<string, string> = {
+  pending: 'Sırada',
+  running: 'İşleniyor',
+  completed: 'Tamamlandı',
+  failed: 'Başarısız',
+  cancelled: 'İptal edildi',
+};
+
+const isFinal = (job: ImportJob | null) => !!job && FINAL_STATUSES.includes(job.status);
+
+const describeError = (err: ImportJobError) => {
+  if (err.row !== undefined) return `Satır ${err.row}: ${err.error}`;
+  if (err.rows) return `Satır ${err.rows[0]}-${err.rows[1]}: ${err.error}`;
+  return err.error;
+};
 
 export default function AdminImport() {
   const [file, setFile] = useState<File | null>(null);
+  const [mode, setMode] = useState<ImportMode>('insert');
   const [loading, setLoading] = useState(false);
-  const [result, setResult] = useState<any>(null);
+  const [cancelling, setCancelling] = useState(false);
+  const [job, setJob] = useState<ImportJob | null>(null);
   const [error, setError] = useState('');
 
   // SEO: noindex - admin import sayfası indexlenmemeli
   useSEO({ title: 'CSV Import', noIndex: true });
 
+  // İş bitene kadar GET /api/import/jobs/{job_id} ile ilerlemeyi takip et
+  useEffect(() => {
+    if (!job || isFinal(job)) return;
+    const timer = setTimeout(async () => {
+      try {
+        setJob(await importApi.getJob(job.job_id));
+        setError('');
+      } catch (err: any) {
+        setError(err.response?.data?.detail || 'İş durumu alınamadı, tekrar deneniyor...');
+        // Geçici hatada sorgulamaya devam et
+        setJob({ ...job });
+      }
+    }, POLL_INTERVAL_MS);
+    return () => clearTimeout(timer);
+  }, [job]);
+
   const handleFileChange = (e: React.ChangeEvent<HTMLInputElement>) => {
     if (e.target.files && e.target.files[0]) {
       setFile(e.target.files[0]);
-      setResult(null);
+      setJob(null);
       setError('');
     }
   };
@@ -27,11 +66,11 @@ export default function AdminImport() {
 
     setLoading(true);
     setError('');
-    setResult(null);
+    setJob(null);
 
     try {
-      const data = await importApi.uploadCSV(file);
-      setResult(data);
+      const data = await importApi.uploadCSV(file, mode);
+      setJob(data);
     } catch (err: any) {
       setError(err.response?.data?.detail || 'Yükleme başarısız');
     } finally {
@@ -39,11 +78,25 @@ export default function AdminImport() {
     }
   };
 
+  const handleCancel = async () => {
+    if (!job) return;
+    setCancelling(true);
+    try {
+      setJob(await importApi.cancelJob(job.job_id));
+    } catch (err: any) {
+      setError(err.response?.data?.detail || 'İş iptal edilemedi');
+    } finally {
+      setCancelling(false);
+    }
+  };
+
+  const running = !!job && !isFinal(job);
+
   return (
     <div className="admin-import-page" data-testid="admin-import-page">
       <div style={{ marginBottom: '2rem' }}>
         <h1>CSV Import</h1>
-        <p style={{ color: 'var(--neutral-gray-500)' }}>Toplu tur yüklemesi için CSV dosyası yükleyin</p>
+        <p style={{ color: 'var(--neutral-gray-500)' }}>Toplu tur yüklemesi için CSV, Excel (.xlsx) veya NDJSON dosyası yükleyin</p>
       </div>
 
       {/* CSV Format Info */}
@@ -64,17 +117,38 @@ export default function AdminImport() {
         <div className="alert alert-error" data-testid="import-error">{error}</div>
       )}
 
-      {result && (
-        <div className="alert alert-success" data-testid="import-result">
-          <p><strong>Başarılı:</strong> {result.imported} tur import edildi</p>
-          {result.errors > 0 && (
+      {job && (
+        <div
+          className={`alert ${job.status === 'failed' ? 'alert-error' : running ? 'alert-info' : 'alert-success'}`}
+          data-testid="import-result"
+        >
+          <p>
+            <strong>{STATUS_LABELS[job.status] || job.status}:</strong> {job.filename}
+            {running && ` — ${job.processed} satır işlendi`}
+          </p>
+          <p style={{ marginTop: '0.5rem' }} data-testid="import-progress">
+            {job.imported} tur import edildi
+            {job.mode === 'upsert' && ` (${job.inserted} yeni, ${job.updated} güncellendi, ${job.unchanged} değişmedi)`}
+          </p>
+          {running && (
+            <button
+              onClick={handleCancel}
+              className="btn btn-secondary"
+              style={{ marginTop: '0.5rem' }}
+              disabled={cancelling}
+              data-testid="cancel-import-btn"
+            >
+              {cancelling ? 'İptal ediliyor...' : 'İptal Et'}
+            </button>
+          )}
+          {job.errors > 0 && (
             <div style={{ marginTop: '0.5rem' }}>
-              <p><strong>Hatalar:</strong> {result.errors} satırda hata</p>
-              {result.error_details && result.error_details.length > 0 && (
+              <p><strong>Hatalar:</strong> {job.errors} satırda hata</p>
+              {job.error_details && job.error_details.length > 0 && (
                 <ul style={{ marginTop: '0.5rem', paddingLeft: '1.5rem' }}>
-                  {result.error_details.map((err: any, idx: number) => (
+                  {job.error_details.map((err, idx) => (
                     <li key={idx} style={{ fontSize: '0.875rem' }}>
-                      Satır {err.row}: {err.error}
+                      {describeError(err)}
                     </li>
                   ))}
                 </ul>
@@ -90,7 +164,7 @@ export default function AdminImport() {
         <div className="form-group">
           <input
             type="file"
-            accept=".csv"
+            accept=".csv,.txt,.xlsx,.ndjson,.jsonl"
             onChange={handleFileChange}
             className="form-input"
             data-testid="csv-file-input"
@@ -101,13 +175,24 @@ export default function AdminImport() {
             </p>
           )}
         </div>
+        <div className="form-group">
+          <label style={{ fontSize: '0.875rem' }}>
+            <input
+              type="checkbox"
+              checked={mode === 'upsert'}
+              onChange={(e) => setMode(e.target.checked ? 'upsert' : 'insert')}
+              data-testid="import-upsert-checkbox"
+            />{' '}
+            Mevcut turları güncelle (aynı tur tekrar eklenmez)
+          </label>
+        </div>
         <button
           onClick={handleUpload}
           className="btn btn-primary"
-          disabled={!file || loading}
+          disabled={!file || loading || running}
           data-testid="upload-csv-btn"
         >
-          {loading ? 'Yükleniyor...' : 'CSV Yükle'}
+          {loading ? 'Yükleniyor...' : running ? 'İşleniyor...' : 'CSV Yükle'}
         </button>
       </div>
 
@@ -128,3 +128,33 @@ export interface TicketAttachment {
   created_at: string;
 }
 
+
+// Tour Import Job Types (POST /api/import/csv → GET /api/import/jobs/{job_id})
+export type ImportJobStatus = 'pending' | 'running' | 'completed' | 'failed' | 'cancelled';
+export type ImportMode = 'insert' | 'upsert';
+
+export interface ImportJobError {
+  row?: number;
+  chunk?: number;
+  rows?: [number, number];
+  error: string;
+}
+
+export interface ImportJob {
+  job_id: number;
+  filename: string;
+  format: 'csv' | 'xlsx' | 'ndjson';
+  mode: ImportMode;
+  status: ImportJobStatus;
+  processed: number;
+  imported: number;
+  inserted: number;
+  updated: number;
+  unchanged: number;
+  errors: number;
+  error_details: ImportJobError[];
+  created_at?: string;
+  started_at?: string | null;
+  finished_at?: string | null;
+  message?: string;
+}
@@ -0,0 +1,130 @@
+"""
+Auth Route Tests - Hac & Umre Platform
+Supabase Auth is replaced by a stub; PostgREST by an in-process httpx transport.
+Run with: pytest tests/test_auth_routes.py -v
+"""
+import pytest
+import sys
+import os
+import json
+import asyncio
+from types import SimpleNamespace
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+os.environ.setdefault("SUPABASE_URL", "https://test.supabase.co")
+os.environ.setdefault("SUPABASE_ANON_KEY", "test-anon")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test-service")
+
+import httpx
+from fastapi import FastAPI
+
+PROFILE = {"id": "user-1", "email": "haci@example.com", "user_role": "operator", "company_name": "Hira Turizm", "status": "active"}
+
+
+class FakeAuth:
+    """supabase.auth yerine: verilen şifreyle giriş başarılı"""
+
+    def __init__(self, password="Doğru-Şifre1"):
+        self.password = password
+
+    def sign_in_with_password(self, credentials):
+        if credentials["password"] != self.password:
+            return SimpleNamespace(user=None, session=None)
+        return SimpleNamespace(
+            user=SimpleNamespace(id=PROFILE["id"], email="haci@example.com"),
+            session=SimpleNamespace(access_token="access-123", refresh_token="refresh-456"),
+        )
+
+
+def _postgrest(request: httpx.Request) -> httpx.Response:
+    rows = [PROFILE] if request.url.path.endswith("/users") else []
+    return httpx.Response(200, headers={"content-type": "application/json"}, content=json.dumps(rows).encode())
+
+
+def _login(password: str):
+    """POST /api/auth/login; (yanıt, session için saklanan CSRF token'ı) döner"""
+    import dependencies
+    from routes import auth_routes
+    from security import limiter, state
+
+    app = FastAPI()
+    app.state.limiter = limiter
+    app.include_router(auth_routes.router)
+
+    async def run():
+        dependencies.db.transport = httpx.MockTransport(_postgrest)
+        await dependencies.db.aclose()
+        original = auth_routes.supabase
+        auth_routes.supabase = SimpleNamespace(auth=FakeAuth())
+        try:
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                response = await client.post(
+                    "/api/auth/login", json={"email": "haci@example.com", "password": password}
+                )
+            return response, await state.get(f"csrf:{PROFILE['id']}")
+        finally:
+            auth_routes.supabase = original
+            await dependencies.db.aclose()
+            dependencies.db.transport = None
+
+    return asyncio.run(run())
+
+
+class TestLogin:
+    """POST /api/auth/login"""
+
+    def test_successful_login_returns_stored_csrf_token(self):
+        response, stored = _login("Doğru-Şifre1")
+
+        assert response.status_code == 200, response.text
+        body = response.json()
+        assert isinstance(body["csrf_token"], str) and body["csrf_token"]
+        assert body["csrf_token"] == stored
+        assert body["token"] == "access-123"
+        assert body["user"]["role"] == "operator"
+        assert "access_token=access-123" in response.headers["set-cookie"]
+
+    def test_wrong_password_is_401(self):
+        response, _ = _login("yanlış")
+        assert response.status_code == 401
+
+
+class TestJwtVerification:
+    """dependencies.check_jwt_secret / verify_supabase_jwt"""
+
+    def test_placeholder_or_short_secret_rejected(self):
+        from dependencies import check_jwt_secret
+        with pytest.raises(RuntimeError):
+            check_jwt_secret("your-jwt-secret")
+        with pytest.raises(RuntimeError):
+            check_jwt_secret("kısa-secret")
+        assert check_jwt_secret("") == ""
+        assert check_jwt_secret("x" * 40) == "x" * 40
+
+    def test_jwks_key_fetched_off_the_event_loop(self, monkeypatch):
+        pytest.importorskip("cryptography")
+        import threading
+        import jwt
+        from cryptography.hazmat.primitives.asymmetric import rsa
+        import dependencies
+
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        token = jwt.encode({"sub": PROFILE["id"], "aud": "authenticated"}, private_key, algorithm="RS256")
+        threads = []
+
+        class FakeJwksClient:
+            def get_signing_key_from_jwt(self, _token):
+                threads.append(threading.current_thread())
+                return SimpleNamespace(key=private_key.public_key())
+
+        monkeypatch.setattr(dependencies, "SUPABASE_JWKS_URL", "https://test.supabase.co/auth/v1/.well-known/jwks.json")
+        monkeypatch.setattr(dependencies, "_get_jwks_client", lambda: FakeJwksClient())
+
+        async def verify():
+            return await dependencies.verify_supabase_jwt(token), threading.current_thread()
+
+        claims, loop_thread = asyncio.run(verify())
+        assert claims["sub"] == PROFILE["id"]
+        assert threads and threads[0] is not loop_thread
@@ -0,0 +1,181 @@
+"""
+Cache Layer Tests - Hac & Umre Platform
+Run with: pytest tests/test_cache.py -v
+"""
+import pytest
+import sys
+import os
+import time
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+
+class TestAuthTokenCache:
+    """Verified JWT cache (get_current_user hot path)"""
+
+    def setup_method(self):
+        from cache import auth_token_cache
+        auth_token_cache.clear()
+
+    def test_cache_hit_returns_profile(self):
+        """Cached token should be served without re-verification"""
+        from cache import cache_auth, get_cached_auth, cache_stats
+
+        profile = {"id": "user-1", "user_role": "user"}
+        assert cache_auth("token-a", {"sub": "user-1", "exp": time.time() + 60}, profile)
+
+        hits_before = cache_stats["auth_cache_hits"]
+        entry = get_cached_auth("token-a")
+
+        assert entry["profile"] == profile
+        assert cache_stats["auth_cache_hits"] == hits_before + 1
+
+    def test_expired_token_is_evicted(self):
+        """Entries must not outlive the token's exp claim"""
+        from cache import cache_auth, get_cached_auth, auth_token_cache, get_auth_cache_key
+
+        cache_auth("token-b", {"sub": "user-1", "exp": time.time() + 60}, {"id": "user-1"})
+        auth_token_cache[get_auth_cache_key("token-b")]["exp"] = time.time() - 1
+
+        assert get_cached_auth("token-b") is None
+        assert get_auth_cache_key("token-b") not in auth_token_cache
+
+    def test_already_expired_token_not_cached(self):
+        """Tokens past exp should never enter the cache"""
+        from cache import cache_auth
+
+        assert cache_auth("token-c", {"sub": "user-1", "exp": time.time() - 5}, {"id": "user-1"}) is False
+
+    def test_invalidate_user_removes_all_sessions(self):
+        """Suspension should evict every cached token of the user"""
+        from cache import cache_auth, get_cached_auth, invalidate_auth_user
+
+        exp = time.time() + 60
+        cache_auth("token-d", {"sub": "user-1", "exp": exp}, {"id": "user-1"})
+        cache_auth("token-e", {"sub": "user-1", "exp": exp}, {"id": "user-1"})
+        cache_auth("token-f", {"sub": "user-2", "exp": exp}, {"id": "user-2"})
+
+        assert invalidate_auth_user("user-1") == 2
+        assert get_cached_auth("token-d") is None
+        assert get_cached_auth("token-f") is not None
+
+    def test_stats_report_auth_counters(self):
+        """get_cache_stats should expose auth hit/miss counters"""
+        from cache import get_cache_stats, get_cached_auth
+
+        get_cached_auth("unknown-token")
+        stats = get_cache_stats()
+
+        assert "auth_cache_hits" in stats
+        assert stats["auth_cache_misses"] >= 1
+        assert "auth_hit_rate" in stats
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
+
+
+class TestGetOrCompute:
+    """Stale-while-revalidate + single-flight (cache.get_or_compute)"""
+
+    def setup_method(self):
+        from cache import memory_cache
+        memory_cache.clear()
+
+    def test_concurrent_misses_coalesce(self):
+        """Concurrent misses on one key run the producer once"""
+        import asyncio
+        from cache import get_or_compute, cache_stats
+
+        calls = []
+
+        async def producer():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "value"
+
+        async def run():
+            return await asyncio.gather(*(get_or_compute("k-coalesce", producer, ttl=60) for _ in range(10)))
+
+        waits_before = cache_stats["coalesced_waits"]
+        results = asyncio.run(run())
+
+        assert results == ["value"] * 10
+        assert len(calls) == 1
+        assert cache_stats["coalesced_waits"] - waits_before == 9
+
+    def test_stale_value_served_while_refreshing(self):
+        """Expired-but-stale entries return immediately and refresh in background"""
+        import asyncio
+        from cache import get_or_compute, cache_stats
+
+        versions = iter(["v1", "v2"])
+
+        async def producer():
+            return next(versions)
+
+        async def run():
+            first = await get_or_compute("k-stale", producer, ttl=0, stale_ttl=60)
+            stale = await get_or_compute("k-stale", producer, ttl=0, stale_ttl=60)
+            await asyncio.sleep(0.01)  # let the refresh task finish
+            return first, stale
+
+        stale_before = cache_stats["stale_serves"]
+        first, stale = asyncio.run(run())
+
+        assert (first, stale) == ("v1", "v1")
+        assert cache_stats["stale_serves"] - stale_before == 1
+
+        from cache import memory_cache
+        assert '"v2"' in memory_cache["k-stale"]
+
+    def test_none_and_errors_not_cached(self):
+        import asyncio
+        from cache import get_or_compute
+
+        calls = []
+
+        async def missing():
+            calls.append(1)
+            return None
+
+        async def failing():
+            raise RuntimeError("boom")
+
+        assert asyncio.run(get_or_compute("k-none", missing)) is None
+        assert asyncio.run(get_or_compute("k-none", missing)) is None
+        assert len(calls) == 2
+
+        with pytest.raises(RuntimeError):
+            asyncio.run(get_or_compute("k-err", failing))
+        assert asyncio.run(get_or_compute("k-err", missing)) is None
+
+    def test_redis_lock_shared_across_replicas(self, monkeypatch):
+        """A replica that loses the Redis lock waits for the owner's value"""
+        fakeredis = pytest.importorskip("fakeredis")
+        import asyncio
+        import cache
+
+        server = fakeredis.FakeServer()
+        monkeypatch.setattr(cache, "REDIS_AVAILABLE", True)
+        monkeypatch.setattr(cache, "COMPUTE_LOCK_TIMEOUT", 2)
+
+        calls = []
+
+        async def producer():
+            calls.append(1)
+            await asyncio.sleep(0.1)
+            return "shared"
+
+        async def run():
+            monkeypatch.setattr(cache, "redis_client", fakeredis.FakeAsyncRedis(server=server, decode_responses=True))
+            owner = asyncio.ensure_future(cache.get_or_compute("k-lock", producer, ttl=60))
+            await asyncio.sleep(0.02)
+            # Simulate a second replica: same Redis, empty in-process flight table
+            cache._inflight.pop("k-lock", None)
+            peer = await cache.get_or_compute("k-lock", producer, ttl=60)
+            return await owner, peer
+
+        assert asyncio.run(run()) == ("shared", "shared")
+        assert len(calls) == 1
@@ -0,0 +1,529 @@
+"""
+Import Job Tests - Hac & Umre Platform
+Background CSV import jobs: submit, chunked progress, resume, cancel and release.
+PostgREST (import_jobs + tours) is replaced by an in-process httpx transport.
+Run with: pytest tests/test_import_jobs.py -v
+"""
+import pytest
+import sys
+import os
+import io
+import csv
+import json
+import asyncio
+import threading
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import httpx
+from fastapi import FastAPI
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+os.environ.setdefault("SUPABASE_URL", "https://test.supabase.co")
+os.environ.setdefault("SUPABASE_ANON_KEY", "test-anon")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test-service")
+
+USER = {"id": "admin-1", "email": "admin@example.com", "role": "admin"}
+FIELDS = ["title", "operator", "price", "currency", "duration", "hotel", "visa", "start_date"]
+
+
+def _csv(count: int, invalid=()) -> bytes:
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=FIELDS)
+    writer.writeheader()
+    for i in range(1, count + 1):
+        writer.writerow({
+            "title": f"Umre Turu {i}", "operator": "Operatör A", "price": str(1000 + i),
+            "currency": "" if i in invalid else "USD", "duration": "15 gün", "hotel": "Hilton",
+            "visa": "Dahil", "start_date": "2026-03-01",
+        })
+    return out.getvalue().encode("utf-8")
+
+
+def _ago(seconds: float) -> str:
+    return (datetime.now(timezone.utc) - timedelta(seconds=seconds)).isoformat()
+
+
+class FakePostgrest:
+    """eq / gt / in / is.null filtreleri; import_jobs insert/update, tours insert/upsert/select"""
+
+    def __init__(self):
+        self.jobs = {}
+        self.next_id = 1
+        self.tours = {}
+        self.tour_inserts = []
+        self.tour_upserts = []
+        self.tour_selects = 0
+        self.job_updates = []
+        self.on_tour_insert = None
+        self.stale_reads = None
+
+    @staticmethod
+    def _matches(row: dict, params) -> bool:
+        for column, condition in params.multi_items():
+            if column in ("select", "order", "limit", "offset", "columns"):
+                continue
+            op, _, value = condition.partition(".")
+            current = row.get(column)
+            if op == "eq" and str(current) != value:
+                return False
+            if op == "gt" and not current > int(value):
+                return False
+            if op == "in" and str(current) not in [v.strip('"') for v in value.strip("()").split(",")]:
+                return False
+            if op == "is" and value == "null" and current is not None:
+                return False
+        return True
+
+    def add_job(self, **values) -> dict:
+        job = {
+            "id": self.next_id, "user_id": USER["id"], "created_by": USER["email"],
+            "filename": "katalog.csv", "status": "pending", "processed": 0, "imported_count": 0,
+            "error_count": 0, "errors": [], "worker_id": None, "heartbeat_at": None,
+            "started_at": None, "finished_at": None, "created_at": _ago(0),
+        }
+        job.update(values)
+        self.jobs[job["id"]] = job
+        self.next_id += 1
+        return job
+
+    def _json(self, data, status=200, headers=None) -> httpx.Response:
+        headers = {"content-type": "application/json", **(headers or {})}
+        return httpx.Response(status, headers=headers, content=json.dumps(data).encode())
+
+    async def _tours(self, request: httpx.Request, body) -> httpx.Response:
+        if request.method == "GET":
+            self.tour_selects += 1
+            matched = [t for _, t in sorted(self.tours.items()) if self._matches(t, request.url.params)]
+            page = matched[:int(request.url.params.get("limit", len(matched)))]
+            return self._json(page, headers={"content-range": f"0-{len(page)}/{len(matched)}"})
+        on_conflict = request.url.params.get("on_conflict")
+        if on_conflict == "id":
+            self.tour_upserts.append(body)
+            for row in body:
+                self.tours[row["id"]].update(row)
+            return self._json([], 201)
+        self.tour_inserts.append(body)
+        keys = {t.get("import_key") for t in self.tours.values()}
+        for row in body:
+            if on_conflict == "import_key" and row["import_key"] in keys:
+                continue
+            tour_id = len(self.tours) + 1
+            self.tours[tour_id] = {"id": tour_id, **row}
+        if self.on_tour_insert:
+            await self.on_tour_insert(len(self.tour_inserts))
+        return self._json([], 201)
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        table = request.url.path.rsplit("/", 1)[-1]
+        body = json.loads(request.content) if request.content else None
+
+        if table == "tours":
+            return await self._tours(request, body)
+
+        if request.method == "POST":
+            return self._json([self.add_job(**body)], 201)
+
+        matched = sorted(
+            (job for job in self.jobs.values() if self._matches(job, request.url.params)),
+            key=lambda job: job["id"],
+        )
+        if request.method == "GET" and self.stale_reads is not None:
+            return self._json(self.stale_reads)
+        if request.method == "PATCH":
+            self.job_updates.append(body)
+            for job in matched:
+                job.update(body)
+        return self._json(matched)
+
+
+@pytest.fixture
+def fake_db(tmp_path):
+    import dependencies
+    from import_jobs import ImportJobRunner, LocalImportFileStore
+
+    fake = FakePostgrest()
+    imported_calls = []
+
+    async def on_imported():
+        imported_calls.append(True)
+
+    runner = ImportJobRunner(
+        dependencies.db, LocalImportFileStore(str(tmp_path)), dependencies.insert_rows,
+        upsert_rows=dependencies.upsert_rows, on_imported=on_imported, worker_id="pod-a", batch_size=500, stale_seconds=120,
+    )
+    fake.runner = runner
+    fake.store_dir = tmp_path
+    fake.imported_calls = imported_calls
+    return fake
+
+
+def _run(fake, coro_factory):
+    import dependencies
+
+    async def run():
+        dependencies.db.transport = httpx.MockTransport(fake.handler)
+        await dependencies.db.aclose()
+        try:
+            return await coro_factory()
+        finally:
+            await dependencies.db.aclose()
+            dependencies.db.transport = None
+
+    return asyncio.run(run())
+
+
+async def _stage(fake, data: bytes, **values) -> dict:
+    """Dosyayı depoya koyup iş satırını doğrudan ekler (route'suz)"""
+    key = f"imports/test-{fake.next_id}.csv"
+    await fake.runner.store.save(key, io.BytesIO(data))
+    return fake.add_job(file_path=key, **values)
+
+
+def _api(fake):
+    import dependencies
+    from routes import tour_routes
+
+    app = FastAPI()
+    app.include_router(tour_routes.router)
+    app.dependency_overrides[dependencies.require_admin] = lambda: USER
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+class TestImportJobRoutes:
+    """POST /api/import/csv, GET /api/import/jobs/{id}, POST .../cancel"""
+
+    def test_submit_returns_job_and_worker_processes_it(self, fake_db, monkeypatch):
+        from routes import tour_routes
+        monkeypatch.setattr(tour_routes, "import_job_runner", fake_db.runner)
+
+        async def scenario():
+            async with _api(fake_db) as client:
+                accepted = await client.post(
+                    "/api/import/csv", files={"file": ("katalog.csv", _csv(1101, invalid={1101}), "text/csv")}
+                )
+                # Yanıt dönerken hiçbir tur yazılmamış olmalı
+                inserts_at_submit = len(fake_db.tour_inserts)
+                job_id = await fake_db.runner.run_once()
+                status = await client.get(f"/api/import/jobs/{job_id}")
+                return accepted, inserts_at_submit, status
+
+        accepted, inserts_at_submit, status = _run(fake_db, scenario)
+
+        assert accepted.status_code == 202
+        assert accepted.json()["status"] == "pending"
+        assert accepted.json()["filename"] == "katalog.csv"
+        assert inserts_at_submit == 0
+
+        body = status.json()
+        assert body["job_id"] == accepted.json()["job_id"]
+        assert (body["status"], body["processed"], body["imported"], body["errors"]) == ("completed", 1101, 1100, 1)
+        assert body["error_details"] == [{"row": 1101, "error": "Eksik alanlar: currency"}]
+        assert [len(rows) for rows in fake_db.tour_inserts] == [500, 500, 100]
+        assert fake_db.imported_calls == [True]
+        assert list(fake_db.store_dir.iterdir()) == []
+
+    def test_unknown_job_is_404(self, fake_db, monkeypatch):
+        from routes import tour_routes
+        monkeypatch.setattr(tour_routes, "import_job_runner", fake_db.runner)
+
+        async def scenario():
+            async with _api(fake_db) as client:
+                return await client.get("/api/import/jobs/99"), await client.post("/api/import/jobs/99/cancel")
+
+        missing, cancel_missing = _run(fake_db, scenario)
+        assert missing.status_code == 404
+        assert cancel_missing.status_code == 404
+
+    def test_cancel_pending_and_finished_jobs(self, fake_db, monkeypatch):
+        from routes import tour_routes
+        monkeypatch.setattr(tour_routes, "import_job_runner", fake_db.runner)
+
+        async def scenario():
+            pending = await _stage(fake_db, _csv(10))
+            finished = await _stage(fake_db, _csv(10), status="completed")
+            async with _api(fake_db) as client:
+                cancelled = await client.post(f"/api/import/jobs/{pending['id']}/cancel")
+                conflict = await client.post(f"/api/import/jobs/{finished['id']}/cancel")
+            claimed = await fake_db.runner.run_once()
+            return cancelled, conflict, claimed
+
+        cancelled, conflict, claimed = _run(fake_db, scenario)
+        assert cancelled.status_code == 200 and cancelled.json()["status"] == "cancelled"
+        assert conflict.status_code == 409
+        # İptal edilen işin dosyası silinir, worker'a iş kalmaz
+        assert claimed is None
+        assert fake_db.tour_inserts == []
+        assert [p.name for p in fake_db.store_dir.iterdir()] == ["imports_test-2.csv"]
+
+
+    def test_upsert_reupload_is_idempotent(self, fake_db, monkeypatch):
+        from routes import tour_routes
+        monkeypatch.setattr(tour_routes, "import_job_runner", fake_db.runner)
+
+        async def upload(client, data):
+            accepted = await client.post(
+                "/api/import/csv?mode=upsert", files={"file": ("katalog.csv", data, "text/csv")}
+            )
+            job_id = await fake_db.runner.run_once()
+            return accepted, (await client.get(f"/api/import/jobs/{job_id}")).json()
+
+        async def scenario():
+            async with _api(fake_db) as client:
+                first = await upload(client, _csv(600))
+                second = await upload(client, _csv(600))
+                changed = _csv(601).replace(b"Umre Turu 7,Operat\xc3\xb6r A,1007,USD,15 g\xc3\xbcn,Hilton",
+                                            b"Umre Turu 7,Operat\xc3\xb6r A,1007,USD,12 g\xc3\xbcn,Hilton")
+                third = await upload(client, changed)
+                invalid = await client.post("/api/import/csv?mode=merge", files={"file": ("k.csv", b"", "text/csv")})
+            return first, second, third, invalid
+
+        first, second, third, invalid = _run(fake_db, scenario)
+
+        assert first[0].status_code == 202 and first[0].json()["mode"] == "upsert"
+        assert (first[1]["inserted"], first[1]["updated"], first[1]["unchanged"]) == (600, 0, 0)
+        assert (second[1]["inserted"], second[1]["updated"], second[1]["unchanged"]) == (0, 0, 600)
+        assert (third[1]["inserted"], third[1]["updated"], third[1]["unchanged"]) == (1, 1, 599)
+        assert len(fake_db.tours) == 601
+        assert fake_db.tours[7]["duration"] == "12 gün"
+        # Her iş için index tek sorguda yüklendi
+        assert fake_db.tour_selects == 3
+        assert [len(rows) for rows in fake_db.tour_upserts] == [1]
+        assert invalid.status_code == 400
+
+    def test_upsert_matches_tours_of_other_admins(self, fake_db, monkeypatch):
+        from routes import tour_routes
+        from tour_import import validate_row
+        monkeypatch.setattr(tour_routes, "import_job_runner", fake_db.runner)
+        row = next(csv.DictReader(io.StringIO(_csv(1).decode("utf-8"))))
+        tour = validate_row({**row, "hotel": "Swissotel"}, {"id": "admin-2", "email": "other@example.com"})
+        fake_db.tours[1] = {"id": 1, **tour, "status": "pending", "content_hash": None}
+
+        async def scenario():
+            async with _api(fake_db) as client:
+                await client.post("/api/import/csv?mode=upsert", files={"file": ("katalog.csv", _csv(2), "text/csv")})
+                job_id = await fake_db.runner.run_once()
+                return (await client.get(f"/api/import/jobs/{job_id}")).json()
+
+        job = _run(fake_db, scenario)
+
+        assert (job["inserted"], job["updated"]) == (1, 1)
+        assert len(fake_db.tours) == 2
+        assert fake_db.tours[1]["hotel"] == "Hilton"
+        assert (fake_db.tours[1]["status"], fake_db.tours[1]["operator_id"]) == ("pending", "admin-2")
+        assert fake_db.tours[2]["operator_id"] == USER["id"]
+
+
+    def test_format_picked_from_extension(self, fake_db, monkeypatch):
+        from routes import tour_routes
+        monkeypatch.setattr(tour_routes, "import_job_runner", fake_db.runner)
+        reader = csv.DictReader(io.StringIO(_csv(3).decode("utf-8")))
+        ndjson = "\n".join(json.dumps(row, ensure_ascii=False) for row in reader).encode("utf-8")
+
+        async def scenario():
+            async with _api(fake_db) as client:
+                accepted = await client.post("/api/import/csv", files={"file": ("katalog.jsonl", ndjson, "application/json")})
+                job_id = await fake_db.runner.run_once()
+                status = await client.get(f"/api/import/jobs/{job_id}")
+                rejected = await client.post("/api/import/csv", files={"file": ("katalog.xls", b"x", "application/octet-stream")})
+            return accepted, status, rejected
+
+        accepted, status, rejected = _run(fake_db, scenario)
+        assert accepted.json()["format"] == "ndjson"
+        assert fake_db.jobs[1]["file_path"].endswith(".ndjson")
+        assert (status.json()["status"], status.json()["imported"]) == ("completed", 3)
+        assert rejected.status_code == 400
+        assert len(fake_db.jobs) == 1
+
+
+class TestImportJobRunner:
+    """import_jobs.ImportJobRunner"""
+
+    def test_progress_checkpointed_after_each_chunk(self, fake_db):
+        async def scenario():
+            await _stage(fake_db, _csv(1200))
+            return await fake_db.runner.run_once()
+
+        _run(fake_db, scenario)
+        checkpoints = [u["processed"] for u in fake_db.job_updates if "heartbeat_at" in u and "processed" in u]
+        assert checkpoints == [500, 1000]
+        final = fake_db.jobs[1]
+        assert (final["status"], final["processed"], final["imported_count"]) == ("completed", 1200, 1200)
+        assert final["worker_id"] == "pod-a" and final["finished_at"]
+
+    def test_cancel_mid_run_stops_at_chunk_boundary(self, fake_db):
+        async def cancel_after_first_chunk(inserts):
+            if inserts == 1:
+                await fake_db.runner.cancel(1)
+
+        fake_db.on_tour_insert = cancel_after_first_chunk
+
+        async def scenario():
+            await _stage(fake_db, _csv(1200))
+            return await fake_db.runner.run_once()
+
+        _run(fake_db, scenario)
+        job = fake_db.jobs[1]
+        assert len(fake_db.tour_inserts) == 1
+        assert (job["status"], job["processed"], job["imported_count"]) == ("cancelled", 500, 500)
+        assert fake_db.runner.stats["cancelled"] == 1
+        assert list(fake_db.store_dir.iterdir()) == []
+
+    def test_cancel_during_last_partial_chunk_still_cleans_up(self, fake_db):
+        """Son parçadan sonra checkpoint yok: sayaçlar iptal satırına yazılır, dosya silinir"""
+        async def cancel_during_last_chunk(inserts):
+            if inserts == 3:
+                await fake_db.runner.cancel(1)
+
+        fake_db.on_tour_insert = cancel_during_last_chunk
+
+        async def scenario():
+            await _stage(fake_db, _csv(1200))
+            return await fake_db.runner.run_once()
+
+        _run(fake_db, scenario)
+        job = fake_db.jobs[1]
+        assert (job["status"], job["processed"], job["imported_count"]) == ("cancelled", 1200, 1200)
+        assert (fake_db.runner.stats["cancelled"], fake_db.runner.stats["completed"]) == (1, 0)
+        assert fake_db.imported_calls
+        assert list(fake_db.store_dir.iterdir()) == []
+
+    def test_reader_runs_off_the_event_loop(self, fake_db, monkeypatch):
+        from tour_import import IMPORT_READERS
+
+        loop_thread = threading.get_ident()
+        reader_threads = set()
+        csv_reader = IMPORT_READERS["csv"]
+
+        def recording_reader(file):
+            for item in csv_reader(file):
+                reader_threads.add(threading.get_ident())
+                yield item
+
+        monkeypatch.setitem(IMPORT_READERS, "csv", recording_reader)
+
+        async def scenario():
+            await _stage(fake_db, _csv(1200))
+            return await fake_db.runner.run_once()
+
+        _run(fake_db, scenario)
+        assert fake_db.jobs[1]["imported_count"] == 1200
+        assert reader_threads and loop_thread not in reader_threads
+
+    def test_stale_job_resumed_by_another_worker(self, fake_db):
+        async def scenario():
+            # pod-b 500 satırı yazdıktan sonra öldü
+            await _stage(
+                fake_db, _csv(1200), status="running", worker_id="pod-b", heartbeat_at=_ago(600),
+                started_at=_ago(900), processed=500, imported_count=500,
+            )
+            return await fake_db.runner.run_once()
+
+        assert _run(fake_db, scenario) == 1
+        job = fake_db.jobs[1]
+        assert [len(rows) for rows in fake_db.tour_inserts] == [500, 200]
+        assert fake_db.tour_inserts[0][0]["title"] == "Umre Turu 501"
+        assert (job["status"], job["processed"], job["imported_count"]) == ("completed", 1200, 1200)
+        assert job["worker_id"] == "pod-a"
+
+    def test_live_job_of_another_worker_not_claimed(self, fake_db):
+        async def scenario():
+            await _stage(fake_db, _csv(10), status="running", worker_id="pod-b", heartbeat_at=_ago(5))
+            return await fake_db.runner.run_once()
+
+        assert _run(fake_db, scenario) is None
+        assert fake_db.jobs[1]["worker_id"] == "pod-b"
+        assert fake_db.tour_inserts == []
+
+    def test_claim_is_compare_and_set(self, fake_db):
+        from import_jobs import ImportJobRunner
+
+        async def scenario():
+            await _stage(fake_db, _csv(10))
+            other = ImportJobRunner(fake_db.runner.db, fake_db.runner.store, fake_db.runner._insert_rows,
+                                    worker_id="pod-b")
+            # İki worker aynı anda "pending" satırı okudu; yalnızca biri alabilir
+            fake_db.stale_reads = [dict(fake_db.jobs[1])]
+            first = await fake_db.runner._claim()
+            second = await other._claim()
+            return first, second
+
+        first, second = _run(fake_db, scenario)
+        assert first["worker_id"] == "pod-a"
+        assert second is None
+        assert fake_db.jobs[1]["worker_id"] == "pod-a"
+
+    def test_stop_releases_job_at_chunk_boundary(self, fake_db):
+        async def stop_after_first_chunk(inserts):
+            if inserts == 1:
+                fake_db.runner._stopping = True
+
+        fake_db.on_tour_insert = stop_after_first_chunk
+
+        async def scenario():
+            await _stage(fake_db, _csv(1200))
+            return await fake_db.runner.run_once()
+
+        _run(fake_db, scenario)
+        job = fake_db.jobs[1]
+        assert (job["status"], job["worker_id"], job["heartbeat_at"]) == ("pending", None, None)
+        assert (job["processed"], job["imported_count"]) == (500, 500)
+        assert fake_db.runner.stats["released"] == 1
+        # Dosya devam için depoda kalır
+        assert len(list(fake_db.store_dir.iterdir())) == 1
+
+    def test_failed_job_marked_failed(self, fake_db):
+        async def scenario():
+            fake_db.add_job(file_path="imports/missing.csv")
+            return await fake_db.runner.run_once()
+
+        _run(fake_db, scenario)
+        job = fake_db.jobs[1]
+        assert job["status"] == "failed"
+        assert "İş yarıda kaldı" in job["errors"][-1]["error"]
+
+
+class FakeBucket:
+    def __init__(self):
+        self.signed = []
+
+    def create_signed_url(self, key, expires_in):
+        self.signed.append((key, expires_in))
+        return {"signedURL": f"https://storage.test/object/sign/imports/{key}?token=t"}
+
+
+class TestSupabaseFileStore:
+    """import_jobs.SupabaseImportFileStore"""
+
+    def _store(self, handler):
+        from import_jobs import SupabaseImportFileStore
+        bucket = FakeBucket()
+        client = SimpleNamespace(storage=SimpleNamespace(from_=lambda name: bucket))
+        store = SupabaseImportFileStore(client, "imports", http_client=httpx.Client(transport=httpx.MockTransport(handler)))
+        return store, bucket
+
+    def test_download_streamed_into_spool(self):
+        data = _csv(20000)
+        chunks = []
+
+        def body():
+            for i in range(0, len(data), 8192):
+                chunks.append(i)
+                yield data[i:i + 8192]
+
+        store, bucket = self._store(lambda request: httpx.Response(200, content=body()))
+        spool = asyncio.run(store.open("imports/abc.csv"))
+
+        assert bucket.signed[0][0] == "imports/abc.csv"
+        assert len(chunks) > 1
+        assert spool.read() == data
+        # 1 MB'ı aşan dosya bellekte değil diskte
+        assert len(data) > 1024 * 1024 and spool._rolled
+        spool.close()
+
+    def test_download_error_raised(self):
+        store, _ = self._store(lambda request: httpx.Response(404, content=b"not found"))
+        with pytest.raises(httpx.HTTPStatusError):
+            asyncio.run(store.open("imports/missing.csv"))
@@ -0,0 +1,109 @@
+"""
+Knowledge Base Retrieval Tests - Hac & Umre Platform
+Run with: pytest tests/test_knowledge_base.py -v
+"""
+import pytest
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+os.environ.setdefault("SUPABASE_URL", "https://test.supabase.co")
+os.environ.setdefault("SUPABASE_ANON_KEY", "test-anon")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test-service")
+
+
+class TestTurkishStemming:
+    """stem / tokenize"""
+
+    @pytest.mark.parametrize("word,expected", [
+        ("umrenin", "umr"),
+        ("umre", "umr"),
+        ("haccin", "hac"),
+        ("vacipleri", "vacip"),
+        ("mezhebine", "mezhep"),
+        ("rukunleri", "farz"),
+    ])
+    def test_stem(self, word, expected):
+        from knowledge_base import stem
+        assert stem(word) == expected
+
+    def test_apostrophe_suffix_and_stop_words(self):
+        from knowledge_base import tokenize
+        assert tokenize("Şafii'de umre farz mı?") == ["saf", "umr", "farz"]
+
+
+class TestSectionSplit:
+    """split_sections"""
+
+    def test_subsections_carry_parent_title(self):
+        from knowledge_base import split_sections
+
+        text = "## A\nmetin a\n\n## B\n\n### B1\nmetin b1\n\n### B2\nmetin b2\n\n---\n"
+        sections = split_sections(text)
+
+        assert [s["title"] for s in sections] == ["A", "B › B1", "B › B2"]
+        assert sections[1]["body"] == "## B\n### B1\nmetin b1"
+        assert sections[2]["body"].endswith("metin b2")
+
+    def test_chat_knowledge_base_sections(self):
+        from ai_service import CHAT_KNOWLEDGE_BASE, CHAT_KNOWLEDGE_INDEX
+
+        assert len(CHAT_KNOWLEDGE_INDEX) == 32
+        for section in CHAT_KNOWLEDGE_INDEX.sections:
+            assert section["body"].splitlines()[-1] in CHAT_KNOWLEDGE_BASE
+
+
+class TestBM25Retrieval:
+    """CHAT_KNOWLEDGE_INDEX.search"""
+
+    @pytest.mark.parametrize("question,title", [
+        ("Hanefi mezhebine göre haccın farzları nelerdir?", "HANEFİ MEZHEBİNE GÖRE HAC › HAC'CIN FARZLARI (3 Farz):"),
+        ("Şafii'de umre farz mı?", "UMRE BİLGİLERİ (DÖRT MEZHEBE GÖRE) › ŞAFİİ'DE UMRE:"),
+        ("Türkiye'den gidenler için mikat neresi?", "MİKAT MAHALLERİ:"),
+        ("Temettu haccı nedir?", "HAC TÜRLERİ:"),
+        ("Telbiye duası videosu", "🎬 VİDEOLU ANLATIM KAYNAKLARI › DUA VE ZİKİR VİDEOLARI:"),
+    ])
+    def test_relevant_section_retrieved(self, question, title):
+        from ai_service import CHAT_KNOWLEDGE_INDEX
+
+        titles = [s["title"] for s in CHAT_KNOWLEDGE_INDEX.search(question, 4)]
+        assert title in titles
+
+    def test_results_in_knowledge_base_order(self):
+        from ai_service import CHAT_KNOWLEDGE_INDEX
+
+        sections = CHAT_KNOWLEDGE_INDEX.search("ihram yasakları ve mikat", 4)
+        positions = [CHAT_KNOWLEDGE_INDEX.sections.index(s) for s in sections]
+        assert positions == sorted(positions)
+
+    def test_no_match_returns_empty(self):
+        from ai_service import CHAT_KNOWLEDGE_INDEX
+        assert CHAT_KNOWLEDGE_INDEX.search("merhaba", 4) == []
+
+
+class TestChatSystemPrompt:
+    """build_chat_system_prompt"""
+
+    def test_rules_always_included(self):
+        from ai_service import build_chat_system_prompt, CHAT_SYSTEM_PROMPT_HEADER, CHAT_SYSTEM_PROMPT_FOOTER
+
+        for question in ("İhram yasakları nelerdir?", "merhaba"):
+            prompt = build_chat_system_prompt(question)
+            assert prompt.startswith(CHAT_SYSTEM_PROMPT_HEADER)
+            assert prompt.endswith(CHAT_SYSTEM_PROMPT_FOOTER)
+
+    def test_prompt_is_slimmer_and_relevant(self):
+        from ai_service import build_chat_system_prompt, CHAT_SYSTEM_PROMPT
+
+        prompt = build_chat_system_prompt("İhram yasakları nelerdir?")
+        assert "Dikişli elbise giymek" in prompt
+        assert "Zülhuleyfe" not in prompt
+        assert len(prompt) < len(CHAT_SYSTEM_PROMPT) / 2
+
+    def test_retrieval_disabled_sends_full_prompt(self, monkeypatch):
+        import ai_service
+
+        monkeypatch.setattr(ai_service, "CHAT_KB_RETRIEVAL_ENABLED", False)
+        assert ai_service.build_chat_system_prompt("İhram yasakları nelerdir?") == ai_service.CHAT_SYSTEM_PROMPT
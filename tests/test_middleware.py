@@ -0,0 +1,189 @@
+"""
+Middleware Tests - Hac & Umre Platform
+Pure ASGI middleware chain (WAF, timeout, signing, security headers, logging)
+exercised through an in-process httpx ASGI client.
+Run with: pytest tests/test_middleware.py -v
+"""
+import pytest
+import sys
+import os
+import json
+import asyncio
+import hashlib
+import logging
+import time
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+os.environ.setdefault("SUPABASE_URL", "https://test.supabase.co")
+os.environ.setdefault("SUPABASE_ANON_KEY", "test-anon")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test-service")
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+def _app(*middlewares):
+    """Küçük bir uygulama; middleware'ler içten dışa sırayla eklenir"""
+    app = FastAPI()
+
+    @app.get("/api/ping")
+    async def ping():
+        return {"ok": True}
+
+    @app.post("/api/favorites")
+    async def favorites(body: dict):
+        return {"received": body}
+
+    @app.get("/api/slow")
+    async def slow():
+        await asyncio.sleep(0.5)
+        return {"ok": True}
+
+    @app.get("/api/chat/stream")
+    async def stream():
+        async def chunks():
+            for i in range(3):
+                await asyncio.sleep(0.03)
+                yield f"data: {i}\n\n"
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    for middleware in middlewares:
+        app.add_middleware(middleware)
+    return app
+
+
+def _request(app, method, path, **kwargs):
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.request(method, path, **kwargs)
+    return asyncio.run(run())
+
+
+def _signed_headers(signing, path, body: bytes, nonce: str):
+    timestamp = str(int(time.time()))
+    body_hash = hashlib.sha256(body).hexdigest()
+    return {
+        "X-Timestamp": timestamp,
+        "X-Nonce": nonce,
+        "X-Signature": signing.compute_signature("POST", path, timestamp, nonce, body_hash, "test-secret"),
+        "content-type": "application/json",
+    }
+
+
+class TestSecurityHeadersMiddleware:
+    """SecurityHeadersMiddleware"""
+
+    def test_headers_added_and_override_existing(self):
+        from security import SecurityHeadersMiddleware, SECURITY_HEADERS
+
+        app = _app(SecurityHeadersMiddleware)
+
+        @app.get("/api/framed")
+        async def framed():
+            return JSONResponse({"ok": True}, headers={"X-Frame-Options": "SAMEORIGIN"})
+
+        response = _request(app, "GET", "/api/framed")
+        for name, value in SECURITY_HEADERS.items():
+            assert response.headers[name] == value
+        assert response.headers.get_list("X-Frame-Options") == ["DENY"]
+        assert response.json() == {"ok": True}
+
+
+class TestRequestSignatureMiddleware:
+    """RequestSignatureMiddleware"""
+
+    @pytest.fixture(autouse=True)
+    def _secret(self, monkeypatch):
+        import signing
+        from state_backend import MemoryStateBackend
+        monkeypatch.setattr(signing, "API_SIGNING_SECRET", "test-secret")
+        monkeypatch.setattr(signing, "state", MemoryStateBackend())
+
+    def test_missing_signature_is_401_json(self):
+        import signing
+
+        response = _request(_app(signing.RequestSignatureMiddleware), "POST", "/api/favorites", json={"tour_id": 1})
+        assert response.status_code == 401
+        assert "X-Signature" in response.json()["detail"]
+
+    def test_valid_signature_passes_body_through(self):
+        import signing
+
+        body = json.dumps({"tour_id": 7}).encode()
+        headers = _signed_headers(signing, "/api/favorites", body, "n-valid")
+        response = _request(_app(signing.RequestSignatureMiddleware), "POST", "/api/favorites", content=body, headers=headers)
+        assert response.status_code == 200
+        assert response.json() == {"received": {"tour_id": 7}}
+
+    def test_tampered_body_and_stale_timestamp_rejected(self):
+        import signing
+
+        app = _app(signing.RequestSignatureMiddleware)
+        headers = _signed_headers(signing, "/api/favorites", b'{"tour_id": 7}', "n-tampered")
+        tampered = _request(app, "POST", "/api/favorites", content=b'{"tour_id": 8}', headers=headers)
+        assert tampered.status_code == 401
+        assert tampered.json()["detail"] == "Geçersiz istek imzası"
+
+        stale = _signed_headers(signing, "/api/favorites", b"", "n-stale")
+        stale["X-Timestamp"] = str(int(time.time()) - 3600)
+        assert _request(app, "POST", "/api/favorites", headers=stale).status_code == 401
+
+    def test_exempt_get_skips_check(self):
+        import signing
+
+        assert _request(_app(signing.RequestSignatureMiddleware), "GET", "/api/tours/1").status_code == 404
+
+
+class TestTimeoutAndWAF:
+    """server.TimeoutMiddleware / server.WAFMiddleware"""
+
+    def test_slow_request_gets_504(self, monkeypatch):
+        import server
+
+        monkeypatch.setattr(server, "REQUEST_TIMEOUT", 0.05)
+        response = _request(_app(server.TimeoutMiddleware), "GET", "/api/slow")
+        assert response.status_code == 504
+        assert response.json()["detail"].startswith("İstek zaman aşımına")
+
+    def test_started_stream_not_cut_by_timeout(self, monkeypatch):
+        import server
+
+        monkeypatch.setattr(server, "AI_REQUEST_TIMEOUT", 0.05)
+        response = _request(_app(server.TimeoutMiddleware), "GET", "/api/chat/stream")
+        assert response.status_code == 200
+        assert response.text == "data: 0\n\ndata: 1\n\ndata: 2\n\n"
+
+    def test_waf_blocks_exploit_paths(self):
+        import server
+
+        app = _app(server.WAFMiddleware)
+        assert _request(app, "GET", "/.env").status_code == 403
+        assert _request(app, "GET", "/WP-ADMIN/setup.php").json() == {"detail": "Access Denied"}
+        assert _request(app, "GET", "/api/ping").status_code == 200
+
+
+class TestRequestLoggingMiddleware:
+    """RequestLoggingMiddleware"""
+
+    def test_logs_status_and_user(self, caplog):
+        from logging_config import RequestLoggingMiddleware
+
+        app = _app(RequestLoggingMiddleware)
+
+        @app.get("/api/me")
+        async def me(request: Request):
+            request.state.user_id = "user-9"
+            return {"ok": True}
+
+        with caplog.at_level(logging.INFO, logger="hac-umre-api"):
+            _request(app, "GET", "/api/me")
+            _request(app, "GET", "/api/missing")
+            _request(app, "GET", "/health")
+
+        messages = [r.getMessage() for r in caplog.records]
+        assert any(m.startswith("GET /api/me 200 ") and m.endswith("user=user-9") for m in messages)
+        assert any(m.startswith("GET /api/missing 404 ") and m.endswith("user=anon") for m in messages)
+        assert not any("/health" in m for m in messages)
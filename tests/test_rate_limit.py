@@ -0,0 +1,131 @@
+"""
+Rate Limit Property Tests - Hac & Umre Platform
+Token bucket invariants over random request timings (hypothesis); memory and
+Redis (fakeredis) backends must make the same decisions.
+Run with: pytest tests/test_rate_limit.py -v
+"""
+import pytest
+import sys
+import os
+import asyncio
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+os.environ.setdefault("SUPABASE_URL", "https://test.supabase.co")
+os.environ.setdefault("SUPABASE_ANON_KEY", "test-anon")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test-service")
+
+pytest.importorskip("hypothesis")
+from hypothesis import example, given, settings, strategies as st
+
+LIMITS = st.integers(min_value=1, max_value=20)
+WINDOWS = st.sampled_from([1.0, 60.0, 3600.0])
+# İstekler arası süre (pencerenin katı olarak); 0 = aynı anda gelen burst
+GAPS = st.lists(st.sampled_from([0.0, 0.0, 0.001, 0.01, 0.05, 0.1, 0.5, 1.0]), min_size=1, max_size=60)
+
+
+def _timeline(gaps, window, start=1_000_000.0):
+    now, times = start, []
+    for gap in gaps:
+        now += gap * window
+        times.append(now)
+    return times
+
+
+def _run_bucket(backend, key, limit, window, times):
+    async def run():
+        return [await backend.token_bucket(key, limit, window, now=t) for t in times]
+    return asyncio.run(run())
+
+
+class TestTokenBucketProperties:
+    """MemoryStateBackend.token_bucket"""
+
+    @given(limit=LIMITS, window=WINDOWS, gaps=GAPS)
+    def test_allowed_never_exceeds_burst_plus_refill(self, limit, window, gaps):
+        from state_backend import MemoryStateBackend
+
+        times = _timeline(gaps, window)
+        results = _run_bucket(MemoryStateBackend(), "rate:p", limit, window, times)
+        allowed_at = [t for t, r in zip(times, results) if r.allowed]
+        rate = limit / window
+        # Herhangi bir [t_i, t_j] aralığında izin verilen istek ≤ kova + o sürede dolan token
+        for i, start in enumerate(allowed_at):
+            for j in range(i, len(allowed_at)):
+                assert j - i + 1 <= limit + (allowed_at[j] - start) * rate + 1e-6
+
+    @given(limit=LIMITS, window=WINDOWS, count=st.integers(min_value=1, max_value=60))
+    def test_steady_client_at_rate_never_denied(self, limit, window, count):
+        from state_backend import MemoryStateBackend
+
+        interval = window / limit
+        times = [1_000_000.0 + i * interval for i in range(count)]
+        results = _run_bucket(MemoryStateBackend(), "rate:steady", limit, window, times)
+        assert all(r.allowed for r in results)
+
+    @given(limit=LIMITS, window=WINDOWS, gaps=GAPS)
+    # Tam zamanında gelen 5. istek (0, 0, 6, 9, 15 sn): 0.9999999… token yüzünden reddedilmemeli
+    @example(limit=4, window=60.0, gaps=[0.0, 0.0, 0.1, 0.05, 0.1])
+    def test_result_fields_within_bounds(self, limit, window, gaps):
+        from state_backend import MemoryStateBackend
+
+        results = _run_bucket(MemoryStateBackend(), "rate:b", limit, window, _timeline(gaps, window))
+        for r in results:
+            assert r.limit == limit
+            assert 0 <= r.remaining <= limit - 1
+            assert 0.0 <= r.reset_after <= window + 1e-9
+            if r.allowed:
+                assert r.retry_after == 0.0
+            else:
+                assert r.remaining == 0
+                assert 0.0 < r.retry_after <= window / limit + 1e-9
+
+    @given(limit=LIMITS, window=WINDOWS, gaps=GAPS)
+    def test_state_is_constant_size_per_key(self, limit, window, gaps):
+        from state_backend import MemoryStateBackend
+
+        backend = MemoryStateBackend()
+        _run_bucket(backend, "rate:o1", limit, window, _timeline(gaps, window))
+        # İstek sayısından bağımsız: tek anahtar, (token, son zaman)
+        assert list(backend._values.keys()) == ["rate:o1"]
+        assert len(backend._values["rate:o1"][0]) == 2
+
+
+class TestBackendsAgree:
+    """Memory ve Redis (Lua) aynı kararı verir"""
+
+    @settings(max_examples=40, deadline=None)
+    @given(limit=LIMITS, window=WINDOWS, gaps=GAPS)
+    @example(limit=4, window=60.0, gaps=[0.0, 0.0, 0.1, 0.05, 0.1])
+    def test_memory_and_redis_decisions_match(self, limit, window, gaps):
+        fakeredis = pytest.importorskip("fakeredis")
+        pytest.importorskip("lupa")
+        from state_backend import MemoryStateBackend, RedisStateBackend
+
+        times = _timeline(gaps, window)
+        redis_backend = RedisStateBackend(fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer(), decode_responses=True))
+        memory = _run_bucket(MemoryStateBackend(), "rate:eq", limit, window, times)
+        redis = _run_bucket(redis_backend, "rate:eq", limit, window, times)
+        assert [(r.allowed, r.remaining) for r in redis] == [(r.allowed, r.remaining) for r in memory]
+        assert [r.retry_after for r in redis] == pytest.approx([r.retry_after for r in memory])
+        if gaps == [0.0, 0.0, 0.1, 0.05, 0.1]:
+            assert all(r.allowed for r in redis)
+
+    def test_redis_bucket_is_one_hash_with_ttl(self):
+        fakeredis = pytest.importorskip("fakeredis")
+        pytest.importorskip("lupa")
+        from state_backend import RedisStateBackend
+
+        client = fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer(), decode_responses=True)
+        backend = RedisStateBackend(client, prefix="t:")
+
+        async def run():
+            for i in range(50):
+                await backend.token_bucket("rate:h", 10, 60, now=5000.0 + i * 0.1)
+            return await client.keys("*"), await client.hgetall("t:rate:h"), await client.pttl("t:rate:h")
+
+        keys, fields, ttl = asyncio.run(run())
+        assert keys == ["t:rate:h"]
+        assert set(fields) == {"t", "ts"}
+        assert 0 < ttl <= 60_000
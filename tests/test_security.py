@@ -80,33 +80,137 @@ class TestSecurityRateLimit:
     
     def test_brute_force_protection_blocks_after_5_attempts(self):
         """User should be blocked after 5 failed login attempts"""
-        from security import failed_login_attempts, record_failed_login, check_brute_force, blocked_ips
-        import time
+        import asyncio
+        from security import record_failed_login, check_brute_force, state
         
         test_ip = "192.168.1.100"
         
-        # Clear any existing state
-        if test_ip in failed_login_attempts:
-            del failed_login_attempts[test_ip]
-        if test_ip in blocked_ips:
-            del blocked_ips[test_ip]
-        
-        # Simulate 5 failed attempts
-        for i in range(5):
-            record_failed_login(test_ip)
-        
-        # 6th attempt should raise exception
-        from fastapi import HTTPException
-        with pytest.raises(HTTPException) as exc_info:
-            check_brute_force(test_ip)
-        
-        assert exc_info.value.status_code == 429
-        
-        # Cleanup
-        if test_ip in failed_login_attempts:
-            del failed_login_attempts[test_ip]
-        if test_ip in blocked_ips:
-            del blocked_ips[test_ip]
+        async def run():
+            # Clear any existing state
+            await state.delete(f"bf:fail:{test_ip}")
+            await state.delete(f"bf:block:{test_ip}")
+            
+            # Simulate 5 failed attempts
+            for i in range(4):
+                await record_failed_login(test_ip)
+            assert await check_brute_force(test_ip)
+            await record_failed_login(test_ip)
+            
+            # 6th attempt should raise exception
+            from fastapi import HTTPException
+            with pytest.raises(HTTPException) as exc_info:
+                await check_brute_force(test_ip)
+            
+            assert exc_info.value.status_code == 429
+            
+            # Cleanup
+            await state.delete(f"bf:fail:{test_ip}")
+            await state.delete(f"bf:block:{test_ip}")
+        
+        asyncio.run(run())
+
+    def test_successful_login_resets_attempts(self):
+        import asyncio
+        from security import record_failed_login, record_successful_login, check_brute_force, state
+
+        test_ip = "192.168.1.102"
+
+        async def run():
+            for _ in range(4):
+                await record_failed_login(test_ip)
+            await record_successful_login(test_ip)
+            for _ in range(4):
+                await record_failed_login(test_ip)
+            assert await check_brute_force(test_ip)
+            await state.delete(f"bf:fail:{test_ip}")
+
+        asyncio.run(run())
+
+
+class TestRateLimitEventAggregation:
+    """log_rate_limit_event → bellekte toplama, toplu rate_limit_logs insert'i"""
+
+    def setup_method(self):
+        from security import drain_rate_limit_events
+        drain_rate_limit_events()
+
+    def test_events_aggregated_per_key_without_io(self):
+        from security import log_rate_limit_event, drain_rate_limit_events
+
+        with patch("supabase.create_client") as create_client:
+            for _ in range(50):
+                log_rate_limit_event("1.2.3.4", endpoint="/api/chat", blocked=True, reason="Anonymous hourly limit exceeded")
+            log_rate_limit_event("5.6.7.8", endpoint="/api/chat", blocked=True, reason="Anonymous hourly limit exceeded")
+        create_client.assert_not_called()
+
+        rows = {row["ip_address"]: row for row in drain_rate_limit_events()}
+        assert rows["1.2.3.4"]["hit_count"] == 50
+        assert rows["5.6.7.8"]["hit_count"] == 1
+        assert rows["1.2.3.4"]["created_at"] <= rows["1.2.3.4"]["last_seen_at"]
+        assert drain_rate_limit_events() == []
+
+    def test_brute_force_attempts_share_one_row(self):
+        import asyncio
+        from security import record_failed_login, drain_rate_limit_events, state
+
+        test_ip = "192.168.1.101"
+
+        async def run():
+            for _ in range(10):
+                await record_failed_login(test_ip)
+            await state.delete(f"bf:block:{test_ip}")
+
+        asyncio.run(run())
+        rows = drain_rate_limit_events()
+        assert len(rows) == 1
+        assert rows[0]["hit_count"] == 2
+
+    def test_key_overflow_collapses_to_wildcard_ip(self, monkeypatch):
+        import security
+
+        monkeypatch.setattr(security, "RATE_LIMIT_LOG_MAX_KEYS", 3)
+        for i in range(10):
+            security.log_rate_limit_event(f"10.0.0.{i}", endpoint="/api/chat", reason="flood")
+
+        rows = {row["ip_address"]: row for row in security.drain_rate_limit_events()}
+        assert len(rows) == 4
+        assert rows[security.RATE_LIMIT_LOG_OVERFLOW_IP]["hit_count"] == 7
+
+    def test_flush_single_batched_insert(self):
+        import asyncio
+        import json
+        import httpx
+        import dependencies
+        from security import log_rate_limit_event, rate_limit_log_stats
+        from routes.monitoring_routes import flush_rate_limit_events
+
+        requests_ = []
+
+        def handler(request):
+            requests_.append(request)
+            return httpx.Response(201)
+
+        for _ in range(3):
+            log_rate_limit_event("1.2.3.4", endpoint="/api/chat", reason="User hourly limit exceeded")
+        log_rate_limit_event("1.2.3.4", endpoint="/api/auth/login", reason="Brute force: 5+ failed attempts")
+        flushed_before = rate_limit_log_stats["rows_flushed"]
+
+        async def run():
+            dependencies.db.transport = httpx.MockTransport(handler)
+            await dependencies.db.aclose()
+            try:
+                await flush_rate_limit_events()
+                await flush_rate_limit_events()  # boş tampon: istek yok
+            finally:
+                await dependencies.db.aclose()
+                dependencies.db.transport = None
+
+        asyncio.run(run())
+        assert len(requests_) == 1
+        assert requests_[0].url.path.endswith("/rate_limit_logs")
+        body = json.loads(requests_[0].content)
+        assert sorted(row["hit_count"] for row in body) == [1, 3]
+        assert rate_limit_log_stats["rows_flushed"] - flushed_before == 2
 
 
 class TestSecurityFileUpload:
@@ -0,0 +1,72 @@
+"""
+Semantic Cache Tests - Hac & Umre Platform
+Run with: pytest tests/test_semantic_cache.py -v
+"""
+import pytest
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+
+class TestTurkishNormalization:
+    """normalize_turkish_text"""
+
+    def test_dotted_and_dotless_i(self):
+        from semantic_cache import normalize_turkish_text
+        assert normalize_turkish_text("İHRAM") == normalize_turkish_text("ihram") == "ihram"
+        assert normalize_turkish_text("ISLAK") == "islak"
+
+    def test_diacritics_punctuation_and_fillers(self):
+        from semantic_cache import normalize_turkish_text
+        assert normalize_turkish_text("Umrenin farzları nelerdir, acaba?") == "umrenin farzlari nelerdir"
+        assert normalize_turkish_text("umrenin   farzlari nelerdir") == "umrenin farzlari nelerdir"
+
+
+class TestSemanticCache:
+    """Near-duplicate lookup"""
+
+    def _cache(self, **kwargs):
+        from semantic_cache import SemanticCache
+        cache = SemanticCache(threshold=kwargs.get("threshold", 0.6), max_entries=kwargs.get("max_entries", 100))
+        cache.add("Umrenin farzları nelerdir?", "openai", "ihram ve tavaf")
+        return cache
+
+    def test_variation_hits(self):
+        cache = self._cache()
+        assert cache.lookup("umrenin farzlari neler acaba", "openai") == "ihram ve tavaf"
+        assert cache.lookup("UMRENİN FARZLARI NELERDİR", "openai") == "ihram ve tavaf"
+
+    def test_unrelated_question_misses(self):
+        cache = self._cache()
+        assert cache.lookup("Medine'de hangi yerler ziyaret edilir?", "openai") is None
+
+    def test_discriminating_terms_must_match(self):
+        """Similar wording, different answer: hac vs umre, farz vs vacip, years"""
+        cache = self._cache()
+        cache.add("Umre turu 2025 fiyatları ne kadar?", "openai", "2025 fiyatları")
+        assert cache.lookup("Haccın farzları nelerdir?", "openai") is None
+        assert cache.lookup("Umrenin vacipleri nelerdir?", "openai") is None
+        assert cache.lookup("Umre turu 2026 fiyatları ne kadar?", "openai") is None
+
+    def test_scoped_by_provider(self):
+        cache = self._cache()
+        assert cache.lookup("Umrenin farzları nelerdir?", "anthropic") is None
+
+    def test_threshold_is_configurable(self):
+        strict = self._cache(threshold=0.99)
+        assert strict.lookup("umrenin farzlari neler acaba", "openai") is None
+
+    def test_lru_eviction(self):
+        from semantic_cache import SemanticCache
+        cache = SemanticCache(threshold=0.6, max_entries=2)
+        cache.add("Tavaf nasıl yapılır?", "openai", "tavaf")
+        cache.add("Zemzem suyu nasıl içilir?", "openai", "zemzem")
+        assert cache.lookup("tavaf nasil yapilir", "openai") == "tavaf"  # tavaf now most recent
+        cache.add("Mikat sınırları nerelerdir?", "openai", "mikat")
+
+        assert len(cache) == 2
+        assert cache.lookup("zemzem suyu nasil icilir", "openai") is None
+        assert cache.lookup("tavaf nasil yapilir", "openai") == "tavaf"
+        assert not any("zemzem" in key for bucket in cache._buckets.values() for key in bucket)
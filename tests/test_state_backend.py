@@ -0,0 +1,231 @@
+"""
+State Backend Tests - Hac & Umre Platform
+Memory and Redis (fakeredis) backends must behave the same; two Redis
+backends on one fake server stand in for two replicas.
+Run with: pytest tests/test_state_backend.py -v
+"""
+import pytest
+import sys
+import os
+import asyncio
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")  # fakeredis'te Lua (EVALSHA) desteği
+
+
+def _redis_backend(server=None):
+    from state_backend import RedisStateBackend
+    client = fakeredis.FakeAsyncRedis(server=server or fakeredis.FakeServer(), decode_responses=True)
+    return RedisStateBackend(client)
+
+
+@pytest.fixture(params=["memory", "redis"])
+def backend(request):
+    from state_backend import MemoryStateBackend
+    return MemoryStateBackend() if request.param == "memory" else _redis_backend()
+
+
+class TestStateBackendContract:
+    """MemoryStateBackend / RedisStateBackend"""
+
+    def test_token_bucket_blocks_at_limit_and_refills(self, backend):
+        async def run():
+            results = [await backend.token_bucket("rate:u1", 3, 60, now=1000.0) for _ in range(4)]
+            assert [r.allowed for r in results] == [True, True, True, False]
+            assert [r.remaining for r in results] == [2, 1, 0, 0]
+            assert results[3].retry_after == pytest.approx(20.0)
+            assert results[3].reset_after == pytest.approx(60.0)
+            # 60 sn'de 3 token → 20 sn'de bir token geri gelir
+            assert not (await backend.token_bucket("rate:u1", 3, 60, now=1019.0)).allowed
+            refilled = await backend.token_bucket("rate:u1", 3, 60, now=1020.0)
+            assert refilled.allowed and refilled.remaining == 0
+
+        asyncio.run(run())
+
+    def test_rejected_requests_not_counted(self, backend):
+        async def run():
+            for _ in range(10):
+                await backend.token_bucket("rate:u2", 2, 60, now=2000.0)
+            peek = await backend.token_bucket("rate:u2", 2, 60, cost=0, now=2030.0)
+            assert peek.allowed and peek.remaining == 1
+
+        asyncio.run(run())
+
+    def test_limit_and_window_per_call(self, backend):
+        async def run():
+            anon = [await backend.token_bucket("rate:anon", 2, 3600, now=0.0) for _ in range(3)]
+            user = [await backend.token_bucket("rate:user", 5, 60, now=0.0) for _ in range(3)]
+            assert [r.allowed for r in anon] == [True, True, False]
+            assert [r.remaining for r in user] == [4, 3, 2]
+            assert user[0].limit == 5 and user[0].reset_after == pytest.approx(12.0)
+
+        asyncio.run(run())
+
+    def test_set_nx_single_use(self, backend):
+        async def run():
+            assert await backend.set_nx("nonce:abc", 120) is True
+            assert await backend.set_nx("nonce:abc", 120) is False
+            assert await backend.set_nx("nonce:def", 120) is True
+
+        asyncio.run(run())
+
+    def test_incr_get_set_delete(self, backend):
+        async def run():
+            assert [await backend.incr("bf:fail:ip", 3600) for _ in range(3)] == [1, 2, 3]
+            await backend.delete("bf:fail:ip")
+            assert await backend.incr("bf:fail:ip", 3600) == 1
+            await backend.set("csrf:s1", "token", 3600)
+            assert await backend.get("csrf:s1") == "token"
+            assert await backend.get("csrf:missing") is None
+
+        asyncio.run(run())
+
+    def test_values_expire(self, backend):
+        async def run():
+            await backend.set("bf:block:ip", "1", 0.05)
+            assert await backend.set_nx("nonce:short", 0.05)
+            await asyncio.sleep(0.1)
+            assert await backend.get("bf:block:ip") is None
+            assert await backend.set_nx("nonce:short", 0.05)
+
+        asyncio.run(run())
+
+
+class TestSharedAcrossReplicas:
+    """Aynı Redis'e bağlı iki backend = iki pod"""
+
+    def test_rate_limit_shared(self):
+        server = fakeredis.FakeServer()
+        pod_a, pod_b = _redis_backend(server), _redis_backend(server)
+
+        async def run():
+            allowed = []
+            for i in range(6):
+                pod = pod_a if i % 2 == 0 else pod_b
+                allowed.append((await pod.token_bucket("rate:user-1", 4, 3600, now=3000.0 + i)).allowed)
+            return allowed
+
+        assert asyncio.run(run()) == [True, True, True, True, False, False]
+
+    def test_nonce_not_replayable_on_other_pod(self):
+        server = fakeredis.FakeServer()
+        pod_a, pod_b = _redis_backend(server), _redis_backend(server)
+
+        async def run():
+            assert await pod_a.set_nx("nonce:n1", 120)
+            assert not await pod_b.set_nx("nonce:n1", 120)
+
+        asyncio.run(run())
+
+    def test_concurrent_hits_never_exceed_limit(self):
+        server = fakeredis.FakeServer()
+        pods = [_redis_backend(server) for _ in range(3)]
+
+        async def run():
+            results = await asyncio.gather(*(
+                pods[i % 3].token_bucket("rate:burst", 10, 60) for i in range(40)
+            ))
+            return sum(r.allowed for r in results)
+
+        assert asyncio.run(run()) == 10
+
+
+class TestRedisFallback:
+    """Redis hatasında bellek backend'i"""
+
+    def test_falls_back_to_memory_on_error(self):
+        from state_backend import RedisStateBackend, state_stats
+
+        server = fakeredis.FakeServer()
+        backend = RedisStateBackend(fakeredis.FakeAsyncRedis(server=server, decode_responses=True))
+        server.connected = False
+        errors_before = state_stats["redis_errors"]
+
+        async def run():
+            assert [(await backend.token_bucket("rate:x", 1, 60)).allowed for _ in range(2)] == [True, False]
+            assert await backend.set_nx("nonce:x", 120)
+            assert not await backend.set_nx("nonce:x", 120)
+
+        asyncio.run(run())
+        assert state_stats["redis_errors"] - errors_before == 4
+
+
+class TestSecurityStateWiring:
+    """Güvenlik state'inin backend üzerinden paylaşılması"""
+
+    def test_user_rate_limit_shared_between_pods(self, monkeypatch):
+        import cache
+
+        server = fakeredis.FakeServer()
+        pod_a, pod_b = _redis_backend(server), _redis_backend(server)
+
+        async def run():
+            results = []
+            for i in range(4):
+                monkeypatch.setattr(cache, "state", pod_a if i % 2 == 0 else pod_b)
+                results.append(await cache.check_user_rate_limit("user-42", limit=3, window=3600))
+            return results, await cache.get_user_usage("user-42", limit=3, window=3600)
+
+        assert asyncio.run(run()) == ([True, True, True, False], 3)
+
+    def test_brute_force_block_seen_by_other_pod(self, monkeypatch):
+        import security
+        from fastapi import HTTPException
+
+        server = fakeredis.FakeServer()
+        pod_a, pod_b = _redis_backend(server), _redis_backend(server)
+
+        async def run():
+            monkeypatch.setattr(security, "state", pod_a)
+            for _ in range(5):
+                await security.record_failed_login("203.0.113.9")
+            monkeypatch.setattr(security, "state", pod_b)
+            with pytest.raises(HTTPException) as exc_info:
+                await security.check_brute_force("203.0.113.9")
+            assert exc_info.value.status_code == 429
+
+        asyncio.run(run())
+        security.drain_rate_limit_events()
+
+    def test_signed_request_nonce_replay_rejected_across_pods(self, monkeypatch):
+        import hashlib
+        import time
+        import httpx
+        import signing
+        from fastapi import FastAPI
+
+        server = fakeredis.FakeServer()
+        pods = [_redis_backend(server), _redis_backend(server)]
+        monkeypatch.setattr(signing, "API_SIGNING_SECRET", "test-secret")
+
+        app = FastAPI()
+        app.add_middleware(signing.RequestSignatureMiddleware)
+
+        @app.post("/api/favorites")
+        async def favorites():
+            return {"ok": True}
+
+        timestamp = str(int(time.time()))
+        body_hash = hashlib.sha256(b"").hexdigest()
+        headers = {
+            "X-Timestamp": timestamp,
+            "X-Nonce": "nonce-1",
+            "X-Signature": signing.compute_signature("POST", "/api/favorites", timestamp, "nonce-1", body_hash, "test-secret"),
+        }
+
+        async def run():
+            statuses = []
+            for pod in pods:
+                monkeypatch.setattr(signing, "state", pod)
+                async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                    statuses.append((await client.post("/api/favorites", headers=headers)).status_code)
+            return statuses
+
+        assert asyncio.run(run()) == [200, 401]
+
+    def test_limiter_uses_memory_storage_without_redis(self):
+        import security
+        assert security.RATE_LIMIT_STORAGE_URI == "memory://"
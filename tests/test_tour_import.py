@@ -0,0 +1,307 @@
+"""
+Tour Import Tests - Hac & Umre Platform
+Streaming CSV / XLSX / NDJSON readers, row validation, upsert mode and chunked multi-row inserts.
+Run with: pytest tests/test_tour_import.py -v
+"""
+import pytest
+import sys
+import os
+import io
+import csv
+import json
+import asyncio
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+os.environ.setdefault("SUPABASE_URL", "https://test.supabase.co")
+os.environ.setdefault("SUPABASE_ANON_KEY", "test-anon")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test-service")
+
+USER = {"id": "admin-1", "email": "admin@example.com", "role": "admin"}
+FIELDS = ["title", "operator", "price", "currency", "duration", "hotel", "visa", "services", "itinerary", "start_date"]
+
+
+def _row(i, **overrides):
+    row = {
+        "title": f"Umre Turu {i}", "operator": "Operatör A", "price": str(1000 + i), "currency": "USD",
+        "duration": "15 gün", "hotel": "Hilton", "visa": "Dahil", "services": "Vize,Uçak",
+        "itinerary": "Mekke|Medine", "start_date": "2026-03-01",
+    }
+    row.update(overrides)
+    return row
+
+
+def _csv(rows) -> bytes:
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=FIELDS)
+    writer.writeheader()
+    writer.writerows(rows)
+    return out.getvalue().encode("utf-8")
+
+
+class RecordingInsert:
+    """insert_rows yerine; fail_on verilen çağrı numaralarında hata fırlatır"""
+
+    def __init__(self, fail_on=()):
+        self.calls = []
+        self.fail_on = set(fail_on)
+
+    async def __call__(self, table, rows):
+        self.calls.append((table, list(rows)))
+        if len(self.calls) in self.fail_on:
+            raise RuntimeError("connection reset")
+
+
+def _import(data: bytes, insert, batch_size=500):
+    from tour_import import iter_csv_rows, import_tours
+    return asyncio.run(import_tours(iter_csv_rows(io.BytesIO(data)), USER, insert, batch_size=batch_size))
+
+
+class TestImportPipeline:
+    """tour_import.import_tours"""
+
+    def test_rows_written_in_chunks(self):
+        insert = RecordingInsert()
+        result = _import(_csv([_row(i) for i in range(1, 1201)]), insert)
+
+        assert [len(rows) for _, rows in insert.calls] == [500, 500, 200]
+        assert {table for table, _ in insert.calls} == {"tours"}
+        assert (result.processed, result.imported, result.error_count, result.chunks) == (1200, 1200, 0, 3)
+        first = insert.calls[0][1][0]
+        assert first["price"] == 1001.0
+        assert first["services"] == ["Vize", "Uçak"]
+        assert first["itinerary"] == ["Mekke", "Medine"]
+        assert first["operator_id"] == "admin-1" and first["status"] == "approved"
+
+    def test_invalid_rows_reported_and_skipped(self):
+        insert = RecordingInsert()
+        rows = [_row(1), _row(2, hotel=""), _row(3, price="ücretsiz"), _row(4)]
+        result = _import(_csv(rows), insert)
+
+        assert [r["title"] for r in insert.calls[0][1]] == ["Umre Turu 1", "Umre Turu 4"]
+        assert result.imported == 2 and result.error_count == 2
+        assert result.errors[0] == {"row": 2, "error": "Eksik alanlar: hotel"}
+        assert result.errors[1]["row"] == 3 and "price" in result.errors[1]["error"]
+
+    def test_failed_chunk_attributed_to_its_row_range(self):
+        insert = RecordingInsert(fail_on={2})
+        rows = [_row(i) for i in range(1, 11)]
+        rows[0] = _row(1, title="")  # satır 1 doğrulamada düşer
+        result = _import(_csv(rows), insert, batch_size=4)
+
+        # Parçalar: satır 2-5, 6-9 (hata), 10
+        assert result.imported == 5
+        assert result.error_count == 1 + 4
+        assert result.errors[1] == {"chunk": 2, "rows": [6, 9], "error": "connection reset"}
+
+    def test_quoted_newlines_and_bom(self):
+        insert = RecordingInsert()
+        data = b"\xef\xbb\xbf" + _csv([_row(1, hotel="Hilton\nMakkah"), _row(2)])
+        result = _import(data, insert)
+        assert result.imported == 2
+        assert insert.calls[0][1][0]["hotel"] == "Hilton\nMakkah"
+
+    def test_error_details_capped(self, monkeypatch):
+        import tour_import
+        monkeypatch.setattr(tour_import, "IMPORT_MAX_ERROR_DETAILS", 3)
+        result = _import(_csv([_row(i, visa="") for i in range(10)]), RecordingInsert())
+        assert result.error_count == 10
+        assert len(result.errors) == 3
+
+
+class RecordingUpsert:
+    """upsert_rows yerine"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, table, rows, on_conflict, ignore_duplicates=False):
+        self.calls.append((table, list(rows), on_conflict, ignore_duplicates))
+
+
+class IndexLoader:
+    """load_index yerine: verilen mevcut turlardan istenen operatörlerinkini döner"""
+
+    def __init__(self, tours=()):
+        self.tours = list(tours)
+        self.calls = []
+
+    async def __call__(self, operators):
+        from tour_import import build_import_index
+        self.calls.append(list(operators))
+        return build_import_index(t for t in self.tours if t["operator"] in operators)
+
+
+def _existing(*rows, user=USER, **overrides):
+    """Verilen CSV satırları daha önce import edilmiş gibi turlar (id = 100 + sıra)"""
+    from tour_import import validate_row
+    return [{"id": 100 + i, **validate_row(row, user), **overrides} for i, row in enumerate(rows)]
+
+
+class TestUpsertMode:
+    """import_tours(mode="upsert")"""
+
+    def _upsert(self, rows, existing=(), batch_size=500):
+        from tour_import import iter_csv_rows, import_tours
+        insert, upsert, loader = RecordingInsert(), RecordingUpsert(), IndexLoader(existing)
+        result = asyncio.run(import_tours(
+            iter_csv_rows(io.BytesIO(_csv(rows))), USER, insert, batch_size=batch_size,
+            mode="upsert", load_index=loader, upsert_rows=upsert,
+        ))
+        assert insert.calls == []
+        return result, upsert, loader
+
+    def test_natural_key_ignores_case_whitespace_and_price_format(self):
+        from tour_import import natural_key
+        a = {"title": "Umre  Turu 1", "operator": "Operatör A", "start_date": "2026-03-01", "price": 1001.0}
+        b = {"title": "umre turu 1 ", "operator": "OPERATÖR A", "start_date": "2026-03-01T00:00:00+00:00", "price": 1001}
+        assert natural_key(a) == natural_key(b)
+        assert natural_key(a) != natural_key({**a, "price": 1002})
+        assert natural_key(a) != natural_key({**a, "start_date": "2026-04-01"})
+
+    def test_reimport_of_same_file_writes_nothing(self):
+        rows = [_row(i) for i in range(1, 6)]
+        result, upsert, _ = self._upsert(rows, _existing(*rows))
+        assert upsert.calls == []
+        assert (result.processed, result.unchanged, result.imported) == (5, 5, 0)
+
+    def test_inserted_updated_unchanged(self):
+        from tour_import import natural_key
+        existing = [_row(1), _row(2), _row(3)]
+        rows = [_row(1), _row(2, hotel="Swissotel"), _row(4), _row(3)]
+        result, upsert, _ = self._upsert(rows, _existing(*existing))
+
+        assert (result.inserted, result.updated, result.unchanged, result.imported) == (1, 1, 2, 2)
+        (_, inserts, insert_conflict, ignore), (table, updates, on_conflict, _) = upsert.calls
+        assert (insert_conflict, ignore) == ("import_key", True)
+        assert [r["title"] for r in inserts] == ["Umre Turu 4"]
+        assert inserts[0]["import_key"] == natural_key(inserts[0])
+        assert (table, on_conflict) == ("tours", "id")
+        assert len(updates) == 1
+        assert updates[0]["id"] == 101 and updates[0]["hotel"] == "Swissotel"
+
+    def test_update_keeps_status_owner_and_source(self):
+        rows = [_row(1, hotel="Swissotel")]
+        other_admin = {"id": "admin-2", "email": "other@example.com"}
+        existing = _existing(_row(1), user=other_admin, status="pending", source="manual")
+        result, upsert, _ = self._upsert(rows, existing)
+
+        update = upsert.calls[0][1][0]
+        assert result.updated == 1
+        assert update["operator_id"] == "admin-2"
+        assert not {"status", "created_by", "source"} & set(update)
+        assert update["import_key"] and update["content_hash"]
+
+    def test_legacy_tour_without_hash_is_updated_once(self):
+        rows = [_row(1)]
+        result, upsert, _ = self._upsert(rows, _existing(*rows, content_hash=None))
+        assert result.updated == 1
+        assert upsert.calls[0][2] == "id" and upsert.calls[0][1][0]["content_hash"]
+
+    def test_index_loaded_once_per_operator_of_the_rows(self):
+        rows = [_row(1), _row(2, operator="Operatör B"), _row(3), _row(4, operator="Operatör B"), _row(5, operator="Operatör C")]
+        existing = _existing(_row(2, operator="Operatör B"), _row(9, operator="Operatör Z"))
+        result, _, loader = self._upsert(rows, existing, batch_size=2)
+
+        assert loader.calls == [["Operatör A", "Operatör B"], ["Operatör C"]]
+        assert (result.inserted, result.unchanged) == (4, 1)
+
+    def test_duplicates_deduplicated_within_chunk(self):
+        rows = [_row(1), _row(1), _row(1, hotel="Swissotel")]
+        result, upsert, _ = self._upsert(rows)
+        assert [len(r) for _, r, _, _ in upsert.calls] == [1]
+        assert (result.inserted, result.unchanged, result.error_count) == (1, 1, 1)
+        assert result.errors[0]["row"] == 3
+
+    def test_duplicates_across_chunks_left_to_import_key_conflict(self):
+        rows = [_row(1), _row(2), _row(1)]
+        result, upsert, _ = self._upsert(rows, batch_size=2)
+        first, second = upsert.calls
+        assert first[3] and second[3]
+        assert first[1][0]["import_key"] == second[1][0]["import_key"]
+        assert result.error_count == 0
+
+    def test_invalid_mode_rejected(self):
+        from tour_import import import_tours
+        with pytest.raises(ValueError):
+            asyncio.run(import_tours([], USER, RecordingInsert(), mode="merge"))
+        with pytest.raises(ValueError):
+            asyncio.run(import_tours([], USER, RecordingInsert(), mode="upsert"))
+
+
+def _collect(reader, data: bytes):
+    return list(reader(io.BytesIO(data)))
+
+
+class TestReaders:
+    """tour_import.IMPORT_READERS"""
+
+    def test_csv_windows_1254_with_semicolons(self):
+        from tour_import import iter_csv_rows
+        data = "title;operator;hotel\r\nUmre Turu;Işık Turizm;Şahin Otel\r\n".encode("cp1254")
+        assert _collect(iter_csv_rows, data) == [(1, {"title": "Umre Turu", "operator": "Işık Turizm", "hotel": "Şahin Otel"})]
+
+    def test_csv_utf8_split_at_sniff_boundary(self, monkeypatch):
+        import tour_import
+        data = "title,hotel\nÜmre,Çelik\n".encode("utf-8")
+        # Örnek "Ü"nün ortasında biter; yine UTF-8 sayılmalı
+        monkeypatch.setattr(tour_import, "IMPORT_SNIFF_BYTES", data.index("Ü".encode()) + 1)
+        assert _collect(tour_import.iter_csv_rows, data) == [(1, {"title": "Ümre", "hotel": "Çelik"})]
+
+    def test_sniff_encoding(self):
+        from tour_import import sniff_encoding
+        assert sniff_encoding(b"\xef\xbb\xbftitle") == "utf-8-sig"
+        assert sniff_encoding("Gümüşhane".encode("utf-8")) == "utf-8"
+        assert sniff_encoding("Gümüşhane".encode("cp1254")) == "cp1254"
+
+    def test_ndjson_rows_and_bad_lines(self):
+        from tour_import import ImportRowError, iter_ndjson_rows
+        data = (
+            '{"title": "Umre", "price": 1500, "services": ["Vize", "Uçak"], "rating": null}\n'
+            '\n'
+            '{"title": \n'
+            '[1, 2]\n'
+        ).encode("utf-8")
+        rows = _collect(iter_ndjson_rows, data)
+        assert rows[0] == (1, {"title": "Umre", "price": "1500", "services": ["Vize", "Uçak"], "rating": ""})
+        assert [n for n, _ in rows] == [1, 2, 3]
+        assert all(isinstance(row, ImportRowError) for _, row in rows[1:])
+
+    def test_ndjson_through_pipeline(self):
+        from tour_import import iter_ndjson_rows, import_tours
+        lines = [json.dumps({**_row(1), "price": 1001, "itinerary": ["Mekke", "Medine"]}), "not json"]
+        insert = RecordingInsert()
+        result = asyncio.run(import_tours(
+            iter_ndjson_rows(io.BytesIO("\n".join(lines).encode())), USER, insert
+        ))
+        doc = insert.calls[0][1][0]
+        assert (doc["price"], doc["itinerary"], doc["services"]) == (1001.0, ["Mekke", "Medine"], ["Vize", "Uçak"])
+        assert result.imported == 1 and result.errors[0]["row"] == 2
+
+    def test_xlsx_rows(self):
+        openpyxl = pytest.importorskip("openpyxl")
+        from datetime import datetime
+        from tour_import import iter_xlsx_rows
+
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.append(["title", "price", "start_date", "rating", "hotel"])
+        sheet.append(["Umre Turu 1", 1500.0, datetime(2026, 3, 1), 4.5, None])
+        sheet.append([None, None, None, None, None])
+        sheet.append(["Umre Turu 2", 2000, datetime(2026, 4, 1), None, "Hilton"])
+        out = io.BytesIO()
+        workbook.save(out)
+
+        assert _collect(iter_xlsx_rows, out.getvalue()) == [
+            (1, {"title": "Umre Turu 1", "price": "1500", "start_date": "2026-03-01", "rating": "4.5", "hotel": ""}),
+            (2, {"title": "Umre Turu 2", "price": "2000", "start_date": "2026-04-01", "rating": "", "hotel": "Hilton"}),
+        ]
+
+    def test_detect_format(self):
+        from tour_import import detect_format
+        assert detect_format("Katalog.XLSX") == "xlsx"
+        assert detect_format("tours.jsonl") == "ndjson"
+        assert detect_format("tours.csv") == "csv"
+        assert detect_format("tours.xls") is None
+        assert detect_format(None) is None
@@ -0,0 +1,268 @@
+"""
+Tour Route Tests - Hac & Umre Platform
+PostgREST is replaced by an in-process httpx transport; no network needed.
+Run with: pytest tests/test_tour_routes.py -v
+"""
+import pytest
+import sys
+import os
+import json
+import asyncio
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+os.environ.setdefault("SUPABASE_URL", "https://test.supabase.co")
+os.environ.setdefault("SUPABASE_ANON_KEY", "test-anon")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test-service")
+
+import httpx
+from fastapi import FastAPI
+
+
+class FakePostgrest:
+    """Records PostgREST requests and answers with canned rows"""
+
+    def __init__(self, rows=None, total=None):
+        self.rows = rows or []
+        self.total = total if total is not None else len(self.rows)
+        self.requests = []
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        headers = {"content-type": "application/json"}
+        if "count=" in request.headers.get("prefer", ""):
+            headers["content-range"] = f"0-{max(len(self.rows) - 1, 0)}/{self.total}"
+        return httpx.Response(200, headers=headers, content=json.dumps(self.rows).encode())
+
+
+def _get(fake: FakePostgrest, path: str, headers: dict = None) -> httpx.Response:
+    import dependencies
+    from routes.tour_routes import router
+
+    app = FastAPI()
+    app.include_router(router)
+
+    async def run():
+        dependencies.db.transport = httpx.MockTransport(fake.handler)
+        await dependencies.db.aclose()
+        try:
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                return await client.get(path, headers=headers)
+        finally:
+            await dependencies.db.aclose()
+            dependencies.db.transport = None
+
+    return asyncio.run(run())
+
+
+def _reset_cache():
+    from cache import memory_cache
+    memory_cache.clear()
+
+
+class TestTourListing:
+    """GET /api/tours"""
+
+    def setup_method(self):
+        _reset_cache()
+
+    def test_single_round_trip_with_filtered_total(self):
+        """Rows and total come from one filtered query"""
+        fake = FakePostgrest(rows=[{"id": 1, "price": 1800}], total=7)
+        response = _get(fake, "/api/tours?min_price=1500&max_price=2000&operator=Hira")
+
+        assert response.status_code == 200
+        assert response.json()["total"] == 7
+        assert len(fake.requests) == 1
+
+        request = fake.requests[0]
+        assert "count=exact" in request.headers["prefer"]
+        params = str(request.url.params)
+        assert "price=gte.1500" in params
+        assert "price=lte.2000" in params
+        assert "operator=ilike" in params
+
+    def test_estimated_count_mode(self):
+        """count=estimated asks PostgREST for a planner estimate"""
+        fake = FakePostgrest(rows=[], total=1000)
+        response = _get(fake, "/api/tours?count=estimated")
+
+        assert response.status_code == 200
+        assert "count=estimated" in fake.requests[0].headers["prefer"]
+        assert response.json()["total"] == 1000
+
+    def test_count_none_skips_total(self):
+        """count=none returns no total and sends no count preference"""
+        fake = FakePostgrest(rows=[{"id": 1}])
+        response = _get(fake, "/api/tours?count=none")
+
+        assert response.status_code == 200
+        assert response.json()["total"] is None
+        assert "count=" not in fake.requests[0].headers.get("prefer", "")
+
+    def test_invalid_count_mode_rejected(self):
+        fake = FakePostgrest()
+        response = _get(fake, "/api/tours?count=bogus")
+        assert response.status_code == 400
+        assert fake.requests == []
+
+
+class TestTourCursorPagination:
+    """Keyset pagination on GET /api/tours"""
+
+    def setup_method(self):
+        _reset_cache()
+
+    def _rows(self, n):
+        return [{"id": i, "created_at": f"2026-01-{30 - i:02d}T10:00:00+00:00"} for i in range(1, n + 1)]
+
+    def test_next_cursor_when_more_rows(self):
+        """limit+1 rows are fetched; the extra row only signals another page"""
+        fake = FakePostgrest(rows=self._rows(3))
+        response = _get(fake, "/api/tours?limit=2")
+
+        body = response.json()
+        assert [t["id"] for t in body["tours"]] == [1, 2]
+        assert body["next_cursor"]
+        assert fake.requests[0].url.params["limit"] == "3"
+
+    def test_last_page_has_no_cursor(self):
+        fake = FakePostgrest(rows=self._rows(2))
+        response = _get(fake, "/api/tours?limit=2")
+        assert response.json()["next_cursor"] is None
+
+    def test_cursor_applies_keyset_filter(self):
+        """A cursor replaces the offset with a (created_at, id) filter"""
+        from dependencies import encode_cursor
+
+        cursor = encode_cursor("created_at", "2026-01-28T10:00:00+00:00", 2)
+        fake = FakePostgrest(rows=self._rows(1))
+        response = _get(fake, f"/api/tours?limit=2&skip=40&cursor={cursor}")
+
+        assert response.status_code == 200
+        params = fake.requests[0].url.params
+        assert params["offset"] == "0"
+        assert params["order"] == "created_at.desc,id.desc"
+        assert params["or"] == (
+            '(created_at.lt."2026-01-28T10:00:00+00:00",'
+            'and(created_at.eq."2026-01-28T10:00:00+00:00",id.lt."2"))'
+        )
+
+    def test_total_only_counted_on_first_page(self):
+        """Cursor pages skip count=exact and report no total"""
+        from dependencies import encode_cursor
+
+        cursor = encode_cursor("created_at", "2026-01-28T10:00:00+00:00", 2)
+        fake = FakePostgrest(rows=self._rows(1), total=9)
+        first = _get(fake, "/api/tours?limit=2")
+        later = _get(fake, f"/api/tours?limit=2&cursor={cursor}")
+
+        assert first.json()["total"] == 9
+        assert later.json()["total"] is None
+        assert "count=" not in fake.requests[1].headers.get("prefer", "")
+
+    def test_cursor_for_other_sort_rejected(self):
+        from dependencies import encode_cursor
+
+        cursor = encode_cursor("price", 1500, 2)
+        fake = FakePostgrest()
+        response = _get(fake, f"/api/tours?cursor={cursor}")
+        assert response.status_code == 400
+        assert fake.requests == []
+
+    def test_garbage_cursor_rejected(self):
+        fake = FakePostgrest()
+        response = _get(fake, "/api/tours?cursor=not-a-cursor")
+        assert response.status_code == 400
+
+    def test_unknown_sort_column_rejected(self):
+        fake = FakePostgrest()
+        for query in ("sort_by=operator_id", "sort_by=price.lt.0,id", "sort_order=sideways"):
+            assert _get(fake, f"/api/tours?{query}").status_code == 400
+        assert fake.requests == []
+
+    def test_nullable_sort_puts_nulls_last(self):
+        fake = FakePostgrest(rows=[{"id": 1, "start_date": "2026-03-01"}])
+        _get(fake, "/api/tours?sort_by=start_date&sort_order=asc")
+        assert fake.requests[0].url.params["order"] == "start_date.asc.nullslast,id.asc"
+
+    def test_null_sort_value_keeps_paginating(self):
+        """The page ending on a NULL start_date still yields a cursor; the next page walks the NULLs by id"""
+        from dependencies import decode_cursor
+
+        rows = [{"id": 4, "start_date": "2026-03-01"}, {"id": 5, "start_date": None}, {"id": 6, "start_date": None}]
+        fake = FakePostgrest(rows=rows)
+        body = _get(fake, "/api/tours?sort_by=start_date&sort_order=asc&limit=2").json()
+        assert decode_cursor(body["next_cursor"], "start_date", desc=False) == (None, 5)
+
+        _reset_cache()
+        _get(fake, f"/api/tours?sort_by=start_date&sort_order=asc&limit=2&cursor={body['next_cursor']}")
+        params = fake.requests[1].url.params
+        assert (params["start_date"], params["id"]) == ("is.null", "gt.5")
+        assert "or" not in params
+
+    def test_nullable_cursor_includes_null_rows(self):
+        from dependencies import encode_cursor
+
+        cursor = encode_cursor("start_date", "2026-03-01", 4, desc=False)
+        fake = FakePostgrest()
+        _get(fake, f"/api/tours?sort_by=start_date&sort_order=asc&cursor={cursor}")
+        assert fake.requests[0].url.params["or"] == (
+            '(start_date.gt."2026-03-01",and(start_date.eq."2026-03-01",id.gt."4"),start_date.is.null)'
+        )
+
+
+class TestTourCache:
+    """Read-through cache + ETag for public tour endpoints"""
+
+    def setup_method(self):
+        _reset_cache()
+
+    def test_list_served_from_cache(self):
+        fake = FakePostgrest(rows=[{"id": 1}])
+        first = _get(fake, "/api/tours?limit=5")
+        second = _get(fake, "/api/tours?limit=5")
+
+        assert first.json() == second.json()
+        assert len(fake.requests) == 1
+        assert "public" in second.headers["cache-control"]
+
+    def test_param_order_and_case_share_key(self):
+        fake = FakePostgrest(rows=[{"id": 1}])
+        _get(fake, "/api/tours?operator=Hira&limit=5")
+        _get(fake, "/api/tours?limit=5&operator=hira")
+        assert len(fake.requests) == 1
+
+    def test_non_public_status_not_cached(self):
+        fake = FakePostgrest(rows=[{"id": 1, "status": "pending"}])
+        _get(fake, "/api/tours?status=pending")
+        response = _get(fake, "/api/tours?status=pending")
+        assert len(fake.requests) == 2
+        assert "etag" not in response.headers
+
+    def test_etag_not_modified(self):
+        fake = FakePostgrest(rows=[{"id": 3, "status": "approved"}])
+        first = _get(fake, "/api/tours/3")
+        second = _get(fake, "/api/tours/3", headers={"If-None-Match": first.headers["etag"]})
+
+        assert first.status_code == 200
+        assert second.status_code == 304
+        assert second.content == b""
+
+    def test_unapproved_detail_not_cached(self):
+        fake = FakePostgrest(rows=[{"id": 4, "status": "pending"}])
+        assert _get(fake, "/api/tours/4").status_code == 404
+        assert _get(fake, "/api/tours/4").status_code == 404
+        assert len(fake.requests) == 2
+
+    def test_invalidation_drops_list_and_detail(self):
+        from dependencies import invalidate_tours
+
+        fake = FakePostgrest(rows=[{"id": 5, "status": "approved"}])
+        _get(fake, "/api/tours")
+        _get(fake, "/api/tours/5")
+        asyncio.run(invalidate_tours(5))
+        _get(fake, "/api/tours")
+        _get(fake, "/api/tours/5")
+        assert len(fake.requests) == 4
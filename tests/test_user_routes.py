@@ -0,0 +1,131 @@
+"""
+User Route Tests - Hac & Umre Platform
+PostgREST is replaced by an in-process httpx transport; no network needed.
+Run with: pytest tests/test_user_routes.py -v
+"""
+import pytest
+import sys
+import os
+import json
+import asyncio
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+os.environ.setdefault("SUPABASE_URL", "https://test.supabase.co")
+os.environ.setdefault("SUPABASE_ANON_KEY", "test-anon")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test-service")
+
+import httpx
+from fastapi import FastAPI
+
+USER = {"id": "user-1", "email": "user@example.com", "role": "user"}
+
+
+class FakePostgrest:
+    """tours için in.(...) filtresine göre durum döner, favorites yazımlarını kaydeder"""
+
+    def __init__(self, statuses: dict, fail_writes: bool = False):
+        self.statuses = statuses
+        self.fail_writes = fail_writes
+        self.requests = []
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        headers = {"content-type": "application/json"}
+        if request.url.path.endswith("/tours"):
+            ids = [int(i) for i in request.url.params["id"][len("in.("):-1].split(",")]
+            rows = [{"id": i, "status": self.statuses[i]} for i in ids if i in self.statuses]
+            return httpx.Response(200, headers=headers, content=json.dumps(rows).encode())
+        if self.fail_writes:
+            return httpx.Response(500, headers=headers, content=b'{"message": "db down"}')
+        return httpx.Response(201, headers=headers, content=b"")
+
+    @property
+    def writes(self):
+        return [r for r in self.requests if r.method == "POST"]
+
+
+def _sync(fake: FakePostgrest, tour_ids) -> httpx.Response:
+    import dependencies
+    from routes.user_routes import router
+
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[dependencies.get_current_user] = lambda: USER
+
+    async def run():
+        dependencies.db.transport = httpx.MockTransport(fake.handler)
+        await dependencies.db.aclose()
+        try:
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                return await client.post("/api/favorites/sync", json={"tour_ids": tour_ids})
+        finally:
+            await dependencies.db.aclose()
+            dependencies.db.transport = None
+
+    return asyncio.run(run())
+
+
+class TestFavoritesSync:
+    """POST /api/favorites/sync"""
+
+    def test_two_round_trips_with_per_id_results(self):
+        fake = FakePostgrest({1: "approved", 2: "pending", 3: "approved"})
+        response = _sync(fake, [1, 2, 3, 4, 1])
+
+        assert response.status_code == 200
+        body = response.json()
+        assert (body["synced"], body["skipped"]) == (2, 2)
+        assert body["results"] == [
+            {"tour_id": 1, "status": "synced"},
+            {"tour_id": 2, "status": "unavailable"},
+            {"tour_id": 3, "status": "synced"},
+            {"tour_id": 4, "status": "not_found"},
+        ]
+
+        assert len(fake.requests) == 2
+        lookup, write = fake.requests
+        assert lookup.url.params["id"] == "in.(1,2,3,4)"
+        assert json.loads(write.content) == [{"user_id": "user-1", "tour_id": 1}, {"user_id": "user-1", "tour_id": 3}]
+        assert write.url.params["on_conflict"] == "user_id,tour_id"
+        assert "resolution=ignore-duplicates" in write.headers["prefer"]
+
+    def test_nothing_approved_skips_write(self):
+        fake = FakePostgrest({1: "rejected"})
+        body = _sync(fake, [1, 2]).json()
+        assert body["synced"] == 0
+        assert fake.writes == []
+
+    def test_empty_list(self):
+        fake = FakePostgrest({})
+        body = _sync(fake, []).json()
+        assert (body["synced"], body["skipped"], body["results"]) == (0, 0, [])
+        assert fake.requests == []
+
+    def test_ids_over_cap_rejected(self):
+        from dependencies import FAVORITES_SYNC_MAX_IDS
+        fake = FakePostgrest({})
+        response = _sync(fake, list(range(1, FAVORITES_SYNC_MAX_IDS + 2)))
+
+        assert response.status_code == 422
+        assert fake.requests == []
+
+    def test_ids_at_cap_accepted(self):
+        from dependencies import FAVORITES_SYNC_MAX_IDS
+        fake = FakePostgrest({1: "approved"})
+        body = _sync(fake, list(range(1, FAVORITES_SYNC_MAX_IDS + 1))).json()
+
+        assert len(body["results"]) == FAVORITES_SYNC_MAX_IDS
+        assert body["synced"] == 1
+
+    def test_failed_write_marks_ids_as_error(self):
+        fake = FakePostgrest({1: "approved", 2: "pending"}, fail_writes=True)
+        response = _sync(fake, [1, 2])
+
+        assert response.status_code == 200
+        assert response.json()["results"] == [
+            {"tour_id": 1, "status": "error"},
+            {"tour_id": 2, "status": "unavailable"},
+        ]
+        assert response.json()["synced"] == 0
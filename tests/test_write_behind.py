@@ -0,0 +1,136 @@
+"""
+Write-Behind Queue Tests - Hac & Umre Platform
+Run with: pytest tests/test_write_behind.py -v
+"""
+import pytest
+import sys
+import os
+import asyncio
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+
+class RecordingInserter:
+    """(tablo, satırlar) çağrılarını kaydeder; fail_tables için hata fırlatır"""
+
+    def __init__(self, fail_tables=(), fail_rows=(), delay=0.0):
+        self.calls = []
+        self.fail_tables = set(fail_tables)
+        self.fail_rows = set(fail_rows)
+        self.delay = delay
+
+    async def __call__(self, table, rows):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if table in self.fail_tables or any(row.get("n") in self.fail_rows for row in rows):
+            raise RuntimeError("insert failed")
+        self.calls.append((table, [row["n"] for row in rows]))
+
+
+def _queue(inserter, **kwargs):
+    from write_behind import WriteBehindQueue
+    return WriteBehindQueue(inserter, **{"maxsize": 100, "batch_size": 50, "flush_interval": 0.05, "enabled": True, **kwargs})
+
+
+class TestWriteBehindQueue:
+    """WriteBehindQueue"""
+
+    def test_rows_batched_per_table(self):
+        inserter = RecordingInserter()
+        queue = _queue(inserter)
+
+        async def run():
+            queue.start()
+            for n in range(3):
+                await queue.submit("chats", {"n": n})
+            await queue.submit("comparisons", {"n": 10})
+            assert inserter.calls == []  # yanıt yolunda insert yok
+            await asyncio.sleep(0.15)
+            await queue.stop()
+
+        asyncio.run(run())
+        assert inserter.calls == [("chats", [0, 1, 2]), ("comparisons", [10])]
+        assert queue.stats["batches"] == 2
+        assert queue.stats["written"] == 4
+        assert queue.stats["lost_writes"] == 0
+
+    def test_batch_size_caps_insert(self):
+        inserter = RecordingInserter()
+        queue = _queue(inserter, batch_size=2, flush_interval=1.0)
+
+        async def run():
+            queue.start()
+            for n in range(5):
+                await queue.submit("chats", {"n": n})
+            await queue.stop()
+
+        asyncio.run(run())
+        assert [rows for _, rows in inserter.calls] == [[0, 1], [2, 3], [4]]
+
+    def test_stop_drains_queue(self):
+        inserter = RecordingInserter()
+        queue = _queue(inserter, flush_interval=10.0)
+
+        async def run():
+            queue.start()
+            for n in range(4):
+                await queue.submit("audit_logs", {"n": n})
+            await asyncio.sleep(0.01)  # task satırları toplarken kapanış
+            await queue.stop()
+
+        asyncio.run(run())
+        assert sorted(n for _, rows in inserter.calls for n in rows) == [0, 1, 2, 3]
+        assert queue.stats["lost_writes"] == 0
+        assert queue.get_stats()["running"] is False
+
+    def test_backpressure_writes_directly_when_full(self):
+        inserter = RecordingInserter(delay=0.05)
+        queue = _queue(inserter, maxsize=2, batch_size=1, flush_interval=0.0)
+
+        async def run():
+            queue.start()
+            for n in range(6):
+                await queue.submit("chats", {"n": n})
+            await queue.stop()
+
+        asyncio.run(run())
+        assert queue.stats["backpressure"] >= 1
+        assert sorted(n for _, rows in inserter.calls for n in rows) == list(range(6))
+        assert queue.stats["max_depth"] == 2
+
+    def test_failed_batch_retried_per_row_and_counted_lost(self):
+        inserter = RecordingInserter(fail_rows={1})
+        queue = _queue(inserter)
+
+        async def run():
+            queue.start()
+            for n in range(3):
+                await queue.submit("chats", {"n": n})
+            await queue.stop()
+
+        asyncio.run(run())
+        assert inserter.calls == [("chats", [0]), ("chats", [2])]
+        assert queue.stats["batch_failures"] == 1
+        assert queue.stats["lost_writes"] == 1
+
+    def test_direct_write_without_task(self):
+        inserter = RecordingInserter()
+        queue = _queue(inserter)
+
+        asyncio.run(queue.submit("user_notifications", {"n": 7}))
+        assert inserter.calls == [("user_notifications", [7])]
+        assert queue.stats["direct_writes"] == 1
+
+    def test_disabled_queue_writes_directly(self):
+        inserter = RecordingInserter()
+        queue = _queue(inserter, enabled=False)
+
+        async def run():
+            queue.start()
+            await queue.submit("chats", {"n": 1})
+            assert inserter.calls == [("chats", [1])]
+            await queue.stop()
+
+        asyncio.run(run())
+        assert queue.stats["enqueued"] == 0